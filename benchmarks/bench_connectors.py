@@ -0,0 +1,157 @@
+"""
+Connection setup, command latency and bulk download of `SSHConnector`, `KeyConnector` and `OpenSSHConnector`.
+
+    python benchmarks/bench_connectors.py
+    python benchmarks/bench_connectors.py --address 10.0.0.2 --user pardus --password pardus --key ~/.ssh/id_rsa
+
+Without `--address`, the connectors run against a simulated host (see `mock_fleet.py`). Its server side is paramiko
+too, so bulk numbers there are bounded by it; use a real host to compare transfers.
+
+`reuse` is the time a new process takes to connect and run one command. `OpenSSHConnector` finds the master
+connection started by this process and skips the handshake.
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from typing import Any, Callable, Dict, List, Optional
+
+import paramiko
+
+from post import KeyConnector, SSHConnector
+from post.connection.model_connector import ModelConnector
+from post.connection.openssh_connector import OpenSSHConnector
+
+REUSE_SCRIPT = """
+import logging, sys, time
+logging.disable(logging.ERROR)
+start = time.perf_counter()
+from post.connection.openssh_connector import OpenSSHConnector
+connector = OpenSSHConnector(sys.argv[1], int(sys.argv[2]), sys.argv[3], sys.argv[4] or None, lazy=True,
+                             control_dir=sys.argv[5], options={"UserKnownHostsFile": "/dev/null"}, metrics=None)
+connector.run("true")
+print(time.perf_counter() - start)
+"""
+
+
+def best(operation: Callable[[], Any], repeat: int) -> float:
+    """Returns the best time in seconds of an operation"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def measure(name: str, factory: Callable[[], ModelConnector], commands: int, blob: str, blob_size: int,
+            repeat: int) -> Dict[str, Any]:
+    """
+    Times a connector.
+
+    Args:
+        name (str): the name of the connector
+        factory (Callable[[], ModelConnector]): connects a new connector
+        commands (int): number of sequential commands timed
+        blob (str): path of a file to download
+        blob_size (int): its size in bytes
+        repeat (int): runs of each measure, the best one counts
+
+    Returns:
+        Dict[str, Any]: setup, per command and transfer figures
+    """
+    start = time.perf_counter()
+    connector = factory()
+    connector.run("true")
+    setup = time.perf_counter() - start
+
+    sequential = best(lambda: [connector.run("echo post") for _ in range(commands)], repeat)
+    download = best(lambda: connector.read_file(blob), repeat)
+    many = best(lambda: connector.run_many(["echo post"] * commands), repeat)
+    connector.close()
+
+    return {
+        "connector": name,
+        "setup_seconds": setup,
+        "command_seconds": sequential / commands,
+        "run_many_seconds": many / commands,
+        "download_mib_per_second": blob_size / download / 2 ** 20,
+    }
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--address", help="a real host instead of the simulated one")
+    parser.add_argument("--port", type=int, default=22)
+    parser.add_argument("--user", default="pardus")
+    parser.add_argument("--password", default="pardus")
+    parser.add_argument("--key", help="private key for KeyConnector and OpenSSHConnector (-i)")
+    parser.add_argument("--blob", default="/var/tmp/post-bench.bin", help="file downloaded from the host")
+    parser.add_argument("--blob-size", type=int, default=32 * 2 ** 20, help="its size, created if missing")
+    parser.add_argument("--commands", type=int, default=50, help="commands per latency measure")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measure, the best one counts")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args(arguments)
+
+    logging.disable(logging.ERROR)
+    with ExitStack() as stack:
+        directory = stack.enter_context(tempfile.TemporaryDirectory())
+        control_dir = os.path.join(directory, "control")
+        key = args.key
+        if args.address is None:
+            from mock_fleet import MockFleet
+
+            fleet = stack.enter_context(MockFleet(hosts=1))
+            address, port = fleet.addresses[0]
+            user, password = fleet.user, fleet.password
+            fleet.hosts[0].directories.add(os.path.dirname(args.blob))
+            fleet.hosts[0].write(args.blob, os.urandom(args.blob_size))
+            if key is None:
+                key = os.path.join(directory, "id_rsa")
+                paramiko.RSAKey.generate(2048).write_private_key_file(key)
+        else:
+            address, port, user, password = args.address, args.port, args.user, args.password
+            SSHConnector(address, port, user, password).sudo_run(
+                f"test -e {args.blob} || head -c {args.blob_size} /dev/urandom > {args.blob}"
+            )
+
+        options = {"UserKnownHostsFile": "/dev/null"}
+        factories: Dict[str, Callable[[], ModelConnector]] = {
+            "SSHConnector": lambda: SSHConnector(address, port, user, password, metrics=None),
+            "OpenSSHConnector": lambda: OpenSSHConnector(address, port, user, password, control_dir=control_dir,
+                                                         options=options, metrics=None),
+        }
+        if key is not None:
+            factories["KeyConnector"] = lambda: KeyConnector(address, port, user, key, metrics=None)
+
+        results = []
+        print(f"{'connector':<18}{'setup ms':>10}{'command ms':>12}{'run_many ms':>13}{'MiB/s':>9}")
+        for name, factory in factories.items():
+            result = measure(name, factory, args.commands, args.blob, args.blob_size, args.repeat)
+            results.append(result)
+            print(f"{name:<18}{result['setup_seconds'] * 1000:>10.1f}{result['command_seconds'] * 1000:>12.2f}"
+                  f"{result['run_many_seconds'] * 1000:>13.2f}{result['download_mib_per_second']:>9.1f}")
+
+        reuse = subprocess.run([sys.executable, "-c", REUSE_SCRIPT, address, str(port), user, password or "",
+                                control_dir], capture_output=True, text=True, check=True)
+        print(f"new process reusing the OpenSSH master: {float(reuse.stdout) * 1000:.1f} ms")
+        results.append({"connector": "OpenSSHConnector (new process)", "setup_seconds": float(reuse.stdout)})
+
+        OpenSSHConnector(address, port, user, password, control_dir=control_dir, options=options, lazy=True,
+                         metrics=None).stop()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+End-to-end wall time, connections per second and memory of the fleet managers, against simulated hosts (see
+`mock_fleet.py`).
+
+    python benchmarks/bench_fleet.py --hosts 10 100 500
+    python benchmarks/bench_fleet.py --hosts 2000 --latency 0.02 --bandwidth 1000000 --failure-rate 0.01
+
+Each fleet size starts its own simulated hosts, connects lazy `SSHConnector`s to them with `connect_all`, then times
+`AptList.list`, `ServiceList.list` and `UserList.list`. With `--processes`, `apt list` is also run by a
+`FleetExecutor` sharding the hosts over that many worker processes, connections included. Memory is the peak
+resident set size of the process, which includes the simulated hosts.
+"""
+import argparse
+import json
+import logging
+import resource
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from mock_fleet import MockFleet
+
+from post import Apt, AptList, Service, ServiceList, SSHConnector, User, UserList
+from post.connection.base_ssh_connector import connect_all
+from post.connection.fleet import FleetExecutor, HostSpec
+
+
+def peak_rss() -> int:
+    """Returns the peak resident set size of the process in bytes"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def timed(operation: Callable[[], Any]) -> Dict[str, Any]:
+    """Runs an operation and returns its wall time and the number of hosts that answered"""
+    start = time.perf_counter()
+    result = operation()
+    return {"seconds": time.perf_counter() - start, "answered": len(result)}
+
+
+def run(hosts: int, latency: float, bandwidth: Optional[float], failure_rate: float, connect_failure_rate: float,
+        concurrency: int, packages: int, units: int, processes: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Runs the managers against a simulated fleet of the given size.
+
+    Returns:
+        Dict[str, Any]: wall times, connection rate, failures and peak memory
+    """
+    with MockFleet(hosts=hosts, latency=latency, bandwidth=bandwidth, failure_rate=failure_rate,
+                   connect_failure_rate=connect_failure_rate, packages=packages, units=units) as fleet:
+        connectors = [SSHConnector(address, port, fleet.user, fleet.password, lazy=True, metrics=None)
+                      for address, port in fleet.addresses]
+        start = time.perf_counter()
+        errors = connect_all(connectors, concurrency=concurrency)
+        connect_seconds = time.perf_counter() - start
+        connected = sum(error is None for error in errors)
+
+        result = {
+            "hosts": hosts,
+            "connected": connected,
+            "connect_seconds": connect_seconds,
+            "connections_per_second": connected / connect_seconds if connect_seconds else 0.0,
+            "apt list": timed(lambda: AptList([Apt(connector, cache=None) for connector in connectors]).list()),
+            "systemctl list-units": timed(
+                lambda: ServiceList([Service(connector, cache=None) for connector in connectors]).list()
+            ),
+            "users": timed(lambda: UserList([User(connector) for connector in connectors]).list()),
+        }
+
+        for connector in connectors:
+            connector.close()
+
+        if processes:
+            specs = [HostSpec(address, port, fleet.user, fleet.password, options={"metrics": None})
+                     for address, port in fleet.addresses]
+            with FleetExecutor(specs, processes=processes, initializer=logging.disable,
+                               initargs=(logging.ERROR,)) as executor:
+                result["apt list (processes)"] = timed(lambda: executor.map("Apt(cache=None).list()"))
+
+        result["commands"] = fleet.commands
+        result["injected_failures"] = fleet.failures
+        result["peak_rss_bytes"] = peak_rss()
+        return result
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, nargs="+", default=[10, 100, 500], help="fleet sizes to run")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds each command waits on the host")
+    parser.add_argument("--bandwidth", type=float, help="bytes per second of each command output")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="probability a command drops its connection")
+    parser.add_argument("--connect-failure-rate", type=float, default=0.0,
+                        help="probability a new connection is dropped")
+    parser.add_argument("--concurrency", type=int, default=64, help="handshakes in flight in connect_all")
+    parser.add_argument("--packages", type=int, default=2000, help="packages in the simulated package database")
+    parser.add_argument("--units", type=int, default=200, help="systemd units per simulated host")
+    parser.add_argument("--processes", type=int, help="also run apt list from this many worker processes")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args(arguments)
+
+    logging.disable(logging.ERROR)
+    results = []
+    print(f"{'hosts':>6}{'conn/s':>10}{'apt s':>10}{'units s':>10}{'users s':>10}{'failures':>10}{'peak MiB':>10}")
+    for hosts in args.hosts:
+        result = run(hosts, args.latency, args.bandwidth, args.failure_rate, args.connect_failure_rate,
+                     args.concurrency, args.packages, args.units, args.processes)
+        results.append(result)
+        print(f"{hosts:>6}{result['connections_per_second']:>10.1f}{result['apt list']['seconds']:>10.2f}"
+              f"{result['systemctl list-units']['seconds']:>10.2f}{result['users']['seconds']:>10.2f}"
+              f"{result['injected_failures']:>10}{result['peak_rss_bytes'] / 2 ** 20:>10.1f}")
+        if "apt list (processes)" in result:
+            print(f"{'':>6}apt list from {args.processes} processes: {result['apt list (processes)']['seconds']:.2f} s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""
+Throughput and peak memory of the text parsers, on synthetic outputs (see `fixtures.py`).
+
+    python benchmarks/bench_parsers.py --scale realistic
+    python benchmarks/bench_parsers.py --scale realistic --baseline benchmarks/baseline.json
+    python benchmarks/bench_parsers.py --scale realistic --save-baseline benchmarks/baseline.json
+
+Throughput is normalized by a fixed pure python workload timed on the same machine (`calibrate`), so a baseline
+saved on one machine can be compared on another. The exit status is 1 if a parser got slower (or used more memory)
+than the baseline by more than the threshold.
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import fixtures
+
+from post.apt.apt import package_parser, package_stream_parser, search_parser, show_parser
+from post.connection.stream import CHUNK_SIZE, iter_lines
+from post.sambatool.gpo import gpo_parser, parse_ldif
+from post.service.service import service_parser
+
+SCALES = ("smoke", "realistic", "extreme")
+
+
+def chunks(text: str) -> List[bytes]:
+    """Splits an output into the chunks a channel delivers"""
+    data = text.encode()
+    return [data[start:start + CHUNK_SIZE] for start in range(0, len(data), CHUNK_SIZE)]
+
+
+def gui_arrangers() -> Tuple[Optional[Callable], Optional[Callable]]:
+    """Returns the GUI arrangers. None if PyQt6 is not installed."""
+    try:
+        from post.gui.apt_main import package_arranger
+        from post.gui.services_main import service_arranger
+    except ImportError:
+        return None, None
+
+    return package_arranger, service_arranger
+
+
+class Case:
+    """
+    A parser and the input it is benchmarked with.
+
+    Args:
+        name (str): The name of the case.
+        unit (str): What a processed item is (line, package, entry...).
+        sizes (Tuple[int, int, int]): Number of items at the smoke, realistic and extreme scales.
+        prepare (Callable): Builds the input of the given size.
+        parse (Callable): Parses the input.
+    """
+
+    def __init__(self, name: str, unit: str, sizes: Tuple[int, int, int], prepare: Callable[[int], Any],
+                 parse: Callable[[Any], Any]) -> None:
+        self.name = name
+        self.unit = unit
+        self.sizes = sizes
+        self.prepare = prepare
+        self.parse = parse
+
+    def size(self, scale: str) -> int:
+        return self.sizes[SCALES.index(scale)]
+
+
+def cases() -> List[Case]:
+    package_arranger, service_arranger = gui_arrangers()
+    result = [
+        Case("apt list", "package", (200, 5000, 70000), fixtures.apt_list, package_parser),
+        Case("apt list (stream)", "package", (200, 5000, 70000), lambda n: chunks(fixtures.apt_list(n)),
+             lambda data: list(package_stream_parser(iter_lines(data)))),
+        Case("apt search", "package", (200, 5000, 70000), fixtures.apt_search, search_parser),
+        Case("apt show", "depend", (50, 500, 5000), lambda n: fixtures.apt_show(n, n), show_parser),
+        Case("systemctl list-units", "unit", (100, 500, 20000), fixtures.systemctl, service_parser),
+        Case("journal", "line", (1000, 100000, 1000000), lambda n: chunks(fixtures.journal(n)),
+             lambda data: [line for line in iter_lines(data) if line.strip()]),
+        Case("gpo listall", "gpo", (50, 500, 10000), fixtures.gpo_listall, gpo_parser),
+        Case("ldif", "attribute", (200, 5000, 50000), fixtures.ldif, parse_ldif),
+    ]
+    if package_arranger is not None and service_arranger is not None:
+        result.extend([
+            Case("package_arranger", "package", (2000, 100000, 1000000),
+                 lambda n: fixtures.ip_packages(max(1, n // 5000), min(n, 5000)), package_arranger),
+            Case("service_arranger", "unit", (1000, 50000, 500000),
+                 lambda n: fixtures.ip_services(max(1, n // 500), min(n, 500)), service_arranger),
+        ])
+
+    return result
+
+
+def calibrate(repeat: int = 5) -> float:
+    """Returns the best time in seconds of a fixed pure python workload, similar to what the parsers do"""
+    text = "\n".join(f"name{index}/repo,now 1.{index} amd64 [installed]" for index in range(20000))
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in text.split("\n"):
+            name, rest = line.split("/")
+            {"name": name, "fields": rest.split()}
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def measure(case: Case, scale: str, repeat: int) -> Dict[str, Any]:
+    """
+    Runs a case and returns its best time, throughput and peak memory.
+
+    The input is built before measuring. Peak memory is measured in a separate run, since tracing allocations slows
+    the parser down.
+    """
+    size = case.size(scale)
+    data = case.prepare(size)
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        case.parse(data)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        case.parse(data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"unit": case.unit, "size": size, "seconds": best, "throughput": size / best, "peak_bytes": peak}
+
+
+def compare(results: Dict[str, Dict[str, Any]], calibration: float, baseline: Dict[str, Any],
+            threshold: float) -> List[str]:
+    """
+    Returns the regressions of the results against a baseline of the same scale.
+
+    Args:
+        results (Dict[str, Dict[str, Any]]): the results of `measure` per case
+        calibration (float): the result of `calibrate` on this machine
+        baseline (Dict[str, Any]): a saved run with its `calibration` and `results`
+        threshold (float): the allowed ratio of slow down and memory growth, e.g. 0.25
+
+    Returns:
+        List[str]: descriptions of the regressions. Empty if there are none.
+    """
+    regressions = []
+    speed = baseline["calibration"] / calibration
+    for name, result in results.items():
+        expected = baseline["results"].get(name)
+        if expected is None:
+            continue
+
+        throughput = expected["throughput"] * speed
+        if result["throughput"] < throughput * (1 - threshold):
+            regressions.append(f"{name}: {result['throughput']:.0f} {result['unit']}/s, expected at least "
+                               f"{throughput * (1 - threshold):.0f}")
+
+        if result["peak_bytes"] > expected["peak_bytes"] * (1 + threshold):
+            regressions.append(f"{name}: peak {result['peak_bytes']} bytes, expected at most "
+                               f"{expected['peak_bytes'] * (1 + threshold):.0f}")
+
+    return regressions
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=SCALES, default="realistic")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, the best one counts")
+    parser.add_argument("--only", action="append", default=[], help="run only the cases containing this text")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="fail if slower than this saved run")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed regression ratio")
+    parser.add_argument("--save-baseline", help="save this run as a baseline to this file")
+    args = parser.parse_args(arguments)
+
+    calibration = calibrate()
+    results: Dict[str, Dict[str, Any]] = {}
+    print(f"{'case':<24}{'size':>10}{'seconds':>11}{'items/s':>14}{'peak MiB':>11}")
+    for case in cases():
+        if args.only and not any(text in case.name for text in args.only):
+            continue
+
+        result = measure(case, args.scale, args.repeat)
+        results[case.name] = result
+        print(f"{case.name:<24}{result['size']:>10}{result['seconds']:>11.4f}{result['throughput']:>14.0f}"
+              f"{result['peak_bytes'] / 2 ** 20:>11.2f}")
+
+    run = {"calibration": calibration, "results": results}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(run, f, indent=2)
+
+    if args.save_baseline:
+        try:
+            with open(args.save_baseline) as f:
+                baselines = json.load(f)
+        except FileNotFoundError:
+            baselines = {}
+
+        baselines[args.scale] = run
+        with open(args.save_baseline, "w") as f:
+            json.dump(baselines, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f).get(args.scale)
+
+        if baseline is None:
+            print(f"No baseline for the {args.scale} scale")
+            return 0
+
+        regressions = compare(results, calibration, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
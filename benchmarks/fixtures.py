@@ -0,0 +1,149 @@
+"""
+Synthetic command outputs for the parser benchmarks.
+
+The outputs follow what Debian 12 / Pardus 23 hosts print. They are generated from a seed, so every run parses the
+same text.
+"""
+import random
+from typing import Dict, List
+
+ARCHITECTURES = ["amd64", "all", "i386"]
+REPOSITORIES = ["yirmiuc-deb", "yirmiuc-deb-security", "yirmiuc-updates", "bookworm-backports"]
+TAGS = ["", " [installed]", " [installed,automatic]", " [installed,local]", " [upgradable from: 1.0-1]"]
+UNIT_TYPES = ["service", "socket", "mount", "target", "timer", "device", "path", "scope", "slice"]
+STATES = [("loaded", "active", "running"), ("loaded", "active", "exited"), ("loaded", "inactive", "dead"),
+          ("not-found", "inactive", "dead"), ("loaded", "failed", "failed")]
+WORDS = ("package system library daemon utility network kernel module shared tool service server client data "
+         "python perl gnome kde xfce driver firmware font theme locale documentation development").split()
+
+
+def _name(rng: random.Random, index: int) -> str:
+    return f"{rng.choice(['lib', 'python3-', 'node-', 'r-cran-', 'golang-', ''])}{rng.choice(WORDS)}{index}"
+
+
+def _version(rng: random.Random) -> str:
+    return f"{rng.randint(0, 9)}:{rng.randint(0, 40)}.{rng.randint(0, 99)}.{rng.randint(0, 9)}-{rng.randint(1, 9)}" \
+           f"+deb12u{rng.randint(1, 9)}"
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def apt_list(packages: int, seed: int = 0) -> str:
+    """Output of `apt list` with the given number of packages"""
+    rng = random.Random(seed)
+    lines = ["Listing..."]
+    for index in range(packages):
+        repos = ",".join(rng.sample(REPOSITORIES, rng.randint(1, 2)))
+        if rng.random() < 0.3:
+            repos += ",now"
+        lines.append(f"{_name(rng, index)}/{repos} {_version(rng)} {rng.choice(ARCHITECTURES)}{rng.choice(TAGS)}")
+
+    return "\n".join(lines) + "\n"
+
+
+def apt_search(packages: int, seed: int = 0) -> str:
+    """Output of `apt search` with the given number of matches"""
+    rng = random.Random(seed)
+    lines = ["Sorting...", "Full Text Search..."]
+    for index in range(packages):
+        lines.append(f"{_name(rng, index)}/{rng.choice(REPOSITORIES)} {_version(rng)} "
+                     f"{rng.choice(ARCHITECTURES)}{rng.choice(TAGS)}")
+        lines.append(f"  {_sentence(rng, 8)}")
+        lines.append("")
+
+    return "\n".join(lines)
+
+
+def apt_show(depends: int, description_lines: int, seed: int = 0) -> str:
+    """Output of `apt show` with long `Depends` and `Description` fields"""
+    rng = random.Random(seed)
+    lines = [
+        "Package: synthetic",
+        f"Version: {_version(rng)}",
+        "Priority: optional",
+        "Section: utils",
+        "Maintainer: Pardus <dev@pardus.org.tr>",
+        "Installed-Size: 1024 kB",
+        "Depends: " + ", ".join(f"{_name(rng, index)} (>= {_version(rng)})" for index in range(depends)),
+        "Homepage: https://pardus.org.tr",
+        f"Description: {_sentence(rng, 6)}",
+    ]
+    lines.extend(f" {_sentence(rng, 12)}" for _ in range(description_lines))
+    return "\n".join(lines) + "\n"
+
+
+def systemctl(units: int, seed: int = 0) -> str:
+    """Output of `systemctl list-units --all --no-legend` with the given number of units"""
+    rng = random.Random(seed)
+    lines = []
+    for index in range(units):
+        load, active, sub = rng.choice(STATES)
+        lines.append(f"{rng.choice(WORDS)}-{index}.{rng.choice(UNIT_TYPES)} {load} {active} {sub} "
+                     f"{_sentence(rng, rng.randint(2, 8))}")
+
+    return "\n".join(lines) + "\n"
+
+
+def journal(lines: int, seed: int = 0) -> str:
+    """Output of `journalctl -o short-iso` with the given number of lines"""
+    rng = random.Random(seed)
+    result = []
+    for index in range(lines):
+        result.append(f"2024-10-{1 + index % 28:02d}T{index % 24:02d}:{index % 60:02d}:{index % 60:02d}+0300 "
+                      f"pardus {rng.choice(WORDS)}[{rng.randint(100, 99999)}]: {_sentence(rng, rng.randint(3, 20))}")
+
+    return "\n".join(result) + "\n"
+
+
+def gpo_listall(gpos: int, seed: int = 0) -> str:
+    """Output of `samba-tool gpo listall` with the given number of GPOs"""
+    rng = random.Random(seed)
+    blocks = []
+    for index in range(gpos):
+        guid = "{%08X-%04X-%04X-%04X-%012X}" % (rng.getrandbits(32), rng.getrandbits(16), rng.getrandbits(16),
+                                                rng.getrandbits(16), rng.getrandbits(48))
+        blocks.append("\n".join([
+            f"GPO          : {guid}",
+            f"display name : Policy {index} {_sentence(rng, 2)}",
+            f"path         : \\\\domain.prd\\sysvol\\domain.prd\\Policies\\{guid}",
+            f"dn           : CN={guid},CN=Policies,CN=System,DC=domain,DC=prd",
+            f"version      : {rng.randint(0, 500)}",
+            "flags        : NONE",
+        ]))
+
+    return "\n\n".join(blocks) + "\n"
+
+
+def ldif(attributes: int, seed: int = 0) -> str:
+    """An LDIF entry as printed by `ldbsearch`, with the given number of attributes, some folded over lines"""
+    rng = random.Random(seed)
+    lines = ["# record 1", "dn: CN={31B2F340-016D-11D2-945F-00C04FB984F9},CN=Policies,CN=System,DC=domain,DC=prd"]
+    for index in range(attributes):
+        value = _sentence(rng, rng.randint(1, 30))
+        key = f"attribute{index % 500}"
+        if len(value) > 76:
+            lines.append(f"{key}: {value[:70]}")
+            lines.extend(f" {value[start:start + 76]}" for start in range(70, len(value), 76))
+        else:
+            lines.append(f"{key}: {value}")
+
+    lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def ip_packages(hosts: int, packages: int, seed: int = 0) -> Dict[str, List[Dict[str, str]]]:
+    """Parsed `apt list` outputs of many hosts, as the GUI gets them"""
+    from post.apt.apt import package_parser
+
+    parsed = package_parser(apt_list(packages, seed=seed))
+    return {f"10.0.{index // 256}.{index % 256}": parsed for index in range(hosts)}
+
+
+def ip_services(hosts: int, units: int, seed: int = 0) -> Dict[str, List[Dict[str, str]]]:
+    """Parsed `systemctl list-units` outputs of many hosts, as the GUI gets them"""
+    from post.service.service import service_parser
+
+    parsed = service_parser(systemctl(units, seed=seed))
+    return {f"10.0.{index // 256}.{index % 256}": parsed for index in range(hosts)}
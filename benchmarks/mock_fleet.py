@@ -0,0 +1,1101 @@
+"""
+A fleet of simulated hosts served by in-process paramiko SSH servers, to run the managers against without machines.
+
+Each host listens on its own port of 127.0.0.1 and answers a small shell (`&&`, `||`, `;`, pipes and redirections)
+with the commands the managers send: `apt`, `dpkg-query`, `systemctl`, `journalctl`, `cat`, `getent`, `id`,
+`groups`, `useradd`... over a fake filesystem and package database. SFTP is served from the same filesystem,
+and `direct-tcpip` channels are forwarded to the other hosts, so any of them can be a jump host.
+
+Latency, bandwidth and failures can be injected per fleet:
+
+    with MockFleet(hosts=100, latency=0.02, bandwidth=1_000_000, failure_rate=0.01) as fleet:
+        connectors = [SSHConnector(address, port, fleet.user, fleet.password, lazy=True)
+                      for address, port in fleet.addresses]
+"""
+import base64
+import gzip
+import io
+import os
+import posixpath
+import random
+import re
+import selectors
+import shlex
+import socket
+import stat
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import paramiko
+from paramiko.common import cMSG_CHANNEL_SUCCESS
+
+_HOST_KEY: Optional[paramiko.RSAKey] = None
+_HOST_KEY_LOCK = threading.Lock()
+
+Output = Tuple[int, bytes, bytes]
+
+STDIN_COMMAND = re.compile(r"(^|;\s*)cat\s*>")
+SUDO_COMMAND = re.compile(r"(^|[\s'(])sudo\s.*-S ")
+STATUS_SCRIPT = re.compile(r"^\((.*)\); echo post-exit:\$\? >&2$", re.S)
+
+WORDS = ("package system library daemon utility network kernel module shared tool service server client data "
+         "python perl gnome kde xfce driver firmware font theme locale documentation development").split()
+
+
+def host_key() -> paramiko.RSAKey:
+    """Returns the host key shared by every simulated host, generated once per process"""
+    global _HOST_KEY
+    with _HOST_KEY_LOCK:
+        if _HOST_KEY is None:
+            _HOST_KEY = paramiko.RSAKey.generate(2048)
+
+    return _HOST_KEY
+
+
+class Package:
+    def __init__(self, name: str, version: str, architecture: str, repository: str, installed: bool,
+                 automatic: bool = False, upgradable: bool = False) -> None:
+        self.name = name
+        self.version = version
+        self.architecture = architecture
+        self.repository = repository
+        self.installed = installed
+        self.automatic = automatic
+        self.upgradable = upgradable
+
+    def line(self) -> str:
+        """The line of the package in `apt list`"""
+        tags = []
+        if self.installed:
+            tags.append("installed")
+            if self.automatic:
+                tags.append("automatic")
+        if self.upgradable:
+            tags.append("upgradable from: 0.1-1")
+
+        repository = f"{self.repository},now" if self.installed else self.repository
+        suffix = f" [{','.join(tags)}]" if tags else ""
+        return f"{self.name}/{repository} {self.version} {self.architecture}{suffix}"
+
+
+class Unit:
+    def __init__(self, name: str, description: str, active: bool = True, enabled: bool = True) -> None:
+        self.name = name
+        self.description = description
+        self.active = active
+        self.enabled = enabled
+
+    def line(self) -> str:
+        """The line of the unit in `systemctl list-units --no-legend`"""
+        state = "active running" if self.active else "inactive dead"
+        return f"{self.name} loaded {state} {self.description}"
+
+
+class FakeFile:
+    def __init__(self, data: bytes = b"", mode: int = 0o644, uid: int = 0, gid: int = 0) -> None:
+        self.data = data
+        self.mode = mode
+        self.uid = uid
+        self.gid = gid
+        self.mtime = time.time()
+
+
+def generate_packages(count: int, seed: int = 0) -> Dict[str, Package]:
+    """Returns a package database of the given size"""
+    rng = random.Random(seed)
+    packages = {}
+    for index in range(count):
+        name = f"{rng.choice(['lib', 'python3-', 'node-', ''])}{rng.choice(WORDS)}{index}"
+        packages[name] = Package(
+            name, f"{rng.randint(0, 40)}.{rng.randint(0, 99)}-{rng.randint(1, 9)}",
+            rng.choice(["amd64", "all"]), "yirmiuc-deb", installed=rng.random() < 0.3, automatic=rng.random() < 0.5,
+            upgradable=rng.random() < 0.02,
+        )
+
+    return packages
+
+
+def generate_units(count: int, seed: int = 0) -> Dict[str, Unit]:
+    """Returns the systemd units of a host"""
+    rng = random.Random(seed)
+    units = {
+        "ssh.service": Unit("ssh.service", "OpenBSD Secure Shell server"),
+        "cron.service": Unit("cron.service", "Regular background program processing daemon"),
+    }
+    for index in range(count - len(units)):
+        name = f"{rng.choice(WORDS)}-{index}.{rng.choice(['service', 'socket', 'timer', 'mount'])}"
+        units[name] = Unit(name, " ".join(rng.choice(WORDS) for _ in range(4)), active=rng.random() < 0.7)
+
+    return units
+
+
+class FakeHost:
+    """
+    The state of a simulated host and a small shell running commands against it.
+
+    The package database is shared with other hosts until this host changes it.
+
+    Args:
+        name (str): The host name.
+        packages (Dict[str, Package]): The shared package database.
+        units (Dict[str, Unit]): The shared systemd units.
+        users (int): Number of regular users. Defaults to 20.
+        journal_lines (int): Lines `journalctl` prints per unit. Defaults to 200.
+    """
+
+    def __init__(self, name: str, packages: Dict[str, Package], units: Dict[str, Unit], users: int = 20,
+                 journal_lines: int = 200) -> None:
+        self.name = name
+        self.base_packages = packages
+        self.package_changes: Dict[str, Optional[Package]] = {}
+        self.units = {unit_name: Unit(unit.name, unit.description, unit.active, unit.enabled)
+                      for unit_name, unit in units.items()}
+        self.journal_lines = journal_lines
+        self.lock = threading.RLock()
+        self.directories = {"/", "/etc", "/etc/apt", "/etc/apt/sources.list.d", "/home", "/root", "/tmp", "/var",
+                            "/var/lib", "/var/lib/dpkg"}
+        self.files: Dict[str, FakeFile] = {}
+
+        passwd = ["root:x:0:0:root:/root:/bin/bash", "daemon:x:1:1:daemon:/usr/sbin:/usr/sbin/nologin"]
+        group = ["root:x:0:", "sudo:x:27:pardus", "users:x:100:"]
+        shadow = ["root:*:19000:0:99999:7:::", "daemon:*:19000:0:99999:7:::"]
+        for index in range(users):
+            user = "pardus" if index == 0 else f"user{index}"
+            passwd.append(f"{user}:x:{1000 + index}:{1000 + index}:{user}:/home/{user}:/bin/bash")
+            group.append(f"{user}:x:{1000 + index}:")
+            shadow.append(f"{user}:$y$j9T$salt$hash:19000:0:99999:7:::")
+            self.directories.add(f"/home/{user}")
+
+        self.write("/etc/passwd", "\n".join(passwd) + "\n")
+        self.write("/etc/group", "\n".join(group) + "\n")
+        self.write("/etc/shadow", "\n".join(shadow) + "\n", mode=0o640)
+        self.write("/etc/hostname", f"{name}\n")
+        self.write("/etc/hosts", f"127.0.0.1 localhost\n127.0.1.1 {name}\n")
+        self.write("/etc/apt/sources.list", "deb http://depo.pardus.org.tr/pardus yirmiuc main contrib non-free\n")
+        self.write("/etc/ssh/sshd_config", "Port 22\nPermitRootLogin no\nPasswordAuthentication yes\n")
+        self.directories.add("/etc/ssh")
+
+    def write(self, path: str, data: Union[str, bytes], mode: int = 0o644) -> None:
+        """Creates or replaces a file"""
+        if isinstance(data, str):
+            data = data.encode()
+
+        self.files[path] = FakeFile(data, mode)
+
+    # Packages
+
+    def package(self, name: str) -> Optional[Package]:
+        if name in self.package_changes:
+            return self.package_changes[name]
+
+        return self.base_packages.get(name)
+
+    def packages(self) -> Iterable[Package]:
+        for name, package in self.base_packages.items():
+            if name not in self.package_changes:
+                yield package
+
+        for package in self.package_changes.values():
+            if package is not None:
+                yield package
+
+    def set_installed(self, name: str, installed: bool) -> None:
+        package = self.package(name)
+        if package is not None:
+            self.package_changes[name] = Package(package.name, package.version, package.architecture,
+                                                 package.repository, installed)
+
+    # Shell
+
+    def execute(self, command: str, stdin: bytes = b"") -> Output:
+        """
+        Runs a command line.
+
+        Args:
+            command (str): the command line
+            stdin (bytes): the standard input
+
+        Returns:
+            Output: exit status, standard output and standard error
+        """
+        try:
+            lexer = shlex.shlex(command, posix=True, punctuation_chars="|&;<>")
+            lexer.whitespace_split = True
+            tokens = list(lexer)
+        except ValueError as e:
+            return 2, b"", f"sh: {e}\n".encode()
+
+        code, stdout, stderr = 0, b"", b""
+        operator = ";"
+        index = 0
+        while index < len(tokens):
+            end = index
+            while end < len(tokens) and tokens[end] not in ("&&", "||", ";"):
+                end += 1
+
+            if operator == ";" or (operator == "&&" and code == 0) or (operator == "||" and code != 0):
+                code, out, err = self.pipeline(tokens[index:end], stdin)
+                stdout += out
+                stderr += err
+
+            operator = tokens[end] if end < len(tokens) else ";"
+            index = end + 1
+
+        return code, stdout, stderr
+
+    def pipeline(self, tokens: List[str], stdin: bytes) -> Output:
+        stages: List[List[str]] = [[]]
+        for token in tokens:
+            if token == "|":
+                stages.append([])
+            else:
+                stages[-1].append(token)
+
+        code, data, errors = 0, stdin, b""
+        for stage in stages:
+            code, data, err = self.simple(stage, data)
+            errors += err
+
+        return code, data, errors
+
+    def simple(self, tokens: List[str], stdin: bytes) -> Output:
+        words: List[str] = []
+        stdout_to: Optional[Tuple[str, bool]] = None
+        stderr_to_null = False
+        index = 0
+        while index < len(tokens):
+            token = tokens[index]
+            if token in (">", ">>", "&>") and index + 1 < len(tokens):
+                target = tokens[index + 1]
+                if words and words[-1] == "2" and token == ">":
+                    words.pop()
+                    stderr_to_null = True
+                elif token == "&>":
+                    stderr_to_null = True
+                    stdout_to = (target, False)
+                else:
+                    stdout_to = (target, token == ">>")
+                index += 2
+                continue
+
+            if token == ">&" and index + 1 < len(tokens):
+                if words and words[-1] == "2":
+                    words.pop()
+                index += 2
+                continue
+
+            words.append(token)
+            index += 1
+
+        if not words:
+            return 0, b"", b""
+
+        handler = COMMANDS.get(posixpath.basename(words[0]))
+        if handler is None:
+            code, out, err = 127, b"", f"sh: 1: {words[0]}: not found\n".encode()
+        else:
+            with self.lock:
+                code, out, err = handler(self, words[1:], stdin)
+
+        if stderr_to_null:
+            err = b""
+
+        if stdout_to is not None:
+            target, append = stdout_to
+            if target != "/dev/null":
+                with self.lock:
+                    existing = self.files.get(target)
+                    data = (existing.data if existing is not None and append else b"") + out
+                    if existing is None:
+                        self.files[target] = FakeFile(data)
+                    else:
+                        existing.data = data
+                        existing.mtime = time.time()
+            out = b""
+
+        return code, out, err
+
+
+def _text(lines: Iterable[str]) -> bytes:
+    return "".join(f"{line}\n" for line in lines).encode()
+
+
+def _sudo(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    while args and args[0].startswith("-"):
+        option = args.pop(0)
+        if option == "-S":
+            _, _, stdin = stdin.partition(b"\n")
+        elif option in ("-p", "-u"):
+            if args:
+                args.pop(0)
+        elif option in ("-v", "-k"):
+            return 0, b"", b""
+
+    if not args:
+        return 1, b"", b"usage: sudo command\n"
+
+    return host.execute(shlex.join(args), stdin) if args[0] != "su" else _su(host, args[1:], stdin)
+
+
+def _su(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    if len(args) >= 2 and args[0] == "-c":
+        return host.execute(args[1], stdin)
+
+    return 1, b"", b"su: no command\n"
+
+
+def _apt(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    if not args:
+        return 1, b"", b"apt: missing command\n"
+
+    action, rest = args[0], [arg for arg in args[1:] if not arg.startswith("-")]
+    if action == "list":
+        packages = host.packages()
+        if "--installed" in args:
+            packages = (package for package in packages if package.installed)
+        if "--upgradeable" in args:
+            packages = (package for package in packages if package.upgradable)
+        return 0, _text(["Listing...", *sorted(package.line() for package in packages)]), b""
+
+    if action == "search":
+        pattern = re.compile(re.escape(rest[0]) if rest else "")
+        lines = ["Sorting...", "Full Text Search..."]
+        for package in host.packages():
+            if pattern.search(package.name):
+                lines.extend([package.line(), f"  {package.name} description", ""])
+        return 0, _text(lines), b""
+
+    if action == "show":
+        package = host.package(rest[0]) if rest else None
+        if package is None:
+            return 100, b"", b"E: No packages found\n"
+        return 0, _text([f"Package: {package.name}", f"Version: {package.version}", "Priority: optional",
+                         "Depends: libc6 (>= 2.34), libssl3 (>= 3.0.0)", f"Description: {package.name}",
+                         " A simulated package."]), b""
+
+    if action in ("install", "reinstall", "remove", "purge"):
+        for name in rest:
+            if host.package(name) is None:
+                return 100, b"", f"E: Unable to locate package {name}\n".encode()
+            host.set_installed(name, action in ("install", "reinstall"))
+        return 0, _text([f"{action} {' '.join(rest)} done"]), b""
+
+    if action in ("update", "upgrade", "autoremove"):
+        return 0, b"Reading package lists... Done\n", b""
+
+    return 1, b"", f"E: Invalid operation {action}\n".encode()
+
+
+def _dpkg_query(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    template = "${Package}\t${Version}\n"
+    for arg in args:
+        if arg.startswith("-f="):
+            template = arg[3:].replace("\\t", "\t").replace("\\n", "\n")
+
+    output = io.StringIO()
+    for package in host.packages():
+        status = "install ok installed" if package.installed else "unknown ok not-installed"
+        output.write(template.replace("${Package}", package.name).replace("${Version}", package.version)
+                     .replace("${Status}", status))
+    return 0, output.getvalue().encode(), b""
+
+
+def _systemctl(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    words = [arg for arg in args if not arg.startswith("-")]
+    if not words:
+        return 1, b"", b"systemctl: missing command\n"
+
+    action, names = words[0], words[1:]
+    if action == "list-units":
+        return 0, _text(unit.line() for unit in host.units.values()), b""
+
+    if action == "daemon-reload":
+        return 0, b"", b""
+
+    for name in names:
+        unit = host.units.get(name) or host.units.get(f"{name}.service")
+        if unit is None:
+            return 5, b"", f"Failed to {action} {name}: Unit {name} not found.\n".encode()
+
+        if action in ("start", "restart"):
+            unit.active = True
+        elif action == "stop":
+            unit.active = False
+        elif action in ("enable", "disable"):
+            unit.enabled = action == "enable"
+        elif action == "is-active":
+            return (0 if unit.active else 3), b"active\n" if unit.active else b"inactive\n", b""
+        elif action == "status":
+            return 0, _text([unit.line()]), b""
+
+    return 0, b"", b""
+
+
+def _journalctl(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    unit = args[args.index("-u") + 1] if "-u" in args and args.index("-u") + 1 < len(args) else "system"
+    return 0, _text(f"2024-10-01T10:{index // 60 % 60:02d}:{index % 60:02d}+0300 {host.name} {unit}[1]: "
+                    f"message {index}" for index in range(host.journal_lines)), b""
+
+
+def _cat(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    if not args:
+        return 0, stdin, b""
+
+    output = b""
+    for path in args:
+        if path in host.directories:
+            return 1, output, f"cat: {path}: Is a directory\n".encode()
+        file = host.files.get(path)
+        if file is None:
+            return 1, output, f"cat: {path}: No such file or directory\n".encode()
+        output += file.data
+    return 0, output, b""
+
+
+def _test(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    if len(args) == 2:
+        flag, path = args
+        exists = {"-e": path in host.files or path in host.directories, "-f": path in host.files,
+                  "-d": path in host.directories}.get(flag, False)
+        return (0 if exists else 1), b"", b""
+    return 2, b"", b"test: unsupported\n"
+
+
+def _touch(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    for path in args:
+        if path in host.files:
+            host.files[path].mtime = time.time()
+        else:
+            host.files[path] = FakeFile()
+    return 0, b"", b""
+
+
+def _mkdir(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    for path in (arg for arg in args if not arg.startswith("-")):
+        while path not in ("", "/"):
+            host.directories.add(path)
+            path = posixpath.dirname(path)
+    return 0, b"", b""
+
+
+def _rm(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    for path in (arg for arg in args if not arg.startswith("-")):
+        if host.files.pop(path, None) is None and "-f" not in args and "-rf" not in args:
+            return 1, b"", f"rm: cannot remove '{path}': No such file or directory\n".encode()
+    return 0, b"", b""
+
+
+def _cp(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    paths = [arg for arg in args if not arg.startswith("-")]
+    source = host.files.get(paths[0]) if len(paths) == 2 else None
+    if source is None:
+        return 1, b"", b"cp: cannot stat\n"
+    host.files[paths[1]] = FakeFile(source.data, source.mode, source.uid, source.gid)
+    return 0, b"", b""
+
+
+def _mv(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    code, out, err = _cp(host, args, stdin)
+    if code == 0:
+        host.files.pop([arg for arg in args if not arg.startswith("-")][0], None)
+    return code, out, err
+
+
+def _install(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    mode = 0o644
+    paths = []
+    index = 0
+    while index < len(args):
+        if args[index] in ("-m", "-o", "-g"):
+            if args[index] == "-m":
+                mode = int(args[index + 1], 8)
+            index += 2
+            continue
+        paths.append(args[index])
+        index += 1
+
+    code, out, err = _cp(host, paths, stdin)
+    if code == 0:
+        host.files[paths[1]].mode = mode
+    return code, out, err
+
+
+def _stat(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    path = args[-1]
+    if path in host.directories:
+        return 0, f"4096 41ed 0 0 {int(time.time())} directory\n".encode(), b""
+    file = host.files.get(path)
+    if file is None:
+        return 1, b"", f"stat: cannot statx '{path}': No such file or directory\n".encode()
+    return 0, f"{len(file.data)} {stat.S_IFREG | file.mode:x} {file.uid} {file.gid} {int(file.mtime)} " \
+              f"regular file\n".encode(), b""
+
+
+def _ls(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    directory = ([arg for arg in args if not arg.startswith("-")] or ["/"])[0].rstrip("/") or "/"
+    names = {posixpath.basename(path) for path in [*host.files, *host.directories]
+             if posixpath.dirname(path) == directory and path != directory}
+    return 0, _text(sorted(names)), b""
+
+
+def _echo(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    return 0, (" ".join(args) + "\n").encode(), b""
+
+
+def _base64(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    if "-d" in args:
+        try:
+            return 0, base64.b64decode(stdin.strip()), b""
+        except ValueError:
+            return 1, b"", b"base64: invalid input\n"
+    return 0, base64.b64encode(stdin) + b"\n", b""
+
+
+def _cut(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    delimiter, field = "\t", 1
+    for arg in args:
+        if arg.startswith("-d"):
+            delimiter = arg[2:]
+        elif arg.startswith("-f"):
+            field = int(arg[2:])
+    lines = stdin.decode().splitlines()
+    return 0, _text(line.split(delimiter)[field - 1] if delimiter in line else line for line in lines), b""
+
+
+def _tr(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    return 0, stdin, b""
+
+
+def _grep(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    words = [arg for arg in args if not arg.startswith("-")]
+    if not words:
+        return 2, b"", b"grep: no pattern\n"
+
+    pattern, paths = re.compile(words[0]), words[1:]
+    if not paths:
+        lines = stdin.decode().splitlines()
+    else:
+        lines = []
+        for path in paths:
+            for name in sorted(host.files):
+                if name == path or (name.startswith(path.rstrip("/") + "/") and "-r" in args):
+                    lines.extend(host.files[name].data.decode(errors="replace").splitlines())
+
+    matches = [line for line in lines if pattern.search(line)]
+    return (0 if matches else 1), _text(matches), b""
+
+
+def _passwd_entries(host: FakeHost, path: str) -> List[List[str]]:
+    return [line.split(":") for line in host.files[path].data.decode().splitlines() if line]
+
+
+def _getent(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    if not args or args[0] not in ("passwd", "group"):
+        return 1, b"", b"getent: unknown database\n"
+
+    entries = _passwd_entries(host, f"/etc/{args[0]}")
+    if len(args) > 1:
+        entries = [entry for entry in entries if entry[0] in args[1:]]
+        if not entries:
+            return 2, b"", b""
+    return 0, _text(":".join(entry) for entry in entries), b""
+
+
+def _id(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    names = [arg for arg in args if not arg.startswith("-")]
+    name = names[0] if names else "root"
+    for entry in _passwd_entries(host, "/etc/passwd"):
+        if entry[0] == name:
+            if "-u" in args:
+                return 0, f"{entry[2]}\n".encode(), b""
+            return 0, f"uid={entry[2]}({name}) gid={entry[3]}({name}) groups={entry[3]}({name})\n".encode(), b""
+    return 1, b"", f"id: '{name}': no such user\n".encode()
+
+
+def _groups(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    name = args[0] if args else "root"
+    groups = [entry[0] for entry in _passwd_entries(host, "/etc/group")
+              if entry[0] == name or name in entry[3].split(",")]
+    if not groups:
+        return 1, b"", f"groups: '{name}': no such user\n".encode()
+    return 0, f"{name} : {' '.join(groups)}\n".encode(), b""
+
+
+def _passwd(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    if "-S" in args:
+        name = [arg for arg in args if not arg.startswith("-")][0]
+        for entry in _passwd_entries(host, "/etc/shadow"):
+            if entry[0] == name:
+                state = "L" if entry[1].startswith(("!", "*")) else "P"
+                return 0, f"{name} {state} 01/01/2024 0 99999 7 -1\n".encode(), b""
+        return 1, b"", f"passwd: user '{name}' does not exist\n".encode()
+    return 0, b"", b""
+
+
+def _useradd(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    name = args[-1]
+    uid = 1000 + len(_passwd_entries(host, "/etc/passwd"))
+    host.files["/etc/passwd"].data += f"{name}:x:{uid}:{uid}:{name}:/home/{name}:/bin/bash\n".encode()
+    host.files["/etc/group"].data += f"{name}:x:{uid}:\n".encode()
+    host.files["/etc/shadow"].data += f"{name}:!:19000:0:99999:7:::\n".encode()
+    return 0, b"", b""
+
+
+def _deluser(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    name = args[-1]
+    for path in ("/etc/passwd", "/etc/group", "/etc/shadow"):
+        host.files[path].data = _text(":".join(entry) for entry in _passwd_entries(host, path) if entry[0] != name)
+    return 0, b"", b""
+
+
+def _sh(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    if len(args) < 2 or args[0] != "-c":
+        return 2, b"", b"sh: only -c is supported\n"
+    # the subshell and exit status trailer of `wrap_command`
+    match = STATUS_SCRIPT.match(args[1])
+    if match is None:
+        return host.execute(args[1], stdin)
+    code, out, err = host.execute(match.group(1), stdin)
+    return 0, out, err + f"post-exit:{code}\n".encode()
+
+
+def _gzip(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    level = next((int(arg[1:]) for arg in args if arg[1:].isdigit()), 6)
+    return 0, gzip.compress(stdin, compresslevel=level, mtime=0), b""
+
+
+def _command(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    if args[:1] == ["-v"] and len(args) > 1:
+        return (0, f"/usr/bin/{args[1]}\n".encode(), b"") if args[1] in COMMANDS else (1, b"", b"")
+    return host.execute(shlex.join(args), stdin)
+
+
+def _constant(code: int, output: Callable[[FakeHost], str] = lambda host: "") -> Callable[..., Output]:
+    return lambda host, args, stdin: (code, output(host).encode(), b"")
+
+
+def _mktemp(host: FakeHost, args: List[str], stdin: bytes) -> Output:
+    path = f"/tmp/tmp.{random.getrandbits(40):010x}"
+    host.files[path] = FakeFile(mode=0o600)
+    return 0, f"{path}\n".encode(), b""
+
+
+COMMANDS: Dict[str, Callable[[FakeHost, List[str], bytes], Output]] = {
+    "sudo": _sudo, "su": _su, "apt": _apt, "apt-get": _apt, "dpkg-query": _dpkg_query, "systemctl": _systemctl,
+    "journalctl": _journalctl, "cat": _cat, "test": _test, "touch": _touch, "mkdir": _mkdir, "rm": _rm, "cp": _cp,
+    "mv": _mv, "install": _install, "stat": _stat, "ls": _ls, "echo": _echo, "base64": _base64, "cut": _cut,
+    "tr": _tr, "grep": _grep, "getent": _getent, "id": _id, "groups": _groups, "passwd": _passwd,
+    "useradd": _useradd, "deluser": _deluser, "userdel": _deluser, "mktemp": _mktemp, "chmod": _constant(0),
+    "chown": _constant(0), "umask": _constant(0), "usermod": _constant(0), "true": _constant(0), "false": _constant(1),
+    "whoami": _constant(0, lambda host: "root\n"), "hostname": _constant(0, lambda host: f"{host.name}\n"),
+    "uname": _constant(0, lambda host: "Linux\n"), "sh": _sh, "gzip": _gzip, "command": _command,
+}
+
+
+class FakeSFTPHandle(paramiko.SFTPHandle):
+    def __init__(self, host: FakeHost, path: str, flags: int) -> None:
+        super().__init__(flags)
+        self.host = host
+        self.path = path
+        file = host.files.get(path)
+        if file is None or flags & os.O_TRUNC:
+            file = FakeFile(b"", file.mode if file is not None else 0o644)
+            host.files[path] = file
+        self.file = file
+
+    def read(self, offset: int, length: int) -> bytes:
+        return self.file.data[offset:offset + length]
+
+    def write(self, offset: int, data: bytes) -> int:
+        current = self.file.data
+        self.file.data = current[:offset].ljust(offset, b"\0") + data + current[offset + len(data):]
+        self.file.mtime = time.time()
+        return paramiko.SFTP_OK
+
+    def stat(self) -> paramiko.SFTPAttributes:
+        return _attributes(self.file)
+
+    def chattr(self, attr: paramiko.SFTPAttributes) -> int:
+        return _chattr(self.file, attr)
+
+
+def _attributes(file: Optional[FakeFile], filename: str = "") -> paramiko.SFTPAttributes:
+    attributes = paramiko.SFTPAttributes()
+    attributes.filename = filename
+    if file is None:
+        attributes.st_mode = stat.S_IFDIR | 0o755
+        attributes.st_size = 4096
+        attributes.st_uid = attributes.st_gid = 0
+        attributes.st_mtime = int(time.time())
+    else:
+        attributes.st_mode = stat.S_IFREG | file.mode
+        attributes.st_size = len(file.data)
+        attributes.st_uid = file.uid
+        attributes.st_gid = file.gid
+        attributes.st_mtime = int(file.mtime)
+    return attributes
+
+
+def _chattr(file: FakeFile, attr: paramiko.SFTPAttributes) -> int:
+    if attr.st_mode is not None:
+        file.mode = attr.st_mode & 0o7777
+    if attr.st_uid is not None:
+        file.uid = attr.st_uid
+    if attr.st_gid is not None:
+        file.gid = attr.st_gid
+    return paramiko.SFTP_OK
+
+
+class FakeSFTPServer(paramiko.SFTPServerInterface):
+    def __init__(self, server: "MockServer", *args, **kwargs) -> None:
+        super().__init__(server, *args, **kwargs)
+        self.host = server.host
+
+    def canonicalize(self, path: str) -> str:
+        return posixpath.normpath(posixpath.join("/home/pardus", path))
+
+    def open(self, path: str, flags: int, attr: paramiko.SFTPAttributes) -> Union[FakeSFTPHandle, int]:
+        path = self.canonicalize(path)
+        with self.host.lock:
+            if path not in self.host.files and not flags & os.O_CREAT:
+                return paramiko.SFTP_NO_SUCH_FILE
+            if posixpath.dirname(path) not in self.host.directories:
+                return paramiko.SFTP_NO_SUCH_FILE
+            if path.startswith("/etc/") and flags & (os.O_WRONLY | os.O_RDWR):
+                return paramiko.SFTP_PERMISSION_DENIED
+            return FakeSFTPHandle(self.host, path, flags)
+
+    def stat(self, path: str) -> Union[paramiko.SFTPAttributes, int]:
+        path = self.canonicalize(path)
+        if path in self.host.directories:
+            return _attributes(None, posixpath.basename(path))
+        file = self.host.files.get(path)
+        if file is None:
+            return paramiko.SFTP_NO_SUCH_FILE
+        return _attributes(file, posixpath.basename(path))
+
+    lstat = stat
+
+    def list_folder(self, path: str) -> Union[List[paramiko.SFTPAttributes], int]:
+        path = self.canonicalize(path)
+        if path not in self.host.directories:
+            return paramiko.SFTP_NO_SUCH_FILE
+        return [_attributes(file, posixpath.basename(name)) for name, file in self.host.files.items()
+                if posixpath.dirname(name) == path]
+
+    def remove(self, path: str) -> int:
+        path = self.canonicalize(path)
+        with self.host.lock:
+            if self.host.files.pop(path, None) is None:
+                return paramiko.SFTP_NO_SUCH_FILE
+        return paramiko.SFTP_OK
+
+    def rename(self, oldpath: str, newpath: str) -> int:
+        oldpath, newpath = self.canonicalize(oldpath), self.canonicalize(newpath)
+        with self.host.lock:
+            file = self.host.files.pop(oldpath, None)
+            if file is None:
+                return paramiko.SFTP_NO_SUCH_FILE
+            self.host.files[newpath] = file
+        return paramiko.SFTP_OK
+
+    posix_rename = rename
+
+    def mkdir(self, path: str, attr: paramiko.SFTPAttributes) -> int:
+        self.host.directories.add(self.canonicalize(path))
+        return paramiko.SFTP_OK
+
+    def chattr(self, path: str, attr: paramiko.SFTPAttributes) -> int:
+        file = self.host.files.get(self.canonicalize(path))
+        if file is None:
+            return paramiko.SFTP_NO_SUCH_FILE
+        return _chattr(file, attr)
+
+
+class MockTransport(paramiko.Transport):
+    """
+    A server transport starting the commands of `MockServer` after their exec requests are acknowledged, and
+    forwarding `direct-tcpip` channels, so a simulated host can be a jump host to the others
+    """
+
+    def __init__(self, sock: socket.socket) -> None:
+        super().__init__(sock)
+        self.pending: Dict[int, threading.Thread] = {}
+        self.forwards: Dict[int, Tuple[str, int]] = {}
+        self.forwarder: Optional[threading.Thread] = None
+
+    def forward(self, chanid: int, destination: Tuple[str, int]) -> None:
+        """Connects the channel being opened to a destination once it is accepted"""
+        self.forwards[chanid] = destination
+        if self.forwarder is None:
+            self.forwarder = threading.Thread(target=self.accept_forwards, daemon=True)
+            self.forwarder.start()
+
+    def accept_forwards(self) -> None:
+        while self.is_active():
+            channel = self.accept(timeout=1)
+            if channel is None:
+                continue
+
+            destination = self.forwards.pop(channel.get_id(), None)
+            if destination is not None:
+                threading.Thread(target=pipe, args=(channel, destination), daemon=True).start()
+
+    def _send_user_message(self, data: paramiko.Message) -> None:
+        super()._send_user_message(data)
+        packet = data.asbytes()
+        if packet[:1] == cMSG_CHANNEL_SUCCESS:
+            thread = self.pending.pop(int.from_bytes(packet[1:5], "big"), None)
+            if thread is not None:
+                thread.start()
+
+
+def pipe(channel: paramiko.Channel, destination: Tuple[str, int]) -> None:
+    """Copies data both ways between a channel and a new TCP connection to the destination"""
+    try:
+        sock = socket.create_connection(destination, timeout=10)
+    except OSError:
+        channel.close()
+        return
+
+    sock.settimeout(None)
+    with selectors.DefaultSelector() as selector:
+        selector.register(channel, selectors.EVENT_READ, sock)
+        selector.register(sock, selectors.EVENT_READ, channel)
+        try:
+            while True:
+                for key, _ in selector.select():
+                    data = key.fileobj.recv(32768)
+                    if not data:
+                        return
+                    key.data.sendall(data)
+        except OSError:
+            pass
+        finally:
+            sock.close()
+            channel.close()
+
+
+class MockServer(paramiko.ServerInterface):
+    """The SSH side of a simulated host: authentication and command execution with the fleet's injections"""
+
+    def __init__(self, fleet: "MockFleet", host: FakeHost, transport: MockTransport) -> None:
+        self.fleet = fleet
+        self.host = host
+        self.transport = transport
+
+    def get_allowed_auths(self, username: str) -> str:
+        return "password,publickey"
+
+    def check_auth_publickey(self, username: str, key: paramiko.PKey) -> int:
+        if username == self.fleet.user and (not self.fleet.authorized_keys or key in self.fleet.authorized_keys):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_auth_password(self, username: str, password: str) -> int:
+        if username == self.fleet.user and password == self.fleet.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind: str, chanid: int) -> int:
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_direct_tcpip_request(self, chanid: int, origin: Tuple[str, int],
+                                           destination: Tuple[str, int]) -> int:
+        if tuple(destination) not in self.fleet.addresses:
+            return paramiko.OPEN_FAILED_CONNECT_FAILED
+
+        self.fleet.forwards += 1
+        self.transport.forward(chanid, tuple(destination))
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_exec_request(self, channel: paramiko.Channel, command: bytes) -> bool:
+        # started by MockTransport once the request is acknowledged, or the client could see the channel closing
+        # before its request succeeds
+        self.transport.pending[channel.remote_chanid] = threading.Thread(
+            target=self.run, args=(channel, command.decode()), daemon=True
+        )
+        return True
+
+    def run(self, channel: paramiko.Channel, command: str) -> None:
+        fleet = self.fleet
+        try:
+            stdin = b""
+            if STDIN_COMMAND.search(command):
+                # an upload (see `OpenSSHConnector.write_file`), the client closes the standard input when it is done
+                while True:
+                    data = channel.recv(32768)
+                    if not data:
+                        break
+                    stdin += data
+            elif SUDO_COMMAND.search(command):
+                # sudo reads the password line, nothing else is sent and the standard input is never closed
+                while not stdin.endswith(b"\n"):
+                    data = channel.recv(1024)
+                    if not data:
+                        break
+                    stdin += data
+
+            delay = fleet.latency() if callable(fleet.latency) else fleet.latency
+            if delay:
+                time.sleep(delay)
+
+            if fleet.failure_rate and fleet.random.random() < fleet.failure_rate:
+                fleet.failures += 1
+                channel.get_transport().close()
+                return
+
+            code, stdout, stderr = self.host.execute(command, stdin)
+            fleet.commands += 1
+            self.send(channel, stdout, channel.sendall)
+            if stderr:
+                channel.sendall_stderr(stderr)
+            channel.send_exit_status(code)
+        except Exception:
+            pass
+        finally:
+            try:
+                channel.shutdown_write()
+                channel.close()
+            except Exception:
+                pass
+
+    def send(self, channel: paramiko.Channel, data: bytes, sendall: Callable[[bytes], None]) -> None:
+        bandwidth = self.fleet.bandwidth
+        if not bandwidth:
+            sendall(data)
+            return
+
+        chunk = 16384
+        for start in range(0, len(data), chunk):
+            part = data[start:start + chunk]
+            sendall(part)
+            time.sleep(len(part) / bandwidth)
+
+
+class MockFleet:
+    """
+    Starts simulated hosts, each listening on its own port of 127.0.0.1.
+
+    Args:
+        hosts (int): Number of hosts. Defaults to 10.
+        user (str): The user accepted by every host. Defaults to `pardus`.
+        password (str): Its password. Defaults to `pardus`.
+        packages (int): Size of the package database. Defaults to 2000.
+        units (int): Number of systemd units per host. Defaults to 200.
+        latency (Union[float, Callable]): Seconds each command waits before running, or a function returning
+            them. Defaults to 0.
+        bandwidth (float, optional): Bytes per second of the standard output of each command. Defaults to None
+            (no limit).
+        failure_rate (float): Probability that a command drops the connection instead of answering. Defaults to 0.
+        connect_failure_rate (float): Probability that a new connection is dropped before the handshake.
+            Defaults to 0.
+        seed (int): The seed of the generated data and the injected failures. Defaults to 0.
+        authorized_keys (List[paramiko.PKey], optional): The public keys accepted for the user. Defaults to None
+            (any key).
+    """
+
+    def __init__(self, hosts: int = 10, user: str = "pardus", password: str = "pardus", packages: int = 2000,
+                 units: int = 200, latency: Union[float, Callable[[], float]] = 0.0,
+                 bandwidth: Optional[float] = None, failure_rate: float = 0.0, connect_failure_rate: float = 0.0,
+                 seed: int = 0, authorized_keys: Optional[List[paramiko.PKey]] = None) -> None:
+        self.user = user
+        self.authorized_keys = authorized_keys or []
+        self.password = password
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.failure_rate = failure_rate
+        self.connect_failure_rate = connect_failure_rate
+        self.random = random.Random(seed)
+        self.commands = 0
+        self.failures = 0
+        self.connections = 0
+        self.forwards = 0
+
+        shared_packages = generate_packages(packages, seed)
+        shared_units = generate_units(units, seed)
+        self.hosts = [FakeHost(f"host{index}", shared_packages, shared_units) for index in range(hosts)]
+        self.sockets: List[socket.socket] = []
+        self.transports: List[MockTransport] = []
+        self.selector = selectors.DefaultSelector()
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "MockFleet":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    @property
+    def addresses(self) -> List[Tuple[str, int]]:
+        """(address, port) of each host"""
+        return [sock.getsockname() for sock in self.sockets]
+
+    def start(self) -> None:
+        """Opens the ports and starts accepting connections"""
+        host_key()
+        for host in self.hosts:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(("127.0.0.1", 0))
+            sock.listen(128)
+            sock.setblocking(False)
+            self.sockets.append(sock)
+            self.selector.register(sock, selectors.EVENT_READ, host)
+
+        self.running = True
+        self.thread = threading.Thread(target=self.accept, name="mock-fleet", daemon=True)
+        self.thread.start()
+
+    def accept(self) -> None:
+        while self.running:
+            for key, _ in self.selector.select(timeout=0.1):
+                try:
+                    client, _ = key.fileobj.accept()
+                except (BlockingIOError, OSError):
+                    continue
+
+                self.connections += 1
+                if self.connect_failure_rate and self.random.random() < self.connect_failure_rate:
+                    client.close()
+                    continue
+
+                client.setblocking(True)
+                transport = MockTransport(client)
+                transport.add_server_key(host_key())
+                transport.set_subsystem_handler("sftp", paramiko.SFTPServer, FakeSFTPServer)
+                self.transports.append(transport)
+                try:
+                    transport.start_server(event=threading.Event(), server=MockServer(self, key.data, transport))
+                except Exception:
+                    transport.close()
+
+    def stop(self) -> None:
+        """Stops accepting connections and closes the open ones"""
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+
+        for transport in self.transports:
+            transport.close()
+
+        for sock in self.sockets:
+            self.selector.unregister(sock)
+            sock.close()
+
+        self.transports.clear()
+        self.sockets.clear()
+        self.selector.close()
+
+    def host(self, port: int) -> FakeHost:
+        """Returns the host listening on a port"""
+        for sock, host in zip(self.sockets, self.hosts):
+            if sock.getsockname()[1] == port:
+                return host
+
+        raise KeyError(port)
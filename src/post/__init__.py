@@ -1,32 +1,80 @@
 from .connection.ssh_connector import SSHConnector
+from .connection.base_ssh_connector import connect_all
 from .connection.local_connector import LocalConnector
 from .connection.key_connector import KeyConnector
+from .connection.openssh_connector import OpenSSHConnector
+from .connection.pool import SSHConnectionPool
+from .connection.jump import JumpHost
+from .connection.retry import RetryPolicy
+from .connection.compression import CompressionPolicy, GLOBAL_COMPRESSION
+from .connection.shell_session import PersistentShellSession
+from .connection.agent import AgentSession
+from .connection.local_agent import LocalAgentSession
+from .connection.result_cache import ResultCache, GLOBAL_RESULT_CACHE
+from .connection.metrics import MetricsRegistry, CommandEvent, GLOBAL_METRICS
+from .connection.recording import RecordingConnector, ReplayConnector
+from .connection.fleet import FleetExecutor, HostSpec, Operation
+from .connection.async_ssh_connector import AsyncSSHConnector
 from .apt.apt import Apt
 from .apt.apt_list import AptList
+from .apt.async_apt import AsyncApt
 from .service.service import Service
 from .service.service_list import ServiceList
+from .service.async_service import AsyncService
 from .config.config import Config
 from .config.config_list import ConfigList
 from .config.config_raw import ConfigRaw
 from .user.user import User
 from .user.user_list import UserList
-from .utils.common import nmap
+from .user.async_user import AsyncUser
+from .utils.common import nmap, gather_limited
+from .utils.scanner import Scanner, ScanResult
+from .utils.tracing import Tracer, GLOBAL_TRACER
 from .sambatool.sambatool import SambaTool
 
 __all__ = [
     "SSHConnector",
+    "connect_all",
     "LocalConnector",
     "KeyConnector",
+    "OpenSSHConnector",
+    "SSHConnectionPool",
+    "JumpHost",
+    "RetryPolicy",
+    "CompressionPolicy",
+    "GLOBAL_COMPRESSION",
+    "PersistentShellSession",
+    "AgentSession",
+    "LocalAgentSession",
+    "ResultCache",
+    "GLOBAL_RESULT_CACHE",
+    "MetricsRegistry",
+    "CommandEvent",
+    "GLOBAL_METRICS",
+    "RecordingConnector",
+    "ReplayConnector",
+    "FleetExecutor",
+    "HostSpec",
+    "Operation",
+    "AsyncSSHConnector",
     "Apt",
     "AptList",
+    "AsyncApt",
     "Service",
     "ServiceList",
+    "AsyncService",
     "Config",
     "ConfigList",
     "ConfigRaw",
     "User",
     "UserList",
+    "AsyncUser",
     "nmap",
+    "Scanner",
+    "ScanResult",
+    "gather_limited",
+    "Tracer",
+    "GLOBAL_TRACER",
     "SambaTool"
 ]
 
@@ -2,15 +2,18 @@ import re
 from datetime import datetime
 
 from logging import Logger
-from typing import List, Optional, Dict, Union, Any
+from typing import List, Optional, Dict, Union, Any, Iterable, Iterator
 
 from typing_extensions import Self
 
 from post import SSHConnector
 from post.apt.model_apt import ModelApt
 from post.connection.model_connector import ModelConnector
+from post.connection.pool import GLOBAL_POOL
+from post.connection.result_cache import ResultCache
 from post.utils.common import escape_string, GLOBAL_LOGGER
 from post.utils.error import AlreadyExist, NotFound
+from post.utils.tracing import traced_methods
 
 
 def is_valid_source_line(line: str) -> None:
@@ -44,6 +47,164 @@ def option_matcher(option: str) -> Optional[Dict[str, str]]:
     return options_to_return
 
 
+def repository_parser(text: str) -> List[Dict[str, Any]]:
+    """
+    Parses `grep '^deb '` output of the source lists to a list of repositories
+
+    Args:
+        text (str): lines of the source lists
+
+    Returns:
+        List[Dict[str, Any]]: list of repositories
+    """
+    pattern = re.compile(r'^(deb|deb-src)\s+'
+                         r'(\[.*?\]\s+)?'
+                         r'(\S+)\s+'
+                         r'(\S+)\s+'
+                         r'(.+)$')
+    repositories = []
+
+    for repo in text.split("\n"):
+        line = repo.strip()
+        match = pattern.match(line)
+        if match:
+            entry = {
+                'kind': match.group(1),
+                'options': option_matcher(match.group(2)),
+                'url': match.group(3),
+                'distribution': match.group(4),
+                'components': match.group(5).strip()
+            }
+            repositories.append(entry)
+
+    return repositories
+
+
+def package_stream_parser(lines: Iterable[str], logger: Logger = GLOBAL_LOGGER) -> Iterator[Dict[str, Any]]:
+    """
+    Parses `apt list`'s output line by line and yields packages as they are parsed
+
+    Args:
+        lines (Iterable[str]): lines of the output of `apt list`
+        logger (Logger): A logger to log unparsable lines. Defaults to GLOBAL_LOGGER.
+
+    Returns:
+        Iterator[Dict[str, Any]]: packages
+    """
+    for line in lines:
+        try:
+
+            if "/" not in line.strip():
+                continue
+            package, rest = line.strip().split("/")
+            exp = re.findall(r'\[[^\]]*\]|\S+', rest)
+            if len(exp) == 3:
+                repo, version, arch = exp
+                tags = ""
+            else:
+                repo, version, arch, tags = exp
+
+            yield {
+                "package": package,
+                "repo": repo,
+                "version": version,
+                "arch": arch,
+                "tags": [each.strip() for each in tags.lstrip("[").rstrip("]").split(",") if each.strip()]
+            }
+        except Exception as e:
+            logger.warning(e)
+
+
+def package_parser(text: str, logger: Logger = GLOBAL_LOGGER) -> List[Dict[str, Any]]:
+    """
+    Parses `apt list`'s output to a list of packages
+
+    Args:
+        text (str): the output of `apt list`
+        logger (Logger): A logger to log unparsable lines. Defaults to GLOBAL_LOGGER.
+
+    Returns:
+        List[Dict[str, Any]]: list of packages
+    """
+    return list(package_stream_parser(text.split("\n"), logger=logger))
+
+
+def search_stream_parser(lines: Iterable[str]) -> Iterator[Dict[str, str]]:
+    """
+    Parses `apt search`'s output line by line and yields packages as they are parsed
+
+    Args:
+        lines (Iterable[str]): lines of the output of `apt search`
+
+    Returns:
+        Iterator[Dict[str, str]]: found packages
+    """
+    pattern = re.compile(r'(.+?)/(.+?)\s+([\d\w.:+-]+)\s+(\S+)(?:\s+\[.*\])?')
+
+    package: Optional[Dict[str, str]] = None
+    for line in lines:
+        if package is None:
+            match = pattern.match(line.strip())
+            if match:
+                name, repo, version, arch = match.groups()
+                package = {
+                    'name': name,
+                    'repo': repo,
+                    'version': version,
+                    'architecture': arch,
+                    'description': ''
+                }
+        elif line.startswith(' '):
+            package['description'] = line.strip()
+            yield package
+            package = None
+
+    if package is not None:
+        yield package
+
+
+def search_parser(text: str) -> List[Dict[str, str]]:
+    """
+    Parses `apt search`'s output to a list of packages
+
+    Args:
+        text (str): the output of `apt search`
+
+    Returns:
+        List[Dict[str, str]]: list of found packages
+    """
+    return list(search_stream_parser(text.strip().split("\n")))
+
+
+def show_parser(text: str) -> Dict[Union[str, None], Any]:
+    """
+    Parses `apt show`'s output to a dictionary
+
+    Args:
+        text (str): the output of `apt show`
+
+    Returns:
+        Dict[Union[str, None], Any]: information about the package
+    """
+    lines = text.strip().split('\n')
+    parsed_dict: dict[Union[str, None], Any] = {}
+
+    current_key = None
+    for line in lines:
+        if line.startswith(' '):
+            parsed_dict[current_key] += '\n' + line.strip()
+        else:
+            key, value = line.split(': ', 1)
+            current_key = key.strip()
+            if current_key == 'Depends':
+                parsed_dict[current_key] = [dep.strip() for dep in value.split(',')]
+            else:
+                parsed_dict[current_key] = value.strip()
+
+    return parsed_dict
+
+
+@traced_methods
 class Apt(ModelApt):
     """
     APT package manager.
@@ -52,10 +213,12 @@ class Apt(ModelApt):
         connector (ModelConnector): A connector that extends from ModelConnector abstract class.
         sudo_passwd (str, optional): The sudo password of the user if the connection is done by an ssh key. Defaults to None.
         logger (Logger, optional): A logger to log. Defaults to None.
+        cache (ResultCache, optional): The cache of package lists, e.g. GLOBAL_RESULT_CACHE. Defaults to None (no
+            caching).
     """
 
     def __init__(self, connector: ModelConnector, sudo_passwd: Optional[str] = None,
-                 logger: Optional[Logger] = None) -> None:
+                 logger: Optional[Logger] = None, cache: Optional[ResultCache] = None) -> None:
         """
         Constructs an Apt object
 
@@ -63,6 +226,8 @@ class Apt(ModelApt):
             connector (ModelConnector): A connector that extends from ModelConnector abstract class.
             sudo_passwd (str, optional): The sudo password of the user if the connection is done by an ssh key. Defaults to None.
             logger (Logger, optional): A logger to log. Defaults to None.
+            cache (ResultCache, optional): The cache of package lists, e.g. GLOBAL_RESULT_CACHE. Defaults to None (no
+                caching).
         """
         if logger is None:
             self.logger = GLOBAL_LOGGER
@@ -71,6 +236,7 @@ class Apt(ModelApt):
 
         self.sudo_passwd = sudo_passwd
         self.connector = connector
+        self.cache = cache
 
     def __str__(self) -> str:
         return f"{self.__class__.__name__}(connector: {self.connector})"
@@ -97,7 +263,7 @@ class Apt(ModelApt):
         Raises:
             ValueError: If a connection cannot be established
         """
-        ssh_connector = SSHConnector(address, port, user, passwd, logger=logger)
+        ssh_connector = SSHConnector(address, port, user, passwd, logger=logger, pool=GLOBAL_POOL)
         return cls(ssh_connector, logger=logger)
 
     def repositories(self) -> List[Dict[str, Any]]:
@@ -111,28 +277,7 @@ class Apt(ModelApt):
 
         output = self.connector.run("grep --no-filename -r '^deb ' /etc/apt/sources.list /etc/apt/sources.list.d/")
 
-        pattern = re.compile(r'^(deb|deb-src)\s+'
-                             r'(\[.*?\]\s+)?'
-                             r'(\S+)\s+'
-                             r'(\S+)\s+'
-                             r'(.+)$')
-        repositories = []
-
-        repos = output.read().decode().split("\n")
-        for repo in repos:
-            line = repo.strip()
-            match = pattern.match(line)
-            if match:
-                entry = {
-                    'kind': match.group(1),
-                    'options': option_matcher(match.group(2)),
-                    'url': match.group(3),
-                    'distribution': match.group(4),
-                    'components': match.group(5).strip()
-                }
-                repositories.append(entry)
-
-        return repositories
+        return repository_parser(output.read().decode())
 
     def add_repository(self, repository: str) -> None:
         """
@@ -165,6 +310,7 @@ class Apt(ModelApt):
         stdout = self.connector.sudo_run(f"echo {repository} >> /etc/apt/sources.list.d/post.list",
                                          passwd=self.sudo_passwd)
         _ = stdout.read().decode()
+        self._changed()
 
     def update(self) -> None:
         """
@@ -177,6 +323,7 @@ class Apt(ModelApt):
 
         stdout = self.connector.sudo_run("apt update", passwd=self.sudo_passwd)
         _ = stdout.read().decode()
+        self._changed()
 
     def upgrade(self, package_name: Optional[str] = None) -> None:
         """
@@ -198,15 +345,17 @@ class Apt(ModelApt):
                 f"sudo apt upgrade -y --only-upgrade {package_name}", passwd=self.sudo_passwd
             )
             _ = stdout.read().decode()
+            self._changed()
             return
 
         stdout = self.connector.sudo_run("sudo apt upgrade -y", passwd=self.sudo_passwd)
         _ = stdout.read().decode()
+        self._changed()
 
     def list(self, installed: bool = False, upgradeable: bool = False) -> List[Dict[str, str]]:
         """
-        Installs available upgrades of all packages currently installed on the system from the sources configured via
-        sources.list
+        Returns the packages known to apt. With a `cache`, a non-empty result is kept per host (see `ResultCache`)
+        until a mutating method of Apt runs on the host.
 
         Args:
             installed (bool): Filters only installed packages. Defaults to False
@@ -217,6 +366,32 @@ class Apt(ModelApt):
         """
         self.logger.info("Listing all available packages")
 
+        if self.cache is None:
+            return list(self.iter_list(installed=installed, upgradeable=upgradeable))
+
+        packages = self.cache.get_or_load(
+            self.connector, f"apt.list.{int(installed)}{int(upgradeable)}",
+            lambda: list(self.iter_list(installed=installed, upgradeable=upgradeable)),
+            cacheable=bool
+        )
+        return list(packages)
+
+    def _changed(self) -> None:
+        """Drops the cached package lists of the host after it was changed"""
+        if self.cache is not None:
+            self.cache.invalidate(self.connector, "apt.")
+
+    def iter_list(self, installed: bool = False, upgradeable: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Yields packages while `apt list` is still running. See `list`.
+
+        Args:
+            installed (bool): Filters only installed packages. Defaults to False
+            upgradeable (bool): Filters only upgradeable packages. Defaults to False.
+
+        Raises:
+            CommandError: If standard error is not empty
+        """
         command = "apt list"
         if installed:
             command += " --installed"
@@ -224,35 +399,37 @@ class Apt(ModelApt):
         if upgradeable:
             command += " --upgradeable"
 
-        packages = self.connector.sudo_run(command, passwd=self.sudo_passwd)
-
-        parsed_data = []
-        for line in packages.read().decode().split("\n"):
-            try:
-
-                if "/" not in line.strip():
-                    continue
-                package, rest = line.strip().split("/")
-                exp = re.findall(r'\[[^\]]*\]|\S+', rest)
-                if len(exp) == 3:
-                    repo, version, arch = exp
-                    tags = ""
-                else:
-                    repo, version, arch, tags = exp
-
-                parsed_data.append(
-                    {
-                        "package": package,
-                        "repo": repo,
-                        "version": version,
-                        "arch": arch,
-                        "tags": [each.strip() for each in tags.lstrip("[").rstrip("]").split(",") if each.strip()]
-                    }
-                )
-            except Exception as e:
-                self.logger.warning(e)
-
-        return parsed_data
+        lines = self.connector.sudo_run_stream(command, passwd=self.sudo_passwd)
+        yield from package_stream_parser(lines, logger=self.logger)
+
+    def installed(self) -> Dict[str, str]:
+        """
+        Returns the installed packages and their versions as dpkg knows them.
+
+        Much cheaper than `list(installed=True)` since it does not run apt. Uses the remote agent if the connector
+        runs one.
+
+        Returns:
+            Dict[str, str]: package names and versions
+        """
+        self.logger.info("Listing installed packages")
+
+        agent = self.connector.get_agent(passwd=self.sudo_passwd)
+        if agent is not None:
+            return {
+                package["package"]: package.get("version", "")
+                for package in agent.dpkg_status()
+                if package.get("status", "").endswith(" installed")
+            }
+
+        packages = {}
+        output = self.connector.run("dpkg-query -W -f='${Package}\\t${Version}\\t${Status}\\n'")
+        for line in output.lines():
+            columns = line.split("\t")
+            if len(columns) == 3 and columns[2].endswith(" installed"):
+                packages[columns[0]] = columns[1]
+
+        return packages
 
     def install(self, package_name: Union[str, List[str]]) -> None:
         """
@@ -295,6 +472,7 @@ class Apt(ModelApt):
         command = f"DEBIAN_FRONTEND=noninteractive apt install {' '.join(package_to_be_installed)} -y"
         stdout = self.connector.sudo_run(command, passwd=self.sudo_passwd)
         _ = stdout.read().decode()
+        self._changed()
 
     def reinstall(self, package_name: Union[str, List[str]]) -> None:
         """
@@ -335,6 +513,7 @@ class Apt(ModelApt):
         command = f"apt reinstall {' '.join(package_to_be_installed)} -y"
         stdout = self.connector.sudo_run(command, passwd=self.sudo_passwd)
         _ = stdout.read().decode()
+        self._changed()
 
     def remove(self, package_name: Union[str, List[str]]) -> None:
         """
@@ -375,6 +554,7 @@ class Apt(ModelApt):
         command = f"apt remove {' '.join(package_to_be_installed)} -y"
         stdout = self.connector.sudo_run(command, passwd=self.sudo_passwd)
         _ = stdout.read().decode()
+        self._changed()
 
     def purge(self, package_name: Union[str, List[str]]) -> None:
         """
@@ -415,6 +595,7 @@ class Apt(ModelApt):
         command = f"apt purge {' '.join(package_to_be_installed)} -y"
         stdout = self.connector.sudo_run(command, passwd=self.sudo_passwd)
         _ = stdout.read().decode()
+        self._changed()
 
     def search(self, package_name: str) -> List[Dict[str, str]]:
         """
@@ -437,35 +618,8 @@ class Apt(ModelApt):
             self.logger.warning(f"Package `{package_name}` not found")
 
         command = f"apt search {package_name}"
-        stdout = self.connector.run(command)
 
-        lines = stdout.read().decode().strip().split('\n')
-        packages_to_return = []
-
-        while lines:
-            name_version_arch = lines.pop(0).strip()
-            description_lines = []
-
-            match = re.match(r'(.+?)/(.+?)\s+([\d\w.:+-]+)\s+(\S+)(?:\s+\[.*\])?', name_version_arch)
-            if match:
-                name, repo, version, arch = match.groups()
-                description = ''
-
-                while lines and not lines[0].startswith(' '):
-                    description_lines.append(lines.pop(0).strip())
-
-                if lines:
-                    description = lines.pop(0).strip()
-
-                packages_to_return.append({
-                    'name': name,
-                    'repo': repo,
-                    'version': version,
-                    'architecture': arch,
-                    'description': description
-                })
-
-        return packages_to_return
+        return list(search_stream_parser(self.connector.run_stream(command)))
 
     def show(self, package_name: str) -> Dict[Union[str, None], Any]:
         """
@@ -492,24 +646,10 @@ class Apt(ModelApt):
         command = f"apt show {package_name}"
         stdout = self.connector.run(command)
 
-        lines = stdout.read().decode().strip().split('\n')
-        parsed_dict: dict[Union[str, None], Any] = {}
-
-        current_key = None
-        for line in lines:
-            if line.startswith(' '):
-                parsed_dict[current_key] += '\n' + line.strip()
-            else:
-                key, value = line.split(': ', 1)
-                current_key = key.strip()
-                if current_key == 'Depends':
-                    parsed_dict[current_key] = [dep.strip() for dep in value.split(',')]
-                else:
-                    parsed_dict[current_key] = value.strip()
-
-        return parsed_dict
+        return show_parser(stdout.read().decode())
 
     def auto_remove(self):
         command = "apt autoremove -y"
         stdout = self.connector.run(command)
         _ = stdout.read().decode()
+        self._changed()
@@ -8,8 +8,10 @@ from post.apt.model_apt_list import ModelAptList
 from post.connection.model_connector import ModelConnector
 from post.utils.common import GLOBAL_LOGGER
 from post.utils.error import NumberOfElementsError
+from post.utils.tracing import traced_methods
 
 
+@traced_methods
 class AptList(ModelAptList):
     """
     Multiple APT package manager.
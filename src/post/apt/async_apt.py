@@ -0,0 +1,203 @@
+from logging import Logger
+from typing import List, Optional, Dict, Union, Any
+
+from typing_extensions import Self
+
+from post.apt.apt import repository_parser, package_parser, search_parser, show_parser
+from post.connection.async_model_connector import AsyncModelConnector
+from post.connection.async_ssh_connector import AsyncSSHConnector
+from post.connection.pool import GLOBAL_POOL
+from post.utils.common import escape_string, GLOBAL_LOGGER
+from post.utils.error import NotFound
+
+
+class AsyncApt:
+    """
+    asyncio APT package manager. Does what Apt does using an AsyncModelConnector.
+
+    Many of them can be awaited together to inventory a fleet. See `post.utils.common.gather_limited`.
+
+    Args:
+        connector (AsyncModelConnector): A connector that extends from AsyncModelConnector abstract class.
+        sudo_passwd (str, optional): The sudo password of the user if the connection is done by an ssh key. Defaults to None.
+        logger (Logger, optional): A logger to log. Defaults to None.
+    """
+
+    def __init__(self, connector: AsyncModelConnector, sudo_passwd: Optional[str] = None,
+                 logger: Optional[Logger] = None) -> None:
+        """
+        Constructs an AsyncApt object
+
+        Args:
+            connector (AsyncModelConnector): A connector that extends from AsyncModelConnector abstract class.
+            sudo_passwd (str, optional): The sudo password of the user if the connection is done by an ssh key. Defaults to None.
+            logger (Logger, optional): A logger to log. Defaults to None.
+        """
+        if logger is None:
+            self.logger = GLOBAL_LOGGER
+        else:
+            self.logger = logger
+
+        self.sudo_passwd = sudo_passwd
+        self.connector = connector
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(connector: {self.connector})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    @classmethod
+    def from_ssh_connector(cls, address: str, port: int, user: str, passwd: str,
+                           logger: Optional[Logger] = None) -> Self:
+        """
+        Constructs an AsyncApt object using an ssh connection information. The connection is established on the
+        first call.
+
+        Args:
+            address (str): An IP address or hostname.
+            port (int): The ssh port. Most probably is 22.
+            user (str): The ssh username.
+            passwd (str): The ssh user's password.
+            logger (Logger, optional): A logger to log. Defaults to None.
+
+        Returns:
+            Self: An AsyncApt object.
+        """
+        ssh_connector = AsyncSSHConnector(address, port, user, passwd, logger=logger, pool=GLOBAL_POOL)
+        return cls(ssh_connector, logger=logger)
+
+    async def __packages_to_act_on(self, package_name: Union[str, List[str]], installed: bool) -> List[str]:
+        """
+        Filters the given package(s) to the ones available and (not) installed.
+
+        Args:
+            package_name (str or List[str]): Package names.
+            installed (bool): Whether the packages must be installed or not.
+
+        Raises:
+            NotFound: If there is nothing to act on
+        """
+        available_packages = {p["package"]: p["tags"] for p in await self.list()}
+
+        if isinstance(package_name, list):
+            package_names = package_name
+        else:
+            package_names = [package_name]
+
+        packages = []
+        for p in package_names:
+            if p not in available_packages.keys():
+                self.logger.warning(f"Package `{p}` not found. Skipping")
+                continue
+
+            if ("installed" in available_packages[p]) != installed:
+                self.logger.warning(f"Package `{p}` is {'not ' if installed else 'already '}installed. Skipping")
+                continue
+
+            escape_string(p)
+            packages.append(p)
+
+        if len(packages) == 0:
+            self.logger.error("No packages were found")
+            raise NotFound("No packages were found")
+
+        return packages
+
+    async def repositories(self) -> List[Dict[str, Any]]:
+        """See Apt.repositories"""
+        self.logger.info("Getting repositories")
+
+        output = await self.connector.run(
+            "grep --no-filename -r '^deb ' /etc/apt/sources.list /etc/apt/sources.list.d/"
+        )
+        return repository_parser(output.decode())
+
+    async def update(self) -> None:
+        """See Apt.update"""
+        self.logger.info("Updating repos")
+
+        _ = await self.connector.sudo_run("apt update", passwd=self.sudo_passwd)
+
+    async def upgrade(self, package_name: Optional[str] = None) -> None:
+        """See Apt.upgrade"""
+        self.logger.info("Upgrading either a package or all packages")
+
+        if package_name is not None:
+            escape_string(package_name)
+            _ = await self.connector.sudo_run(
+                f"sudo apt upgrade -y --only-upgrade {package_name}", passwd=self.sudo_passwd
+            )
+            return
+
+        _ = await self.connector.sudo_run("sudo apt upgrade -y", passwd=self.sudo_passwd)
+
+    async def list(self, installed: bool = False, upgradeable: bool = False) -> List[Dict[str, Any]]:
+        """See Apt.list"""
+        self.logger.info("Listing all available packages")
+
+        command = "apt list"
+        if installed:
+            command += " --installed"
+
+        if upgradeable:
+            command += " --upgradeable"
+
+        packages = await self.connector.sudo_run(command, passwd=self.sudo_passwd)
+        return package_parser(packages.decode(), logger=self.logger)
+
+    async def install(self, package_name: Union[str, List[str]]) -> None:
+        """See Apt.install"""
+        self.logger.info("Installing packages")
+
+        packages = await self.__packages_to_act_on(package_name, installed=False)
+        command = f"DEBIAN_FRONTEND=noninteractive apt install {' '.join(packages)} -y"
+        _ = await self.connector.sudo_run(command, passwd=self.sudo_passwd)
+
+    async def reinstall(self, package_name: Union[str, List[str]]) -> None:
+        """See Apt.reinstall"""
+        self.logger.info("Reinstalling packages")
+
+        packages = await self.__packages_to_act_on(package_name, installed=True)
+        _ = await self.connector.sudo_run(f"apt reinstall {' '.join(packages)} -y", passwd=self.sudo_passwd)
+
+    async def remove(self, package_name: Union[str, List[str]]) -> None:
+        """See Apt.remove"""
+        self.logger.info("Removing packages")
+
+        packages = await self.__packages_to_act_on(package_name, installed=True)
+        _ = await self.connector.sudo_run(f"apt remove {' '.join(packages)} -y", passwd=self.sudo_passwd)
+
+    async def purge(self, package_name: Union[str, List[str]]) -> None:
+        """See Apt.purge"""
+        self.logger.info("Purging packages")
+
+        packages = await self.__packages_to_act_on(package_name, installed=True)
+        _ = await self.connector.sudo_run(f"apt purge {' '.join(packages)} -y", passwd=self.sudo_passwd)
+
+    async def search(self, package_name: str) -> List[Dict[str, str]]:
+        """See Apt.search"""
+        self.logger.info("Searching package")
+
+        escape_string(package_name)
+
+        stdout = await self.connector.run(f"apt search {package_name}")
+        return search_parser(stdout.decode())
+
+    async def show(self, package_name: str) -> Dict[Union[str, None], Any]:
+        """See Apt.show"""
+        self.logger.info("Showing package")
+
+        escape_string(package_name)
+
+        available_packages = {p["package"] for p in await self.list()}
+        if package_name not in available_packages:
+            self.logger.warning(f"Package `{package_name}` not found")
+            raise NotFound(f"Package `{package_name}` not found")
+
+        stdout = await self.connector.run(f"apt show {package_name}")
+        return show_parser(stdout.decode())
+
+    async def auto_remove(self) -> None:
+        """Removes packages that were automatically installed and are no longer required"""
+        _ = await self.connector.run("apt autoremove -y")
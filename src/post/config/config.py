@@ -2,17 +2,19 @@ import configparser
 import io
 from logging import Logger
 from pathlib import Path
-from typing import Optional, Union, Dict, Any
+from typing import Optional, Union, Dict, Any, Tuple
 
 from typing_extensions import Self
 
 from post import SSHConnector
 from post.config.model_config import ModelConfig
 from post.connection.model_connector import ModelConnector
+from post.connection.pool import GLOBAL_POOL
 from post.utils.common import GLOBAL_LOGGER
-from post.utils.error import CommandError
+from post.utils.tracing import traced_methods
 
 
+@traced_methods
 class Config(Dict[str, Any], ModelConfig):
     """
     Config file manager.
@@ -59,17 +61,19 @@ class Config(Dict[str, Any], ModelConfig):
 
         self.connector = connector
         self.sudo_passwd = sudo_passwd
-        if not self.exist():
+        exists, content = self.__probe()
+        if not exists:
             if not create:
                 raise FileNotFoundError("Config file does not exist")
             else:
                 self.touch()
+                content = ""
 
         if backup:
             self.create_backup()
 
         self.config = configparser.ConfigParser(interpolation=None)
-        self.config.read_string(self.read())
+        self.config.read_string(content)
 
         super().__init__({section: dict(self.config.items(section)) for section in self.config.sections()})
 
@@ -108,7 +112,7 @@ class Config(Dict[str, Any], ModelConfig):
         Raises:
             FileNotFoundError: if the config file does not exist and create is False.
         """
-        ssh_connector = SSHConnector(address, port, user, passwd, logger=logger)
+        ssh_connector = SSHConnector(address, port, user, passwd, logger=logger, pool=GLOBAL_POOL)
         return cls(ssh_connector, path, create=create, backup=backup, force=force, logger=logger)
 
     def clear(self) -> None:
@@ -132,6 +136,12 @@ class Config(Dict[str, Any], ModelConfig):
         """
         self.logger.info("Creating config file")
 
+        agent = self.connector.get_agent(passwd=self.sudo_passwd)
+        if agent is not None:
+            agent.mkdir(self.path.parent.absolute())
+            agent.touch(self.path.absolute())
+            return
+
         stdout = self.connector.sudo_run(
             f"mkdir -p {self.path.parent.absolute().__str__()}", passwd=self.sudo_passwd
         )
@@ -157,15 +167,11 @@ class Config(Dict[str, Any], ModelConfig):
             else:
                 file_to_check = Path(the_file)
 
-        try:
-            stdout = self.connector.run(f"test -e {file_to_check} && echo exist")
-            if stdout.read().decode().strip() == "":
-                return False
-        except CommandError as e:
-            self.logger.warning(e)
-            return False
+        agent = self.connector.get_agent(passwd=self.sudo_passwd)
+        if agent is not None:
+            return agent.exists(file_to_check)
 
-        return True
+        return self.connector.exists(file_to_check)
 
     def create_backup(self) -> None:
         """
@@ -180,19 +186,42 @@ class Config(Dict[str, Any], ModelConfig):
             backup_base = backup_base.parent / (backup_base.stem + f".{counter}")
             counter += 1
 
+        agent = self.connector.get_agent(passwd=self.sudo_passwd)
+        if agent is not None:
+            agent.copy(self.path.absolute(), backup_base.absolute())
+            return
+
         stdout = self.connector.sudo_run(
             f"cp {self.path.absolute().__str__()} {backup_base.absolute().__str__()}", passwd=self.sudo_passwd
         )
         _ = stdout.read().decode()
 
+    def __probe(self) -> Tuple[bool, str]:
+        """
+        Checks if the config file exists and reads it if it does.
+
+        Returns:
+            Tuple[bool, str]: whether the file exists and its content
+        """
+        agent = self.connector.get_agent(passwd=self.sudo_passwd)
+        if agent is not None:
+            if not agent.exists(self.path.absolute()):
+                return False, ""
+
+            return True, agent.read_file(self.path.absolute()).decode()
+
+        if not self.connector.exists(self.path.absolute(), passwd=self.sudo_passwd):
+            return False, ""
+
+        return True, self.connector.read_file(self.path.absolute(), passwd=self.sudo_passwd).decode()
+
     def read(self) -> str:
         """
         Reads the config file.
         """
         self.logger.info("Reading config file")
 
-        stdout = self.connector.sudo_run(f"cat {self.path.absolute().__str__()}", passwd=self.sudo_passwd)
-        return str(stdout.read().decode())
+        return self.connector.read_file(self.path.absolute(), passwd=self.sudo_passwd).decode()
 
     def __update(self) -> None:
         """
@@ -212,6 +241,4 @@ class Config(Dict[str, Any], ModelConfig):
         with io.StringIO() as ss:
             self.config.write(ss)
             ss.seek(0)
-            stdout = self.connector.sudo_run(f"echo '{ss.read()}' > {self.path.absolute().__str__()}",
-                                             passwd=self.sudo_passwd)
-            _ = stdout.read().decode()
+            self.connector.write_file(self.path.absolute(), ss.read().encode(), passwd=self.sudo_passwd)
@@ -9,8 +9,10 @@ from post.config.model_config_list import ModelConfigList
 from post.connection.model_connector import ModelConnector
 from post.utils.common import GLOBAL_LOGGER
 from post.utils.error import NumberOfElementsError
+from post.utils.tracing import traced_methods
 
 
+@traced_methods
 class ConfigList(dict[Any, Any], ModelConfigList):
     """
     Multiple Config manager.
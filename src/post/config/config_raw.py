@@ -1,14 +1,17 @@
 from logging import Logger
 from pathlib import Path
-from typing import Union, Optional
+from typing import Union, Optional, Tuple
 
 from typing_extensions import Self
 
 from post import SSHConnector
 from post.connection.model_connector import ModelConnector
+from post.connection.pool import GLOBAL_POOL
 from post.utils.common import GLOBAL_LOGGER
+from post.utils.tracing import traced_methods
 
 
+@traced_methods
 class ConfigRaw:
     """
     Config ConfigRaw manager.
@@ -55,16 +58,18 @@ class ConfigRaw:
         self.connector = connector
         self.sudo_passwd = sudo_passwd
 
-        if not self.exist():
+        exists, content = self.__probe()
+        if not exists:
             if not create:
                 raise FileNotFoundError("Config file does not exist")
             else:
                 self.touch()
+                content = ""
 
         if backup:
             self.create_backup()
 
-        self.__data = self.read()
+        self.__data = content
 
     def __str__(self) -> str:
         return self.data
@@ -101,7 +106,7 @@ class ConfigRaw:
         Raises:
             FileNotFoundError: if the config file does not exist and create is False.
         """
-        ssh_connector = SSHConnector(address, port, user, passwd, logger=logger)
+        ssh_connector = SSHConnector(address, port, user, passwd, logger=logger, pool=GLOBAL_POOL)
         return cls(ssh_connector, path, create=create, backup=backup, force=force)
 
     @property
@@ -129,6 +134,25 @@ class ConfigRaw:
         self.__data = data
         self.__update()
 
+    def __probe(self) -> Tuple[bool, str]:
+        """
+        Checks if the config file exists and reads it if it does.
+
+        Returns:
+            Tuple[bool, str]: whether the file exists and its content
+        """
+        agent = self.connector.get_agent(passwd=self.sudo_passwd)
+        if agent is not None:
+            if not agent.exists(self.path.absolute()):
+                return False, ""
+
+            return True, agent.read_file(self.path.absolute()).decode()
+
+        if not self.connector.exists(self.path.absolute(), passwd=self.sudo_passwd):
+            return False, ""
+
+        return True, self.connector.read_file(self.path.absolute(), passwd=self.sudo_passwd).decode()
+
     def read(self) -> str:
         """
         Reading the data from the config file
@@ -138,10 +162,7 @@ class ConfigRaw:
         """
         self.logger.info("Reading the data from the config file")
 
-        stdout = self.connector.sudo_run(
-            f"cat {self.path.absolute().__str__()}", passwd=self.sudo_passwd
-        )
-        return str(stdout.read().decode())
+        return self.connector.read_file(self.path.absolute(), passwd=self.sudo_passwd).decode()
 
     def exist(self, the_file: Optional[Union[str, Path]] = None) -> bool:
         """
@@ -163,8 +184,11 @@ class ConfigRaw:
             else:
                 file_to_check = Path(the_file)
 
-        stdout = self.connector.run(f"test -e {file_to_check} && echo exist")
-        return "e" in stdout.read().decode()
+        agent = self.connector.get_agent(passwd=self.sudo_passwd)
+        if agent is not None:
+            return agent.exists(file_to_check)
+
+        return self.connector.exists(file_to_check)
 
     def create_backup(self) -> None:
         """Creates a backup before each update"""
@@ -177,6 +201,11 @@ class ConfigRaw:
             backup_base = backup_base.parent / (backup_base.stem + f".{counter}")
             counter += 1
 
+        agent = self.connector.get_agent(passwd=self.sudo_passwd)
+        if agent is not None:
+            agent.copy(self.path.absolute(), backup_base.absolute())
+            return
+
         stdout = self.connector.sudo_run(
             f"cp {self.path.absolute().__str__()} {backup_base.absolute().__str__()}",
             passwd=self.sudo_passwd,
@@ -187,6 +216,12 @@ class ConfigRaw:
         """Creates the config file"""
         self.logger.info("Creating the config file")
 
+        agent = self.connector.get_agent(passwd=self.sudo_passwd)
+        if agent is not None:
+            agent.mkdir(self.path.parent.absolute())
+            agent.touch(self.path.absolute())
+            return
+
         stdout = self.connector.sudo_run(
             f"mkdir -p {self.path.parent.absolute().__str__()}", passwd=self.sudo_passwd
         )
@@ -200,7 +235,4 @@ class ConfigRaw:
         """Updates the config file"""
         self.logger.info("Updating the config file")
 
-        stdout = self.connector.sudo_run(
-            f"echo '{self.data}' > {self.path.absolute().__str__()}", passwd=self.sudo_passwd
-        )
-        _ = stdout.read().decode()
+        self.connector.write_file(self.path.absolute(), self.data.encode(), passwd=self.sudo_passwd)
@@ -0,0 +1,238 @@
+import base64
+import json
+import socket
+import struct
+import threading
+import time
+import uuid
+from logging import Logger
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union, cast
+
+from paramiko.channel import Channel
+from paramiko.transport import Transport
+
+from post.connection.command_result import CommandResult
+from post.connection.shell_session import open_sudo_channel
+from post.connection.stream import CHUNK_SIZE
+from post.utils.common import GLOBAL_LOGGER
+from post.utils.error import CommandError
+
+AGENT_SOURCE = (Path(__file__).parent / "remote_agent.py").read_bytes()
+
+ERRORS = {
+    "FileNotFoundError": FileNotFoundError,
+    "FileExistsError": FileExistsError,
+    "PermissionError": PermissionError,
+    "IsADirectoryError": IsADirectoryError,
+    "NotADirectoryError": NotADirectoryError,
+    "KeyError": KeyError,
+}
+
+
+class AgentSession:
+    """
+    A helper process running as root on the remote host, talked to over one channel.
+
+    The helper (`post/connection/remote_agent.py`) is sent as source when the session is opened, so nothing has to be
+    installed on the host except `python3`. File access, passwd/group lookups and dpkg status reading are then done
+    in the helper's process instead of spawning `sudo`, `su`, a shell and a utility for each call.
+
+    Requests and responses are length-prefixed JSON frames. Calls are made one at a time.
+
+    Args:
+        transport (Transport): An authenticated transport to open the channel on.
+        passwd (str, optional): The sudo password. Defaults to None.
+        logger (Logger, optional): The logger to log. Defaults to None.
+        timeout (float, optional): Seconds to wait for a response. Defaults to 60.
+        python (str): The python interpreter on the remote host. Defaults to `python3`.
+
+    Raises:
+        CommandError: If the helper cannot be started.
+    """
+
+    def __init__(self, transport: Transport, passwd: Optional[str] = None, logger: Optional[Logger] = None,
+                 timeout: Optional[float] = 60.0, python: str = "python3") -> None:
+        if logger is None:
+            self.logger = GLOBAL_LOGGER
+        else:
+            self.logger = logger
+
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.request_id = 0
+        self.logger.info("Starting remote agent")
+
+        marker = uuid.uuid4().hex
+        bootstrap = (f"import sys;sys.stdout.write(\"{marker}\\n\");sys.stdout.flush();"
+                     f"n=int(sys.stdin.buffer.readline());"
+                     f"exec(compile(sys.stdin.buffer.read(n),\"post-agent\",\"exec\"))")
+        self.channel: Optional[Channel] = self._open(transport, python, bootstrap, marker, passwd)
+        self.channel.sendall(f"{len(AGENT_SOURCE)}\n".encode() + AGENT_SOURCE)
+
+        if self.call("ping") != "pong":
+            self.close()
+            raise CommandError("Remote agent did not answer")
+
+    def _open(self, transport: Transport, python: str, bootstrap: str, marker: str,
+              passwd: Optional[str]) -> Channel:
+        """Starts the bootstrap as root and returns its channel, with the output up to the `marker` line consumed"""
+        return open_sudo_channel(transport, f"{python} -c '{bootstrap}'", marker, passwd=passwd, logger=self.logger)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(active: {self.active})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    @property
+    def active(self) -> bool:
+        """True if the helper is still running"""
+        return self.channel is not None and not self.channel.closed and not self.channel.exit_status_ready()
+
+    def __recv_exactly(self, channel: Channel, size: int) -> bytes:
+        """Receives exactly `size` bytes from the standard output of the helper"""
+        data = bytearray()
+        while len(data) < size:
+            chunk = channel.recv(min(CHUNK_SIZE, size - len(data)))
+            if not chunk:
+                stderr = b""
+                while channel.recv_stderr_ready():
+                    stderr += channel.recv_stderr(CHUNK_SIZE)
+
+                self.close()
+                raise CommandError(f"Remote agent exited: {stderr.decode(errors='replace').strip()}")
+
+            data += chunk
+
+        return bytes(data)
+
+    def call(self, method: str, **params: Any) -> Any:
+        """
+        Calls a method of the helper.
+
+        Args:
+            method (str): the name of the method. See `METHODS` in `post/connection/remote_agent.py`.
+            **params: the arguments of the method
+
+        Returns:
+            Any: the decoded result
+
+        Raises:
+            CommandError: If the helper is not running, does not answer in time or the method fails. The builtin
+                `OSError`s and `KeyError` raised in the helper are raised as they are.
+        """
+        with self.lock:
+            if self.channel is None or not self.active:
+                raise CommandError("Remote agent is closed")
+
+            channel = self.channel
+            self.request_id += 1
+            data = json.dumps({"id": self.request_id, "method": method, "params": params}).encode()
+
+            channel.settimeout(self.timeout)
+            try:
+                channel.sendall(struct.pack(">I", len(data)) + data)
+                (length,) = struct.unpack(">I", self.__recv_exactly(channel, 4))
+                response = json.loads(self.__recv_exactly(channel, length).decode())
+            except socket.timeout:
+                self.close()
+                raise CommandError(f"Remote agent did not answer `{method}` in {self.timeout} seconds")
+
+        if "error" in response:
+            error_type = ERRORS.get(response["error"]["type"], CommandError)
+            self.logger.error(response["error"]["message"])
+            raise error_type(response["error"]["message"])
+
+        return response["result"]
+
+    def read_file(self, path: Union[str, Path]) -> bytes:
+        """Returns the content of a file"""
+        return base64.b64decode(self.call("read_file", path=str(path)))
+
+    def write_file(self, path: Union[str, Path], data: bytes, append: bool = False) -> None:
+        """Replaces the content of a file atomically, keeping its mode and owner. Or appends to it."""
+        self.call("write_file", path=str(path), data=base64.b64encode(data).decode(), append=append)
+
+    def stat(self, path: Union[str, Path]) -> Optional[Dict[str, Any]]:
+        """Returns size, mode, uid, gid, mtime and is_dir of a path. None if it does not exist."""
+        return cast(Optional[Dict[str, Any]], self.call("stat", path=str(path)))
+
+    def exists(self, path: Union[str, Path]) -> bool:
+        """Checks if a path exists"""
+        return bool(self.call("exists", path=str(path)))
+
+    def mkdir(self, path: Union[str, Path]) -> None:
+        """Creates a directory and its parents (`mkdir -p`)"""
+        self.call("mkdir", path=str(path))
+
+    def touch(self, path: Union[str, Path]) -> None:
+        """Creates a file or updates its modification time"""
+        self.call("touch", path=str(path))
+
+    def copy(self, source: Union[str, Path], destination: Union[str, Path]) -> None:
+        """Copies a file with its metadata"""
+        self.call("copy", source=str(source), destination=str(destination))
+
+    def passwd(self) -> List[Dict[str, Any]]:
+        """Returns the user database (name, uid, gid, gecos, home, shell)"""
+        return cast(List[Dict[str, Any]], self.call("passwd"))
+
+    def user(self, username: str) -> Dict[str, Any]:
+        """
+        Returns the name, uid, gid, gecos, home and shell of a user. Looked up with NSS as `getent passwd` does, so
+        users of sssd, winbind or LDAP are found too.
+
+        Raises:
+            KeyError: If the user does not exist
+        """
+        return cast(Dict[str, Any], self.call("user", name=username))
+
+    def group(self) -> List[Dict[str, Any]]:
+        """Returns the group database (name, gid, members)"""
+        return cast(List[Dict[str, Any]], self.call("group"))
+
+    def user_groups(self, username: str) -> List[str]:
+        """Returns the groups of a user, primary group first"""
+        return cast(List[str], self.call("user_groups", name=username))
+
+    def password_status(self, username: str) -> str:
+        """Returns the password status of a user as `passwd -S` does (L, NP or P)"""
+        return cast(str, self.call("password_status", name=username))
+
+    def dpkg_status(self) -> List[Dict[str, str]]:
+        """Returns package, version, architecture and status of each package known to dpkg"""
+        return cast(List[Dict[str, str]], self.call("dpkg_status"))
+
+    def systemd_units(self) -> str:
+        """Returns the output of `systemctl list-units --all --no-legend --plain`"""
+        return cast(str, self.call("systemd_units"))
+
+    def run(self, command: str) -> CommandResult:
+        """
+        Runs a shell command as root without spawning sudo and su.
+
+        Args:
+            command (str): the shell command to execute
+
+        Returns:
+            CommandResult: the result of the command
+        """
+        start = time.monotonic()
+        result = self.call("run", command=command)
+        return CommandResult(command, result["exit_code"], base64.b64decode(result["stdout"]),
+                             base64.b64decode(result["stderr"]), time.monotonic() - start)
+
+    def close(self) -> None:
+        """Stops the helper"""
+        self.logger.info("Stopping remote agent")
+
+        channel = self.channel
+        self.channel = None
+        if channel is not None:
+            try:
+                channel.shutdown_write()
+            except Exception as e:
+                self.logger.warning(e)
+            finally:
+                channel.close()
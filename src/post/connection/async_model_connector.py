@@ -0,0 +1,17 @@
+from abc import ABC, abstractmethod
+from typing import Optional
+
+
+class AsyncModelConnector(ABC):
+
+    @abstractmethod
+    async def run(self, command: str) -> bytes:
+        """Run a command and return its standard output"""
+
+    @abstractmethod
+    async def sudo_run(self, command: str, passwd: Optional[str] = None) -> bytes:
+        """Run a command as root and return its standard output"""
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Closes the connection"""
@@ -0,0 +1,140 @@
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from logging import Logger
+from typing import Any, Callable, Optional, TypeVar
+
+from post.connection.async_model_connector import AsyncModelConnector
+from post.connection.pool import SSHConnectionPool
+from post.connection.ssh_connector import SSHConnector
+from post.utils.common import GLOBAL_LOGGER
+
+T = TypeVar("T")
+
+# The default executor of the event loop has min(32, cpu_count + 4) threads, fewer than the 64 hosts `gather_limited`
+# runs concurrently. Blocking paramiko calls are run here instead so that concurrency is real.
+GLOBAL_SSH_EXECUTOR = ThreadPoolExecutor(max_workers=64, thread_name_prefix="post-ssh")
+
+
+class AsyncSSHConnector(AsyncModelConnector):
+    """
+    An asyncio counterpart of SSHConnector. It uses address, port, username and password to connect.
+
+    paramiko is blocking, so each command is executed (and its output is read) in an executor. The connection is
+    established on the first command (or with `connect`), so many connectors can be created and dialed concurrently.
+
+    This connector can be used for any of AsyncApt, AsyncService or AsyncUser objects.
+
+    Args:
+        address (str): The address of the server.
+        port (int): The port of the server.
+        user (str): The username to use.
+        passwd (str): The password to use.
+        logger (Logger, optional): The logger to log. Defaults to None.
+        pool (SSHConnectionPool, optional): A connection pool to draw the connection from. Defaults to None.
+        executor (Executor, optional): The executor the blocking calls are run in. Defaults to None, which is
+            `GLOBAL_SSH_EXECUTOR` with 64 threads. At most that many commands of all connectors sharing it run at
+            the same time.
+    """
+
+    def __init__(self, address: str, port: int, user: str, passwd: str, logger: Optional[Logger] = None,
+                 pool: Optional[SSHConnectionPool] = None, executor: Optional[Executor] = None) -> None:
+        """
+        Constructs an AsyncSSHConnector object
+
+        Args:
+            address (str): The address of the server.
+            port (int): The port of the server.
+            user (str): The username to use.
+            passwd (str): The password to use.
+            logger (Logger, optional): The logger to log. Defaults to None.
+            pool (SSHConnectionPool, optional): A connection pool to draw the connection from. Defaults to None.
+            executor (Executor, optional): The executor the blocking calls are run in. Defaults to None, which is
+                `GLOBAL_SSH_EXECUTOR`.
+        """
+        if logger is None:
+            self.logger = GLOBAL_LOGGER
+        else:
+            self.logger = logger
+
+        self.address = address
+        self.port = port
+        self.user = user
+        self.passwd = passwd
+        self.pool = pool
+        if executor is None:
+            self.executor: Executor = GLOBAL_SSH_EXECUTOR
+        else:
+            self.executor = executor
+
+        self.connector: Optional[SSHConnector] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(address: {self.address}:{self.port}, user: {self.user})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    async def __aenter__(self) -> "AsyncSSHConnector":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def _in_executor(self, function: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, function, *args)
+
+    async def connect(self) -> SSHConnector:
+        """
+        Connects to the server. Does nothing if already connected.
+
+        Raises:
+            ValueError: If the connection fails.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if self.connector is None:
+                self.connector = await self._in_executor(
+                    lambda: SSHConnector(self.address, self.port, self.user, self.passwd, logger=self.logger,
+                                         pool=self.pool)
+                )
+
+        return self.connector
+
+    async def close(self) -> None:
+        """Closes the connection"""
+        if self.connector is not None:
+            connector, self.connector = self.connector, None
+            await self._in_executor(connector.close)
+
+    async def run(self, command: str) -> bytes:
+        """
+        Runs a command with user privileges
+
+        Args:
+            command (str): the shell command to execute
+
+        Returns:
+            bytes: the standard output of the command
+        """
+        connector = await self.connect()
+        return await self._in_executor(lambda: connector.run(command).read())
+
+    async def sudo_run(self, command: str, passwd: Optional[str] = None) -> bytes:
+        """
+        Runs a command with root privileges
+
+        Args:
+            command (str): the shell command to execute
+            passwd (str, optional): the password to use. useful if connection is done via ssh-keys and no actual
+                password is available. Defaults to None.
+
+        Returns:
+            bytes: the standard output of the command
+        """
+        connector = await self.connect()
+        return await self._in_executor(lambda: connector.sudo_run(command, passwd=passwd).read())
@@ -0,0 +1,997 @@
+import posixpath
+import shlex
+import stat
+import threading
+import time
+import uuid
+from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from logging import Logger
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, TypeVar, Union
+
+from paramiko.channel import Channel
+from paramiko.client import SSHClient
+from paramiko.sftp_client import SFTPClient
+from paramiko.ssh_exception import SSHException
+from paramiko.transport import Transport
+
+from post.connection.agent import AgentSession
+from post.connection.command_result import CommandResult, collect_many
+from post.connection.compression import (GLOBAL_COMPRESSION, CompressionPolicy, Decompressor, split_status,
+                                         wrap_command)
+from post.connection.jump import JumpHost
+from post.connection.metrics import GLOBAL_METRICS, MetricsRegistry, host_label
+from post.connection.model_connector import ModelConnector
+from post.connection.pool import SSHConnectionPool, credential_fingerprint
+from post.connection.retry import RETRYABLE_ERRORS, RetryPolicy
+from post.connection.shell_session import PersistentShellSession
+from post.connection.stream import iter_channel, iter_lines
+from post.connection.sudo_cache import SudoCache
+from post.utils.common import GLOBAL_LOGGER
+from post.utils.error import CommandError
+
+T = TypeVar("T")
+
+
+def connect_all(connectors: Sequence["BaseSSHConnector"],
+                concurrency: int = 16) -> List[Optional[Exception]]:
+    """
+    Connects lazy connectors at the same time.
+
+    Args:
+        connectors (Sequence[BaseSSHConnector]): the connectors to connect
+        concurrency (int): Maximum number of handshakes in flight. Defaults to 16.
+
+    Returns:
+        List[Optional[Exception]]: the error of each connector in order. None if it is connected.
+    """
+
+    def connect_one(connector: BaseSSHConnector) -> Optional[Exception]:
+        try:
+            connector.ensure_connected()
+        except Exception as e:
+            connector.logger.warning(f"{connector}: {e}")
+            return e
+
+        return None
+
+    if not connectors:
+        return []
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(connectors)))) as executor:
+        return list(executor.map(connect_one, connectors))
+
+
+class BaseSSHConnector(ModelConnector):
+    """
+    Common parts of the paramiko based connectors (SSHConnector and KeyConnector).
+
+    Subclasses only have to know how to authenticate a new client (`_new_client`).
+
+    Args:
+        address (str): The address of the server.
+        port (int): The port of the server.
+        user (str): The username to use.
+        passwd (str, optional): The password used for sudo. Defaults to None.
+        logger (Logger, optional): The logger to log. Defaults to None.
+        pool (SSHConnectionPool, optional): A pool to draw the client from. Defaults to None.
+        fail_fast (bool): Raise CommandError as soon as a command exits with a non-zero status. Defaults to False.
+        timeout (float, optional): Seconds to wait for a command to finish. Defaults to None (no limit).
+        max_channels (int): Maximum number of channels opened at once by `run_many`. OpenSSH allows 10 sessions
+            per connection by default (`MaxSessions`). Defaults to 8.
+        persistent_shell (bool): Run `sudo_run` commands in one root shell kept open per connector instead of
+            spawning `sudo` and `su` for each command. See `PersistentShellSession`. Defaults to False.
+        use_agent (bool): Start the remote helper agent so managers can skip process creation for file, user and
+            package queries. See `AgentSession`. Defaults to False.
+        lazy (bool): Do not connect before the first command. See `connect_all` to connect many connectors at
+            once. Defaults to False.
+        keepalive (int): Seconds between keepalive packets, so idle connections are not dropped by NAT and
+            firewalls. 0 disables them. Defaults to 30.
+        retry (RetryPolicy, optional): Retry commands failed because of the transport. Defaults to None (a dead
+            transport is still replaced before the next command).
+        cache_sudo (bool): Validate the sudo credentials once and run `sudo_run` commands with `sudo -n`, falling
+            back to the password when the timestamp expired. See `SudoCache`. Defaults to False.
+        metrics (MetricsRegistry, optional): The registry to record command metrics into. None records nothing.
+            Defaults to GLOBAL_METRICS.
+        jump (JumpHost, optional): A bastion to reach the host through. The connection is a `direct-tcpip` channel
+            on the shared transport of the bastion. Defaults to None.
+        compression (CompressionPolicy, optional): Have the host compress large command outputs and decompress
+            them here. See `CompressionPolicy`. Defaults to None (only commands run with `compress=True` are
+            compressed, with a default policy).
+    """
+
+    def __init__(self, address: str, port: int, user: str, passwd: Optional[str] = None,
+                 logger: Optional[Logger] = None, pool: Optional[SSHConnectionPool] = None,
+                 fail_fast: bool = False, timeout: Optional[float] = None, max_channels: int = 8,
+                 persistent_shell: bool = False, use_agent: bool = False, lazy: bool = False, keepalive: int = 30,
+                 retry: Optional[RetryPolicy] = None, cache_sudo: bool = False,
+                 metrics: Optional[MetricsRegistry] = GLOBAL_METRICS, jump: Optional[JumpHost] = None,
+                 compression: Optional[CompressionPolicy] = None) -> None:
+        if logger is None:
+            self.logger = GLOBAL_LOGGER
+        else:
+            self.logger = logger
+
+        self.address = address
+        self.port = port
+        self.user = user
+        self.passwd = passwd
+        self.pool = pool
+        self.fail_fast = fail_fast
+        self.timeout = timeout
+        self.max_channels = max_channels
+        self.persistent_shell = persistent_shell
+        self.shell: Optional[PersistentShellSession] = None
+        self.use_agent = use_agent
+        self.agent: Optional[AgentSession] = None
+        self.lazy = lazy
+        self.keepalive = keepalive
+        self.retry = retry
+        self.sudo_cache: Optional[SudoCache] = None
+        if cache_sudo:
+            self.sudo_cache = SudoCache(logger=self.logger, on_observe=self._record_sudo_cache)
+
+        self.metrics = metrics
+        self.jump = jump
+        self.compression = compression
+        self.closed = False
+        self.connect_lock = threading.Lock()
+        self.sftp: Optional[SFTPClient] = None
+        self.sftp_lock = threading.Lock()
+        self.client: Optional[SSHClient] = None
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(address: {self.address}:{self.port}, user: {self.user})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def __del__(self):
+        self.close()
+
+    def close(self) -> None:
+        """Closes the connection. A pooled connection is given back to the pool instead."""
+        self.logger.info("Closing Connection")
+
+        self.closed = True
+        try:
+            shell = getattr(self, "shell", None)
+            if shell is not None:
+                self.shell = None
+                shell.close()
+
+            agent = getattr(self, "agent", None)
+            if agent is not None:
+                self.agent = None
+                agent.close()
+
+            sftp = getattr(self, "sftp", None)
+            if sftp is not None:
+                self.sftp = None
+                sftp.close()
+
+            client = getattr(self, "client", None)
+            if client is not None:
+                self.client = None
+                if self.pool is not None:
+                    self.pool.release(client)
+                else:
+                    self._close_client(client)
+        except Exception as e:
+            self.logger.warning(e)
+
+    @abstractmethod
+    def _new_client(self) -> SSHClient:
+        """Creates and authenticates a brand-new client"""
+
+    def _credential(self) -> str:
+        """Returns the fingerprint of the credentials `_new_client` authenticates with. See `credential_fingerprint`."""
+        return credential_fingerprint(self.passwd)
+
+    def _sock(self) -> Optional[Channel]:
+        """Returns a channel to the host through the jump host, to connect over. None if there is no jump host."""
+        if self.jump is None:
+            return None
+
+        return self.jump.open_channel(self.address, self.port)
+
+    def _close_client(self, client: SSHClient) -> None:
+        """Closes a client that is not pooled, and its channel through the jump host"""
+        transport = client.get_transport()
+        client.close()
+        if self.jump is not None and transport is not None and isinstance(transport.sock, Channel):
+            self.jump.release(transport.sock)
+
+    def connect(self) -> SSHClient:
+        """
+        Connects to the server. Uses the pool if one was given.
+
+        Raises:
+            ValueError: If the connection fails.
+        """
+        self.logger.info("Connecting")
+
+        if self.pool is not None:
+            client = self.pool.acquire(self.address, self.port, self.user, self._new_client, self._credential())
+        else:
+            client = self._new_client()
+
+        transport = client.get_transport()
+        if transport is not None and self.keepalive:
+            transport.set_keepalive(self.keepalive)
+
+        return client
+
+    def reconnect(self) -> None:
+        """
+        Replaces the client with a new connection. The persistent shell and the agent are dropped with the old one.
+
+        Raises:
+            ValueError: If the connector is closed or the connection fails.
+        """
+        self.logger.warning("Reconnecting")
+
+        with self.connect_lock:
+            for session in (self.shell, self.agent):
+                if session is not None:
+                    try:
+                        session.close()
+                    except Exception as e:
+                        self.logger.warning(e)
+
+            self.shell = None
+            self.agent = None
+            self.sftp = None
+
+            client = self.client
+            self.client = None
+            if client is not None:
+                if self.pool is None:
+                    self._close_client(client)
+                elif self.pool.is_healthy(client):
+                    # other connectors may lease it, only this lease is given back
+                    self.pool.release(client)
+                else:
+                    self.pool.discard(client)
+
+            if self.closed:
+                self.logger.error("Connection is closed")
+                raise ValueError("Connection is closed")
+
+            self.client = self.connect()
+
+    @property
+    def connected(self) -> bool:
+        """True if the connector has a client"""
+        return self.client is not None
+
+    def ensure_connected(self) -> None:
+        """
+        Connects if the connector is not connected yet. Used by lazy connectors.
+
+        Raises:
+            ValueError: If the connector is closed or the connection fails.
+        """
+        with self.connect_lock:
+            if self.client is not None:
+                return
+
+            if self.closed:
+                self.logger.error("Connection is closed")
+                raise ValueError("Connection is closed")
+
+            self.client = self.connect()
+
+    def _get_client(self) -> SSHClient:
+        """
+        Returns the connected client. A lazy connector connects here on first use.
+
+        Raises:
+            ValueError: If the connector is closed or the connection fails.
+        """
+        if self.client is None and self.lazy and not self.closed:
+            self.ensure_connected()
+
+        if self.client is None:
+            self.logger.error("Connection is closed")
+            raise ValueError("Connection is closed")
+
+        return self.client
+
+    def _get_transport(self) -> Transport:
+        """
+        Returns an active transport. Reconnects if the current one is dead (e.g. dropped by a firewall).
+
+        Raises:
+            ValueError: If the connector is closed or the connection fails.
+        """
+        transport = self._get_client().get_transport()
+        if transport is None or not transport.is_active():
+            self.logger.warning("Transport is not active")
+            self.reconnect()
+            transport = self._get_client().get_transport()
+
+        if transport is None:
+            self.logger.error("Connection is closed")
+            raise ValueError("Connection is closed")
+
+        return transport
+
+    def _retrying(self, operation: Callable[[], T], idempotent: bool, command: str = "") -> T:
+        """
+        Calls the operation and, if the transport fails and the policy allows it, reconnects and calls it again.
+
+        Args:
+            operation (Callable): the operation to call
+            idempotent (bool): whether the operation can be repeated after it started running
+            command (str): the command the operation runs, to count the retries of. Defaults to "".
+
+        Returns:
+            T: the result of the operation
+        """
+        if self.retry is None or not idempotent:
+            return operation()
+
+        delays = self.retry.delays()
+        while True:
+            try:
+                return operation()
+            except RETRYABLE_ERRORS as e:
+                delay = next(delays, None)
+                if delay is None:
+                    raise
+
+                self.logger.warning(f"Transport failed ({e}). Retrying in {delay:.1f} seconds")
+                self._record_retry(command)
+                time.sleep(delay)
+                self.reconnect()
+
+    def _is_idempotent(self, command: str) -> bool:
+        """Checks with the retry policy if a command can be run again"""
+        return self.retry is not None and self.retry.is_idempotent(command)
+
+    def _open_channel(self, command: str) -> Channel:
+        """
+        Opens a channel and executes the command on it.
+
+        Failing to open the channel is retried as the policy allows, whatever the command is, since nothing has run.
+
+        Args:
+            command (str): the shell command to execute
+
+        Returns:
+            Channel: the channel
+        """
+        channel = self._retrying(lambda: self._get_transport().open_session(), idempotent=True, command=command)
+        try:
+            channel.exec_command(command)
+        except Exception:
+            channel.close()
+            raise
+
+        return channel
+
+    def _lost_check(self, results: List[CommandResult]) -> List[CommandResult]:
+        """
+        A channel closed by a dying transport looks like a command without an exit status. Turns it into an error.
+
+        Raises:
+            SSHException: If a command has no exit status and the transport is not active anymore
+        """
+        if any(result.exit_code == -1 for result in results):
+            transport = self.client.get_transport() if self.client is not None else None
+            if transport is None or not transport.is_active():
+                self.logger.error("Transport was lost while running the command")
+                raise SSHException("Transport was lost while running the command")
+
+        return results
+
+    def _get_shell(self, passwd: Optional[str] = None) -> PersistentShellSession:
+        """
+        Returns the persistent root shell. Opens a new one if there is none or the last one exited.
+
+        Args:
+            passwd (str, optional): the sudo password. Defaults to None.
+
+        Raises:
+            CommandError: If the root shell cannot be started.
+        """
+        if self.shell is None or not self.shell.active:
+            transport = self._get_transport()
+            self.shell = PersistentShellSession(transport, passwd=passwd, logger=self.logger)
+
+        return self.shell
+
+    def get_agent(self, passwd: Optional[str] = None) -> Optional[AgentSession]:
+        """
+        Returns the remote helper agent. Starts it if there is none or the last one exited.
+
+        If the agent cannot be started (e.g. there is no python3 on the host) it is disabled for this connector and
+        None is returned, so managers fall back to shell commands.
+
+        Args:
+            passwd (str, optional): the sudo password. Defaults to None.
+
+        Returns:
+            AgentSession: the agent. None if `use_agent` is not set or it could not be started.
+        """
+        if not self.use_agent:
+            return None
+
+        if self.agent is None or not self.agent.active:
+            transport = self._get_transport()
+            try:
+                self.agent = AgentSession(transport, passwd=passwd if passwd is not None else self.passwd,
+                                          logger=self.logger)
+            except CommandError as e:
+                self.logger.warning(f"Remote agent is disabled: {e}")
+                self.use_agent = False
+                self.agent = None
+
+        return self.agent
+
+    def _validate(self, result: CommandResult) -> CommandResult:
+        """
+        Validates the command. Checks the exit status if `fail_fast` is set.
+
+        Args:
+            result (CommandResult): the result of the command
+
+        Raises:
+            CommandError: If `fail_fast` is set and the exit status is not 0
+        """
+        self.logger.info("Validating command")
+
+        if self.fail_fast and not result.ok:
+            self.logger.error(result.stderr.decode(errors="replace"))
+            result.check()
+
+        return result
+
+    def _compression_policy(self) -> CompressionPolicy:
+        """Returns the compression policy, `GLOBAL_COMPRESSION` if none was given. It is not kept for later calls."""
+        if self.compression is None:
+            return GLOBAL_COMPRESSION
+
+        return self.compression
+
+    def _codec(self, command: str, compress: Optional[bool] = None) -> Optional[str]:
+        """
+        Returns the codec the output of a command is compressed with, or None to run it as it is.
+
+        Args:
+            command (str): the command, without the `sudo` wrapper
+            compress (bool, optional): True or False to force the choice. Defaults to None (the policy decides).
+        """
+        if compress is False or (self.compression is None and not compress):
+            return None
+
+        compression = self._compression_policy()
+        if compress is None and not compression.wanted(host_label(self), command):
+            return None
+
+        return compression.codec_for(host_label(self), lambda probe: self._execute(probe, idempotent=True).ok)
+
+    def _execute(self, command: str, stdin_data: Optional[bytes] = None, idempotent: bool = False,
+                 codec: Optional[str] = None) -> CommandResult:
+        """
+        Executes a command on a new channel and collects its outputs and exit status.
+
+        Args:
+            command (str): the shell command to execute
+            stdin_data (bytes, optional): data written to the standard input. Defaults to None.
+            idempotent (bool): whether the command can be run again if the transport fails. Defaults to False.
+            codec (str, optional): compress the standard output on the host with this codec. Defaults to None.
+
+        Returns:
+            CommandResult: the result of the command
+        """
+        return self._execute_many([command], stdin_data=stdin_data, idempotent=idempotent, codecs=[codec])[0]
+
+    def _execute_many(self, commands: List[str], stdin_data: Optional[bytes] = None,
+                      idempotent: bool = False, codecs: Optional[List[Optional[str]]] = None) -> List[CommandResult]:
+        """
+        Executes commands on parallel channels of the same transport and collects their results.
+
+        At most `max_channels` channels are open at the same time.
+
+        Args:
+            commands (List[str]): the shell commands to execute
+            stdin_data (bytes, optional): data written to the standard input of each command. Defaults to None.
+            idempotent (bool): whether the commands can be run again if the transport fails. Defaults to False.
+            codecs (List[Optional[str]], optional): the codec compressing the standard output of each command on
+                the host, None for no compression. Defaults to None.
+
+        Returns:
+            List[CommandResult]: the results in the order of the commands
+        """
+        if codecs is None:
+            codecs = [None] * len(commands)
+
+        def execute_batch(batch: List[str], batch_codecs: List[Optional[str]]) -> List[CommandResult]:
+            channels: List[Channel] = []
+            try:
+                for command, codec in zip(batch, batch_codecs):
+                    if codec is not None:
+                        command = wrap_command(command, codec, self._compression_policy().level)
+                    channels.append(self._open_channel(command))
+            except Exception:
+                for channel in channels:
+                    channel.close()
+                raise
+
+            return self._lost_check(collect_many(channels, batch, [stdin_data] * len(batch), timeout=self.timeout))
+
+        results: List[CommandResult] = []
+        for start in range(0, len(commands), self.max_channels):
+            batch = commands[start:start + self.max_channels]
+            batch_codecs = codecs[start:start + self.max_channels]
+            results.extend(self._retrying(lambda: execute_batch(batch, batch_codecs), idempotent, command=batch[0]))
+
+        compression = self.compression
+        if compression is None:
+            return results
+
+        host = host_label(self)
+        for index, (command, codec) in enumerate(zip(commands, codecs)):
+            if codec is None:
+                compression.observe(host, command, results[index])
+            else:
+                results[index] = compression.unwrap(host, results[index], codec)
+
+        return results
+
+    def _execute_stream(self, command: str, stdin_data: Optional[bytes] = None, codec: Optional[str] = None,
+                        transfer: Optional[Dict[str, Any]] = None,
+                        results: Optional[List[CommandResult]] = None) -> Iterator[str]:
+        """
+        Executes a command on a new channel and yields its standard output line by line while it is running.
+
+        Args:
+            command (str): the shell command to execute
+            stdin_data (bytes, optional): data written to the standard input. Defaults to None.
+            codec (str, optional): compress the standard output on the host with this codec. It is decompressed
+                chunk by chunk as it arrives. Defaults to None.
+            transfer (Dict[str, Any], optional): filled with `compressed_bytes` and `seconds_saved` once the output
+                is over, if it was compressed. Defaults to None.
+            results (List[CommandResult], optional): if given, the result (without the standard output) is appended
+                to it instead of being validated. Defaults to None.
+
+        Raises:
+            CommandError: If `fail_fast` is set and the exit status is not 0
+        """
+        start = time.monotonic()
+        decompressor = Decompressor(codec) if codec is not None else None
+        channel = self._open_channel(
+            wrap_command(command, codec, self._compression_policy().level) if codec is not None else command
+        )
+        try:
+            if stdin_data:
+                channel.sendall(stdin_data)
+
+            stderr = bytearray()
+            chunks = iter_channel(channel, stderr)
+            if decompressor is not None:
+                chunks = decompressor.iterate(chunks)
+            yield from iter_lines(chunks)
+
+            exit_code = channel.recv_exit_status()
+        finally:
+            channel.close()
+
+        if decompressor is not None:
+            errors, status = split_status(bytes(stderr))
+            stderr = bytearray(errors)
+            exit_code = status if status is not None else exit_code or -1
+            if transfer is not None:
+                transfer.update(compressed_bytes=decompressor.compressed_bytes,
+                                seconds_saved=self._compression_policy().saved_seconds(
+                                    host_label(self), decompressor, time.monotonic() - start))
+
+        result = self._lost_check([CommandResult(command, exit_code, b"", bytes(stderr), 0.0)])[0]
+        if results is not None:
+            results.append(result)
+        else:
+            self._validate(result)
+
+    def run(self, command: str, compress: Optional[bool] = None) -> CommandResult:
+        """
+        Runs a command with user privileges
+
+        Args:
+            command (str): the shell command to execute
+            compress (bool, optional): compress the output on the host, or not. Defaults to None (the compression
+                policy decides).
+
+        Returns:
+            CommandResult: the result of the command
+
+        Raises:
+            CommandError: If `fail_fast` is set and the exit status is not 0
+        """
+        self.logger.info("Run command")
+
+        return self._measured(
+            command, False,
+            lambda: self._validate(self._execute(command, idempotent=self._is_idempotent(command),
+                                                 codec=self._codec(command, compress)))
+        )
+
+    def sudo_run(self, command: str, passwd: Optional[str] = None, compress: Optional[bool] = None) -> CommandResult:
+        """
+        Runs a command with root privileges
+
+        Args:
+            command (str): the shell command to execute
+            passwd (str, optional): the password to use. useful if connection is done via ssh-keys and no actual
+                password is available. Defaults to None.
+            compress (bool, optional): compress the output on the host, or not. Ignored in the persistent shell.
+                Defaults to None (the compression policy decides).
+
+        Returns:
+            CommandResult: the result of the command
+
+        Raises:
+            CommandError: If `fail_fast` is set and the exit status is not 0
+        """
+        self.logger.info("Run command as ROOT")
+
+        return self._measured(command, True, lambda: self.__sudo_run(command, passwd, compress))
+
+    def __sudo_run(self, command: str, passwd: Optional[str] = None, compress: Optional[bool] = None) -> CommandResult:
+        """Runs a command with root privileges in the persistent shell, with the cached credentials or the password"""
+        if passwd is None:
+            passwd_to_use = self.passwd
+        else:
+            passwd_to_use = passwd
+
+        if self.persistent_shell:
+            return self._validate(self._get_shell(passwd_to_use).run(command, timeout=self.timeout))
+
+        password_line = f"{passwd_to_use or ''}\n".encode()
+        idempotent = self._is_idempotent(command)
+        codec = self._codec(command, compress)
+        if self.sudo_cache is not None:
+            result = self.sudo_cache.run(
+                lambda cached_command, stdin_data: self._execute(cached_command, stdin_data=stdin_data,
+                                                                 idempotent=idempotent, codec=codec),
+                command, password_line
+            )
+            if result is not None:
+                return self._validate(result)
+
+        sudo_command = f"sudo -S -p '' su -c \"{command}\""
+        return self._validate(self._execute(sudo_command, stdin_data=password_line, idempotent=idempotent,
+                                            codec=codec))
+
+    def run_stream(self, command: str, compress: Optional[bool] = None) -> Iterator[str]:
+        """
+        Runs a command with user privileges and yields its standard output line by line while it is running.
+
+        Args:
+            command (str): the shell command to execute
+            compress (bool, optional): compress the output on the host, or not. Defaults to None (the compression
+                policy decides).
+
+        Raises:
+            CommandError: If `fail_fast` is set and the exit status is not 0
+        """
+        self.logger.info("Run command (stream)")
+
+        transfer: Dict[str, Any] = {}
+        yield from self._measured_stream(
+            command, False,
+            self._execute_stream(command, codec=self._codec(command, compress), transfer=transfer), transfer
+        )
+
+    def sudo_run_stream(self, command: str, passwd: Optional[str] = None,
+                        compress: Optional[bool] = None) -> Iterator[str]:
+        """
+        Runs a command with root privileges and yields its standard output line by line while it is running.
+
+        With `persistent_shell` the command runs in the root shell and its lines are yielded once it is over.
+
+        Args:
+            command (str): the shell command to execute
+            passwd (str, optional): the password to use. useful if connection is done via ssh-keys and no actual
+                password is available. Defaults to None.
+            compress (bool, optional): compress the output on the host, or not. Defaults to None (the compression
+                policy decides).
+
+        Raises:
+            CommandError: If `fail_fast` is set and the exit status is not 0
+        """
+        self.logger.info("Run command as ROOT (stream)")
+
+        if passwd is None:
+            passwd_to_use = self.passwd
+        else:
+            passwd_to_use = passwd
+
+        if self.persistent_shell:
+            yield from self._measured_stream(command, True, self.__shell_stream(command, passwd_to_use))
+            return
+
+        transfer: Dict[str, Any] = {}
+        yield from self._measured_stream(
+            command, True,
+            self.__sudo_stream(command, passwd_to_use, self._codec(command, compress), transfer),
+            transfer
+        )
+
+    def __sudo_stream(self, command: str, passwd: Optional[str], codec: Optional[str],
+                      transfer: Dict[str, Any]) -> Iterator[str]:
+        """
+        Yields the lines of a command run with the cached credentials, or with the password. A miss of the cache
+        writes nothing to the standard output, so the command is simply run again with the password.
+        """
+        password_line = f"{passwd or ''}\n".encode()
+        if self.sudo_cache is not None and self.sudo_cache.validate(
+                lambda validation, stdin_data: self._execute(validation, stdin_data=stdin_data), password_line
+        ):
+            results: List[CommandResult] = []
+            yield from self._execute_stream(self.sudo_cache.command(command), codec=codec, transfer=transfer,
+                                            results=results)
+            if self.sudo_cache.observe(results[0], command):
+                self._validate(results[0])
+                return
+
+        yield from self._execute_stream(f"sudo -S -p '' su -c \"{command}\"", stdin_data=password_line,
+                                        codec=codec, transfer=transfer)
+
+    def __shell_stream(self, command: str, passwd: Optional[str] = None) -> Iterator[str]:
+        """Runs a command in the persistent shell and yields its standard output line by line once it is over"""
+        result = self._validate(self._get_shell(passwd).run(command, timeout=self.timeout))
+        yield from iter_lines([result.read()])
+
+    def run_many(self, commands: List[str]) -> List[CommandResult]:
+        """
+        Runs independent commands with user privileges on parallel channels of the same connection.
+
+        Args:
+            commands (List[str]): the shell commands to execute
+
+        Returns:
+            List[CommandResult]: the results in the order of the commands
+
+        Raises:
+            CommandError: If `fail_fast` is set and any exit status is not 0
+        """
+        self.logger.info("Run commands")
+
+        idempotent = all(self._is_idempotent(command) for command in commands)
+        results = self._measured_many(
+            commands, False,
+            lambda: self._execute_many(commands, idempotent=idempotent,
+                                       codecs=[self._codec(command) for command in commands])
+        )
+        return [self._validate(result) for result in results]
+
+    def sudo_run_many(self, commands: List[str], passwd: Optional[str] = None) -> List[CommandResult]:
+        """
+        Runs independent commands with root privileges on parallel channels of the same connection.
+
+        With `persistent_shell` the commands run one after the other in the root shell instead.
+
+        Args:
+            commands (List[str]): the shell commands to execute
+            passwd (str, optional): the password to use. useful if connection is done via ssh-keys and no actual
+                password is available. Defaults to None.
+
+        Returns:
+            List[CommandResult]: the results in the order of the commands
+
+        Raises:
+            CommandError: If `fail_fast` is set and any exit status is not 0
+        """
+        self.logger.info("Run commands as ROOT")
+
+        if passwd is None:
+            passwd_to_use = self.passwd
+        else:
+            passwd_to_use = passwd
+
+        if self.persistent_shell:
+            results = self._measured_many(
+                commands, True,
+                lambda: [self._get_shell(passwd_to_use).run(command, timeout=self.timeout) for command in commands]
+            )
+            return [self._validate(result) for result in results]
+
+        results = self._measured_many(commands, True, lambda: self.__sudo_execute_many(commands, passwd_to_use))
+        return [self._validate(result) for result in results]
+
+    def __sudo_execute_many(self, commands: List[str], passwd: Optional[str]) -> List[CommandResult]:
+        """
+        Executes commands as root on parallel channels with the cached credentials. The ones the cache misses, or
+        all of them without a cache, are executed with the password.
+        """
+        password_line = f"{passwd or ''}\n".encode()
+        idempotent = all(self._is_idempotent(command) for command in commands)
+        codecs = [self._codec(command) for command in commands]
+        results: List[Optional[CommandResult]] = [None] * len(commands)
+        if self.sudo_cache is not None and self.sudo_cache.validate(
+                lambda validation, stdin_data: self._execute(validation, stdin_data=stdin_data), password_line
+        ):
+            cached = self._execute_many([self.sudo_cache.command(command) for command in commands],
+                                        idempotent=idempotent, codecs=codecs)
+            for index, result in enumerate(cached):
+                if self.sudo_cache.observe(result, commands[index]):
+                    results[index] = result
+
+        missing = [index for index, result in enumerate(results) if result is None]
+        if missing:
+            fallbacks = self._execute_many([f"sudo -S -p '' su -c \"{commands[index]}\"" for index in missing],
+                                           stdin_data=password_line, idempotent=idempotent,
+                                           codecs=[codecs[index] for index in missing])
+            for index, result in zip(missing, fallbacks):
+                results[index] = result
+
+        return [result for result in results if result is not None]
+
+    def _get_sftp(self) -> SFTPClient:
+        """
+        Returns the SFTP session of the connector. Opens one if there is none or the last one was closed.
+
+        Raises:
+            ValueError: If the connector is closed or the connection fails.
+        """
+        channel = self.sftp.get_channel() if self.sftp is not None else None
+        if channel is None or channel.closed:
+            sftp = SFTPClient.from_transport(self._get_transport())
+            if sftp is None:
+                self.logger.error("Could not open SFTP session")
+                raise ValueError("Could not open SFTP session")
+
+            self.sftp = sftp
+
+        return self.sftp
+
+    def read_file(self, path: Union[str, Path], passwd: Optional[str] = None) -> bytes:
+        """
+        Returns the content of a file.
+
+        The file is transferred over SFTP as the connected user. If the user may not read it, it is read as root.
+        The agent is used instead if the connector runs one.
+
+        Args:
+            path (Union[str, Path]): the path of the file
+            passwd (str, optional): the sudo password. Defaults to None.
+
+        Returns:
+            bytes: the content
+
+        Raises:
+            FileNotFoundError: If the file does not exist
+        """
+        self.logger.info("Reading file")
+
+        agent = self.get_agent(passwd=passwd)
+        if agent is not None:
+            return agent.read_file(path)
+
+        try:
+            with self.sftp_lock:
+                with self._get_sftp().open(str(path), "rb") as f:
+                    f.prefetch()
+                    data: bytes = f.read()
+                    return data
+        except PermissionError:
+            self.logger.info("Not permitted to read over SFTP. Reading as ROOT")
+            return super().read_file(path, passwd=passwd)
+
+    def write_file(self, path: Union[str, Path], data: bytes, passwd: Optional[str] = None) -> None:
+        """
+        Replaces the content of a file. The mode and owner of an existing file are kept.
+
+        The content is transferred over SFTP into a temporary file next to the target, which is then renamed over it.
+        If the user may not do that, the content is transferred into a temporary file in `/tmp` and moved to the
+        target as root with `install`. The agent is used instead if the connector runs one.
+
+        Args:
+            path (Union[str, Path]): the path of the file
+            data (bytes): the content
+            passwd (str, optional): the sudo password. Defaults to None.
+
+        Raises:
+            CommandError: If the file cannot be written
+        """
+        self.logger.info("Writing file")
+
+        agent = self.get_agent(passwd=passwd)
+        if agent is not None:
+            agent.write_file(path, data)
+            return
+
+        info = self.stat(path, passwd=passwd)
+        with self.sftp_lock:
+            if self.__sftp_replace(str(path), data, info):
+                return
+
+            self.logger.info("Not permitted to write over SFTP. Writing as ROOT")
+            sftp = self._get_sftp()
+            temp_path = f"/tmp/.post-{uuid.uuid4().hex}"
+            try:
+                with sftp.open(temp_path, "wb") as f:
+                    f.chmod(0o600)
+                    f.set_pipelined(True)
+                    f.write(data)
+
+                if info is None:
+                    options = "-m 644"
+                else:
+                    options = f"-m {info['mode'] & 0o7777:o} -o {info['uid']} -g {info['gid']}"
+
+                self.sudo_run(f"install {options} {shlex.quote(temp_path)} {shlex.quote(str(path))}",
+                              passwd=passwd).check()
+            finally:
+                try:
+                    sftp.remove(temp_path)
+                except IOError as e:
+                    self.logger.warning(e)
+
+    def __sftp_replace(self, path: str, data: bytes, info: Optional[Dict[str, Any]]) -> bool:
+        """
+        Writes the content to a temporary file next to the target and renames it over the target.
+
+        Returns:
+            bool: False if the user is not permitted to, or the new file would not have the owner of the old one.
+        """
+        sftp = self._get_sftp()
+        directory, name = posixpath.split(path)
+        temp_path = posixpath.join(directory, f".{name}.post-{uuid.uuid4().hex}")
+        try:
+            with sftp.open(temp_path, "wb") as f:
+                f.set_pipelined(True)
+                f.write(data)
+        except PermissionError:
+            return False
+
+        try:
+            if info is not None:
+                temp_info = sftp.stat(temp_path)
+                if (temp_info.st_uid, temp_info.st_gid) != (info["uid"], info["gid"]):
+                    return False
+
+                sftp.chmod(temp_path, info["mode"] & 0o7777)
+
+            sftp.posix_rename(temp_path, path)
+            temp_path = ""
+            return True
+        except IOError:
+            return False
+        finally:
+            if temp_path:
+                try:
+                    sftp.remove(temp_path)
+                except IOError as e:
+                    self.logger.warning(e)
+
+    def stat(self, path: Union[str, Path], passwd: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Returns information about a path, over SFTP. Falls back to `stat` as root if the user may not access it.
+
+        Args:
+            path (Union[str, Path]): the path
+            passwd (str, optional): the sudo password. Defaults to None.
+
+        Returns:
+            Dict[str, Any]: size, mode, uid, gid, mtime and is_dir. None if the path does not exist.
+        """
+        agent = self.get_agent(passwd=passwd)
+        if agent is not None:
+            return agent.stat(path)
+
+        try:
+            with self.sftp_lock:
+                attributes = self._get_sftp().stat(str(path))
+        except FileNotFoundError:
+            return None
+        except PermissionError:
+            return super().stat(path, passwd=passwd)
+
+        return {
+            "size": attributes.st_size, "mode": attributes.st_mode, "uid": attributes.st_uid,
+            "gid": attributes.st_gid, "mtime": attributes.st_mtime, "is_dir": stat.S_ISDIR(attributes.st_mode or 0),
+        }
@@ -0,0 +1,235 @@
+import select
+import time
+from typing import Iterator, List, Optional, Union
+
+from paramiko.channel import Channel
+
+from post.connection.output import OutputBuffer
+from post.connection.stream import CHUNK_SIZE
+from post.utils.error import CommandError
+
+
+class CommandResult:
+    """
+    The outcome of a finished command.
+
+    It has a `read` method returning the standard output, so it can be used wherever a paramiko ChannelFile was
+    used (`connector.run(...).read().decode()`).
+
+    The standard output is kept as raw bytes in an `OutputBuffer` (`output`), which large outputs spill to a
+    memory-mapped temporary file. `lines` and `text` decode it without another copy; `stdout` and `read` return it
+    as bytes, which loads a spilled output into memory.
+
+    Args:
+        command (str): The executed command.
+        exit_code (int): The exit status of the command. -1 if the server did not send one.
+        stdout (Union[bytes, OutputBuffer]): The standard output.
+        stderr (bytes): The standard error.
+        wall_time (float): Seconds passed from sending the command to the end of its output.
+        bytes_sent (int): Number of bytes written to the standard input. Defaults to 0.
+        compressed_bytes (int, optional): Size of the standard output as it was received, if the host compressed
+            it (see `CompressionPolicy`). Defaults to None.
+    """
+
+    def __init__(self, command: str, exit_code: int, stdout: Union[bytes, OutputBuffer], stderr: bytes,
+                 wall_time: float, bytes_sent: int = 0, compressed_bytes: Optional[int] = None) -> None:
+        self.command = command
+        self.exit_code = exit_code
+        if isinstance(stdout, OutputBuffer):
+            self.output = stdout.finish()
+        else:
+            self.output = OutputBuffer.from_bytes(stdout)
+        self.stderr = stderr
+        self.wall_time = wall_time
+        self.bytes_sent = bytes_sent
+        self.compressed_bytes = compressed_bytes
+        self.seconds_saved = 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.__class__.__name__}(command: {self.command!r}, exit_code: {self.exit_code}, "
+                f"wall_time: {self.wall_time:.3f}s, bytes: {self.bytes_transferred})")
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    @property
+    def stdout(self) -> bytes:
+        """The standard output as bytes"""
+        return self.output.getvalue()
+
+    @property
+    def ok(self) -> bool:
+        """True if the exit status is 0"""
+        return self.exit_code == 0
+
+    @property
+    def bytes_received(self) -> int:
+        """Number of bytes of standard output and standard error received, compressed or not"""
+        if self.compressed_bytes is not None:
+            return self.compressed_bytes + len(self.stderr)
+
+        return len(self.output) + len(self.stderr)
+
+    @property
+    def bytes_saved(self) -> int:
+        """Number of bytes compression kept from being transferred. 0 if the output was not compressed."""
+        if self.compressed_bytes is None:
+            return 0
+
+        return len(self.output) - self.compressed_bytes
+
+    @property
+    def bytes_transferred(self) -> int:
+        """Number of bytes sent and received for this command"""
+        return self.bytes_received + self.bytes_sent
+
+    def read(self) -> bytes:
+        """
+        Returns the standard output. Mimics `ChannelFile.read`.
+
+        Returns:
+            bytes: the standard output
+        """
+        return self.stdout
+
+    def text(self, encoding: str = "utf-8", errors: str = "strict") -> str:
+        """
+        Returns the standard output decoded. Same as `read().decode(...)`, without copying the bytes first.
+
+        Args:
+            encoding (str): the encoding. Defaults to utf-8.
+            errors (str): the error handling. Defaults to strict.
+
+        Returns:
+            str: the text
+        """
+        return self.output.decode(encoding, errors)
+
+    def lines(self, encoding: str = "utf-8") -> Iterator[str]:
+        """
+        Yields the standard output line by line, decoding one chunk at a time.
+
+        Args:
+            encoding (str): the encoding. Defaults to utf-8.
+
+        Returns:
+            Iterator[str]: the lines, without the line breaks
+        """
+        return self.output.lines(encoding)
+
+    def close(self) -> None:
+        """Releases the temporary file of a spilled standard output"""
+        self.output.close()
+
+    def check(self) -> "CommandResult":
+        """
+        Raises an error if the command failed.
+
+        Returns:
+            CommandResult: self
+
+        Raises:
+            CommandError: If the exit status is not 0
+        """
+        if not self.ok:
+            raise CommandError(
+                f"`{self.command}` exited with {self.exit_code}: {self.stderr.decode(errors='replace').strip()}"
+            )
+
+        return self
+
+
+def collect(channel: Channel, command: str, stdin_data: Optional[bytes] = None,
+            timeout: Optional[float] = None) -> CommandResult:
+    """
+    Reads standard output and standard error of an executed channel at the same time and waits for the exit status.
+
+    Both streams are drained while the command is running, so the remote side never blocks on a full window, which
+    is what made `recv_exit_status` hang (https://github.com/paramiko/paramiko/issues/448).
+
+    Args:
+        channel (Channel): A channel on which `exec_command` was called.
+        command (str): The executed command. Only kept in the result.
+        stdin_data (bytes, optional): Data to be written to the standard input. Defaults to None.
+        timeout (float, optional): Seconds to wait for the command. Defaults to None (no limit).
+
+    Returns:
+        CommandResult: the result
+
+    Raises:
+        CommandError: If the command does not finish in time
+    """
+    return collect_many([channel], [command], [stdin_data], timeout=timeout)[0]
+
+
+def collect_many(channels: List[Channel], commands: List[str], stdin_datas: Optional[List[Optional[bytes]]] = None,
+                 timeout: Optional[float] = None) -> List[CommandResult]:
+    """
+    Drains several executed channels at the same time. See `collect`.
+
+    Args:
+        channels (List[Channel]): Channels on which `exec_command` was called.
+        commands (List[str]): The executed commands. Only kept in the results.
+        stdin_datas (List[bytes], optional): Data to be written to the standard inputs. Defaults to None.
+        timeout (float, optional): Seconds to wait for all commands. Defaults to None (no limit).
+
+    Returns:
+        List[CommandResult]: the results in the order of the channels
+
+    Raises:
+        CommandError: If the commands do not finish in time
+    """
+    start = time.monotonic()
+
+    if stdin_datas is None:
+        stdin_datas = [None] * len(channels)
+
+    bytes_sent = []
+    for channel, stdin_data in zip(channels, stdin_datas):
+        if stdin_data:
+            channel.sendall(stdin_data)
+        bytes_sent.append(len(stdin_data or b""))
+
+    stdouts = [OutputBuffer() for _ in channels]
+    stderrs = [bytearray() for _ in channels]
+    wall_times = [0.0] * len(channels)
+    running = set(range(len(channels)))
+
+    while running:
+        received = False
+        for index in list(running):
+            channel = channels[index]
+            while channel.recv_ready():
+                stdouts[index].write(channel.recv(CHUNK_SIZE))
+                received = True
+
+            while channel.recv_stderr_ready():
+                stderrs[index] += channel.recv_stderr(CHUNK_SIZE)
+                received = True
+
+            if channel.eof_received or channel.closed:
+                if not channel.recv_ready() and not channel.recv_stderr_ready():
+                    running.discard(index)
+                    wall_times[index] = time.monotonic() - start
+
+        if not running:
+            break
+
+        if timeout is not None and time.monotonic() - start > timeout:
+            for channel in channels:
+                channel.close()
+            raise CommandError(f"`{'; '.join(commands)}` did not finish in {timeout} seconds")
+
+        if not received:
+            select.select([channels[index] for index in running], [], [], 0.1)
+
+    results = []
+    for index, channel in enumerate(channels):
+        exit_code = channel.recv_exit_status()
+        channel.close()
+        results.append(
+            CommandResult(commands[index], exit_code, stdouts[index], bytes(stderrs[index]),
+                          wall_times[index], bytes_sent=bytes_sent[index])
+        )
+
+    return results
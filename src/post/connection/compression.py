@@ -0,0 +1,313 @@
+import shlex
+import threading
+import time
+import zlib
+from typing import Callable, Dict, Iterable, Iterator, Optional, Sequence, Set, Tuple
+
+from post.connection.command_result import CommandResult
+from post.connection.metrics import command_family
+from post.connection.output import OutputBuffer
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODECS = ("zstd", "gzip")
+
+STATUS_MARKER = b"post-exit:"
+
+COMPRESSIBLE_FAMILIES = (
+    "apt list", "apt search", "apt-cache", "dpkg-query", "journalctl", "samba-tool user", "samba-tool group",
+    "samba-tool gpo", "systemctl list-units", "getent",
+)
+
+
+def wrap_command(command: str, codec: str, level: int = 1) -> str:
+    """
+    Returns a command line running `command` with its standard output compressed by `codec`.
+
+    The exit status of a pipeline is the one of the compressor, so the command runs in a subshell and its status is
+    written at the end of the standard error (after `STATUS_MARKER`). It only needs a POSIX shell and the compressor.
+
+    Args:
+        command (str): the shell command, as it would be executed
+        codec (str): `gzip` or `zstd`
+        level (int): the compression level. Defaults to 1 (the fastest).
+
+    Returns:
+        str: the command line
+    """
+    script = f"({command}); echo {STATUS_MARKER.decode()}$? >&2"
+    if codec == "zstd":
+        return f"sh -c {shlex.quote(script)} | zstd -c -q -{level}"
+
+    return f"sh -c {shlex.quote(script)} | gzip -c -{level}"
+
+
+def split_status(stderr: bytes) -> Tuple[bytes, Optional[int]]:
+    """
+    Takes the exit status written by `wrap_command` from the standard error.
+
+    Args:
+        stderr (bytes): the standard error of the wrapped command
+
+    Returns:
+        Tuple[bytes, Optional[int]]: the standard error of the command and its exit status. None if there was none.
+    """
+    head, marker, tail = stderr.rpartition(STATUS_MARKER)
+    if not marker:
+        return stderr, None
+
+    try:
+        return head, int(tail.strip())
+    except ValueError:
+        return stderr, None
+
+
+class Decompressor:
+    """
+    Decompresses a `gzip` or `zstd` stream chunk by chunk.
+
+    Args:
+        codec (str): `gzip` or `zstd`.
+
+    Raises:
+        ValueError: If the codec is unknown or `zstandard` is not installed for `zstd`.
+    """
+
+    def __init__(self, codec: str) -> None:
+        self.codec = codec
+        if codec == "gzip":
+            self._decompressor = zlib.decompressobj(wbits=31)
+        elif codec == "zstd":
+            if zstandard is None:
+                raise ValueError("zstd needs the `zstandard` package")
+            self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+        else:
+            raise ValueError(f"Unknown codec: {codec}")
+
+        self.seconds = 0.0
+        self.compressed_bytes = 0
+        self.decompressed_bytes = 0
+
+    def decompress(self, data: bytes) -> bytes:
+        """Returns the decompressed bytes of the next chunk, possibly empty"""
+        start = time.monotonic()
+        output = self._decompressor.decompress(data)
+        self.seconds += time.monotonic() - start
+        self.compressed_bytes += len(data)
+        self.decompressed_bytes += len(output)
+        return output
+
+    def flush(self) -> bytes:
+        """Returns what is left once the stream is over"""
+        if self.codec == "gzip":
+            output = self._decompressor.flush()
+            self.decompressed_bytes += len(output)
+            return output
+
+        return b""
+
+    def iterate(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Decompresses a stream of chunks.
+
+        Args:
+            chunks (Iterable[bytes]): compressed chunks in order
+
+        Returns:
+            Iterator[bytes]: decompressed chunks
+        """
+        for chunk in chunks:
+            output = self.decompress(chunk)
+            if output:
+                yield output
+
+        rest = self.flush()
+        if rest:
+            yield rest
+
+
+class CompressionPolicy:
+    """
+    Which command outputs are compressed on the host and decompressed by the connector.
+
+    Large text outputs (`apt list`, `journalctl`, `samba-tool user list`, ...) shrink 5 to 20 times with the
+    fastest `gzip` level, which pays off on slow links. A command is compressed if its family is in `families`, or if
+    an earlier output of its family on that host was at least `min_bytes` long, or if the caller asks for it
+    (`run(..., compress=True)`). Each host is asked once which compressors it has, `codec` first then `gzip`. Commands
+    run in the persistent root shell are never compressed.
+
+    The policy keeps the transfer rate of each host measured on large uncompressed outputs, to estimate the seconds a
+    compressed output saved. Both saved bytes and seconds are recorded in the connector metrics.
+
+    Args:
+        codec (str): `gzip`, or `zstd` (needs the `zstandard` package locally). Defaults to `gzip`.
+        level (int): The compression level. Defaults to 1.
+        min_bytes (int): Output size from which a command family is compressed on a host. Defaults to 64 KiB.
+        families (Sequence[str], optional): Command families always compressed. See `command_family`.
+            Defaults to `COMPRESSIBLE_FAMILIES`.
+    """
+
+    def __init__(self, codec: str = "gzip", level: int = 1, min_bytes: int = 65536,
+                 families: Optional[Sequence[str]] = None) -> None:
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec: {codec}. Use one of {', '.join(CODECS)}")
+
+        self.codec = codec
+        self.level = level
+        self.min_bytes = min_bytes
+        if families is None:
+            self.families = tuple(COMPRESSIBLE_FAMILIES)
+        else:
+            self.families = tuple(families)
+
+        self.lock = threading.Lock()
+        self.codecs: Dict[str, Optional[str]] = {}
+        self.large: Set[Tuple[str, str]] = set()
+        self.rates: Dict[str, float] = {}
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(codec: {self.codec}, level: {self.level}, min_bytes: {self.min_bytes})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def wanted(self, host: str, command: str) -> bool:
+        """
+        Checks if the output of a command is worth compressing.
+
+        Args:
+            host (str): the host label
+            command (str): the command, with or without the `sudo` wrapper
+
+        Returns:
+            bool: True if the command should be compressed
+        """
+        family = command_family(command)
+        if family.startswith(self.families):
+            return True
+
+        with self.lock:
+            return (host, family) in self.large
+
+    def codec_for(self, host: str, probe: Callable[[str], bool]) -> Optional[str]:
+        """
+        Returns the codec to use on a host, asking the host once.
+
+        Args:
+            host (str): the host label
+            probe (Callable[[str], bool]): runs a command on the host and tells if it succeeded
+
+        Returns:
+            Optional[str]: the codec. None if the host has no usable compressor.
+        """
+        with self.lock:
+            if host in self.codecs:
+                return self.codecs[host]
+
+        candidates = [self.codec] if self.codec == "gzip" else [self.codec, "gzip"]
+        codec = None
+        for candidate in candidates:
+            if candidate == "zstd" and zstandard is None:
+                continue
+            if probe(f"command -v {candidate}"):
+                codec = candidate
+                break
+
+        with self.lock:
+            self.codecs[host] = codec
+
+        return codec
+
+    def observe(self, host: str, command: str, result: CommandResult) -> None:
+        """
+        Learns from an uncompressed result: large outputs mark their family and measure the transfer rate.
+
+        Args:
+            host (str): the host label
+            command (str): the executed command
+            result (CommandResult): its result
+        """
+        self.measure(host, len(result.output), result.wall_time)
+        if len(result.output) >= self.min_bytes:
+            with self.lock:
+                self.large.add((host, command_family(command)))
+
+    def measure(self, host: str, size: int, seconds: float) -> None:
+        """
+        Updates the transfer rate of a host with a transfer of at least a quarter of `min_bytes`. Smaller ones
+        mostly measure the latency.
+
+        Args:
+            host (str): the host label
+            size (int): the bytes received
+            seconds (float): the wall time of the command
+        """
+        if size < self.min_bytes // 4 or seconds <= 0:
+            return
+
+        with self.lock:
+            rate = size / seconds
+            previous = self.rates.get(host)
+            self.rates[host] = rate if previous is None else 0.7 * previous + 0.3 * rate
+
+    def unwrap(self, host: str, result: CommandResult, codec: str) -> CommandResult:
+        """
+        Decompresses the result of a command run with `wrap_command` and gives it back its exit status.
+
+        Args:
+            host (str): the host label
+            result (CommandResult): the result of the wrapped command
+            codec (str): the codec it was wrapped with
+
+        Returns:
+            CommandResult: the result of the command, with `compressed_bytes` and `seconds_saved` set
+        """
+        stderr, exit_code = split_status(result.stderr)
+        if exit_code is None:
+            exit_code = result.exit_code if result.exit_code != 0 else -1
+
+        decompressor = Decompressor(codec)
+        stdout = OutputBuffer(result.output.spill_bytes)
+        try:
+            for chunk in decompressor.iterate(result.output.chunks()):
+                stdout.write(chunk)
+        except (zlib.error, ValueError, getattr(zstandard, "ZstdError", ValueError)) as e:
+            stderr += f"post: cannot decompress the output: {e}\n".encode()
+            if exit_code == 0:
+                exit_code = -1
+
+        unwrapped = CommandResult(result.command, exit_code, stdout, stderr, result.wall_time,
+                                  bytes_sent=result.bytes_sent, compressed_bytes=len(result.output))
+        result.close()
+        unwrapped.seconds_saved = self.saved_seconds(host, decompressor, result.wall_time)
+        return unwrapped
+
+    def saved_seconds(self, host: str, decompressor: Decompressor, wall_time: float) -> float:
+        """
+        Estimates the seconds compression saved on an output: the transfer time of the saved bytes at the rate of the
+        host, minus the decompression time. Large compressed transfers measure the rate too, as a lower bound, so the
+        estimation is rather high. Until the rate of the host is known, nothing is counted as saved.
+
+        Args:
+            host (str): the host label
+            decompressor (Decompressor): the decompressor of the output, once the output is over
+            wall_time (float): the wall time of the command
+
+        Returns:
+            float: the saved seconds, negative if compression cost more than it saved
+        """
+        self.measure(host, decompressor.compressed_bytes, wall_time)
+        with self.lock:
+            rate = self.rates.get(host)
+
+        if rate is None:
+            return 0.0
+
+        return (decompressor.decompressed_bytes - decompressor.compressed_bytes) / rate - decompressor.seconds
+
+
+# Used for calls run with `compress=True` on a connector without a policy, so the choice stays with that call
+GLOBAL_COMPRESSION = CompressionPolicy()
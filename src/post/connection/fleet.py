@@ -0,0 +1,447 @@
+import ast
+import importlib
+import multiprocessing
+import os
+import pickle
+import threading
+import traceback
+from queue import Empty
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from logging import Logger
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from post.connection.model_connector import ModelConnector
+from post.utils.common import GLOBAL_LOGGER
+from post.utils.error import CommandError, Nope, NotFound
+
+MANAGERS = {
+    "Apt": "post.apt.apt.Apt",
+    "Service": "post.service.service.Service",
+    "Config": "post.config.config.Config",
+    "ConfigRaw": "post.config.config_raw.ConfigRaw",
+    "User": "post.user.user.User",
+    "SambaTool": "post.sambatool.sambatool.SambaTool",
+}
+
+CONNECTORS = {
+    "ssh": "post.connection.ssh_connector.SSHConnector",
+    "key": "post.connection.key_connector.KeyConnector",
+    "local": "post.connection.local_connector.LocalConnector",
+}
+
+
+def _resolve(path: str) -> Any:
+    """Imports `package.module.Name` and returns `Name`"""
+    module, _, name = path.rpartition(".")
+    return getattr(importlib.import_module(module), name)
+
+
+def _keywords(keywords: List[ast.keyword]) -> Dict[str, Any]:
+    """
+    Returns the values of the keyword arguments of a call. They must be python literals.
+
+    Raises:
+        ValueError: If there is a `**` argument
+    """
+    arguments = {}
+    for keyword in keywords:
+        if keyword.arg is None:
+            raise ValueError("`**` arguments are not supported")
+        arguments[keyword.arg] = ast.literal_eval(keyword.value)
+
+    return arguments
+
+
+class HostSpec:
+    """
+    A picklable description of a connection, built into a connector in the process that uses it.
+
+    Args:
+        address (str): The address of the host. Ignored by `local`.
+        port (int): The port. Defaults to 22.
+        user (str, optional): The user. Defaults to None.
+        passwd (str, optional): The password, also used for sudo. Defaults to None.
+        private_key (str, optional): The private key path for `key`. Defaults to None.
+        kind (str): `ssh`, `key` or `local`. Defaults to `ssh`.
+        options (Dict[str, Any], optional): Other keyword arguments of the connector (`timeout`, `retry`,
+            `persistent_shell`...). They must be picklable. Defaults to None.
+    """
+
+    def __init__(self, address: str, port: int = 22, user: Optional[str] = None, passwd: Optional[str] = None,
+                 private_key: Optional[str] = None, kind: str = "ssh",
+                 options: Optional[Dict[str, Any]] = None) -> None:
+        if kind not in CONNECTORS:
+            raise ValueError(f"Unknown connector kind: {kind}")
+
+        self.address = address
+        self.port = port
+        self.user = user
+        self.passwd = passwd
+        self.private_key = private_key
+        self.kind = kind
+        self.options = options or {}
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(label: {self.label}, kind: {self.kind})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    @property
+    def label(self) -> str:
+        """`address:port` of the host, or `localhost`"""
+        if self.kind == "local":
+            return "localhost"
+
+        return f"{self.address}:{self.port}"
+
+    def connect(self) -> ModelConnector:
+        """Returns a lazy connector to the host"""
+        connector: Callable[..., ModelConnector] = _resolve(CONNECTORS[self.kind])
+        if self.kind == "local":
+            return connector(self.passwd or "", **self.options)
+
+        if self.kind == "key":
+            return connector(self.address, self.port, self.user, self.private_key, lazy=True, **self.options)
+
+        return connector(self.address, self.port, self.user, self.passwd, lazy=True, **self.options)
+
+
+class Operation:
+    """
+    A picklable call of a manager method, run on each host of a fleet.
+
+    The manager is built with the connector of the host as its first argument, then the method is called:
+
+        Operation("Apt", "list", kwargs={"installed": True})
+        Operation.parse("Apt.list(installed=True)")
+        Operation.parse("Config(path='/etc/ssh/sshd_config').read()")
+
+    Args:
+        manager (str): A name of `MANAGERS` or the dotted path of a manager class.
+        method (str): The public method to call.
+        args (Sequence[Any], optional): The positional arguments of the method. Defaults to None.
+        kwargs (Dict[str, Any], optional): The keyword arguments of the method. Defaults to None.
+        manager_kwargs (Dict[str, Any], optional): The keyword arguments of the manager. Defaults to None.
+
+    Raises:
+        Nope: If the method is private
+    """
+
+    def __init__(self, manager: str, method: str, args: Optional[Sequence[Any]] = None,
+                 kwargs: Optional[Dict[str, Any]] = None, manager_kwargs: Optional[Dict[str, Any]] = None) -> None:
+        if method.startswith("_"):
+            raise Nope(f"`{method}` is not a public method")
+
+        self.manager = manager
+        self.method = method
+        self.args = tuple(args or ())
+        self.kwargs = kwargs or {}
+        self.manager_kwargs = manager_kwargs or {}
+
+    def __str__(self) -> str:
+        manager_arguments = ", ".join(f"{key}={value!r}" for key, value in self.manager_kwargs.items())
+        arguments = ", ".join([*map(repr, self.args), *(f"{key}={value!r}" for key, value in self.kwargs.items())])
+        manager = f"{self.manager}({manager_arguments})" if manager_arguments else self.manager
+        return f"{manager}.{self.method}({arguments})"
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.__str__()})"
+
+    @classmethod
+    def parse(cls, text: str) -> "Operation":
+        """
+        Parses `Manager.method(...)` or `Manager(...).method(...)`. Arguments must be python literals.
+
+        Args:
+            text (str): the call
+
+        Returns:
+            Operation: the operation
+
+        Raises:
+            ValueError: If the text is not such a call
+        """
+        try:
+            call = ast.parse(text.strip(), mode="eval").body
+        except SyntaxError as e:
+            raise ValueError(f"Not a call: {text}") from e
+
+        if not isinstance(call, ast.Call) or not isinstance(call.func, ast.Attribute):
+            raise ValueError(f"Not a method call: {text}")
+
+        target = call.func.value
+        manager_kwargs: Dict[str, Any] = {}
+        if isinstance(target, ast.Call):
+            if target.args:
+                raise ValueError("Manager arguments must be keywords, the connector is the first argument")
+            manager_kwargs = _keywords(target.keywords)
+            target = target.func
+
+        try:
+            manager = ast.unparse(target)
+        except Exception as e:
+            raise ValueError(f"Not a manager: {text}") from e
+
+        return cls(manager, call.func.attr, args=[ast.literal_eval(argument) for argument in call.args],
+                   kwargs=_keywords(call.keywords), manager_kwargs=manager_kwargs)
+
+    def manager_class(self) -> Any:
+        """Returns the class of the manager"""
+        return _resolve(MANAGERS.get(self.manager, self.manager))
+
+    def __call__(self, connector: ModelConnector) -> Any:
+        manager = self.manager_class()(connector, **self.manager_kwargs)
+        return getattr(manager, self.method)(*self.args, **self.kwargs)
+
+
+class FleetResult:
+    """
+    The outcome of an operation on one host.
+
+    Args:
+        host (str): The label of the host.
+        value (Any): What the operation returned. None if it failed.
+        error (str, optional): The error type and message if it failed. Defaults to None.
+        details (str, optional): The traceback of the error. Defaults to None.
+    """
+
+    def __init__(self, host: str, value: Any = None, error: Optional[str] = None,
+                 details: Optional[str] = None) -> None:
+        self.host = host
+        self.value = value
+        self.error = error
+        self.details = details
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(host: {self.host}, ok: {self.ok})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _worker(hosts: List[HostSpec], threads: int, tasks: Any, results: Any,
+            initializer: Optional[Callable[..., None]], initargs: Tuple[Any, ...]) -> None:
+    """
+    The loop of a worker process: keeps a connector for each host of its shard and runs the operations it receives,
+    sending each host's result as soon as it is ready, then `(task, None)` once the operation is done everywhere.
+    """
+    if initializer is not None:
+        initializer(*initargs)
+
+    connectors: List[Tuple[HostSpec, Optional[ModelConnector], Optional[str]]] = []
+    for host in hosts:
+        try:
+            connectors.append((host, host.connect(), None))
+        except Exception as e:
+            connectors.append((host, None, f"{e.__class__.__name__}: {e}"))
+
+    def run(operation: Operation, host: HostSpec, connector: Optional[ModelConnector],
+            error: Optional[str]) -> FleetResult:
+        if connector is None:
+            return FleetResult(host.label, error=error)
+
+        try:
+            return FleetResult(host.label, value=operation(connector))
+        except Exception as e:
+            return FleetResult(host.label, error=f"{e.__class__.__name__}: {e}", details=traceback.format_exc())
+
+    with ThreadPoolExecutor(max_workers=max(1, min(threads, len(connectors)))) as executor:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+
+            task_id, operation = task
+            futures = [executor.submit(run, operation, host, connector, error)
+                       for host, connector, error in connectors]
+            for future in as_completed(futures):
+                result = future.result()
+                # pickled here rather than in the feeder thread of the queue, where a failure would be lost with the
+                # result. The queue then only copies the bytes.
+                try:
+                    data = pickle.dumps(result)
+                except Exception as e:
+                    data = pickle.dumps(FleetResult(
+                        result.host, error=f"Result cannot be sent back: {e.__class__.__name__}: {e}"
+                    ))
+
+                results.put((task_id, data))
+
+            results.put((task_id, None))
+
+    for _, connector, _ in connectors:
+        if connector is not None and hasattr(connector, "close"):
+            try:
+                connector.close()
+            except Exception:
+                pass
+
+
+class FleetExecutor:
+    """
+    Runs operations on a fleet from several processes, each owning the connections of a shard of the hosts.
+
+    Packet crypto of paramiko and the parsers are CPU bound and hold the GIL, so one process saturates a core long
+    before the network. The hosts are split round-robin between worker processes, which connect lazily, keep their
+    connections between operations and run each operation on their hosts with a thread pool. Results are sent back
+    per host as they complete.
+
+    Operations and results cross process boundaries, so they must be picklable. Metrics, traces and result caches
+    stay in the worker processes.
+
+    Args:
+        hosts (Sequence[HostSpec]): The hosts.
+        processes (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        threads (int): Hosts a worker runs an operation on at the same time. Defaults to 16.
+        start_method (str): The multiprocessing start method. `spawn` does not inherit the threads and sockets of the
+            parent. Defaults to `spawn`.
+        initializer (Callable, optional): Called in each worker process before it connects, e.g. to set up logging.
+            Defaults to None.
+        initargs (Tuple[Any, ...]): The arguments of `initializer`. Defaults to ().
+        logger (Logger, optional): The logger to log. Defaults to None.
+
+    Raises:
+        NotFound: If there are no hosts
+    """
+
+    def __init__(self, hosts: Sequence[HostSpec], processes: Optional[int] = None, threads: int = 16,
+                 start_method: str = "spawn", initializer: Optional[Callable[..., None]] = None,
+                 initargs: Tuple[Any, ...] = (), logger: Optional[Logger] = None) -> None:
+        if logger is None:
+            self.logger = GLOBAL_LOGGER
+        else:
+            self.logger = logger
+
+        if not hosts:
+            self.logger.error("No hosts to run on")
+            raise NotFound("No hosts to run on")
+
+        self.hosts = list(hosts)
+        self.processes = max(1, min(processes or os.cpu_count() or 1, len(self.hosts)))
+        self.threads = threads
+        self.initializer = initializer
+        self.initargs = initargs
+        # a concrete context of the start method, the `BaseContext` of the stubs has no `Process`
+        self.context: Any = multiprocessing.get_context(start_method)
+        self.lock = threading.Lock()
+        self.workers: List[Tuple[Any, Any]] = []
+        self.results: Any = None
+        self.task_id = 0
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(hosts: {len(self.hosts)}, processes: {self.processes})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def __enter__(self) -> "FleetExecutor":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def start(self) -> None:
+        """Starts the worker processes. Called by the first operation if it was not."""
+        if self.workers:
+            return
+
+        self.results = self.context.Queue()
+        for index in range(self.processes):
+            tasks = self.context.Queue()
+            process = self.context.Process(target=_worker, name=f"post-fleet-{index}", daemon=True,
+                                           args=(self.hosts[index::self.processes], self.threads, tasks,
+                                                 self.results, self.initializer, self.initargs))
+            process.start()
+            self.workers.append((process, tasks))
+
+    def close(self) -> None:
+        """Closes the connections and stops the worker processes"""
+        with self.lock:
+            for _, tasks in self.workers:
+                tasks.put(None)
+
+            for process, _ in self.workers:
+                process.join(timeout=10)
+                if process.is_alive():
+                    self.logger.warning(f"{process.name} did not stop, terminating it")
+                    process.terminate()
+
+            self.workers.clear()
+
+    def run(self, operation: Union[Operation, str]) -> Iterator[FleetResult]:
+        """
+        Runs an operation on every host and yields the results as they arrive.
+
+        Operations are run one at a time. The remaining results of an operation left early are discarded.
+
+        Args:
+            operation (Union[Operation, str]): the operation or a text for `Operation.parse`
+
+        Returns:
+            Iterator[FleetResult]: a result per host, in completion order
+
+        Raises:
+            CommandError: If a worker process died
+        """
+        if isinstance(operation, str):
+            operation = Operation.parse(operation)
+
+        with self.lock:
+            self.start()
+            self.task_id += 1
+            task_id = self.task_id
+            for _, tasks in self.workers:
+                tasks.put((task_id, operation))
+
+            running = len(self.workers)
+            while running:
+                received_id, result = self.__receive()
+                if received_id != task_id:
+                    continue
+
+                if result is None:
+                    running -= 1
+                    continue
+
+                if not result.ok:
+                    self.logger.warning(f"{result.host}: {result.error}")
+
+                yield result
+
+    def __receive(self) -> Tuple[int, Optional[FleetResult]]:
+        """Waits for the next result, checking that the workers are still alive"""
+        while True:
+            try:
+                received: Tuple[int, Optional[bytes]] = self.results.get(timeout=1)
+            except Empty:
+                dead = [process.name for process, _ in self.workers if not process.is_alive()]
+                if dead:
+                    self.logger.error(f"Worker processes died: {', '.join(dead)}")
+                    raise CommandError(f"Worker processes died: {', '.join(dead)}")
+
+                continue
+
+            task_id, data = received
+            if data is None:
+                return task_id, None
+
+            result: FleetResult = pickle.loads(data)
+            return task_id, result
+
+    def map(self, operation: Union[Operation, str]) -> Dict[str, Any]:
+        """
+        Runs an operation on every host and returns the values of the hosts where it succeeded.
+
+        Args:
+            operation (Union[Operation, str]): the operation or a text for `Operation.parse`
+
+        Returns:
+            Dict[str, Any]: the value of each host label, like the dictionaries of the `*List` managers
+        """
+        return {result.host: result.value for result in self.run(operation) if result.ok}
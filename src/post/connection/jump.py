@@ -0,0 +1,187 @@
+import getpass
+import threading
+from logging import Logger
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+from paramiko import RSAKey
+from paramiko.channel import Channel
+from paramiko.client import AutoAddPolicy, SSHClient
+
+from post.connection.pool import SSHConnectionPool, credential_fingerprint
+from post.utils.common import GLOBAL_LOGGER
+
+GLOBAL_JUMP_POOL = SSHConnectionPool(max_per_host=1)
+
+
+class JumpHost:
+    """
+    A bastion the connectors reach their hosts through, like `ssh -J`.
+
+    Each connection to a host is a `direct-tcpip` channel opened on the transport of the bastion, so hundreds of
+    connectors share one TCP connection and one handshake with the bastion instead of paying it each. The bastion
+    client is drawn from a pool (`GLOBAL_JUMP_POOL` keeps a single client per bastion) and leased for as long as a
+    channel through it is open.
+
+    Args:
+        address (str): The address of the bastion.
+        port (int): The port of the bastion. Defaults to 22.
+        user (str, optional): The username on the bastion. Defaults to None, which is the local user (as `ssh -J`
+            does).
+        passwd (str, optional): The password on the bastion. Defaults to None.
+        private_key (Union[Path, str], optional): A private key used instead of the password. Defaults to None.
+        pool (SSHConnectionPool, optional): The pool of bastion clients. Give a pool with a larger `max_per_host`
+            to spread the channels over several bastion connections. Defaults to GLOBAL_JUMP_POOL.
+        jump (JumpHost, optional): Another bastion to reach this one through. Defaults to None.
+        keepalive (int): Seconds between keepalive packets on the bastion transport. 0 disables them.
+            Defaults to 30.
+        timeout (float): Seconds to wait for the bastion to open a channel. Defaults to 10.
+        logger (Logger, optional): The logger to log. Defaults to None.
+    """
+
+    def __init__(self, address: str, port: int = 22, user: Optional[str] = None, passwd: Optional[str] = None,
+                 private_key: Optional[Union[Path, str]] = None, pool: Optional[SSHConnectionPool] = None,
+                 jump: Optional["JumpHost"] = None, keepalive: int = 30, timeout: float = 10.0,
+                 logger: Optional[Logger] = None) -> None:
+        if logger is None:
+            self.logger = GLOBAL_LOGGER
+        else:
+            self.logger = logger
+
+        if pool is None:
+            self.pool = GLOBAL_JUMP_POOL
+        else:
+            self.pool = pool
+
+        self.address = address
+        self.port = port
+        self.user = user if user is not None else getpass.getuser()
+        self.passwd = passwd
+        self.private_key = private_key
+        self.jump = jump
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.leases: Dict[int, Tuple[Channel, SSHClient]] = {}
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(address: {self.address}:{self.port}, user: {self.user}, " \
+               f"channels: {len(self)})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def __len__(self) -> int:
+        return len(self.leases)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # a copy sent to another process (see `HostSpec`) opens its own channels, from that process' pool
+        state = self.__dict__.copy()
+        state.update(lock=None, leases={}, pool=None if self.pool is GLOBAL_JUMP_POOL else self.pool)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+        if self.pool is None:
+            self.pool = GLOBAL_JUMP_POOL
+
+    def _new_client(self) -> SSHClient:
+        """
+        Connects to the bastion, through its own jump host if it has one
+
+        Raises:
+            ValueError: If the connection fails.
+        """
+        self.logger.info(f"Connecting to jump host {self.address}:{self.port}")
+
+        client = SSHClient()
+        client.set_missing_host_key_policy(AutoAddPolicy())
+        sock = self.jump.open_channel(self.address, self.port) if self.jump is not None else None
+        try:
+            if self.private_key is not None:
+                client.connect(hostname=self.address, port=self.port, username=self.user, sock=sock,
+                               pkey=RSAKey.from_private_key_file(str(self.private_key)), timeout=10)
+            else:
+                client.connect(hostname=self.address, port=self.port, username=self.user, password=self.passwd,
+                               sock=sock, timeout=10)
+        except ValueError as e:
+            self.logger.error(e)
+            raise ValueError(e)
+
+        transport = client.get_transport()
+        if transport is not None and self.keepalive:
+            transport.set_keepalive(self.keepalive)
+
+        return client
+
+    def open_channel(self, address: str, port: int) -> Channel:
+        """
+        Opens a `direct-tcpip` channel from the bastion to a host. It can be given to paramiko as `sock`.
+
+        Args:
+            address (str): the address of the host, as the bastion resolves it
+            port (int): the port of the host
+
+        Returns:
+            Channel: a channel connected to the host
+
+        Raises:
+            ValueError: If the bastion cannot be reached.
+            SSHException: If the bastion refuses to open the channel.
+        """
+        self.reap()
+
+        client = self.pool.acquire(self.address, self.port, self.user, self._new_client,
+                                   credential_fingerprint(self.passwd, self.private_key))
+        try:
+            channel = client.get_transport().open_channel("direct-tcpip", (address, port), ("127.0.0.1", 0),
+                                                          timeout=self.timeout)
+        except Exception as e:
+            self.logger.error(f"Jump host {self.address}:{self.port} could not reach {address}:{port}: {e}")
+            self.pool.release(client)
+            raise
+
+        with self.lock:
+            self.leases[id(channel)] = (channel, client)
+
+        return channel
+
+    def release(self, channel: Channel) -> None:
+        """
+        Closes a channel and gives its lease on the bastion client back to the pool.
+
+        Args:
+            channel (Channel): a channel returned by `open_channel`
+        """
+        with self.lock:
+            lease = self.leases.pop(id(channel), None)
+
+        if lease is None:
+            return
+
+        channel.close()
+        self.pool.release(lease[1])
+
+    def reap(self) -> int:
+        """
+        Releases the leases of channels that were closed by their connection (e.g. by a pool dropping it).
+
+        Returns:
+            int: number of released leases
+        """
+        with self.lock:
+            closed = [channel for channel, _ in self.leases.values() if channel.closed]
+
+        for channel in closed:
+            self.release(channel)
+
+        return len(closed)
+
+    def close(self) -> None:
+        """Closes every channel opened through the bastion"""
+        with self.lock:
+            channels = [channel for channel, _ in self.leases.values()]
+
+        for channel in channels:
+            self.release(channel)
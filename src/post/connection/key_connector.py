@@ -2,93 +2,53 @@ from logging import Logger
 from pathlib import Path
 from typing import Optional, Union
 
-from paramiko import RSAKey, ChannelFile
+from paramiko import RSAKey
 from paramiko.client import SSHClient, AutoAddPolicy
 
+from post.connection.base_ssh_connector import BaseSSHConnector
+from post.connection.compression import CompressionPolicy
+from post.connection.jump import JumpHost
+from post.connection.metrics import GLOBAL_METRICS, MetricsRegistry
+from post.connection.pool import SSHConnectionPool, credential_fingerprint
+from post.connection.retry import RetryPolicy
+
+
+class KeyConnector(BaseSSHConnector):
+    def __init__(self, address: str, port: int, user: str, private_key: Union[Path, str], logger: Optional[Logger] = None,
+                 pool: Optional[SSHConnectionPool] = None, fail_fast: bool = False,
+                 timeout: Optional[float] = None, persistent_shell: bool = False,
+                 use_agent: bool = False, lazy: bool = False, keepalive: int = 30,
+                 retry: Optional[RetryPolicy] = None, cache_sudo: bool = False,
+                 metrics: Optional[MetricsRegistry] = GLOBAL_METRICS, jump: Optional[JumpHost] = None,
+                 compression: Optional[CompressionPolicy] = None) -> None:
+        super().__init__(address, port, user, logger=logger, pool=pool, fail_fast=fail_fast, timeout=timeout,
+                         persistent_shell=persistent_shell,
+                         use_agent=use_agent, lazy=lazy, keepalive=keepalive, retry=retry,
+                         cache_sudo=cache_sudo, metrics=metrics, jump=jump, compression=compression)
 
-from post.connection.model_connector import ModelConnector
-from post.utils.common import GLOBAL_LOGGER
-
-
-class KeyConnector(ModelConnector):
-    def __init__(self, address: str, port: int, user: str, private_key: Union[Path, str], logger: Optional[Logger] = None) -> None:
-
-        if logger is None:
-            self.logger = GLOBAL_LOGGER
-        else:
-            self.logger = logger
-
-        self.address = address
-        self.port = port
-        self.user = user
         self.private_key = private_key
-        self.client = self.connect()
-
-    def __str__(self) -> str:
-        return f"{self.__class__.__name__}(address: {self.address}:{self.port}, user: {self.user})"
+        if not lazy:
+            self.client = self.connect()
 
-    def __repr__(self) -> str:
-        return self.__str__()
-
-    def __del__(self):
-        self.close()
-
-    def close(self) -> None:
-        """Closes the connection"""
-        self.logger.info("Closing Connection")
-
-        try:
-            if self.client is not None:
-                self.client.close()
-                del self.client
-        except Exception as e:
-            self.logger.warning(e)
+    def _credential(self) -> str:
+        """Returns the fingerprint of the private key and the password"""
+        return credential_fingerprint(self.passwd, self.private_key)
 
-    def connect(self) -> SSHClient:
+    def _new_client(self) -> SSHClient:
         """
-        Connects to the server
+        Creates a new client and authenticates with the private key
 
         Raises:
             ValueError: If the connection fails.
         """
-        self.logger.info("Connecting")
-
         client = SSHClient()
         client.set_missing_host_key_policy(AutoAddPolicy())
         try:
-            private_key = RSAKey.from_private_key_file(self.private_key)
-            client.connect(hostname=self.address, port=self.port, username=self.user, pkey=private_key)
+            private_key = RSAKey.from_private_key_file(str(self.private_key))
+            client.connect(hostname=self.address, port=self.port, username=self.user, pkey=private_key,
+                           sock=self._sock())
             return client
         except ValueError as e:
             print(e)
             self.logger.error(e)
             raise ValueError(e)
-
-    def _validate(self, stdout: ChannelFile, stderr: ChannelFile) -> None:
-        self.logger.info("Validating command")
-
-        return
-        # Thanks to İbrahim ARI reminds me of exit code.
-        # Still hangs. https://github.com/paramiko/paramiko/issues/448
-        # May replace paramiko
-        # if stdout.channel.recv_exit_status() != 0:
-        #     self.logger.error(stderr.read().decode())
-        #     raise CommandError(stderr.read().decode())
-
-    def run(self, command: str) -> ChannelFile:
-        self.logger.info("Run command")
-
-        stdin, stdout, stderr = self.client.exec_command(command)
-        self._validate(stdout, stderr)
-
-        return stdout
-
-    def sudo_run(self, command: str, passwd: str) -> ChannelFile:
-        self.logger.info("Run command as ROOT")
-
-        sudo_command = f"sudo -S -p '' su -c \"{command}\""
-        stdin, stdout, stderr = self.client.exec_command(sudo_command)
-        stdin.write(passwd + "\n")
-        stdin.flush()
-        self._validate(stdout, stderr)
-        return stdout
@@ -0,0 +1,223 @@
+import os
+import select
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from logging import Logger
+from typing import IO, List, Optional
+
+from post.connection.agent import AgentSession
+from post.connection.stream import CHUNK_SIZE
+from post.utils.common import GLOBAL_LOGGER
+from post.utils.error import CommandError
+
+
+class ProcessChannel:
+    """
+    The pipes of a local process behind the part of the paramiko `Channel` interface `AgentSession` uses.
+
+    Reads go to the file descriptors directly, so `select` always sees what is left to read.
+
+    Args:
+        process (subprocess.Popen): A process started with pipes for its standard input, output and error.
+
+    Raises:
+        CommandError: If the process was started without the pipes. It is killed.
+    """
+
+    def __init__(self, process: "subprocess.Popen[bytes]") -> None:
+        if process.stdin is None or process.stdout is None or process.stderr is None:
+            process.kill()
+            raise CommandError("The process was started without pipes")
+
+        self.process = process
+        self.stdin: IO[bytes] = process.stdin
+        self.stdout: IO[bytes] = process.stdout
+        self.stderr: IO[bytes] = process.stderr
+        self.timeout: Optional[float] = None
+        self.closed = False
+        self.stderr_eof = False
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(pid: {self.process.pid}, closed: {self.closed})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    @staticmethod
+    def __readable(stream: IO[bytes], timeout: Optional[float]) -> bool:
+        """Checks if a pipe can be read without blocking, waiting at most `timeout` seconds"""
+        if stream.closed:
+            return False
+
+        readable, _, _ = select.select([stream], [], [], timeout)
+        return bool(readable)
+
+    def settimeout(self, timeout: Optional[float]) -> None:
+        """Sets the seconds `recv` waits for data. None waits forever."""
+        self.timeout = timeout
+
+    def sendall(self, data: bytes) -> None:
+        """Writes to the standard input of the process. A process that exited is noticed by the next `recv`."""
+        try:
+            self.stdin.write(data)
+            self.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            pass
+
+    def recv_ready(self) -> bool:
+        """Checks if the standard output can be read without blocking"""
+        return self.__readable(self.stdout, 0)
+
+    def recv(self, size: int) -> bytes:
+        """
+        Reads at most `size` bytes of the standard output. Empty once the process closed it.
+
+        Raises:
+            socket.timeout: If nothing arrives in `timeout` seconds
+        """
+        if not self.__readable(self.stdout, self.timeout):
+            raise socket.timeout(f"No data in {self.timeout} seconds")
+
+        return os.read(self.stdout.fileno(), size)
+
+    def recv_stderr_ready(self) -> bool:
+        """Checks if there is standard error left to read"""
+        return not self.stderr_eof and self.__readable(self.stderr, 0)
+
+    def recv_stderr(self, size: int) -> bytes:
+        """Reads at most `size` bytes of the standard error"""
+        data = os.read(self.stderr.fileno(), size)
+        if not data:
+            self.stderr_eof = True
+
+        return data
+
+    def exit_status_ready(self) -> bool:
+        """Checks if the process exited"""
+        return self.process.poll() is not None
+
+    def shutdown_write(self) -> None:
+        """Closes the standard input of the process"""
+        try:
+            self.stdin.close()
+        except BrokenPipeError:
+            pass
+
+    def close(self) -> None:
+        """Closes the pipes. The process is killed if it does not exit on its own in 5 seconds."""
+        if self.closed:
+            return
+
+        self.closed = True
+        self.shutdown_write()
+        try:
+            self.process.wait(5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        finally:
+            self.stdout.close()
+            self.stderr.close()
+
+
+def open_sudo_process(arguments: List[str], marker: str, passwd: Optional[str] = None,
+                      logger: Logger = GLOBAL_LOGGER, timeout: Optional[float] = 10.0) -> ProcessChannel:
+    """
+    Runs a long-living local process as root and waits until it writes the `marker` line to its standard output.
+
+    The process is started with sudo, unless this process already runs as root. As with `open_sudo_channel`, the
+    password is only sent if sudo asks for it, so it is never read by the process itself.
+
+    Args:
+        arguments (List[str]): The command line of the process.
+        marker (str): The text that tells the process started.
+        passwd (str, optional): The sudo password. Defaults to None.
+        logger (Logger): The logger to log. Defaults to GLOBAL_LOGGER.
+        timeout (float, optional): Seconds to wait for the marker. Defaults to 10.
+
+    Returns:
+        ProcessChannel: the pipes of the process, with the output up to the marker consumed
+
+    Raises:
+        CommandError: If the process cannot be started.
+    """
+    prompt = f"post-sudo-{uuid.uuid4().hex}:"
+    if os.geteuid() != 0:
+        arguments = ["sudo", "-S", "-p", prompt, *arguments]
+
+    try:
+        process = subprocess.Popen(arguments, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        raise CommandError(f"Could not start root process: {e}")
+
+    channel = ProcessChannel(process)
+    start = time.monotonic()
+    stdout = b""
+    stderr = b""
+    prompts = 0
+    ready = f"{marker}\n".encode()
+    while True:
+        while not stdout.endswith(ready) and channel.recv_ready():
+            data = os.read(channel.stdout.fileno(), 1)
+            if not data:
+                break
+            stdout += data
+
+        while channel.recv_stderr_ready():
+            stderr += channel.recv_stderr(CHUNK_SIZE)
+
+        if stdout.endswith(ready):
+            return channel
+
+        if stderr.count(prompt.encode()) > prompts:
+            prompts += 1
+            if prompts > 1:
+                channel.close()
+                logger.error("Wrong sudo password")
+                raise CommandError("Could not start root process: wrong sudo password")
+
+            channel.sendall(f"{passwd or ''}\n".encode())
+            continue
+
+        if channel.exit_status_ready():
+            channel.close()
+            message = stderr.replace(prompt.encode(), b"").decode(errors="replace").strip()
+            logger.error(message)
+            raise CommandError(f"Could not start root process: {message}")
+
+        if timeout is not None and time.monotonic() - start > timeout:
+            channel.close()
+            raise CommandError(f"Could not start root process in {timeout} seconds")
+
+        select.select([channel.stdout, channel.stderr], [], [], 0.05)
+
+
+class LocalAgentSession(AgentSession):
+    """
+    The helper of `AgentSession` as a local root process, for `LocalConnector`.
+
+    It is started once with sudo (directly if this process runs as root) and then answers file, user and package
+    queries and runs privileged commands over its pipes, with the same frames as the remote helper. A privileged
+    command then costs one shell instead of `sudo`, `su` and two shells.
+
+    Args:
+        passwd (str, optional): The sudo password. Defaults to None.
+        logger (Logger, optional): The logger to log. Defaults to None.
+        timeout (float, optional): Seconds to wait for a response. Defaults to 60.
+        python (str, optional): The python interpreter. Defaults to the running one.
+
+    Raises:
+        CommandError: If the helper cannot be started.
+    """
+
+    def __init__(self, passwd: Optional[str] = None, logger: Optional[Logger] = None,
+                 timeout: Optional[float] = 60.0, python: Optional[str] = None) -> None:
+        super().__init__(None, passwd=passwd, logger=logger, timeout=timeout, python=python or sys.executable)
+
+    def _open(self, transport: None, python: str, bootstrap: str, marker: str,
+              passwd: Optional[str]) -> ProcessChannel:
+        """Starts the bootstrap as a local root process"""
+        return open_sudo_process([python, "-c", bootstrap], marker, passwd=passwd, logger=self.logger)
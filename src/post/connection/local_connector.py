@@ -1,37 +1,60 @@
+import os
 import subprocess
+import tempfile
+import time
 from logging import Logger
-from typing import Optional
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
 
+from post.connection.agent import AgentSession
+from post.connection.command_result import CommandResult
+from post.connection.local_agent import LocalAgentSession
+from post.connection.metrics import GLOBAL_METRICS, MetricsRegistry
 from post.connection.model_connector import ModelConnector
+from post.connection.output import run_process
+from post.connection.stream import CHUNK_SIZE, iter_lines
+from post.connection.sudo_cache import SudoCache
 from post.utils.common import GLOBAL_LOGGER
 from post.utils.error import CommandError
 
 
-class LocalChannelFile:
-    def __init__(self, text):
-        self.text = text
-
-    def read(self):
-        return self.text.encode('utf-8')
-
-
 class LocalConnector(ModelConnector):
     """
     A LocalConnector.
 
+    Files are read, written and checked with Python directly, without `cat` or `test -e`. Only what the user may not
+    access is done as root.
+
+    With `use_agent` a helper process is started once as root (see `LocalAgentSession`). Privileged commands, and
+    files the user may not access, then go through its pipes instead of spawning `sudo` and `su` each time.
 
     Args:
         passwd (str): The password to use.
         logger (Logger, optional): The logger to log. Defaults to None.
+        fail_fast (bool): Raise CommandError as soon as a command exits with a non-zero status. Defaults to False.
+        cache_sudo (bool): Validate the sudo credentials once and run privileged commands with `sudo -n`.
+            See `SudoCache`. Defaults to False.
+        metrics (MetricsRegistry, optional): The registry to record command metrics into. None records nothing.
+            Defaults to GLOBAL_METRICS.
+        use_agent (bool): Keep a root helper process for privileged commands and files. Defaults to False.
     """
 
-    def __init__(self, passwd: str, logger: Optional[Logger] = None):
+    def __init__(self, passwd: str, logger: Optional[Logger] = None, fail_fast: bool = False,
+                 cache_sudo: bool = False, metrics: Optional[MetricsRegistry] = GLOBAL_METRICS,
+                 use_agent: bool = False):
         """
         Constructs a LocalConnector object
 
         Args:
             passwd (str): The password to use.
             logger (Logger, optional): The logger to log. Defaults to None.
+            fail_fast (bool): Raise CommandError as soon as a command exits with a non-zero status.
+                Defaults to False.
+            cache_sudo (bool): Validate the sudo credentials once and run privileged commands with `sudo -n`.
+                Defaults to False.
+            metrics (MetricsRegistry, optional): The registry to record command metrics into. None records
+                nothing. Defaults to GLOBAL_METRICS.
+            use_agent (bool): Keep a root helper process for privileged commands and files. Defaults to False.
         """
         if logger is None:
             self.logger = GLOBAL_LOGGER
@@ -39,11 +62,145 @@ class LocalConnector(ModelConnector):
             self.logger = logger
 
         self.passwd = passwd
+        self.fail_fast = fail_fast
+        self.sudo_cache: Optional[SudoCache] = None
+        if cache_sudo:
+            self.sudo_cache = SudoCache(logger=self.logger, on_observe=self._record_sudo_cache)
+
+        self.metrics = metrics
+        self.use_agent = use_agent
+        self.agent: Optional[AgentSession] = None
 
     def __str__(self):
         return f"{self.__class__.__name__}()"
 
-    def run(self, command: str) -> LocalChannelFile:
+    def __del__(self):
+        self.close()
+
+    def close(self) -> None:
+        """Stops the helper process if there is one"""
+        agent = getattr(self, "agent", None)
+        if agent is not None:
+            self.agent = None
+            agent.close()
+
+    def get_agent(self, passwd: Optional[str] = None) -> Optional[AgentSession]:
+        """
+        Returns the root helper process. Starts it if there is none or the last one exited.
+
+        If the helper cannot be started (e.g. the password is wrong) it is disabled for this connector and None is
+        returned, so privileged work falls back to sudo.
+
+        Args:
+            passwd (str, optional): the sudo password. Defaults to None.
+
+        Returns:
+            AgentSession: the helper. None if `use_agent` is not set or it could not be started.
+        """
+        if not self.use_agent:
+            return None
+
+        if self.agent is None or not self.agent.active:
+            try:
+                self.agent = LocalAgentSession(passwd=passwd if passwd is not None else self.passwd,
+                                               logger=self.logger)
+            except CommandError as e:
+                self.logger.warning(f"Local agent is disabled: {e}")
+                self.use_agent = False
+                self.agent = None
+
+        return self.agent
+
+    def _execute(self, command: str, display_command: Optional[str] = None, stdin_data: Optional[bytes] = None,
+                 validate: bool = True) -> CommandResult:
+        """
+        Executes a shell command and collects its outputs and exit status.
+
+        Args:
+            command (str): the shell command to execute
+            display_command (str, optional): the command to be kept in the result. Defaults to `command`.
+            stdin_data (bytes, optional): data written to the standard input. Defaults to None.
+            validate (bool): check the exit status if `fail_fast` is set. Defaults to True.
+
+        Raises:
+            CommandError: If `fail_fast` is set and the exit status is not 0
+        """
+        start = time.monotonic()
+        exit_code, stdout, stderr = run_process(command, stdin_data=stdin_data, shell=True)
+        command_result = CommandResult(display_command or command, exit_code, stdout, stderr,
+                                       time.monotonic() - start, bytes_sent=len(stdin_data or b""))
+
+        if validate:
+            self._validate(command_result)
+
+        return command_result
+
+    def _validate(self, result: CommandResult) -> CommandResult:
+        """
+        Validates the command. Checks the exit status if `fail_fast` is set.
+
+        Args:
+            result (CommandResult): the result of the command
+
+        Raises:
+            CommandError: If `fail_fast` is set and the exit status is not 0
+        """
+        if self.fail_fast and not result.ok:
+            self.logger.error(result.stderr.decode(errors="replace"))
+            result.check()
+
+        return result
+
+    def _execute_stream(self, command: str, display_command: Optional[str] = None,
+                        stdin_data: Optional[bytes] = None,
+                        results: Optional[List[CommandResult]] = None) -> Iterator[str]:
+        """
+        Executes a shell command and yields its standard output line by line while it is running.
+
+        The standard error goes to a temporary file, so it can never block the command.
+
+        Args:
+            command (str): the shell command to execute
+            display_command (str, optional): the command to be kept in the error. Defaults to `command`.
+            stdin_data (bytes, optional): data written to the standard input. Defaults to None.
+            results (List[CommandResult], optional): if given, the result (without the standard output) is appended
+                to it instead of being validated. Defaults to None.
+
+        Raises:
+            CommandError: If `fail_fast` is set and the exit status is not 0
+        """
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                       stderr=stderr)
+            stdin, stdout = process.stdin, process.stdout
+            if stdin is None or stdout is None:
+                process.kill()
+                raise CommandError("Could not open the pipes of the command")
+
+            try:
+                try:
+                    if stdin_data:
+                        stdin.write(stdin_data)
+                    stdin.close()
+                except BrokenPipeError:
+                    pass
+
+                yield from iter_lines(iter(lambda: os.read(stdout.fileno(), CHUNK_SIZE), b""))
+                exit_code = process.wait()
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                stdout.close()
+
+            if results is not None:
+                stderr.seek(0)
+                results.append(CommandResult(display_command or command, exit_code, b"", stderr.read(), 0.0))
+            elif self.fail_fast and exit_code != 0:
+                stderr.seek(0)
+                CommandResult(display_command or command, exit_code, b"", stderr.read(), 0.0).check()
+
+    def run(self, command: str) -> CommandResult:
         """
         Runs a command with user privileges
 
@@ -51,23 +208,19 @@ class LocalConnector(ModelConnector):
             command (str): the shell command to execute
 
         Raises:
-            CommandError: If the standard error contains any error
+            CommandError: If `fail_fast` is set and the exit status is not 0
         """
         self.logger.info("Run command")
         try:
-            result = subprocess.run(
-                command,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-            )
-            return LocalChannelFile(result.stdout.decode())
+            return self._measured(command, False, lambda: self._execute(command))
+        except CommandError:
+            raise
         except FileNotFoundError as _:
             raise CommandError("Command not found")
         except Exception as e:
             raise ValueError(f"An error occurred: {e}")
 
-    def sudo_run(self, command: str, passwd: Optional[str] = None) -> LocalChannelFile:
+    def sudo_run(self, command: str, passwd: Optional[str] = None) -> CommandResult:
         """
         Runs a command with root privileges
 
@@ -77,25 +230,240 @@ class LocalConnector(ModelConnector):
                 password is available. Defaults to None.
 
         Raises:
-            CommandError: If the standard error contains any error
+            CommandError: If `fail_fast` is set and the exit status is not 0
         """
         self.logger.info("Run command as ROOT")
         try:
-
-            if passwd is None:
-                passwd_to_use = self.passwd
-            else:
-                passwd_to_use = passwd
-
-            sudo_command = f"echo {passwd_to_use} | sudo -S -p '' su -c  \"{command}\""
-            result = subprocess.run(
-                sudo_command,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-            )
-            return LocalChannelFile(result.stdout.decode())
+            return self._measured(command, True, lambda: self.__sudo_run(command, passwd))
+        except CommandError:
+            raise
         except FileNotFoundError as _:
             raise CommandError("Command not found")
         except Exception as e:
             raise ValueError(f"An error occurred: {e}")
+
+    def __sudo_run(self, command: str, passwd: Optional[str] = None) -> CommandResult:
+        """Runs a command with root privileges in the helper process, or with the cached credentials or the password"""
+        if passwd is None:
+            passwd_to_use = self.passwd
+        else:
+            passwd_to_use = passwd
+
+        agent = self.get_agent(passwd=passwd)
+        if agent is not None:
+            return self._validate(agent.run(command))
+
+        # The password goes to the standard input, so it never shows up in the process list
+        password_line = f"{passwd_to_use or ''}\n".encode()
+        if self.sudo_cache is not None:
+            result = self.sudo_cache.run(
+                lambda cached_command, stdin_data: self._execute(cached_command, display_command=command,
+                                                                 stdin_data=stdin_data, validate=False),
+                command, password_line
+            )
+            if result is not None:
+                return self._validate(result)
+
+        sudo_command = f"sudo -S -p '' su -c  \"{command}\""
+        return self._execute(sudo_command, display_command=command, stdin_data=password_line)
+
+    def run_stream(self, command: str) -> Iterator[str]:
+        """
+        Runs a command with user privileges and yields its standard output line by line while it is running.
+
+        Args:
+            command (str): the shell command to execute
+
+        Raises:
+            CommandError: If `fail_fast` is set and the exit status is not 0
+        """
+        self.logger.info("Run command (stream)")
+
+        yield from self._measured_stream(command, False, self._execute_stream(command))
+
+    def sudo_run_stream(self, command: str, passwd: Optional[str] = None) -> Iterator[str]:
+        """
+        Runs a command with root privileges and yields its standard output line by line while it is running.
+
+        With `use_agent` the command runs in the helper process and its lines are yielded once it is over.
+
+        Args:
+            command (str): the shell command to execute
+            passwd (str, optional): the password to use. Defaults to None.
+
+        Raises:
+            CommandError: If `fail_fast` is set and the exit status is not 0
+        """
+        self.logger.info("Run command as ROOT (stream)")
+
+        yield from self._measured_stream(command, True, self.__sudo_stream(command, passwd))
+
+    def __sudo_stream(self, command: str, passwd: Optional[str] = None) -> Iterator[str]:
+        """
+        Yields the lines of a command run in the helper process, with the cached credentials, or with the password.
+        A miss of the cache writes nothing to the standard output, so the command is simply run again with the
+        password.
+        """
+        agent = self.get_agent(passwd=passwd)
+        if agent is not None:
+            yield from self._validate(agent.run(command)).lines()
+            return
+
+        password_line = f"{passwd if passwd is not None else self.passwd or ''}\n".encode()
+        if self.sudo_cache is not None and self.sudo_cache.validate(
+                lambda validation, stdin_data: self._execute(validation, stdin_data=stdin_data, validate=False),
+                password_line
+        ):
+            results: List[CommandResult] = []
+            yield from self._execute_stream(self.sudo_cache.command(command), display_command=command,
+                                            results=results)
+            if self.sudo_cache.observe(results[0], command):
+                self._validate(results[0])
+                return
+
+        sudo_command = f"sudo -S -p '' su -c  \"{command}\""
+        yield from self._execute_stream(sudo_command, display_command=command, stdin_data=password_line)
+
+    def read_file(self, path: Union[str, Path], passwd: Optional[str] = None) -> bytes:
+        """
+        Returns the content of a file. Read as root if the user may not read it.
+
+        Args:
+            path (Union[str, Path]): the path of the file
+            passwd (str, optional): the sudo password. Defaults to None.
+
+        Returns:
+            bytes: the content
+
+        Raises:
+            FileNotFoundError: If the file does not exist
+        """
+        self.logger.info("Reading file")
+
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except PermissionError:
+            self.logger.info("Not permitted to read. Reading as ROOT")
+
+        agent = self.get_agent(passwd=passwd)
+        if agent is not None:
+            return agent.read_file(path)
+
+        return super().read_file(path, passwd=passwd)
+
+    def write_file(self, path: Union[str, Path], data: bytes, passwd: Optional[str] = None) -> None:
+        """
+        Replaces the content of a file. The mode and owner of an existing file are kept.
+
+        The content is written to a temporary file next to the target, which is then renamed over it. If the user may
+        not do that, the file is written as root.
+
+        Args:
+            path (Union[str, Path]): the path of the file
+            data (bytes): the content
+            passwd (str, optional): the sudo password. Defaults to None.
+
+        Raises:
+            CommandError: If the file cannot be written
+        """
+        self.logger.info("Writing file")
+
+        if self.__replace(str(path), data):
+            return
+
+        self.logger.info("Not permitted to write. Writing as ROOT")
+        agent = self.get_agent(passwd=passwd)
+        if agent is not None:
+            agent.write_file(path, data)
+            return
+
+        super().write_file(path, data, passwd=passwd)
+
+    @staticmethod
+    def __replace(path: str, data: bytes) -> bool:
+        """
+        Writes the content to a temporary file next to the target and renames it over the target.
+
+        Returns:
+            bool: False if the user is not permitted to, e.g. to give the new file the owner of the old one.
+        """
+        directory, name = os.path.split(os.path.abspath(path))
+        try:
+            info = os.stat(path)
+        except FileNotFoundError:
+            info = None
+        except PermissionError:
+            return False
+
+        try:
+            descriptor, temp_path = tempfile.mkstemp(prefix=f".{name}.post-", dir=directory)
+        except (PermissionError, FileNotFoundError):
+            return False
+
+        try:
+            with os.fdopen(descriptor, "wb") as f:
+                f.write(data)
+                if info is not None:
+                    temp_info = os.fstat(f.fileno())
+                    if (temp_info.st_uid, temp_info.st_gid) != (info.st_uid, info.st_gid):
+                        os.fchown(f.fileno(), info.st_uid, info.st_gid)
+
+                    os.fchmod(f.fileno(), info.st_mode & 0o7777)
+                else:
+                    os.fchmod(f.fileno(), 0o644)
+
+            os.replace(temp_path, path)
+            temp_path = ""
+            return True
+        except PermissionError:
+            return False
+        finally:
+            if temp_path:
+                os.remove(temp_path)
+
+    def stat(self, path: Union[str, Path], passwd: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Returns information about a path. Falls back to root if the user may not access it.
+
+        Args:
+            path (Union[str, Path]): the path
+            passwd (str, optional): the sudo password. Defaults to None.
+
+        Returns:
+            Dict[str, Any]: size, mode, uid, gid, mtime and is_dir. None if the path does not exist.
+        """
+        try:
+            info = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        except PermissionError:
+            agent = self.get_agent(passwd=passwd)
+            if agent is not None:
+                return agent.stat(path)
+
+            return super().stat(path, passwd=passwd)
+
+        return {
+            "size": info.st_size, "mode": info.st_mode, "uid": info.st_uid, "gid": info.st_gid,
+            "mtime": info.st_mtime, "is_dir": os.path.isdir(path),
+        }
+
+    def exists(self, path: Union[str, Path], passwd: Optional[str] = None) -> bool:
+        """
+        Checks if a path exists. Falls back to root if the user may not access it.
+
+        Args:
+            path (Union[str, Path]): the path
+            passwd (str, optional): the sudo password. Defaults to None.
+
+        Returns:
+            bool: True if the path exists
+        """
+        try:
+            os.stat(path)
+            return True
+        except (FileNotFoundError, NotADirectoryError):
+            return False
+        except PermissionError:
+            return self.stat(path, passwd=passwd) is not None
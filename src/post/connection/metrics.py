@@ -0,0 +1,434 @@
+import bisect
+import json
+import posixpath
+import re
+import threading
+from logging import Logger
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from post.utils.common import GLOBAL_LOGGER
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+SUBCOMMAND_TOOLS = (
+    "apt", "apt-get", "apt-cache", "systemctl", "samba-tool", "dpkg", "journalctl", "usermod", "passwd",
+)
+
+SUDO_WRAPPER = re.compile(r"^sudo (?:-\S+ (?:'' )?)*su -c \"(.*)\"$", re.S)
+ASSIGNMENT = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*=")
+
+
+def command_family(command: str) -> str:
+    """
+    Returns the family of a command: the program and, for tools with subcommands, the subcommand.
+
+    `sudo` (with its options, or wrapped around `su -c "..."`) and leading environment assignments are skipped, so
+    `DEBIAN_FRONTEND=noninteractive apt install htop -y` and `sudo -S -p '' su -c "apt install htop"` are both
+    `apt install`.
+
+    Args:
+        command (str): the shell command
+
+    Returns:
+        str: the family, e.g. `apt list`, `systemctl start`, `cat`
+    """
+    command = command.strip()
+    match = SUDO_WRAPPER.match(command)
+    if match is not None:
+        command = match.group(1)
+
+    words = command.split()
+    while words and (ASSIGNMENT.match(words[0]) or words[0] == "sudo" or words[0].startswith("-")):
+        words.pop(0)
+
+    if not words:
+        return "shell"
+
+    program = posixpath.basename(words[0])
+    if program in SUBCOMMAND_TOOLS and len(words) > 1 and not words[1].startswith("-"):
+        return f"{program} {words[1]}"
+
+    return program
+
+
+def host_label(connector: Any) -> str:
+    """
+    Returns the host label of a connector: `address:port` or `localhost` for connectors without an address.
+
+    Args:
+        connector (ModelConnector): the connector
+
+    Returns:
+        str: the label
+    """
+    address = getattr(connector, "address", None)
+    if address is None:
+        return "localhost"
+
+    port = getattr(connector, "port", None)
+    if port is None:
+        return str(address)
+
+    return f"{address}:{port}"
+
+
+class CommandEvent:
+    """
+    A finished command, as given to the hooks of `MetricsRegistry`.
+
+    Args:
+        host (str): The host label (`address:port`).
+        family (str): The command family. See `command_family`.
+        sudo (bool): Whether the command ran as root.
+        seconds (float): Wall time of the command.
+        bytes_received (int): Bytes of standard output and standard error, as transferred.
+        bytes_sent (int): Bytes written to the standard input.
+        exit_code (int, optional): The exit status. None if the command raised.
+        error (str, optional): The name of the exception raised. Defaults to None.
+        compressed (bool): Whether the output was compressed by the host. Defaults to False.
+        bytes_saved (int): Bytes compression kept from being transferred. Defaults to 0.
+        seconds_saved (float): Estimated seconds compression saved. See `CompressionPolicy`. Defaults to 0.
+    """
+
+    def __init__(self, host: str, family: str, sudo: bool, seconds: float, bytes_received: int = 0,
+                 bytes_sent: int = 0, exit_code: Optional[int] = None, error: Optional[str] = None,
+                 compressed: bool = False, bytes_saved: int = 0, seconds_saved: float = 0.0) -> None:
+        self.host = host
+        self.family = family
+        self.sudo = sudo
+        self.seconds = seconds
+        self.bytes_received = bytes_received
+        self.bytes_sent = bytes_sent
+        self.exit_code = exit_code
+        self.error = error
+        self.compressed = compressed
+        self.bytes_saved = bytes_saved
+        self.seconds_saved = seconds_saved
+
+    def __str__(self) -> str:
+        return (f"{self.__class__.__name__}(host: {self.host}, family: {self.family}, sudo: {self.sudo}, "
+                f"seconds: {self.seconds:.3f}, exit_code: {self.exit_code})")
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    @property
+    def failed(self) -> bool:
+        """True if the command raised or exited with a non-zero status"""
+        return self.error is not None or self.exit_code != 0
+
+
+class Histogram:
+    """
+    Counts of observed values per bucket, as Prometheus keeps them.
+
+    Args:
+        buckets (Sequence[float]): Upper bounds of the buckets in increasing order. Defaults to `BUCKETS`.
+    """
+
+    def __init__(self, buckets: Sequence[float] = BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(count: {self.count}, sum: {self.sum:.3f})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def observe(self, value: float) -> None:
+        """Adds a value"""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """
+        Returns the cumulative counts per upper bound, `+Inf` last.
+
+        Returns:
+            List[Tuple[str, int]]: (upper bound, number of values less than or equal to it)
+        """
+        result = []
+        total = 0
+        for bound, count in zip([*map(repr, self.buckets), "+Inf"], self.counts):
+            total += count
+            result.append((bound, total))
+
+        return result
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a quantile as the upper bound of the bucket it falls in. The maximum for the last bucket.
+
+        Args:
+            q (float): the quantile between 0 and 1
+
+        Returns:
+            float: the estimation. 0 if nothing was observed.
+        """
+        if self.count == 0:
+            return 0.0
+
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return min(bound, self.max)
+
+        return self.max
+
+
+class CommandStats:
+    """
+    Aggregated metrics of a command family on a host.
+
+    Args:
+        buckets (Sequence[float]): Latency histogram buckets. Defaults to `BUCKETS`.
+    """
+
+    def __init__(self, buckets: Sequence[float] = BUCKETS) -> None:
+        self.seconds = Histogram(buckets)
+        self.commands = 0
+        self.sudo = 0
+        self.errors = 0
+        self.retries = 0
+        self.sudo_cache_hits = 0
+        self.sudo_cache_fallbacks = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.compressed = 0
+        self.bytes_saved = 0
+        self.seconds_saved = 0.0
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(commands: {self.commands}, errors: {self.errors})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def add(self, event: CommandEvent) -> None:
+        """Adds a finished command"""
+        self.seconds.observe(event.seconds)
+        self.commands += 1
+        self.sudo += int(event.sudo)
+        self.errors += int(event.failed)
+        self.bytes_received += event.bytes_received
+        self.bytes_sent += event.bytes_sent
+        if event.compressed:
+            self.compressed += 1
+            self.bytes_saved += event.bytes_saved
+            self.seconds_saved += event.seconds_saved
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Returns the metrics as a dictionary.
+
+        Returns:
+            Dict[str, Any]: counters and latency (sum, mean, p50, p95, max) in seconds
+        """
+        return {
+            "commands": self.commands,
+            "sudo": self.sudo,
+            "errors": self.errors,
+            "retries": self.retries,
+            "sudo_cache_hits": self.sudo_cache_hits,
+            "sudo_cache_fallbacks": self.sudo_cache_fallbacks,
+            "bytes_received": self.bytes_received,
+            "bytes_sent": self.bytes_sent,
+            "compressed": self.compressed,
+            "bytes_saved": self.bytes_saved,
+            "seconds_saved": self.seconds_saved,
+            "seconds": {
+                "sum": self.seconds.sum,
+                "mean": self.seconds.sum / self.seconds.count if self.seconds.count else 0.0,
+                "p50": self.seconds.quantile(0.5),
+                "p95": self.seconds.quantile(0.95),
+                "max": self.seconds.max,
+            },
+        }
+
+
+def escape_label(value: str) -> str:
+    """Escapes a Prometheus label value"""
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """
+    Collects the metrics of the commands run by connectors, per host and command family.
+
+    Every connector records into `GLOBAL_METRICS` unless given another registry (or None to record nothing).
+    Hooks are called with each `CommandEvent` right after the command finished, on the thread that ran it.
+
+    Args:
+        buckets (Sequence[float]): Latency histogram buckets in seconds. Defaults to `BUCKETS`.
+        logger (Logger, optional): The logger to log. Defaults to None.
+    """
+
+    def __init__(self, buckets: Sequence[float] = BUCKETS, logger: Optional[Logger] = None) -> None:
+        if logger is None:
+            self.logger = GLOBAL_LOGGER
+        else:
+            self.logger = logger
+
+        self.buckets = tuple(buckets)
+        self.hooks: List[Callable[[CommandEvent], None]] = []
+        self._lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str], CommandStats] = {}
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(series: {len(self._stats)}, hooks: {len(self.hooks)})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def add_hook(self, hook: Callable[[CommandEvent], None]) -> None:
+        """Registers a function called with each CommandEvent"""
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook: Callable[[CommandEvent], None]) -> None:
+        """Unregisters a hook"""
+        self.hooks.remove(hook)
+
+    def __stats(self, host: str, family: str) -> CommandStats:
+        """Returns the stats of a host and family. Must be called with the lock held."""
+        key = (host, family)
+        if key not in self._stats:
+            self._stats[key] = CommandStats(self.buckets)
+
+        return self._stats[key]
+
+    def record(self, event: CommandEvent) -> None:
+        """
+        Adds a finished command and calls the hooks. A failing hook is logged and ignored.
+
+        Args:
+            event (CommandEvent): the command
+        """
+        with self._lock:
+            self.__stats(event.host, event.family).add(event)
+
+        for hook in list(self.hooks):
+            try:
+                hook(event)
+            except Exception as e:
+                self.logger.warning(f"Metrics hook failed: {e}")
+
+    def record_retry(self, host: str, family: str) -> None:
+        """
+        Counts a retry of a command after a transport failure.
+
+        Args:
+            host (str): the host label
+            family (str): the command family
+        """
+        with self._lock:
+            self.__stats(host, family).retries += 1
+
+    def record_sudo_cache(self, host: str, family: str, hit: bool) -> None:
+        """
+        Counts a command run with the cached sudo credentials (a hit), or run again with the password (a fallback).
+        See `SudoCache`.
+
+        Args:
+            host (str): the host label
+            family (str): the command family
+            hit (bool): True for a hit, False for a fallback
+        """
+        with self._lock:
+            stats = self.__stats(host, family)
+            if hit:
+                stats.sudo_cache_hits += 1
+            else:
+                stats.sudo_cache_fallbacks += 1
+
+    def reset(self) -> None:
+        """Drops every collected metric. Hooks are kept."""
+        with self._lock:
+            self._stats.clear()
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Returns the metrics per host and family.
+
+        Returns:
+            Dict[str, Dict[str, Dict[str, Any]]]: `{host: {family: CommandStats.summary()}}`
+        """
+        result: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        with self._lock:
+            for (host, family), stats in sorted(self._stats.items()):
+                result.setdefault(host, {})[family] = stats.summary()
+
+        return result
+
+    def to_json(self, indent: Optional[int] = None) -> str:
+        """
+        Returns `summary` as JSON.
+
+        Args:
+            indent (int, optional): the indentation. Defaults to None (one line).
+
+        Returns:
+            str: the JSON document
+        """
+        return json.dumps(self.summary(), indent=indent)
+
+    def to_prometheus(self, prefix: str = "post") -> str:
+        """
+        Returns the metrics in the Prometheus text exposition format.
+
+        Args:
+            prefix (str): the prefix of the metric names. Defaults to `post`.
+
+        Returns:
+            str: the exposition
+        """
+        with self._lock:
+            series = [(host, family, stats) for (host, family), stats in sorted(self._stats.items())]
+
+        counters = [
+            ("commands_total", "Commands run", lambda s: s.commands),
+            ("sudo_commands_total", "Commands run as root", lambda s: s.sudo),
+            ("command_errors_total", "Commands that raised or exited with a non-zero status", lambda s: s.errors),
+            ("command_retries_total", "Commands retried after a transport failure", lambda s: s.retries),
+            ("sudo_cache_hits_total", "Commands run with the cached sudo credentials", lambda s: s.sudo_cache_hits),
+            ("sudo_cache_fallbacks_total", "Commands run again with the sudo password after the cache expired",
+             lambda s: s.sudo_cache_fallbacks),
+            ("command_received_bytes_total", "Bytes of standard output and error received",
+             lambda s: s.bytes_received),
+            ("command_sent_bytes_total", "Bytes written to the standard input", lambda s: s.bytes_sent),
+            ("compressed_commands_total", "Commands whose output was compressed", lambda s: s.compressed),
+            ("compression_saved_bytes_total", "Bytes compression kept from being transferred",
+             lambda s: s.bytes_saved),
+            ("compression_saved_seconds_total", "Estimated seconds compression saved", lambda s: s.seconds_saved),
+        ]
+
+        lines = [
+            f"# HELP {prefix}_command_seconds Wall time of commands",
+            f"# TYPE {prefix}_command_seconds histogram",
+        ]
+        for host, family, stats in series:
+            labels = f"host=\"{escape_label(host)}\",family=\"{escape_label(family)}\""
+            for bound, count in stats.seconds.cumulative():
+                lines.append(f"{prefix}_command_seconds_bucket{{{labels},le=\"{bound}\"}} {count}")
+
+            lines.append(f"{prefix}_command_seconds_sum{{{labels}}} {stats.seconds.sum!r}")
+            lines.append(f"{prefix}_command_seconds_count{{{labels}}} {stats.seconds.count}")
+
+        for name, description, value in counters:
+            lines.append(f"# HELP {prefix}_{name} {description}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            for host, family, stats in series:
+                labels = f"host=\"{escape_label(host)}\",family=\"{escape_label(family)}\""
+                lines.append(f"{prefix}_{name}{{{labels}}} {value(stats)}")
+
+        return "\n".join(lines) + "\n"
+
+
+GLOBAL_METRICS = MetricsRegistry()
@@ -1,15 +1,217 @@
+import base64
+import shlex
+import time
 from abc import ABC, abstractmethod
-from typing import Optional
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
 
-from paramiko.channel import ChannelFile
+from post.connection.agent import AgentSession
+from post.connection.command_result import CommandResult
+from post.connection.metrics import GLOBAL_METRICS, CommandEvent, MetricsRegistry, command_family, host_label
+from post.connection.stream import iter_lines
+from post.utils.error import CommandError
+from post.utils.tracing import GLOBAL_TRACER
 
 
 class ModelConnector(ABC):
+    metrics: Optional[MetricsRegistry] = GLOBAL_METRICS
+
+    def _record(self, command: str, sudo: bool, seconds: float, result: Optional[CommandResult] = None,
+                bytes_received: int = 0, error: Optional[BaseException] = None, bytes_saved: Optional[int] = None,
+                seconds_saved: float = 0.0) -> None:
+        """
+        Records a finished command in the metrics registry of the connector.
+
+        Without a result, `bytes_saved` is given (even 0) if the output was compressed.
+        """
+        if self.metrics is None:
+            return
+
+        if result is not None:
+            event = CommandEvent(host_label(self), command_family(command), sudo, seconds,
+                                 bytes_received=result.bytes_received, bytes_sent=result.bytes_sent,
+                                 exit_code=result.exit_code, compressed=result.compressed_bytes is not None,
+                                 bytes_saved=result.bytes_saved, seconds_saved=result.seconds_saved)
+        else:
+            event = CommandEvent(host_label(self), command_family(command), sudo, seconds,
+                                 bytes_received=bytes_received, exit_code=None if error is not None else 0,
+                                 error=type(error).__name__ if error is not None else None,
+                                 compressed=bytes_saved is not None, bytes_saved=bytes_saved or 0,
+                                 seconds_saved=seconds_saved)
+
+        self.metrics.record(event)
+
+    def _record_retry(self, command: str) -> None:
+        """Counts a retry of a command in the metrics registry of the connector"""
+        if self.metrics is not None:
+            self.metrics.record_retry(host_label(self), command_family(command))
+
+    def _record_sudo_cache(self, command: str, hit: bool) -> None:
+        """Counts a hit or a fallback of the sudo cache in the metrics registry of the connector"""
+        if self.metrics is not None:
+            self.metrics.record_sudo_cache(host_label(self), command_family(command), hit)
+
+    def _measured(self, command: str, sudo: bool, call: Callable[[], CommandResult]) -> CommandResult:
+        """Calls `call`, which runs the command, in a span and records its result or error"""
+        start = time.monotonic()
+        try:
+            with GLOBAL_TRACER.span(command_family(command), "connector", host=host_label(self), sudo=sudo,
+                                    **GLOBAL_TRACER.command_attributes(command)) as span:
+                result = call()
+                if span is not None:
+                    span.attributes["exit_code"] = result.exit_code
+        except Exception as e:
+            self._record(command, sudo, time.monotonic() - start, error=e)
+            raise
+
+        self._record(command, sudo, time.monotonic() - start, result=result)
+        return result
+
+    def _measured_many(self, commands: List[str], sudo: bool,
+                       call: Callable[[], List[CommandResult]]) -> List[CommandResult]:
+        """Calls `call`, which runs the commands, in a span and records each result with its own wall time"""
+        start = time.monotonic()
+        try:
+            with GLOBAL_TRACER.span(f"{len(commands)} commands", "connector", host=host_label(self), sudo=sudo,
+                                    **GLOBAL_TRACER.command_attributes("\n".join(commands))):
+                results = call()
+        except Exception as e:
+            for command in commands:
+                self._record(command, sudo, time.monotonic() - start, error=e)
+            raise
+
+        for command, result in zip(commands, results):
+            self._record(command, sudo, result.wall_time, result=result)
+
+        return results
+
+    def _measured_stream(self, command: str, sudo: bool, lines: Iterable[str],
+                         transfer: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """
+        Yields the lines of a running command in a span and records it once the lines are exhausted.
+
+        If the output was compressed, `lines` fills `transfer` with `compressed_bytes` and `seconds_saved` by the
+        time it is exhausted.
+        """
+        start = time.monotonic()
+        received = 0
+        span = GLOBAL_TRACER.begin(command_family(command), "connector", host=host_label(self), sudo=sudo,
+                                   **GLOBAL_TRACER.command_attributes(command))
+        try:
+            for line in GLOBAL_TRACER.iterate(span, lines):
+                received += len(line) + 1
+                yield line
+        except Exception as e:
+            self._record(command, sudo, time.monotonic() - start, bytes_received=received, error=e)
+            raise
+
+        if transfer:
+            self._record(command, sudo, time.monotonic() - start, bytes_received=transfer["compressed_bytes"],
+                         bytes_saved=received - transfer["compressed_bytes"],
+                         seconds_saved=transfer["seconds_saved"])
+        else:
+            self._record(command, sudo, time.monotonic() - start, bytes_received=received)
 
     @abstractmethod
-    def run(self, command: str) -> ChannelFile:
+    def run(self, command: str) -> CommandResult:
         """Run a command"""
 
     @abstractmethod
-    def sudo_run(self, command: str, passwd: Optional[str] = None) -> ChannelFile:
+    def sudo_run(self, command: str, passwd: Optional[str] = None) -> CommandResult:
         """Run a command as root"""
+
+    def run_stream(self, command: str) -> Iterator[str]:
+        """
+        Run a command and yield its standard output line by line.
+
+        Connectors should override it to yield lines while the command is still running.
+        """
+        yield from iter_lines([self.run(command).read()])
+
+    def sudo_run_stream(self, command: str, passwd: Optional[str] = None) -> Iterator[str]:
+        """
+        Run a command as root and yield its standard output line by line.
+
+        Connectors should override it to yield lines while the command is still running.
+        """
+        yield from iter_lines([self.sudo_run(command, passwd=passwd).read()])
+
+    def run_many(self, commands: List[str]) -> List[CommandResult]:
+        """
+        Run independent commands and return their results in order.
+
+        Connectors should override it to run the commands concurrently.
+        """
+        return [self.run(command) for command in commands]
+
+    def sudo_run_many(self, commands: List[str], passwd: Optional[str] = None) -> List[CommandResult]:
+        """
+        Run independent commands as root and return their results in order.
+
+        Connectors should override it to run the commands concurrently.
+        """
+        return [self.sudo_run(command, passwd=passwd) for command in commands]
+
+    def get_agent(self, passwd: Optional[str] = None) -> Optional[AgentSession]:
+        """
+        Returns the remote helper agent if the connector runs one. See `AgentSession`.
+
+        Managers use the agent for file, user and package queries when it is available and fall back to shell
+        commands otherwise.
+        """
+        return None
+
+    def read_file(self, path: Union[str, Path], passwd: Optional[str] = None) -> bytes:
+        """
+        Returns the content of a file. Read as root.
+
+        Connectors should override it with a file transfer. This default runs `cat`.
+
+        Raises:
+            FileNotFoundError: If the file cannot be read
+        """
+        result = self.sudo_run(f"cat {shlex.quote(str(path))}", passwd=passwd)
+        if not result.ok:
+            raise FileNotFoundError(f"Cannot read {path}: {result.stderr.decode(errors='replace').strip()}")
+
+        return result.read()
+
+    def write_file(self, path: Union[str, Path], data: bytes, passwd: Optional[str] = None) -> None:
+        """
+        Replaces the content of a file. Written as root.
+
+        Connectors should override it with a file transfer. This default decodes base64 on the command line, so the
+        content is limited by the maximum length of a command.
+
+        Raises:
+            CommandError: If the file cannot be written
+        """
+        encoded = base64.b64encode(data).decode()
+        self.sudo_run(f"echo {encoded} | base64 -d > {shlex.quote(str(path))}", passwd=passwd).check()
+
+    def exists(self, path: Union[str, Path], passwd: Optional[str] = None) -> bool:
+        """
+        Checks if a path exists, as the user.
+
+        Connectors should override it with a file transfer protocol. This default runs `test -e`.
+        """
+        try:
+            return self.run(f"test -e {shlex.quote(str(path))}").ok
+        except CommandError:
+            return False
+
+    def stat(self, path: Union[str, Path], passwd: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Returns size, mode, uid, gid, mtime and is_dir of a path. None if it does not exist.
+
+        Connectors should override it with a file transfer protocol. This default runs `stat`.
+        """
+        result = self.sudo_run(f"stat -c '%s %f %u %g %Y %F' {shlex.quote(str(path))}", passwd=passwd)
+        if not result.ok:
+            return None
+
+        size, mode, uid, gid, mtime, file_type = result.read().decode().strip().split(" ", 5)
+        return {
+            "size": int(size), "mode": int(mode, 16), "uid": int(uid), "gid": int(gid), "mtime": float(mtime),
+            "is_dir": file_type == "directory",
+        }
@@ -0,0 +1,535 @@
+import hashlib
+import os
+import shlex
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logging import Logger
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from post.connection.command_result import CommandResult
+from post.connection.compression import (GLOBAL_COMPRESSION, CompressionPolicy, Decompressor, split_status,
+                                         wrap_command)
+from post.connection.metrics import GLOBAL_METRICS, MetricsRegistry, host_label
+from post.connection.model_connector import ModelConnector
+from post.connection.output import run_process
+from post.connection.stream import CHUNK_SIZE, iter_lines
+from post.connection.sudo_cache import SudoCache
+from post.utils.common import GLOBAL_LOGGER
+from post.utils.error import CommandError
+
+ASKPASS_SCRIPT = "#!/bin/sh\nprintf '%s\\n' \"$POST_SSH_PASSWORD\"\n"
+
+
+def default_control_dir() -> Path:
+    """The directory of the control sockets, private to the user and shared by all of their processes"""
+    return Path(tempfile.gettempdir()) / f"post-ssh-{os.getuid()}"
+
+
+class OpenSSHConnector(ModelConnector):
+    """
+    A connector running commands with the system `ssh` binary over a multiplexed master connection.
+
+    The first command starts a master connection (`ControlMaster`) listening on a control socket. Every command is
+    then a new session on it, without a TCP connection, key exchange or authentication of its own. The master
+    outlives the process for `control_persist` seconds, so other processes connecting to the same host, port and
+    user reuse it.
+
+    The password is only given to the master, through `SSH_ASKPASS`, and never shows up on a command line.
+
+    Args:
+        address (str): The address of the server.
+        port (int): The port of the server.
+        user (str): The username to use.
+        passwd (str, optional): The password, used to log in and for sudo. Defaults to None.
+        private_key (Union[Path, str], optional): A private key to log in with (`ssh -i`). Defaults to None.
+        logger (Logger, optional): The logger to log. Defaults to None.
+        fail_fast (bool): Raise CommandError as soon as a command exits with a non-zero status. Defaults to False.
+        timeout (float, optional): Seconds to wait for a command to finish. Defaults to None (no limit).
+        control_dir (Union[Path, str], optional): The directory of the control sockets. Defaults to
+            `default_control_dir()`.
+        control_persist (int): Seconds the master stays up after its last session. Defaults to 600.
+        max_channels (int): Maximum number of sessions opened at once by `run_many`. OpenSSH allows 10 sessions per
+            connection by default (`MaxSessions`). Defaults to 8.
+        options (Dict[str, str], optional): Other `ssh -o` options, e.g. `{"UserKnownHostsFile": "/dev/null"}`.
+            Defaults to None.
+        ssh (str): The ssh binary. Defaults to `ssh`.
+        lazy (bool): Start the master on the first command instead of now. Defaults to False.
+        cache_sudo (bool): Validate sudo once and run privileged commands with `sudo -n`. Defaults to False.
+        metrics (MetricsRegistry, optional): The registry to record command metrics into. None records nothing.
+            Defaults to GLOBAL_METRICS.
+        compression (CompressionPolicy, optional): Have the host compress large command outputs and decompress
+            them here. See `CompressionPolicy`. To compress the whole connection instead, give
+            `options={"Compression": "yes"}`. Defaults to None.
+
+    Raises:
+        ValueError: If the connection fails.
+    """
+
+    def __init__(self, address: str, port: int, user: str, passwd: Optional[str] = None,
+                 private_key: Optional[Union[Path, str]] = None, logger: Optional[Logger] = None,
+                 fail_fast: bool = False, timeout: Optional[float] = None,
+                 control_dir: Optional[Union[Path, str]] = None, control_persist: int = 600, max_channels: int = 8,
+                 options: Optional[Dict[str, str]] = None, ssh: str = "ssh", lazy: bool = False,
+                 cache_sudo: bool = False, metrics: Optional[MetricsRegistry] = GLOBAL_METRICS,
+                 compression: Optional[CompressionPolicy] = None) -> None:
+        if logger is None:
+            self.logger = GLOBAL_LOGGER
+        else:
+            self.logger = logger
+
+        self.address = address
+        self.port = port
+        self.user = user
+        self.passwd = passwd
+        self.private_key = private_key
+        self.fail_fast = fail_fast
+        self.timeout = timeout
+        self.control_dir = Path(control_dir) if control_dir is not None else default_control_dir()
+        self.control_persist = control_persist
+        self.max_channels = max_channels
+        self.options = options or {}
+        self.ssh = ssh
+        self.sudo_cache: Optional[SudoCache] = None
+        if cache_sudo:
+            self.sudo_cache = SudoCache(logger=self.logger, on_observe=self._record_sudo_cache)
+
+        self.metrics = metrics
+        self.compression = compression
+        self.connect_lock = threading.Lock()
+
+        # ssh's own %C is not known before connecting, so the socket name is hashed the same way here
+        digest = hashlib.sha1(f"{address}:{port}:{user}".encode()).hexdigest()[:16]
+        self.control_path = self.control_dir / f"{digest}.sock"
+
+        if not lazy:
+            self.connect()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(address: {self.address}:{self.port}, user: {self.user})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def _base_command(self, defaults: Optional[Dict[str, Any]] = None) -> List[str]:
+        """
+        The ssh command line up to the destination, without the remote command.
+
+        ssh keeps the first value it is given for an option, so the user's `options` come before the defaults and
+        override them.
+
+        Args:
+            defaults (Dict[str, Any], optional): defaults added to `StrictHostKeyChecking` and `ServerAliveInterval`.
+                Defaults to None.
+        """
+        arguments = [self.ssh, "-p", str(self.port), "-o", f"ControlPath={self.control_path}"]
+        if self.private_key is not None:
+            arguments.extend(["-i", str(self.private_key)])
+
+        for key, value in self.options.items():
+            arguments.extend(["-o", f"{key}={value}"])
+
+        options = {"StrictHostKeyChecking": "accept-new", "ServerAliveInterval": 30, **(defaults or {})}
+        for key, value in options.items():
+            arguments.extend(["-o", f"{key}={value}"])
+
+        arguments.append(f"{self.user}@{self.address}")
+        return arguments
+
+    @property
+    def connected(self) -> bool:
+        """True if a master connection is up for this host, whichever process started it"""
+        if not self.control_path.exists():
+            return False
+
+        arguments = self._base_command()
+        arguments[1:1] = ["-O", "check"]
+        return subprocess.run(arguments, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL).returncode == 0
+
+    def connect(self) -> None:
+        """
+        Starts the master connection if there is none.
+
+        Raises:
+            ValueError: If the connection fails.
+        """
+        with self.connect_lock:
+            if self.connected:
+                return
+
+            self.__start_master()
+
+    def __start_master(self) -> None:
+        """Starts a master connection in the background, authenticated with the key or the password"""
+        self.logger.info("Connecting")
+
+        self.control_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        # a socket left by a master that died would keep the new one from listening
+        self.control_path.unlink(missing_ok=True)
+        environment = dict(os.environ)
+        if self.passwd is not None:
+            askpass = self.control_dir / "askpass.sh"
+            if not askpass.exists():
+                askpass.write_text(ASKPASS_SCRIPT)
+                askpass.chmod(0o700)
+
+            environment.update(SSH_ASKPASS=str(askpass), SSH_ASKPASS_REQUIRE="force",
+                               POST_SSH_PASSWORD=self.passwd)
+
+        arguments = self._base_command({"ControlPersist": self.control_persist, "ConnectTimeout": 10,
+                                        "NumberOfPasswordPrompts": 1})
+        arguments[1:1] = ["-M", "-N", "-f"]
+
+        # `-f` leaves the master in the background after authentication. It must not inherit pipes, or reading
+        # them would wait for the master to exit.
+        with tempfile.TemporaryFile() as errors:
+            result = subprocess.run(arguments, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=errors,
+                                    env=environment, start_new_session=True)
+            if result.returncode != 0:
+                errors.seek(0)
+                message = errors.read().decode(errors="replace").strip()
+                self.logger.error(message)
+                raise ValueError(f"Cannot connect to {self.address}:{self.port}: {message}")
+
+    def ensure_connected(self) -> None:
+        """
+        Starts the master connection if there is none, so the first command does not pay for it.
+
+        Raises:
+            ValueError: If the connection fails.
+        """
+        self.connect()
+
+    def close(self) -> None:
+        """
+        Nothing to close: the master is shared with other connectors and processes and exits by itself
+        `control_persist` seconds after its last session. See `stop`.
+        """
+
+    def stop(self) -> None:
+        """Stops the master connection, closing the sessions of every connector using it"""
+        self.logger.info("Stopping the master connection")
+
+        arguments = self._base_command()
+        arguments[1:1] = ["-O", "exit"]
+        subprocess.run(arguments, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def _command(self, command: str) -> List[str]:
+        """The ssh command line running a command as a session of the master"""
+        arguments = self._base_command()
+        arguments[1:1] = ["-o", "ControlMaster=no", "-o", "BatchMode=yes", "-T"]
+        arguments.extend(["--", command])
+        return arguments
+
+    def _validate(self, result: CommandResult) -> CommandResult:
+        """
+        Validates the command. Checks the exit status if `fail_fast` is set.
+
+        Raises:
+            CommandError: If `fail_fast` is set and the exit status is not 0
+        """
+        if self.fail_fast and not result.ok:
+            self.logger.error(result.stderr.decode(errors="replace"))
+            result.check()
+
+        return result
+
+    def _compression_policy(self) -> CompressionPolicy:
+        """Returns the compression policy, `GLOBAL_COMPRESSION` if none was given. It is not kept for later calls."""
+        if self.compression is None:
+            return GLOBAL_COMPRESSION
+
+        return self.compression
+
+    def _codec(self, command: str, compress: Optional[bool] = None) -> Optional[str]:
+        """
+        Returns the codec the output of a command is compressed with, or None to run it as it is.
+
+        Args:
+            command (str): the command, without the `sudo` wrapper
+            compress (bool, optional): True or False to force the choice. Defaults to None (the policy decides).
+        """
+        if compress is False or (self.compression is None and not compress):
+            return None
+
+        compression = self._compression_policy()
+        if compress is None and not compression.wanted(host_label(self), command):
+            return None
+
+        return compression.codec_for(host_label(self), lambda probe: self._execute(probe, validate=False).ok)
+
+    def _execute(self, command: str, display_command: Optional[str] = None, stdin_data: Optional[bytes] = None,
+                 validate: bool = True, codec: Optional[str] = None) -> CommandResult:
+        """
+        Runs a command on the host and collects its outputs and exit status.
+
+        Args:
+            command (str): the shell command to execute
+            display_command (str, optional): the command to be kept in the result. Defaults to `command`.
+            stdin_data (bytes, optional): data written to the standard input. Defaults to None.
+            validate (bool): check the exit status if `fail_fast` is set. Defaults to True.
+            codec (str, optional): compress the standard output on the host with this codec. Defaults to None.
+
+        Raises:
+            CommandError: If the command does not finish in time, or `fail_fast` is set and the exit status is not 0
+            ValueError: If the connection fails.
+        """
+        if not self.control_path.exists():
+            self.connect()
+
+        display_command = display_command or command
+        if codec is not None:
+            command = wrap_command(command, codec, self._compression_policy().level)
+
+        start = time.monotonic()
+        try:
+            exit_code, stdout, stderr = run_process(self._command(command), stdin_data=stdin_data or b"",
+                                                    timeout=self.timeout)
+            # 255 is ssh's own failure, e.g. the master went away between the check and the command
+            if exit_code == 255 and not self.connected:
+                self.logger.warning("Master connection was lost, reconnecting")
+                self.connect()
+                exit_code, stdout, stderr = run_process(self._command(command), stdin_data=stdin_data or b"",
+                                                        timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            self.logger.error(f"Command did not finish in {self.timeout} seconds")
+            raise CommandError(f"Command did not finish in {self.timeout} seconds")
+
+        command_result = CommandResult(display_command, exit_code, stdout, stderr, time.monotonic() - start,
+                                       bytes_sent=len(stdin_data or b""))
+        if codec is not None:
+            command_result = self._compression_policy().unwrap(host_label(self), command_result, codec)
+        elif self.compression is not None:
+            self.compression.observe(host_label(self), display_command, command_result)
+
+        if validate:
+            self._validate(command_result)
+
+        return command_result
+
+    def _execute_stream(self, command: str, display_command: Optional[str] = None,
+                        stdin_data: Optional[bytes] = None, codec: Optional[str] = None,
+                        transfer: Optional[Dict[str, Any]] = None,
+                        results: Optional[List[CommandResult]] = None) -> Iterator[str]:
+        """
+        Runs a command on the host and yields its standard output line by line while it is running.
+
+        With a `codec`, the output is compressed on the host and decompressed chunk by chunk as it arrives, and
+        `transfer` is filled with `compressed_bytes` and `seconds_saved` once it is over. If `results` is given, the
+        result (without the standard output) is appended to it instead of being validated.
+
+        Raises:
+            CommandError: If `fail_fast` is set and the exit status is not 0
+        """
+        if not self.control_path.exists():
+            self.connect()
+
+        display_command = display_command or command
+        decompressor = None
+        if codec is not None:
+            command = wrap_command(command, codec, self._compression_policy().level)
+            decompressor = Decompressor(codec)
+
+        start = time.monotonic()
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(self._command(command), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                       stderr=stderr)
+            stdin, stdout = process.stdin, process.stdout
+            if stdin is None or stdout is None:
+                process.kill()
+                raise CommandError("Could not open the pipes of ssh")
+
+            try:
+                try:
+                    if stdin_data:
+                        stdin.write(stdin_data)
+                    stdin.close()
+                except BrokenPipeError:
+                    pass
+
+                chunks = iter(lambda: os.read(stdout.fileno(), CHUNK_SIZE), b"")
+                if decompressor is not None:
+                    chunks = decompressor.iterate(chunks)
+                yield from iter_lines(chunks)
+                exit_code = process.wait()
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                stdout.close()
+
+            stderr.seek(0)
+            errors = stderr.read()
+            if decompressor is not None:
+                errors, status = split_status(errors)
+                exit_code = status if status is not None else exit_code or -1
+                if transfer is not None:
+                    transfer.update(compressed_bytes=decompressor.compressed_bytes,
+                                    seconds_saved=self._compression_policy().saved_seconds(
+                                        host_label(self), decompressor, time.monotonic() - start))
+
+            if results is not None:
+                results.append(CommandResult(display_command, exit_code, b"", errors, 0.0))
+            elif self.fail_fast and exit_code != 0:
+                CommandResult(display_command, exit_code, b"", errors, 0.0).check()
+
+    def _password_line(self, passwd: Optional[str]) -> bytes:
+        return f"{passwd if passwd is not None else self.passwd or ''}\n".encode()
+
+    def run(self, command: str, compress: Optional[bool] = None) -> CommandResult:
+        """
+        Runs a command with user privileges
+
+        Args:
+            command (str): the shell command to execute
+            compress (bool, optional): compress the output on the host, or not. Defaults to None (the compression
+                policy decides).
+
+        Raises:
+            CommandError: If `fail_fast` is set and the exit status is not 0
+        """
+        self.logger.info("Run command")
+        return self._measured(command, False, lambda: self._execute(command, codec=self._codec(command, compress)))
+
+    def sudo_run(self, command: str, passwd: Optional[str] = None, compress: Optional[bool] = None) -> CommandResult:
+        """
+        Runs a command with root privileges
+
+        Args:
+            command (str): the shell command to execute
+            passwd (str, optional): the password to use. Defaults to None.
+            compress (bool, optional): compress the output on the host, or not. Defaults to None (the compression
+                policy decides).
+
+        Raises:
+            CommandError: If `fail_fast` is set and the exit status is not 0
+        """
+        self.logger.info("Run command as ROOT")
+        return self._measured(command, True, lambda: self.__sudo_run(command, passwd, compress))
+
+    def __sudo_run(self, command: str, passwd: Optional[str] = None, compress: Optional[bool] = None) -> CommandResult:
+        """Runs a command with root privileges with the cached credentials or the password"""
+        password_line = self._password_line(passwd)
+        codec = self._codec(command, compress)
+        if self.sudo_cache is not None:
+            result = self.sudo_cache.run(
+                lambda cached_command, stdin_data: self._execute(cached_command, display_command=command,
+                                                                 stdin_data=stdin_data, validate=False, codec=codec),
+                command, password_line
+            )
+            if result is not None:
+                return self._validate(result)
+
+        return self._execute(f"sudo -S -p '' su -c \"{command}\"", display_command=command, stdin_data=password_line,
+                             codec=codec)
+
+    def run_stream(self, command: str, compress: Optional[bool] = None) -> Iterator[str]:
+        """
+        Runs a command with user privileges and yields its standard output line by line while it is running.
+
+        Raises:
+            CommandError: If `fail_fast` is set and the exit status is not 0
+        """
+        self.logger.info("Run command (stream)")
+
+        transfer: Dict[str, Any] = {}
+        yield from self._measured_stream(
+            command, False,
+            self._execute_stream(command, codec=self._codec(command, compress), transfer=transfer), transfer
+        )
+
+    def sudo_run_stream(self, command: str, passwd: Optional[str] = None,
+                        compress: Optional[bool] = None) -> Iterator[str]:
+        """
+        Runs a command with root privileges and yields its standard output line by line while it is running.
+
+        Raises:
+            CommandError: If `fail_fast` is set and the exit status is not 0
+        """
+        self.logger.info("Run command as ROOT (stream)")
+
+        transfer: Dict[str, Any] = {}
+        yield from self._measured_stream(
+            command, True, self.__sudo_stream(command, passwd, self._codec(command, compress), transfer), transfer
+        )
+
+    def __sudo_stream(self, command: str, passwd: Optional[str], codec: Optional[str],
+                      transfer: Dict[str, Any]) -> Iterator[str]:
+        """
+        Yields the lines of a command run with the cached credentials, or with the password. A miss of the cache
+        writes nothing to the standard output, so the command is simply run again with the password.
+        """
+        password_line = self._password_line(passwd)
+        if self.sudo_cache is not None and self.sudo_cache.validate(
+                lambda validation, stdin_data: self._execute(validation, stdin_data=stdin_data, validate=False),
+                password_line
+        ):
+            results: List[CommandResult] = []
+            yield from self._execute_stream(self.sudo_cache.command(command), display_command=command, codec=codec,
+                                            transfer=transfer, results=results)
+            if self.sudo_cache.observe(results[0], command):
+                self._validate(results[0])
+                return
+
+        yield from self._execute_stream(f"sudo -S -p '' su -c \"{command}\"", display_command=command,
+                                        stdin_data=password_line, codec=codec, transfer=transfer)
+
+    def run_many(self, commands: List[str]) -> List[CommandResult]:
+        """
+        Runs independent commands as parallel sessions of the master and returns their results in order.
+
+        Raises:
+            CommandError: If `fail_fast` is set and an exit status is not 0
+        """
+        self.logger.info(f"Run {len(commands)} commands")
+        if not commands:
+            return []
+
+        self.connect()
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_channels, len(commands)))) as executor:
+            return list(executor.map(self.run, commands))
+
+    def sudo_run_many(self, commands: List[str], passwd: Optional[str] = None) -> List[CommandResult]:
+        """
+        Runs independent commands with root privileges as parallel sessions of the master and returns their results
+        in order.
+
+        Raises:
+            CommandError: If `fail_fast` is set and an exit status is not 0
+        """
+        self.logger.info(f"Run {len(commands)} commands as ROOT")
+        if not commands:
+            return []
+
+        self.connect()
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_channels, len(commands)))) as executor:
+            return list(executor.map(lambda command: self.sudo_run(command, passwd=passwd), commands))
+
+    def write_file(self, path: Union[str, Path], data: bytes, passwd: Optional[str] = None) -> None:
+        """
+        Replaces the content of a file, keeping its owner and mode. Written as root.
+
+        The content goes through the standard input of a session into a private temporary file, then is moved to the
+        file as root with `install`, so it is not limited by the length of a command line. A new file is created
+        with mode 644.
+
+        Raises:
+            CommandError: If the file cannot be written
+        """
+        info = self.stat(path, passwd=passwd)
+        if info is None:
+            options = "-m 644"
+        else:
+            options = f"-m {info['mode'] & 0o7777:o} -o {info['uid']} -g {info['gid']}"
+
+        temporary = f"/tmp/.post-{os.urandom(16).hex()}"
+        upload = f"umask 077; cat > {temporary}"
+        self._measured(upload, False, lambda: self._execute(upload, stdin_data=data, validate=False)).check()
+        try:
+            self.sudo_run(f"install {options} {temporary} {shlex.quote(str(path))}", passwd=passwd).check()
+        finally:
+            self.run(f"rm -f {temporary}")
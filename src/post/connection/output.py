@@ -0,0 +1,267 @@
+import mmap
+import subprocess
+import tempfile
+from typing import IO, Any, Iterator, List, Optional, Tuple, Union
+
+from post.connection.stream import CHUNK_SIZE, iter_lines
+
+SPILL_BYTES = 64 * 2 ** 20
+
+RELEASE_BYTES = 16 * 2 ** 20
+
+MADV_DONTNEED = getattr(mmap, "MADV_DONTNEED", None)
+
+
+class OutputBuffer:
+    """
+    The raw bytes of a command output, decoded only when asked for.
+
+    The output is kept in memory until it grows past `spill_bytes`. From then on it is written to an anonymous
+    temporary file, which is memory-mapped once the output is over, so a multi-gigabyte `journalctl` or `find` costs
+    page cache instead of controller memory. `view`, `chunks`, `lines` and `decode` read the bytes in place;
+    only `getvalue` (and `CommandResult.stdout`, `CommandResult.read`) copies a spilled output into memory.
+
+    Args:
+        spill_bytes (int, optional): Size from which the output is written to a temporary file. Defaults to
+            `SPILL_BYTES` (64 MiB).
+    """
+
+    def __init__(self, spill_bytes: Optional[int] = None) -> None:
+        if spill_bytes is None:
+            self.spill_bytes = SPILL_BYTES
+        else:
+            self.spill_bytes = spill_bytes
+
+        self.size = 0
+        self.finished = False
+        self._memory = bytearray()
+        self._data = b""
+        self._file: Optional[IO[bytes]] = None
+        self._map: Optional[mmap.mmap] = None
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(size: {self.size}, spilled: {self.spilled})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __bytes__(self) -> bytes:
+        return self.getvalue()
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, OutputBuffer):
+            return self.view() == other.view()
+        if isinstance(other, (bytes, bytearray, memoryview)):
+            return self.view() == other
+
+        return NotImplemented
+
+    @classmethod
+    def from_bytes(cls, data: Union[bytes, bytearray]) -> "OutputBuffer":
+        """
+        Returns a finished buffer holding the given bytes, in memory whatever their size.
+
+        Args:
+            data (Union[bytes, bytearray]): the output
+
+        Returns:
+            OutputBuffer: the buffer
+        """
+        buffer = cls()
+        buffer._data = bytes(data)
+        buffer.size = len(buffer._data)
+        buffer.finished = True
+        return buffer
+
+    @classmethod
+    def from_file(cls, file: IO[bytes], spill_bytes: Optional[int] = None) -> "OutputBuffer":
+        """
+        Returns a finished buffer of the content of a file a process wrote its output to. The file is read into
+        memory if it is smaller than `spill_bytes`, memory-mapped otherwise. It is closed either way.
+
+        Args:
+            file (IO[bytes]): a file opened for reading, e.g. a `tempfile.TemporaryFile`
+            spill_bytes (int, optional): see `OutputBuffer`. Defaults to `SPILL_BYTES`.
+
+        Returns:
+            OutputBuffer: the buffer
+        """
+        buffer = cls(spill_bytes)
+        buffer.size = file.seek(0, 2)
+        if buffer.size > buffer.spill_bytes:
+            buffer._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            file.seek(0)
+            buffer._data = file.read()
+
+        file.close()
+        buffer.finished = True
+        return buffer
+
+    @property
+    def spilled(self) -> bool:
+        """True if the output went to a temporary file"""
+        return self._file is not None or self._map is not None
+
+    def write(self, data: bytes) -> None:
+        """
+        Appends bytes to the output.
+
+        Raises:
+            ValueError: If the buffer is finished
+        """
+        if self.finished:
+            raise ValueError("Cannot write to a finished output")
+
+        self.size += len(data)
+        if self._file is not None:
+            self._file.write(data)
+            return
+
+        self._memory += data
+        if len(self._memory) > self.spill_bytes:
+            self._file = tempfile.TemporaryFile()
+            self._file.write(self._memory)
+            self._memory = bytearray()
+
+    def finish(self) -> "OutputBuffer":
+        """
+        Ends the output. Nothing can be written anymore.
+
+        Returns:
+            OutputBuffer: self
+        """
+        if self.finished:
+            return self
+
+        if self._file is not None:
+            self._file.flush()
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._file.close()
+            self._file = None
+        else:
+            self._data = bytes(self._memory)
+            self._memory = bytearray()
+
+        self.finished = True
+        return self
+
+    def view(self) -> memoryview:
+        """
+        Returns the output without copying it. Finishes the buffer.
+
+        Returns:
+            memoryview: the bytes, in memory or mapped from the temporary file
+        """
+        self.finish()
+        if self._map is not None:
+            return memoryview(self._map)
+
+        return memoryview(self._data)
+
+    def getvalue(self) -> bytes:
+        """
+        Returns the output as bytes. Copies a spilled output into memory.
+
+        Returns:
+            bytes: the output
+        """
+        self.finish()
+        if self._map is not None:
+            return self._map[:]
+
+        return self._data
+
+    def chunks(self, size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """
+        Yields the output in chunks, so only one chunk of a spilled output is copied at a time. The pages of a
+        spilled output that were read are given back every `RELEASE_BYTES`, so they do not stay resident.
+
+        Args:
+            size (int): the chunk size. Defaults to `CHUNK_SIZE`.
+
+        Returns:
+            Iterator[bytes]: the chunks in order
+        """
+        view = self.view()
+        released = 0
+        for start in range(0, len(view), size):
+            yield view[start:start + size].tobytes()
+            if self._map is not None and MADV_DONTNEED is not None and start - released >= RELEASE_BYTES:
+                end = start - start % mmap.PAGESIZE
+                self._map.madvise(MADV_DONTNEED, released, end - released)
+                released = end
+
+    def lines(self, encoding: str = "utf-8") -> Iterator[str]:
+        """
+        Decodes the output line by line (without the line breaks). Invalid bytes are replaced.
+
+        Args:
+            encoding (str): the encoding. Defaults to utf-8.
+
+        Returns:
+            Iterator[str]: the lines
+        """
+        return iter_lines(self.chunks(), encoding=encoding)
+
+    def decode(self, encoding: str = "utf-8", errors: str = "strict") -> str:
+        """
+        Decodes the whole output, like `bytes.decode`.
+
+        Args:
+            encoding (str): the encoding. Defaults to utf-8.
+            errors (str): the error handling. Defaults to strict.
+
+        Returns:
+            str: the text
+        """
+        return str(self.view(), encoding, errors)
+
+    def close(self) -> None:
+        """Releases the temporary file of a spilled output. The output cannot be read anymore."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # a view of it is still in use, the mapping goes away with the last one
+                return
+            self._map = None
+            self._data = b""
+            self.size = 0
+
+
+def run_process(arguments: Union[str, List[str]], stdin_data: Optional[bytes] = None, timeout: Optional[float] = None,
+                shell: bool = False, spill_bytes: Optional[int] = None) -> Tuple[int, OutputBuffer, bytes]:
+    """
+    Runs a process with its standard output going straight to a temporary file, so a large output is never held
+    in memory, and collects its standard error.
+
+    Args:
+        arguments (Union[str, List[str]]): the command line, a string if `shell` is set
+        stdin_data (bytes, optional): data written to the standard input. Defaults to None (inherited).
+        timeout (float, optional): seconds to wait for the process. Defaults to None (no limit).
+        shell (bool): run the command line with the shell. Defaults to False.
+        spill_bytes (int, optional): see `OutputBuffer`. Defaults to `SPILL_BYTES`.
+
+    Returns:
+        Tuple[int, OutputBuffer, bytes]: the exit status, the standard output and the standard error
+
+    Raises:
+        subprocess.TimeoutExpired: If the process does not finish in time. It is killed.
+    """
+    stdout = tempfile.TemporaryFile()
+    try:
+        result = subprocess.run(arguments, shell=shell, input=stdin_data, stdout=stdout, stderr=subprocess.PIPE,
+                                timeout=timeout)
+    except BaseException:
+        stdout.close()
+        raise
+
+    return result.returncode, OutputBuffer.from_file(stdout, spill_bytes), result.stderr
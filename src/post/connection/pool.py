@@ -0,0 +1,280 @@
+import hashlib
+import threading
+import time
+from logging import Logger
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from paramiko.client import SSHClient
+
+from post.utils.common import GLOBAL_LOGGER
+
+PoolKey = Tuple[str, int, str, str]
+
+
+def credential_fingerprint(passwd: Optional[str] = None, private_key: Optional[Union[Path, str]] = None) -> str:
+    """
+    Returns a digest of the credentials a client authenticates with, so clients are only shared between connectors
+    with the same credentials. The content of a key file is hashed, not only its path.
+
+    Args:
+        passwd (str, optional): The password. Defaults to None.
+        private_key (Union[Path, str], optional): The private key file. Defaults to None.
+
+    Returns:
+        str: the hex digest
+    """
+    digest = hashlib.sha256()
+    digest.update((passwd or "").encode())
+    digest.update(b"\0")
+    if private_key is not None:
+        try:
+            digest.update(Path(private_key).read_bytes())
+        except OSError:
+            digest.update(str(private_key).encode())
+
+    return digest.hexdigest()
+
+
+class PooledClient:
+    """
+    Bookkeeping of a single SSHClient living in the pool.
+
+    Args:
+        key (PoolKey): The (address, port, user, credential fingerprint) the client is connected with.
+        client (SSHClient): The connected client.
+    """
+
+    def __init__(self, key: PoolKey, client: SSHClient) -> None:
+        self.key = key
+        self.client = client
+        self.leases = 0
+        self.last_used = time.monotonic()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(key: {self.key[:3]}, leases: {self.leases})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class SSHConnectionPool:
+    """
+    A process-wide pool of authenticated SSH clients keyed by (address, port, user) and the credentials they were
+    authenticated with (see `credential_fingerprint`).
+
+    A paramiko transport can carry many channels at once, so a pooled client is shared between connectors
+    (leased) instead of being handed out exclusively. A new client is only dialed when every pooled client of the
+    host already carries `max_leases_per_client` leases and the host has less than `max_per_host` clients.
+
+    Args:
+        max_per_host (int): Maximum number of clients per (address, port, user, credentials). Defaults to 4.
+        max_leases_per_client (int): Number of connectors sharing a client before another one is dialed.
+            Defaults to 8.
+        idle_timeout (float): Seconds an unused client is kept open. Defaults to 300.
+        logger (Logger, optional): The logger to log. Defaults to None.
+    """
+
+    def __init__(self, max_per_host: int = 4, max_leases_per_client: int = 8, idle_timeout: float = 300.0,
+                 logger: Optional[Logger] = None) -> None:
+        if logger is None:
+            self.logger = GLOBAL_LOGGER
+        else:
+            self.logger = logger
+
+        if max_per_host < 1:
+            self.logger.error("max_per_host must be at least 1")
+            raise ValueError("max_per_host must be at least 1")
+
+        if max_leases_per_client < 1:
+            self.logger.error("max_leases_per_client must be at least 1")
+            raise ValueError("max_leases_per_client must be at least 1")
+
+        self.max_per_host = max_per_host
+        self.max_leases_per_client = max_leases_per_client
+        self.idle_timeout = idle_timeout
+
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._clients: Dict[PoolKey, List[PooledClient]] = {}
+        self._by_client: Dict[int, PooledClient] = {}
+        self._pending: Dict[PoolKey, int] = {}
+        self._last_prune = time.monotonic()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(hosts: {len(self._clients)}, clients: {len(self)})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def __len__(self) -> int:
+        return len(self._by_client)
+
+    @staticmethod
+    def is_healthy(client: SSHClient) -> bool:
+        """
+        Checks if the transport of a client is still alive and authenticated.
+
+        Args:
+            client (SSHClient): The client to be checked.
+
+        Returns:
+            bool: True if the client can be used to run commands.
+        """
+        transport = client.get_transport()
+        if transport is None or not transport.is_active() or not transport.is_authenticated():
+            return False
+
+        try:
+            transport.send_ignore()
+        except Exception:
+            return False
+
+        return True
+
+    def acquire(self, address: str, port: int, user: str, factory: Callable[[], SSHClient],
+                credential: str = "") -> SSHClient:
+        """
+        Leases a live client for the given host. Dials a new one using `factory` if needed.
+
+        Args:
+            address (str): The address of the server.
+            port (int): The port of the server.
+            user (str): The username.
+            factory (Callable[[], SSHClient]): A callable returning a connected SSHClient.
+            credential (str): The fingerprint of the credentials `factory` authenticates with. Clients are only
+                shared between equal fingerprints. See `credential_fingerprint`. Defaults to "".
+
+        Returns:
+            SSHClient: A connected client. Must be given back using `release`.
+
+        Raises:
+            ValueError: If the connection fails.
+        """
+        key = (address, port, user, credential)
+
+        with self._ready:
+            while True:
+                self._prune_locked(key)
+                entries = self._clients.setdefault(key, [])
+
+                available = [entry for entry in entries if entry.leases < self.max_leases_per_client]
+                full = len(entries) + self._pending.get(key, 0) >= self.max_per_host
+
+                if available or (entries and full):
+                    entry = min(available or entries, key=lambda each: each.leases)
+                    entry.leases += 1
+                    entry.last_used = time.monotonic()
+                    self.logger.info(f"Reusing pooled connection for {key[:3]}")
+                    return entry.client
+
+                if not full:
+                    break
+
+                # every allowed client of the host is being dialed, wait for one of them
+                self._ready.wait()
+
+            self._pending[key] = self._pending.get(key, 0) + 1
+
+        try:
+            client = factory()
+        except BaseException:
+            with self._ready:
+                self._pending[key] -= 1
+                self._ready.notify_all()
+            raise
+
+        entry = PooledClient(key, client)
+        entry.leases = 1
+        with self._ready:
+            self._pending[key] -= 1
+            self._clients.setdefault(key, []).append(entry)
+            self._by_client[id(client)] = entry
+            self._ready.notify_all()
+
+        return client
+
+    def release(self, client: SSHClient) -> None:
+        """
+        Gives a leased client back to the pool.
+
+        Args:
+            client (SSHClient): A client previously returned by `acquire`.
+        """
+        with self._lock:
+            entry = self._by_client.get(id(client))
+            if entry is None:
+                return
+
+            entry.leases = max(entry.leases - 1, 0)
+            entry.last_used = time.monotonic()
+
+            if entry.leases == 0 and not self.is_healthy(client):
+                self._drop_locked(entry)
+
+    def discard(self, client: SSHClient) -> None:
+        """
+        Removes a client from the pool and closes it. Useful when a client is known to be broken.
+
+        Args:
+            client (SSHClient): A client previously returned by `acquire`.
+        """
+        with self._lock:
+            entry = self._by_client.get(id(client))
+            if entry is not None:
+                self._drop_locked(entry)
+
+    def prune(self) -> int:
+        """
+        Closes idle and dead clients.
+
+        Returns:
+            int: Number of closed clients.
+        """
+        with self._lock:
+            return self._prune_locked()
+
+    def close_all(self) -> None:
+        """Closes every pooled client"""
+        self.logger.info("Closing all pooled connections")
+
+        with self._lock:
+            for entry in list(self._by_client.values()):
+                self._drop_locked(entry)
+
+    def _prune_locked(self, key: Optional[PoolKey] = None) -> int:
+        now = time.monotonic()
+        if key is not None and now - self._last_prune < self.idle_timeout / 2:
+            keys = [key] if key in self._clients else []
+        else:
+            keys = list(self._clients.keys())
+            self._last_prune = now
+
+        closed = 0
+        for each_key in keys:
+            for entry in list(self._clients.get(each_key, [])):
+                idle = entry.leases == 0 and now - entry.last_used > self.idle_timeout
+                if idle or not self.is_healthy(entry.client):
+                    self._drop_locked(entry)
+                    closed += 1
+
+        return closed
+
+    def _drop_locked(self, entry: PooledClient) -> None:
+        self.logger.info(f"Dropping pooled connection for {entry.key[:3]}")
+
+        self._by_client.pop(id(entry.client), None)
+        entries = self._clients.get(entry.key, [])
+        if entry in entries:
+            entries.remove(entry)
+
+        if not entries:
+            self._clients.pop(entry.key, None)
+
+        try:
+            entry.client.close()
+        except Exception as e:
+            self.logger.warning(e)
+
+
+GLOBAL_POOL = SSHConnectionPool()
@@ -0,0 +1,266 @@
+import base64
+import json
+import re
+import threading
+import time
+from logging import Logger
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from post.connection.command_result import CommandResult
+from post.connection.metrics import GLOBAL_METRICS, MetricsRegistry
+from post.connection.model_connector import ModelConnector
+from post.connection.stream import iter_lines
+from post.utils.common import GLOBAL_LOGGER
+from post.utils.error import NotFound
+
+UNIQUE_TOKEN = re.compile(r"\b[0-9a-f]{32}\b|\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b")
+
+RecordKey = Tuple[bool, str]
+
+
+def normalize_command(command: str) -> str:
+    """
+    Replaces the parts of a command that differ on each run (uuids of temporary files) with `{uuid}`, so a recorded
+    command matches when it is replayed.
+
+    Args:
+        command (str): the command
+
+    Returns:
+        str: the normalized command
+    """
+    return UNIQUE_TOKEN.sub("{uuid}", command)
+
+
+def load_records(path: Union[str, Path]) -> Dict[RecordKey, List[CommandResult]]:
+    """
+    Reads a recording made by `RecordingConnector`.
+
+    The result can be given to many `ReplayConnector`s, so a recording is parsed once for a whole simulated fleet.
+
+    Args:
+        path (Union[str, Path]): the path of the recording
+
+    Returns:
+        Dict[RecordKey, List[CommandResult]]: the results of each (sudo, normalized command) in recorded order
+    """
+    records: Dict[RecordKey, List[CommandResult]] = {}
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+
+            record = json.loads(line)
+            result = CommandResult(record["command"], record["exit_code"], base64.b64decode(record["stdout"]),
+                                   base64.b64decode(record["stderr"]), record["wall_time"])
+            records.setdefault((record["sudo"], normalize_command(record["command"])), []).append(result)
+
+    return records
+
+
+class RecordingConnector(ModelConnector):
+    """
+    Wraps a connector and writes each command it runs with its result to a file (JSON lines), to be replayed by
+    `ReplayConnector`.
+
+    Files are read and written with the shell commands of `ModelConnector`, so they are recorded too. The agent of
+    the wrapped connector is not used. Metrics are left to the wrapped connector.
+
+    Args:
+        connector (ModelConnector): The connector to run the commands.
+        path (Union[str, Path]): The file to write. Records are appended.
+        logger (Logger, optional): The logger to log. Defaults to None.
+    """
+
+    metrics = None
+
+    def __init__(self, connector: ModelConnector, path: Union[str, Path], logger: Optional[Logger] = None) -> None:
+        if logger is None:
+            self.logger = GLOBAL_LOGGER
+        else:
+            self.logger = logger
+
+        self.connector = connector
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.file = open(self.path, "a")
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(connector: {self.connector}, path: {self.path})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def __getattr__(self, name: str) -> Any:
+        # address, port, user... of the wrapped connector, so host keys stay the same
+        if name == "connector":
+            raise AttributeError(name)
+
+        return getattr(self.connector, name)
+
+    def close(self) -> None:
+        """Closes the file"""
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+    def record(self, sudo: bool, result: CommandResult) -> None:
+        """
+        Writes a result to the file.
+
+        Args:
+            sudo (bool): whether the command ran as root
+            result (CommandResult): the result
+        """
+        line = json.dumps({
+            "sudo": sudo,
+            "command": result.command,
+            "exit_code": result.exit_code,
+            "stdout": base64.b64encode(result.stdout).decode(),
+            "stderr": base64.b64encode(result.stderr).decode(),
+            "wall_time": result.wall_time,
+        })
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def __recorded(self, sudo: bool, command: str, call: Callable[[], CommandResult]) -> CommandResult:
+        """Runs the command and records its result, keeping the command as it was given"""
+        start = time.monotonic()
+        result = call()
+        self.record(sudo, CommandResult(command, result.exit_code, result.stdout, result.stderr,
+                                        result.wall_time or time.monotonic() - start))
+        return result
+
+    def __recorded_stream(self, sudo: bool, command: str, call: Callable[[], CommandResult]) -> Iterator[str]:
+        """
+        Runs the command to its end, records it and yields its standard output line by line.
+
+        A stream does not give its exit status and standard error, so the command is run with `run` or `sudo_run`
+        instead. Its lines are only yielded once it is over.
+        """
+        yield from iter_lines([self.__recorded(sudo, command, call).read()])
+
+    def run(self, command: str) -> CommandResult:
+        """Runs a command with user privileges and records it. See `ModelConnector.run`"""
+        return self.__recorded(False, command, lambda: self.connector.run(command))
+
+    def sudo_run(self, command: str, passwd: Optional[str] = None) -> CommandResult:
+        """Runs a command with root privileges and records it. See `ModelConnector.sudo_run`"""
+        return self.__recorded(True, command, lambda: self.connector.sudo_run(command, passwd=passwd))
+
+    def run_stream(self, command: str) -> Iterator[str]:
+        """Runs a command with user privileges and records it. See `ModelConnector.run_stream`"""
+        yield from self.__recorded_stream(False, command, lambda: self.connector.run(command))
+
+    def sudo_run_stream(self, command: str, passwd: Optional[str] = None) -> Iterator[str]:
+        """Runs a command with root privileges and records it. See `ModelConnector.run_stream`"""
+        yield from self.__recorded_stream(True, command, lambda: self.connector.sudo_run(command, passwd=passwd))
+
+    def run_many(self, commands: List[str]) -> List[CommandResult]:
+        """Runs commands with user privileges and records them. See `ModelConnector.run_many`"""
+        results = self.connector.run_many(commands)
+        for command, result in zip(commands, results):
+            self.record(False, CommandResult(command, result.exit_code, result.stdout, result.stderr,
+                                             result.wall_time))
+
+        return results
+
+    def sudo_run_many(self, commands: List[str], passwd: Optional[str] = None) -> List[CommandResult]:
+        """Runs commands with root privileges and records them. See `ModelConnector.sudo_run_many`"""
+        results = self.connector.sudo_run_many(commands, passwd=passwd)
+        for command, result in zip(commands, results):
+            self.record(True, CommandResult(command, result.exit_code, result.stdout, result.stderr,
+                                            result.wall_time))
+
+        return results
+
+
+class ReplayConnector(ModelConnector):
+    """
+    Serves the results recorded by `RecordingConnector` instead of running commands.
+
+    A command recorded more than once is answered with its results in recorded order, the last one repeating. Many
+    replay connectors can share the records of `load_records` and each gets its own `address`, so managers, lists,
+    caches and metrics see a fleet of distinct hosts.
+
+    Args:
+        records (Union[str, Path, Dict]): A recording file or the output of `load_records`.
+        address (str): The simulated address of the host. Defaults to `replay`.
+        port (int): The simulated port. Defaults to 22.
+        user (str, optional): The simulated user. Defaults to None.
+        latency (float): Sleeps the recorded wall time multiplied by it before answering. Defaults to 0 (no delay).
+        strict (bool): Raise NotFound for a command that was not recorded. Otherwise it exits with 127.
+            Defaults to True.
+        logger (Logger, optional): The logger to log. Defaults to None.
+        metrics (MetricsRegistry, optional): The registry to record command metrics into. None records nothing.
+            Defaults to GLOBAL_METRICS.
+    """
+
+    def __init__(self, records: Union[str, Path, Dict[RecordKey, List[CommandResult]]], address: str = "replay",
+                 port: int = 22, user: Optional[str] = None, latency: float = 0.0, strict: bool = True,
+                 logger: Optional[Logger] = None, metrics: Optional[MetricsRegistry] = GLOBAL_METRICS) -> None:
+        if logger is None:
+            self.logger = GLOBAL_LOGGER
+        else:
+            self.logger = logger
+
+        if isinstance(records, dict):
+            self.records = records
+        else:
+            self.records = load_records(records)
+
+        self.address = address
+        self.port = port
+        self.user = user
+        self.latency = latency
+        self.strict = strict
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.positions: Dict[RecordKey, int] = {}
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(address: {self.address}:{self.port}, commands: {len(self.records)})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def __replay(self, sudo: bool, command: str) -> CommandResult:
+        """
+        Returns the next recorded result of a command.
+
+        Raises:
+            NotFound: If `strict` is set and the command was not recorded
+        """
+        key = (sudo, normalize_command(command))
+        results = self.records.get(key)
+        if not results:
+            if self.strict:
+                self.logger.error(f"`{command}` was not recorded")
+                raise NotFound(f"`{command}` was not recorded")
+
+            return CommandResult(command, 127, b"", f"`{command}` was not recorded\n".encode(), 0.0)
+
+        with self.lock:
+            position = self.positions.get(key, 0)
+            self.positions[key] = position + 1
+
+        recorded = results[min(position, len(results) - 1)]
+        if self.latency > 0:
+            time.sleep(recorded.wall_time * self.latency)
+
+        return CommandResult(command, recorded.exit_code, recorded.stdout, recorded.stderr, recorded.wall_time)
+
+    def rewind(self) -> None:
+        """Answers each command with its first recorded result again"""
+        with self.lock:
+            self.positions.clear()
+
+    def run(self, command: str) -> CommandResult:
+        """Returns the recorded result of a command run with user privileges"""
+        return self._measured(command, False, lambda: self.__replay(False, command))
+
+    def sudo_run(self, command: str, passwd: Optional[str] = None) -> CommandResult:
+        """Returns the recorded result of a command run with root privileges"""
+        return self._measured(command, True, lambda: self.__replay(True, command))
@@ -0,0 +1,223 @@
+"""
+The helper run on the remote host by `post.connection.agent.AgentSession`.
+
+This file is not imported by POST. Its source is sent to the remote host and executed by `python3` as root, so it
+must only use the standard library.
+
+Requests and responses are frames of a 4 byte big-endian length followed by a JSON document. Bytes are sent as
+base64 strings.
+"""
+import base64
+import grp
+import json
+import os
+import pwd
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+from typing import Any, Callable, Dict
+
+
+def read_frame(stream):
+    header = stream.read(4)
+    if len(header) < 4:
+        return None
+
+    (length,) = struct.unpack(">I", header)
+    return json.loads(stream.read(length).decode())
+
+
+def write_frame(stream, message):
+    data = json.dumps(message).encode()
+    stream.write(struct.pack(">I", len(data)) + data)
+    stream.flush()
+
+
+def ping():
+    return "pong"
+
+
+def read_file(path):
+    with open(path, "rb") as f:
+        return base64.b64encode(f.read()).decode()
+
+
+def write_file(path, data, append=False):
+    content = base64.b64decode(data)
+    if append:
+        with open(path, "ab") as f:
+            f.write(content)
+        return None
+
+    # Written next to the target and renamed, so readers never see a half written file.
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".post-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+
+        if os.path.exists(path):
+            info = os.stat(path)
+            os.chmod(temp_path, info.st_mode & 0o7777)
+            os.chown(temp_path, info.st_uid, info.st_gid)
+        else:
+            os.chmod(temp_path, 0o644)
+
+        os.replace(temp_path, path)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+
+    return None
+
+
+def stat(path):
+    try:
+        info = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    return {
+        "size": info.st_size, "mode": info.st_mode, "uid": info.st_uid, "gid": info.st_gid,
+        "mtime": info.st_mtime, "is_dir": os.path.isdir(path),
+    }
+
+
+def exists(path):
+    return os.path.exists(path)
+
+
+def mkdir(path):
+    os.makedirs(path, exist_ok=True)
+
+
+def touch(path):
+    with open(path, "a"):
+        os.utime(path, None)
+
+
+def copy(source, destination):
+    shutil.copy2(source, destination)
+
+
+def passwd():
+    return [
+        {"name": p.pw_name, "uid": p.pw_uid, "gid": p.pw_gid, "gecos": p.pw_gecos, "home": p.pw_dir,
+         "shell": p.pw_shell}
+        for p in pwd.getpwall()
+    ]
+
+
+def user(name):
+    p = pwd.getpwnam(name)
+    return {"name": p.pw_name, "uid": p.pw_uid, "gid": p.pw_gid, "gecos": p.pw_gecos, "home": p.pw_dir,
+            "shell": p.pw_shell}
+
+
+def group():
+    return [{"name": g.gr_name, "gid": g.gr_gid, "members": g.gr_mem} for g in grp.getgrall()]
+
+
+def user_groups(name):
+    user = pwd.getpwnam(name)
+    return [grp.getgrgid(gid).gr_name for gid in os.getgrouplist(name, user.pw_gid)]
+
+
+def password_status(name):
+    # Same letters as `passwd -S`: L (locked), NP (no password) or P (usable password)
+    with open("/etc/shadow") as f:
+        for line in f:
+            fields = line.rstrip("\n").split(":")
+            if fields[0] == name:
+                if fields[1].startswith("!"):
+                    return "L"
+                if fields[1] == "":
+                    return "NP"
+                return "P"
+
+    raise KeyError("User does not exist: " + name)
+
+
+def dpkg_status(path="/var/lib/dpkg/status"):
+    packages = []
+    package: Dict[str, str] = {}
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line:
+                if package:
+                    packages.append(package)
+                package = {}
+                continue
+
+            if line[0].isspace() or ":" not in line:
+                continue
+
+            key, value = line.split(":", 1)
+            if key in ("Package", "Version", "Architecture", "Status"):
+                package[key.lower()] = value.strip()
+
+    if package:
+        packages.append(package)
+
+    return packages
+
+
+def systemd_units():
+    result = subprocess.run(
+        ["systemctl", "list-units", "--all", "--no-pager", "--no-legend", "--plain"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    return result.stdout.decode(errors="replace")
+
+
+def run(command):
+    result = subprocess.run(command, shell=True, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+    return {
+        "exit_code": result.returncode,
+        "stdout": base64.b64encode(result.stdout).decode(),
+        "stderr": base64.b64encode(result.stderr).decode(),
+    }
+
+
+METHODS: Dict[str, Callable[..., Any]] = {
+    "ping": ping,
+    "read_file": read_file,
+    "write_file": write_file,
+    "stat": stat,
+    "exists": exists,
+    "mkdir": mkdir,
+    "touch": touch,
+    "copy": copy,
+    "passwd": passwd,
+    "user": user,
+    "group": group,
+    "user_groups": user_groups,
+    "password_status": password_status,
+    "dpkg_status": dpkg_status,
+    "systemd_units": systemd_units,
+    "run": run,
+}
+
+
+def main():
+    stdin = sys.stdin.buffer
+    stdout = sys.stdout.buffer
+    while True:
+        request = read_frame(stdin)
+        if request is None:
+            return
+
+        try:
+            result = METHODS[request["method"]](**request.get("params", {}))
+            response = {"id": request["id"], "result": result}
+        except Exception as e:
+            response = {"id": request["id"], "error": {"type": type(e).__name__, "message": str(e)}}
+
+        write_frame(stdout, response)
+
+
+if __name__ == "__main__":
+    main()
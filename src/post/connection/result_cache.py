@@ -0,0 +1,238 @@
+import threading
+import time
+from logging import Logger
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar, cast
+
+from post.connection.model_connector import ModelConnector
+from post.utils.common import GLOBAL_LOGGER
+
+T = TypeVar("T")
+
+HostKey = Tuple[Any, ...]
+
+DEFAULT_TTLS = {
+    "apt": 60.0,
+    "systemd": 30.0,
+}
+
+
+def host_key(connector: ModelConnector) -> HostKey:
+    """
+    Returns the key of the host a connector runs its commands on.
+
+    Connectors with an address are keyed by (address, port, user) so that all connectors of the same host share their
+    cached results. Others (e.g. `LocalConnector`) are keyed by themselves.
+
+    Args:
+        connector (ModelConnector): the connector
+
+    Returns:
+        HostKey: the key
+    """
+    address = getattr(connector, "address", None)
+    if address is None:
+        return (id(connector),)
+
+    return address, getattr(connector, "port", None), getattr(connector, "user", None)
+
+
+class CachedResult:
+    """
+    A result kept in the cache.
+
+    Args:
+        value (Any): The result.
+        expires (float): `time.monotonic()` after which the result is stale.
+    """
+
+    def __init__(self, value: Any, expires: float) -> None:
+        self.value = value
+        self.expires = expires
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(expires: {self.expires})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class PendingLoad:
+    """
+    The lock a load of one (host, family) holds, and the number of calls waiting for it.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.waiters = 0
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(waiters: {self.waiters})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class ResultCache:
+    """
+    A process-wide cache of read-only command results keyed by (host, command family).
+
+    A family is a dotted name such as `apt.list` or `systemd.units`. Its TTL is looked up by the part before the first
+    dot in `ttls`, falling back to `default_ttl`. Managers invalidate the families of a host after they change it
+    (e.g. `apt.` after `apt install`), so a stale result is only possible when the host is changed by someone else
+    within the TTL.
+
+    Args:
+        ttls (Dict[str, float], optional): TTL in seconds per family prefix. Defaults to `DEFAULT_TTLS`.
+        default_ttl (float): TTL in seconds of families not in `ttls`. Defaults to 30.
+        logger (Logger, optional): The logger to log. Defaults to None.
+    """
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, default_ttl: float = 30.0,
+                 logger: Optional[Logger] = None) -> None:
+        if logger is None:
+            self.logger = GLOBAL_LOGGER
+        else:
+            self.logger = logger
+
+        if ttls is None:
+            self.ttls = dict(DEFAULT_TTLS)
+        else:
+            self.ttls = dict(ttls)
+
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._results: Dict[Tuple[HostKey, str], CachedResult] = {}
+        self._loading: Dict[Tuple[HostKey, str], PendingLoad] = {}
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(entries: {len(self)}, hits: {self.hits}, misses: {self.misses})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._results)
+
+    def ttl(self, family: str) -> float:
+        """
+        Returns the TTL of a family in seconds.
+
+        Args:
+            family (str): the family, e.g. `apt.list`
+
+        Returns:
+            float: the TTL
+        """
+        return self.ttls.get(family.split(".", 1)[0], self.default_ttl)
+
+    def get(self, connector: ModelConnector, family: str) -> Optional[Any]:
+        """
+        Returns a cached result if it is not stale.
+
+        Args:
+            connector (ModelConnector): the connector of the host
+            family (str): the family of the result
+
+        Returns:
+            Any: the result. None if there is none.
+        """
+        key = (host_key(connector), family)
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is None:
+                return None
+
+            if cached.expires <= time.monotonic():
+                del self._results[key]
+                return None
+
+            return cached.value
+
+    def set(self, connector: ModelConnector, family: str, value: Any) -> None:
+        """
+        Caches a result.
+
+        Args:
+            connector (ModelConnector): the connector of the host
+            family (str): the family of the result
+            value (Any): the result
+        """
+        ttl = self.ttl(family)
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            self._results[(host_key(connector), family)] = CachedResult(value, time.monotonic() + ttl)
+
+    def get_or_load(self, connector: ModelConnector, family: str, loader: Callable[[], T],
+                    cacheable: Optional[Callable[[T], bool]] = None) -> T:
+        """
+        Returns a cached result or loads and caches it.
+
+        Concurrent calls for the same host and family wait for a single load instead of each running the command.
+
+        Args:
+            connector (ModelConnector): the connector of the host
+            family (str): the family of the result
+            loader (Callable): runs the command and returns the result
+            cacheable (Callable, optional): tells if a loaded result may be cached. Results it rejects (e.g. the
+                empty output of a failed command) are returned but not cached. Defaults to None (all are cached).
+
+        Returns:
+            Any: the result
+        """
+        key = (host_key(connector), family)
+        with self._lock:
+            pending = self._loading.get(key)
+            if pending is None:
+                pending = self._loading[key] = PendingLoad()
+            pending.waiters += 1
+
+        try:
+            with pending.lock:
+                cached = self.get(connector, family)
+                if cached is not None:
+                    with self._lock:
+                        self.hits += 1
+
+                    return cast(T, cached)
+
+                with self._lock:
+                    self.misses += 1
+
+                value = loader()
+                if cacheable is None or cacheable(value):
+                    self.set(connector, family, value)
+
+                return value
+        finally:
+            with self._lock:
+                pending.waiters -= 1
+                if pending.waiters == 0:
+                    del self._loading[key]
+
+    def invalidate(self, connector: ModelConnector, prefix: Optional[str] = None) -> None:
+        """
+        Drops the cached results of a host.
+
+        Args:
+            connector (ModelConnector): the connector of the host
+            prefix (str, optional): drops only the families starting with it, e.g. `apt.`. Defaults to None (all).
+        """
+        host = host_key(connector)
+        with self._lock:
+            for key in list(self._results):
+                if key[0] == host and (prefix is None or key[1].startswith(prefix)):
+                    del self._results[key]
+
+    def clear(self) -> None:
+        """Drops every cached result"""
+        with self._lock:
+            self._results.clear()
+
+
+GLOBAL_RESULT_CACHE = ResultCache()
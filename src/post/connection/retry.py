@@ -0,0 +1,77 @@
+import random
+from typing import Iterator, Optional, Sequence
+
+from paramiko.ssh_exception import SSHException
+
+RETRYABLE_ERRORS = (SSHException, EOFError, OSError)
+
+READ_ONLY_COMMANDS = (
+    "cat ", "test ", "ls ", "stat ", "grep ", "id ", "groups ", "getent ", "passwd -S ", "dpkg-query ",
+    "apt list", "apt show ", "apt search ", "apt-cache ", "systemctl list-units", "systemctl status ",
+    "systemctl is-", "journalctl ", "samba-tool gpo list", "samba-tool gpo show ", "samba-tool user list",
+    "uname", "hostname", "whoami",
+)
+
+
+class RetryPolicy:
+    """
+    When and how often a failed command is tried again.
+
+    Only transport failures (`RETRYABLE_ERRORS`) are retried, never a non-zero exit status. Opening a channel can
+    always be retried since nothing has run yet. A command that has been started is only retried if it is
+    idempotent, which by default means it starts with one of `READ_ONLY_COMMANDS`.
+
+    The delays grow exponentially: `backoff`, `backoff * multiplier`, ... capped at `max_backoff`, each changed
+    randomly by `jitter` (a ratio) so many connectors do not retry at the same moment.
+
+    Args:
+        attempts (int): Number of retries after the first try. Defaults to 3.
+        backoff (float): Seconds to wait before the first retry. Defaults to 1.
+        multiplier (float): Growth of the delay after each retry. Defaults to 2.
+        max_backoff (float): Maximum seconds to wait. Defaults to 30.
+        jitter (float): Random change ratio of each delay. Defaults to 0.1.
+        idempotent_commands (Sequence[str], optional): Command prefixes that are safe to run again.
+            Defaults to `READ_ONLY_COMMANDS`.
+    """
+
+    def __init__(self, attempts: int = 3, backoff: float = 1.0, multiplier: float = 2.0, max_backoff: float = 30.0,
+                 jitter: float = 0.1, idempotent_commands: Optional[Sequence[str]] = None) -> None:
+        self.attempts = attempts
+        self.backoff = backoff
+        self.multiplier = multiplier
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        if idempotent_commands is None:
+            self.idempotent_commands = tuple(READ_ONLY_COMMANDS)
+        else:
+            self.idempotent_commands = tuple(idempotent_commands)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(attempts: {self.attempts}, backoff: {self.backoff})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def delays(self) -> Iterator[float]:
+        """
+        Yields the seconds to wait before each retry.
+
+        Returns:
+            Iterator[float]: `attempts` delays
+        """
+        delay = self.backoff
+        for _ in range(self.attempts):
+            yield max(0.0, delay * (1 + random.uniform(-self.jitter, self.jitter)))
+            delay = min(delay * self.multiplier, self.max_backoff)
+
+    def is_idempotent(self, command: str) -> bool:
+        """
+        Checks if running the command twice does no harm.
+
+        Args:
+            command (str): the command, without the `sudo` wrapper
+
+        Returns:
+            bool: True if the command can be retried after it was started
+        """
+        return command.strip().startswith(self.idempotent_commands)
@@ -0,0 +1,213 @@
+import select
+import threading
+import time
+import uuid
+from logging import Logger
+from typing import Optional
+
+from paramiko.channel import Channel
+from paramiko.transport import Transport
+
+from post.connection.command_result import CommandResult
+from post.connection.stream import CHUNK_SIZE
+from post.utils.common import GLOBAL_LOGGER
+from post.utils.error import CommandError
+
+
+class PersistentShellSession:
+    """
+    A root shell kept open on one channel.
+
+    `sudo` and `su` are run only once, when the session is opened. Every command is then written to the shell
+    and its output is framed by a random sentinel carrying the exit status, so a privileged command costs one
+    write and one read instead of a PAM authentication and three process spawns.
+
+    Commands are evaluated the same way `su -c "<command>"` would do, in a subshell with the standard input
+    redirected from `/dev/null`. Commands are run one at a time.
+
+    Args:
+        transport (Transport): An authenticated transport to open the channel on.
+        passwd (str, optional): The sudo password. Defaults to None.
+        logger (Logger, optional): The logger to log. Defaults to None.
+        timeout (float, optional): Seconds to wait for the shell to start. Defaults to 10.
+
+    Raises:
+        CommandError: If the root shell cannot be started.
+    """
+
+    def __init__(self, transport: Transport, passwd: Optional[str] = None, logger: Optional[Logger] = None,
+                 timeout: Optional[float] = 10.0) -> None:
+        if logger is None:
+            self.logger = GLOBAL_LOGGER
+        else:
+            self.logger = logger
+
+        self.lock = threading.Lock()
+        self.channel: Optional[Channel] = None
+        self.logger.info("Opening persistent root shell")
+
+        marker = uuid.uuid4().hex
+        self.channel = open_sudo_channel(transport, f"su -c 'echo {marker}; exec sh'", marker, passwd=passwd,
+                                         logger=self.logger, timeout=timeout)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(active: {self.active})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    @property
+    def active(self) -> bool:
+        """True if the shell is still running"""
+        return self.channel is not None and not self.channel.closed and not self.channel.exit_status_ready()
+
+    def run(self, command: str, timeout: Optional[float] = None) -> CommandResult:
+        """
+        Runs a command in the root shell.
+
+        Args:
+            command (str): the command to run. Quoted the same way as for `su -c "<command>"`.
+            timeout (float, optional): Seconds to wait for the command. Defaults to None (no limit).
+
+        Returns:
+            CommandResult: the result
+
+        Raises:
+            CommandError: If the shell is closed or the command does not finish in time. The session is closed on
+                a timeout since the shell cannot be taken back.
+        """
+        with self.lock:
+            if self.channel is None or not self.active:
+                raise CommandError("Persistent shell is closed")
+
+            channel = self.channel
+            sentinel = uuid.uuid4().hex
+            script = (f"( eval \"{command}\" ) </dev/null; post_rc=$?; "
+                      f"printf '\\n%s %d\\n' {sentinel} $post_rc; printf '\\n%s\\n' {sentinel} >&2\n")
+
+            start = time.monotonic()
+            channel.sendall(script.encode())
+
+            stdout_end = f"\n{sentinel} ".encode()
+            stderr_end = f"\n{sentinel}\n".encode()
+            stdout = bytearray()
+            stderr = bytearray()
+            exit_code: Optional[int] = None
+            stderr_done = False
+            while exit_code is None or not stderr_done:
+                received = False
+                while channel.recv_ready():
+                    stdout += channel.recv(CHUNK_SIZE)
+                    received = True
+
+                while channel.recv_stderr_ready():
+                    stderr += channel.recv_stderr(CHUNK_SIZE)
+                    received = True
+
+                if exit_code is None:
+                    index = stdout.rfind(stdout_end)
+                    if index != -1 and stdout.endswith(b"\n"):
+                        exit_code = int(stdout[index + len(stdout_end):].strip())
+                        del stdout[index:]
+
+                if not stderr_done and stderr.endswith(stderr_end):
+                    del stderr[-len(stderr_end):]
+                    stderr_done = True
+
+                if exit_code is not None and stderr_done:
+                    break
+
+                if channel.closed or channel.exit_status_ready():
+                    if not received:
+                        self.close()
+                        raise CommandError(f"Persistent shell exited while running `{command}`")
+
+                if timeout is not None and time.monotonic() - start > timeout:
+                    self.close()
+                    raise CommandError(f"`{command}` did not finish in {timeout} seconds")
+
+                if not received:
+                    select.select([channel], [], [], 0.1)
+
+            return CommandResult(command, exit_code, bytes(stdout), bytes(stderr), time.monotonic() - start,
+                                 bytes_sent=len(script))
+
+    def close(self) -> None:
+        """Exits the root shell"""
+        self.logger.info("Closing persistent root shell")
+
+        channel = self.channel
+        self.channel = None
+        if channel is not None:
+            try:
+                channel.sendall(b"exit\n")
+            except Exception as e:
+                self.logger.warning(e)
+            finally:
+                channel.close()
+
+
+def open_sudo_channel(transport: Transport, command: str, marker: str, passwd: Optional[str] = None,
+                      logger: Logger = GLOBAL_LOGGER, timeout: Optional[float] = 10.0) -> Channel:
+    """
+    Runs a long-living command with sudo on a new channel and waits until it writes the `marker` line to its
+    standard output.
+
+    The password is only sent if sudo asks for it, so it is never read by the command itself.
+
+    Args:
+        transport (Transport): An authenticated transport to open the channel on.
+        command (str): The command to run with sudo. It must print `marker` and a line break as soon as it is ready.
+        marker (str): The text that tells the command started.
+        passwd (str, optional): The sudo password. Defaults to None.
+        logger (Logger): The logger to log. Defaults to GLOBAL_LOGGER.
+        timeout (float, optional): Seconds to wait for the marker. Defaults to 10.
+
+    Returns:
+        Channel: the channel, with the output up to the marker consumed
+
+    Raises:
+        CommandError: If the command cannot be started.
+    """
+    prompt = f"post-sudo-{uuid.uuid4().hex}:"
+    channel = transport.open_session()
+    channel.exec_command(f"sudo -S -p '{prompt}' {command}")
+
+    start = time.monotonic()
+    stdout = b""
+    stderr = b""
+    prompts = 0
+    ready = f"{marker}\n".encode()
+    while True:
+        while not stdout.endswith(ready) and channel.recv_ready():
+            stdout += channel.recv(1)
+
+        while channel.recv_stderr_ready():
+            stderr += channel.recv_stderr(CHUNK_SIZE)
+
+        if stdout.endswith(ready):
+            break
+
+        if stderr.count(prompt.encode()) > prompts:
+            prompts += 1
+            if prompts > 1:
+                channel.close()
+                logger.error("Wrong sudo password")
+                raise CommandError("Could not start root process: wrong sudo password")
+
+            channel.sendall(f"{passwd or ''}\n".encode())
+            continue
+
+        if channel.exit_status_ready() or channel.closed:
+            channel.close()
+            message = stderr.replace(prompt.encode(), b"").decode(errors="replace").strip()
+            logger.error(message)
+            raise CommandError(f"Could not start root process: {message}")
+
+        if timeout is not None and time.monotonic() - start > timeout:
+            channel.close()
+            raise CommandError(f"Could not start root process in {timeout} seconds")
+
+        select.select([channel], [], [], 0.1)
+
+    return channel
@@ -1,14 +1,17 @@
 from logging import Logger
 from typing import Optional
 
-from paramiko.channel import ChannelFile
 from paramiko.client import SSHClient, AutoAddPolicy
 
-from post.connection.model_connector import ModelConnector
-from post.utils.common import GLOBAL_LOGGER
+from post.connection.base_ssh_connector import BaseSSHConnector
+from post.connection.compression import CompressionPolicy
+from post.connection.jump import JumpHost
+from post.connection.metrics import GLOBAL_METRICS, MetricsRegistry
+from post.connection.pool import SSHConnectionPool
+from post.connection.retry import RetryPolicy
 
 
-class SSHConnector(ModelConnector):
+class SSHConnector(BaseSSHConnector):
     """
     An SSHConnector. It uses address, port, username and password to connect.
 
@@ -21,12 +24,33 @@ class SSHConnector(ModelConnector):
         user (str): The username to use.
         passwd (str): The password to use.
         logger (Logger, optional): The logger to log. Defaults to None.
+        pool (SSHConnectionPool, optional): A connection pool to draw the connection from.
+            See `post.connection.pool.GLOBAL_POOL`. Defaults to None.
+        fail_fast (bool): Raise CommandError as soon as a command exits with a non-zero status. Defaults to False.
+        timeout (float, optional): Seconds to wait for a command to finish. Defaults to None (no limit).
+        persistent_shell (bool): Run privileged commands in one root shell kept open for the connector.
+            Defaults to False.
+        use_agent (bool): Start the remote helper agent for file, user and package queries. Defaults to False.
+        lazy (bool): Connect on the first command instead of now. Defaults to False.
+        keepalive (int): Seconds between keepalive packets. 0 disables them. Defaults to 30.
+        retry (RetryPolicy, optional): Retry commands failed because of the transport. Defaults to None.
+        cache_sudo (bool): Validate sudo once and run privileged commands with `sudo -n`. Defaults to False.
+        metrics (MetricsRegistry, optional): The registry to record command metrics into. None records nothing.
+            Defaults to GLOBAL_METRICS.
+        jump (JumpHost, optional): A bastion to reach the host through. Defaults to None.
+        compression (CompressionPolicy, optional): Have the host compress large command outputs. Defaults to None.
 
     Raises:
         ValueError: If the connection fails.
     """
 
-    def __init__(self, address: str, port: int, user: str, passwd: str, logger: Optional[Logger] = None) -> None:
+    def __init__(self, address: str, port: int, user: str, passwd: str, logger: Optional[Logger] = None,
+                 pool: Optional[SSHConnectionPool] = None, fail_fast: bool = False,
+                 timeout: Optional[float] = None, persistent_shell: bool = False,
+                 use_agent: bool = False, lazy: bool = False, keepalive: int = 30,
+                 retry: Optional[RetryPolicy] = None, cache_sudo: bool = False,
+                 metrics: Optional[MetricsRegistry] = GLOBAL_METRICS, jump: Optional[JumpHost] = None,
+                 compression: Optional[CompressionPolicy] = None) -> None:
         """
         Constructs an SSHConnector object
 
@@ -36,124 +60,52 @@ class SSHConnector(ModelConnector):
             user (str): The username to use.
             passwd (str): The password to use.
             logger (Logger, optional): The logger to log. Defaults to None.
+            pool (SSHConnectionPool, optional): A connection pool to draw the connection from.
+                See `post.connection.pool.GLOBAL_POOL`. Defaults to None.
+            fail_fast (bool): Raise CommandError as soon as a command exits with a non-zero status.
+                Defaults to False.
+            timeout (float, optional): Seconds to wait for a command to finish. Defaults to None (no limit).
+            persistent_shell (bool): Run privileged commands in one root shell kept open for the connector.
+                Defaults to False.
+            use_agent (bool): Start the remote helper agent for file, user and package queries.
+                Defaults to False.
+            lazy (bool): Connect on the first command instead of now. Defaults to False.
+            keepalive (int): Seconds between keepalive packets. 0 disables them. Defaults to 30.
+            retry (RetryPolicy, optional): Retry commands failed because of the transport. Defaults to None.
+            cache_sudo (bool): Validate sudo once and run privileged commands with `sudo -n`. Defaults to False.
+            metrics (MetricsRegistry, optional): The registry to record command metrics into. None records
+                nothing. Defaults to GLOBAL_METRICS.
+            jump (JumpHost, optional): A bastion to reach the host through. Defaults to None.
+            compression (CompressionPolicy, optional): Have the host compress large command outputs.
+                Defaults to None.
 
         Raises:
             ValueError: If the connection fails.
         """
-        if logger is None:
-            self.logger = GLOBAL_LOGGER
-        else:
-            self.logger = logger
-
-        self.address = address
-        self.port = port
-        self.user = user
-        self.passwd = passwd
-        self.client = self.connect()
-
-    def __str__(self) -> str:
-        return f"{self.__class__.__name__}(address: {self.address}:{self.port}, user: {self.user})"
-
-    def __repr__(self) -> str:
-        return self.__str__()
-
-    def __del__(self):
-        self.close()
-
-    def close(self) -> None:
-        """Closes the connection"""
-        self.logger.info("Closing Connection")
-
-        try:
-            if self.client is not None:
-                self.client.close()
-                del self.client
-        except Exception as e:
-            self.logger.warning(e)
-
-    def connect(self) -> SSHClient:
+        super().__init__(address, port, user, passwd=passwd, logger=logger, pool=pool, fail_fast=fail_fast,
+                         timeout=timeout, persistent_shell=persistent_shell,
+                         use_agent=use_agent, lazy=lazy, keepalive=keepalive, retry=retry,
+                         cache_sudo=cache_sudo, metrics=metrics, jump=jump, compression=compression)
+        if not lazy:
+            self.client = self.connect()
+
+    def _new_client(self) -> SSHClient:
         """
-        Connects to the server
+        Creates a new client and authenticates with the password
 
         Raises:
             ValueError: If the connection fails.
         """
-        self.logger.info("Connecting")
-
         client = SSHClient()
         client.set_missing_host_key_policy(AutoAddPolicy())
         try:
             client.connect(
                 hostname=self.address, port=self.port,
                 username=self.user, password=self.passwd,
-                timeout=10
+                sock=self._sock(), timeout=10
             )
             return client
         except ValueError as e:
             print(e)
             self.logger.error(e)
             raise ValueError(e)
-
-    def _validate(self, stdout: ChannelFile, stderr: ChannelFile) -> None:
-        """
-        Validates the command. Checks if standard error contains any error.
-
-        Args:
-            stdout (ChannelFile): A paramiko ChannelFile of standard output
-            stderr (ChannelFile): A paramiko ChannelFile of standard error
-
-        Raises:
-            CommandError: If the standard error contains any error
-        """
-        self.logger.info("Validating command")
-
-        return
-        # Thanks to İbrahim ARI reminds me of exit code.
-        # Still hangs. https://github.com/paramiko/paramiko/issues/448
-        # May replace paramiko
-        # if stdout.channel.recv_exit_status() != 0:
-        #     self.logger.error(stderr.read().decode())
-        #     raise CommandError(stderr.read().decode())
-
-    def run(self, command: str) -> ChannelFile:
-        """
-        Runs a command with user privileges
-
-        Args:
-            command (str): the shell command to execute
-
-        Raises:
-            CommandError: If the standard error contains any error
-        """
-        self.logger.info("Run command")
-
-        stdin, stdout, stderr = self.client.exec_command(command)
-        self._validate(stdout, stderr)
-
-        return stdout
-
-    def sudo_run(self, command: str, passwd: Optional[str] = None) -> ChannelFile:
-        """
-        Runs a command with root privileges
-
-        Args:
-            command (str): the shell command to execute
-            passwd (str, optional): the password to use. useful if connection is done via ssh-keys and no actual
-                password is available. Defaults to None.
-
-        Raises:
-            CommandError: If the standard error contains any error
-        """
-        self.logger.info("Run command as ROOT")
-
-        if passwd is None:
-            passwd_to_use = self.passwd
-        else:
-            passwd_to_use = passwd
-
-        sudo_command = f"sudo -S -p '' su -c \"{command}\""
-        stdin, stdout, stderr = self.client.exec_command(sudo_command)
-        stdin.write(passwd_to_use + "\n")
-        stdin.flush()
-        self._validate(stdout, stderr)
-        return stdout
@@ -0,0 +1,71 @@
+import codecs
+import select
+from typing import Iterable, Iterator
+
+from paramiko.channel import Channel
+
+CHUNK_SIZE = 32768
+
+STDERR_LIMIT = 65536
+
+
+def iter_lines(chunks: Iterable[bytes], encoding: str = "utf-8") -> Iterator[str]:
+    """
+    Decodes a stream of byte chunks and yields it line by line (without the line break).
+
+    Only the current (incomplete) line is kept in memory.
+
+    Args:
+        chunks (Iterable[bytes]): byte chunks in order
+        encoding (str): the encoding of the stream. Defaults to utf-8.
+
+    Returns:
+        Iterator[str]: decoded lines
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    rest = ""
+    for chunk in chunks:
+        text = rest + decoder.decode(chunk)
+        lines = text.split("\n")
+        rest = lines.pop()
+        yield from lines
+
+    rest += decoder.decode(b"", final=True)
+    if rest:
+        yield rest
+
+
+def iter_channel(channel: Channel, stderr: bytearray) -> Iterator[bytes]:
+    """
+    Yields the standard output of an executed channel chunk by chunk as it arrives.
+
+    The standard error is drained at the same time into `stderr`, of which only the last `STDERR_LIMIT` bytes
+    are kept. Since chunks are only received when asked for, the SSH window keeps the buffered data bounded.
+
+    Args:
+        channel (Channel): A channel on which `exec_command` was called.
+        stderr (bytearray): A buffer to collect the tail of the standard error.
+
+    Returns:
+        Iterator[bytes]: chunks of the standard output
+    """
+    while True:
+        received = False
+        if channel.recv_stderr_ready():
+            stderr += channel.recv_stderr(CHUNK_SIZE)
+            del stderr[:-STDERR_LIMIT]
+            received = True
+
+        if channel.recv_ready():
+            data = channel.recv(CHUNK_SIZE)
+            if data:
+                yield data
+                continue
+
+        if channel.eof_received or channel.closed:
+            if not channel.recv_ready() and not channel.recv_stderr_ready():
+                return
+            continue
+
+        if not received:
+            select.select([channel], [], [], 0.1)
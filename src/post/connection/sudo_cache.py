@@ -0,0 +1,169 @@
+import threading
+from logging import Logger
+from typing import Callable, Dict, Optional
+
+from post.connection.command_result import CommandResult
+from post.utils.common import GLOBAL_LOGGER
+
+# Written by `SudoCache.command` itself, so it does not depend on the language of sudo
+PASSWORD_REQUIRED = b"post-sudo-password-required"
+
+
+class SudoCache:
+    """
+    Keeps the sudo credentials of a connector validated, so commands run with `sudo -n` and skip authentication.
+
+    The password is given once to `sudo -v`, which starts sudo's timestamp. Commands then run with `sudo -n`. If the
+    timestamp expired, `sudo -n` refuses to run and the command is run again with the password (a fallback).
+
+    sudo keeps the timestamp per terminal by default (`timestamp_type=tty`), and commands run over SSH without a
+    terminal may never share it. After `max_misses` fallbacks in a row the cache disables itself, so such hosts do
+    not pay for the extra attempt.
+
+    Args:
+        max_misses (int): Consecutive fallbacks after which the cache is disabled. Defaults to 2.
+        logger (Logger, optional): The logger to log. Defaults to None.
+        on_observe (Callable[[str, bool], None], optional): Called with the command and True for each hit, False
+            for each fallback. Connectors record them in their metrics. Defaults to None.
+    """
+
+    def __init__(self, max_misses: int = 2, logger: Optional[Logger] = None,
+                 on_observe: Optional[Callable[[str, bool], None]] = None) -> None:
+        if logger is None:
+            self.logger = GLOBAL_LOGGER
+        else:
+            self.logger = logger
+
+        self.max_misses = max_misses
+        self.enabled = True
+        self.validated = False
+        self.misses = 0
+        self.validations = 0
+        self.hits = 0
+        self.fallbacks = 0
+        self.auth_seconds = 0.0
+        self.on_observe = on_observe
+        self.lock = threading.Lock()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(enabled: {self.enabled}, hits: {self.hits}, fallbacks: {self.fallbacks})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    @property
+    def saved_seconds(self) -> float:
+        """Estimated authentication time saved: the average `sudo -v` duration times the cache hits"""
+        if self.validations == 0:
+            return 0.0
+
+        return self.hits * self.auth_seconds / self.validations
+
+    def metrics(self) -> Dict[str, float]:
+        """
+        Returns the counters of the cache.
+
+        Returns:
+            Dict[str, float]: validations, hits, fallbacks, auth_seconds and saved_seconds
+        """
+        return {
+            "validations": self.validations,
+            "hits": self.hits,
+            "fallbacks": self.fallbacks,
+            "auth_seconds": self.auth_seconds,
+            "saved_seconds": self.saved_seconds,
+        }
+
+    def validate(self, execute: Callable[[str, Optional[bytes]], CommandResult], password_line: bytes) -> bool:
+        """
+        Starts sudo's timestamp with `sudo -v` unless it was already started.
+
+        Args:
+            execute (Callable): runs a shell command with the given standard input and returns its result
+            password_line (bytes): the sudo password followed by a line break
+
+        Returns:
+            bool: True if commands can be run with `command`. False if the cache is disabled or the validation failed.
+        """
+        if not self.enabled:
+            return False
+
+        if not self.validated:
+            validation = execute("sudo -S -p '' -v", password_line)
+            with self.lock:
+                self.validations += 1
+                self.auth_seconds += validation.wall_time
+                self.validated = validation.ok
+
+            if not validation.ok:
+                self.logger.warning("Could not validate sudo credentials")
+                return False
+
+        return True
+
+    @staticmethod
+    def command(command: str) -> str:
+        """
+        Returns the command line running a command as root with the cached credentials.
+
+        `sudo -n true` checks the timestamp first. If it expired, `PASSWORD_REQUIRED` is written to the standard error
+        instead of running the command, so a miss is told apart from a failing command in any locale of sudo.
+
+        Args:
+            command (str): the command to run as root, quoted as for `su -c "<command>"`
+        """
+        return f"sudo -n true 2>/dev/null || {{ echo {PASSWORD_REQUIRED.decode()} >&2; exit 1; }}; " \
+               f"sudo -n su -c \"{command}\""
+
+    def observe(self, result: CommandResult, command: Optional[str] = None) -> bool:
+        """
+        Counts the result of a `command` as a hit or a fallback.
+
+        Args:
+            result (CommandResult): the result of the command line returned by `command`
+            command (str, optional): the command run as root, given to `on_observe`. Defaults to the command of the
+                result.
+
+        Returns:
+            bool: True if the command ran. False if the timestamp expired and it must be run with the password.
+        """
+        with self.lock:
+            hit = not (result.exit_code == 1 and PASSWORD_REQUIRED in result.stderr)
+            if hit:
+                self.hits += 1
+                self.misses = 0
+            else:
+                self.fallbacks += 1
+                self.misses += 1
+                self.validated = False
+                if self.misses >= self.max_misses:
+                    self.logger.warning("sudo credentials are not cached on this host. Disabling the sudo cache")
+                    self.enabled = False
+
+        if self.on_observe is not None:
+            self.on_observe(command if command is not None else result.command, hit)
+
+        return hit
+
+    def run(self, execute: Callable[[str, Optional[bytes]], CommandResult], command: str,
+            password_line: bytes) -> Optional[CommandResult]:
+        """
+        Runs a command as root with the cached credentials.
+
+        Args:
+            execute (Callable): runs a shell command with the given standard input and returns its result
+            command (str): the command to run as root, quoted as for `su -c "<command>"`
+            password_line (bytes): the sudo password followed by a line break
+
+        Returns:
+            CommandResult: the result. None if the cache is disabled or could not be used, in which case the caller
+                runs the command with the password.
+        """
+        if not self.validate(execute, password_line):
+            return None
+
+        result = execute(self.command(command), None)
+        if not self.observe(result, command):
+            return None
+
+        return result
@@ -2,7 +2,7 @@ import csv
 
 from PyQt6 import QtWidgets, QtCore, QtGui
 
-from post import SSHConnector
+from post import SSHConnector, connect_all
 from post.gui.add import Ui_FormAdd
 
 
@@ -48,9 +48,11 @@ class AddMainForm(QtWidgets.QWidget, Ui_FormAdd):
             self.the_parent.gui_functions.error("No connection is available")
             return
 
+        # Connectors are lazy: hosts are only dialed when they are used
         for it, each_connection in enumerate(all_connections, start=1):
             try:
-                connection = SSHConnector(*each_connection)
+                address, port, user, passwd = each_connection
+                connection = SSHConnector(address, int(port), user, passwd, lazy=True)
                 self.the_parent.add_connection(connection)
             except Exception as e:
                 self.the_parent.logger.warning(e)
@@ -105,19 +107,22 @@ class AddMainForm(QtWidgets.QWidget, Ui_FormAdd):
             self.the_parent.gui_functions.warning("Nothing to test")
             return
 
-        for it, each_connection in enumerate(all_connections, start=1):
-            try:
-                _ = SSHConnector(*each_connection)
-                color = "green"
-            except Exception as e:
-                color = "red"
-                self.the_parent.logger.warning(e)
-
-            for i in range(4):
-                item = self.tableWidgetBulkInformation.item(it - 1, i)
-                item.setForeground(QtGui.QColor(color))
-
-            self.progressBar.setValue(int(100 * it / len(all_connections)))
+        concurrency = 16
+        for start in range(0, len(all_connections), concurrency):
+            batch = all_connections[start:start + concurrency]
+            # A port that is not a number is dialed as 0, which fails and is marked red like any unreachable host
+            connections = [SSHConnector(address, int(port) if port.isdigit() else 0, user, passwd, lazy=True)
+                           for address, port, user, passwd in batch]
+            errors = connect_all(connections, concurrency=concurrency)
+
+            for it, (connection, error) in enumerate(zip(connections, errors), start=start):
+                connection.close()
+                color = "green" if error is None else "red"
+                for i in range(4):
+                    item = self.tableWidgetBulkInformation.item(it, i)
+                    item.setForeground(QtGui.QColor(color))
+
+            self.progressBar.setValue(int(100 * (start + len(batch)) / len(all_connections)))
             QtCore.QCoreApplication.processEvents()
 
     def import_connections(self):
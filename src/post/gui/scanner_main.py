@@ -2,7 +2,7 @@ from PyQt6 import QtWidgets, QtCore, QtGui
 
 from post import SSHConnector
 from post.gui.scanner import Ui_FormScanner
-from post.utils.common import check_ssh
+from post.utils.scanner import Scanner
 
 
 class ScannerMainForm(QtWidgets.QWidget, Ui_FormScanner):
@@ -11,6 +11,7 @@ class ScannerMainForm(QtWidgets.QWidget, Ui_FormScanner):
         self.setupUi(self)
 
         self.the_parent = parent
+        self.scan_results = {}
 
         self.the_parent.logger.info("Scanner window loaded")
 
@@ -42,8 +43,26 @@ class ScannerMainForm(QtWidgets.QWidget, Ui_FormScanner):
             "Clear",
             lambda: self.the_parent.gui_functions.clear_table(self.tableWidgetConnection),
         )
+        menu.addAction("Keep SSH only", lambda: self.filter_rows(lambda result: result.is_ssh))
+        menu.addAction("Filter...", self.ask_filter)
         menu.exec(self.tableWidgetConnection.mapToGlobal(position))
 
+    def filter_rows(self, keep):
+        self.the_parent.logger.info("Filtering scan results")
+
+        for row in reversed(range(self.tableWidgetConnection.rowCount())):
+            key = (self.tableWidgetConnection.item(row, 0).text(), self.tableWidgetConnection.item(row, 1).text())
+            result = self.scan_results.get(key)
+            if result is None or not keep(result):
+                self.tableWidgetConnection.removeRow(row)
+
+    def ask_filter(self):
+        text, ok = QtWidgets.QInputDialog.getText(
+            self, "Filter", "Keep the hosts whose banner, OS or host key contains:"
+        )
+        if ok and text.strip():
+            self.filter_rows(lambda result: result.matches(text))
+
     def toggle_password_visibility(self):
         self.the_parent.logger.info("Password visibility toggled")
 
@@ -65,23 +84,25 @@ class ScannerMainForm(QtWidgets.QWidget, Ui_FormScanner):
         lower_range = self.spinBoxLastOctetLower.value()
 
         port = self.spinBoxPort.value()
-        the_range = range(lower_range, upper_range + 1)
-        connections = []
-        for it, last_octet in enumerate(the_range, start=1):
-            try:
-                ip = f"{first_octet}.{second_octet}.{third_octet}.{last_octet}"
-                check = check_ssh(ip, port=port)
-
-                if check:
-                    connections.append([ip, port, "", ""])
-            except Exception as e:
-                self.the_parent.logger.warning(e)
-
-            self.progressBar.setValue(int(100 * it / len(the_range)))
-            QtCore.QCoreApplication.processEvents()
-
-        self.the_parent.gui_functions.add_to_table(self.tableWidgetConnection, connections)
-
+        prefix = f"{first_octet}.{second_octet}.{third_octet}"
+        scanner = Scanner(f"{prefix}.{lower_range}-{prefix}.{upper_range}", ports=[port], host_keys=True,
+                          logger=self.the_parent.logger)
+        try:
+            for result in scanner.stream(heartbeat=0.1):
+                if result is not None:
+                    self.scan_results[(result.address, str(result.port))] = result
+                    self.the_parent.gui_functions.add_to_table(
+                        self.tableWidgetConnection, [[result.address, result.port, "", ""]]
+                    )
+                    row = self.tableWidgetConnection.rowCount() - 1
+                    self.tableWidgetConnection.item(row, 0).setToolTip(result.summary)
+
+                self.progressBar.setValue(int(100 * scanner.scanned / max(1, scanner.total)))
+                QtCore.QCoreApplication.processEvents()
+        except Exception as e:
+            self.the_parent.logger.warning(e)
+
+        self.progressBar.setValue(100)
         self.stackedWidget.setCurrentIndex(1)
 
     def test(self):
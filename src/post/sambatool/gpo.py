@@ -1,43 +1,54 @@
 from logging import Logger
-from typing import Optional, Literal
+from typing import Optional, Literal, Iterable, Iterator, Tuple
 from typing_extensions import Self
 
+import itertools
 import re
 
-from post import SSHConnector, Config, ConfigRaw
+from post import SSHConnector, Config
 from post.connection.model_connector import ModelConnector
+from post.connection.pool import GLOBAL_POOL
 from post.utils.common import GLOBAL_LOGGER, random_filename
 from post.utils.error import NotFound, CommandError, AlreadyExist, NumberOfElementsError
+from post.utils.tracing import traced_methods
 
 
-def gpo_parser(text: str) -> dict[str, dict[str, str]]:
+def gpo_stream_parser(lines: Iterable[str]) -> Iterator[Tuple[str, dict[str, str]]]:
     """
-    Parses `samba-tool gpo listall`'s output to a dictionary
+    Parses `samba-tool gpo listall`'s output line by line and yields GPOs as their blocks end
     Args:
-        text (str): the output of `samba-tool gpo listall`
+        lines (Iterable[str]): lines of the output of `samba-tool gpo listall`
 
     Returns:
-        Dict: dictionary of GPOs
+        Iterator[Tuple[str, Dict]]: (GUID, GPO) pairs
 
     """
-    gpo_blocks = text.strip().split("\n\n")
+    gpo: dict[str, str] = {}
+    for line in itertools.chain(lines, [""]):
+        if line == "":
+            if "gpo" in gpo:
+                gpo_id = gpo.pop("gpo")
+                yield gpo_id, gpo
+            gpo = {}
+            continue
 
-    gpos = {}
-    for block in gpo_blocks:
-        gpo = {}
-        lines = block.split("\n")
+        key, _, value = line.partition(":")
+        key = key.strip().lower().replace(" ", "_")
+        value = value.strip()
+        gpo[key] = value
 
-        for line in lines:
-            key, _, value = line.partition(":")
-            key = key.strip().lower().replace(" ", "_")
-            value = value.strip()
-            gpo[key] = value
 
-        if "gpo" in gpo:
-            gpo_id = gpo.pop("gpo")
-            gpos[gpo_id] = gpo
+def gpo_parser(text: str) -> dict[str, dict[str, str]]:
+    """
+    Parses `samba-tool gpo listall`'s output to a dictionary
+    Args:
+        text (str): the output of `samba-tool gpo listall`
+
+    Returns:
+        Dict: dictionary of GPOs
 
-    return gpos
+    """
+    return dict(gpo_stream_parser(text.strip().split("\n")))
 
 
 def parse_ldif(ldif_str) -> dict[str, str]:
@@ -79,6 +90,7 @@ def parse_ldif(ldif_str) -> dict[str, str]:
     return parse_to_dict("\n".join(data))
 
 
+@traced_methods
 class GPO:
     def __init__(self, connector: ModelConnector, ad_passwd: Optional[str] = None, sudo_passwd: Optional[str] = None,
                  logger: Optional[Logger] = None) -> None:
@@ -174,7 +186,7 @@ class GPO:
         Raises:
             ValueError: If a connection cannot be established
         """
-        ssh_connector = SSHConnector(address, port, user, passwd, logger=logger)
+        ssh_connector = SSHConnector(address, port, user, passwd, logger=logger, pool=GLOBAL_POOL)
         return cls(ssh_connector, ad_passwd=ad_passwd, sudo_passwd=sudo_passwd, logger=logger)
 
     def list(self) -> dict[str, dict[str, str]]:
@@ -186,9 +198,8 @@ class GPO:
         """
         self.logger.info("Getting GPO list")
 
-        stdout = self.connector.sudo_run("samba-tool gpo listall", passwd=self.sudo_passwd)
-        gpo_list_as_text = stdout.read().decode()
-        return gpo_parser(gpo_list_as_text)
+        lines = self.connector.sudo_run_stream("samba-tool gpo listall", passwd=self.sudo_passwd)
+        return dict(gpo_stream_parser(lines))
 
     def create(self, name: str, ad_passwd: Optional[str] = None) -> str:
         """
@@ -459,7 +470,7 @@ class GPO:
         psscripts_file = f"{scripts_dir}/psscripts.ini"
         script_file_name = random_filename()
 
-        with open(script_path, "r") as script_2_read:
+        with open(script_path, "rb") as script_2_read:
             info = self.info(gpo)
 
             psscripts = Config(self.connector, psscripts_file, create=True, backup=False)
@@ -476,8 +487,10 @@ class GPO:
             else:
                 psscripts[on_titled] = {f"0CmdLine": f"{script_file_name}", f"0Parameters": f"{parameters}"}
 
-            script = ConfigRaw(self.connector, f"{script_place}/{script_file_name}", create=True, backup=False)
-            script.data = script_2_read.read()
+            mkdir_stdout = self.connector.sudo_run(f"mkdir -p {script_place}", passwd=self.sudo_passwd)
+            _ = mkdir_stdout.read().decode()
+            self.connector.write_file(f"{script_place}/{script_file_name}", script_2_read.read(),
+                                      passwd=self.sudo_passwd)
 
             chmod_stdout = self.connector.sudo_run(
                 f"chmod -R 770 {root_dir}",
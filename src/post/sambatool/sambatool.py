@@ -6,10 +6,13 @@ from typing_extensions import Self
 from .gpo import GPO
 from .user import User
 from post.connection.model_connector import ModelConnector
+from post.connection.pool import GLOBAL_POOL
 from post.utils.common import GLOBAL_LOGGER
+from post.utils.tracing import traced_methods
 from .. import SSHConnector
 
 
+@traced_methods
 class SambaTool:
     def __init__(self, connector: ModelConnector, ad_passwd: Optional[str] = None, sudo_passwd: Optional[str] = None,
                  logger: Optional[Logger] = None):
@@ -53,5 +56,5 @@ class SambaTool:
         Raises:
             ValueError: If a connection cannot be established
         """
-        ssh_connector = SSHConnector(address, port, user, passwd, logger=logger)
+        ssh_connector = SSHConnector(address, port, user, passwd, logger=logger, pool=GLOBAL_POOL)
         return cls(ssh_connector, ad_passwd=ad_passwd, sudo_passwd=sudo_passwd, logger=logger)
\ No newline at end of file
@@ -4,10 +4,13 @@ from typing_extensions import Self
 
 from post import SSHConnector
 from post.connection.model_connector import ModelConnector
+from post.connection.pool import GLOBAL_POOL
 from post.utils.common import GLOBAL_LOGGER
 from post.utils.error import NotFound
+from post.utils.tracing import traced_methods
 
 
+@traced_methods
 class User:
     def __init__(self, connector: ModelConnector, ad_passwd: Optional[str] = None, sudo_passwd: Optional[str] = None,
                  logger: Optional[Logger] = None) -> None:
@@ -70,7 +73,7 @@ class User:
         Raises:
             ValueError: If a connection cannot be established
         """
-        ssh_connector = SSHConnector(address, port, user, passwd, logger=logger)
+        ssh_connector = SSHConnector(address, port, user, passwd, logger=logger, pool=GLOBAL_POOL)
         return cls(ssh_connector, ad_passwd=ad_passwd, sudo_passwd=sudo_passwd, logger=logger)
 
     def __list(self):
@@ -0,0 +1,132 @@
+from logging import Logger
+from typing import Optional, List, Dict
+
+from typing_extensions import Self
+
+from post.connection.async_model_connector import AsyncModelConnector
+from post.connection.async_ssh_connector import AsyncSSHConnector
+from post.connection.pool import GLOBAL_POOL
+from post.service.service import service_parser
+from post.utils.common import escape_string, GLOBAL_LOGGER
+from post.utils.error import NotFound
+
+
+class AsyncService:
+    """
+    asyncio Service manager. Does what Service does using an AsyncModelConnector.
+
+    Args:
+        connector (AsyncModelConnector): A connector that extends from AsyncModelConnector abstract class.
+        sudo_passwd (str, optional): The sudo password of the user if the connection is done by an ssh key. Defaults to None.
+        logger (Logger, optional): A logger to log. Defaults to None.
+    """
+    def __init__(self, connector: AsyncModelConnector, sudo_passwd: Optional[str] = None,
+                 logger: Optional[Logger] = None) -> None:
+        """
+        Constructs an AsyncService object
+
+        Args:
+            connector (AsyncModelConnector): A connector that extends from AsyncModelConnector abstract class.
+            sudo_passwd (str, optional): The sudo password of the user if the connection is done by an ssh key. Defaults to None.
+            logger (Logger, optional): A logger to log. Defaults to None.
+        """
+        if logger is None:
+            self.logger = GLOBAL_LOGGER
+        else:
+            self.logger = logger
+
+        self.sudo_passwd = sudo_passwd
+        self.connector = connector
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(connector: {self.connector})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    @classmethod
+    def from_ssh_connector(cls, address: str, port: int, user: str, passwd: str,
+                           logger: Optional[Logger] = None) -> Self:
+        """
+        Constructs an AsyncService object using an ssh connection information. The connection is established on the
+        first call.
+
+        Args:
+            address (str): An IP address or hostname.
+            port (int): The ssh port. Most probably is 22.
+            user (str): The ssh username.
+            passwd (str): The ssh user's password.
+            logger (Logger, optional): A logger to log. Defaults to None.
+
+        Returns:
+            Self: An AsyncService object.
+        """
+        ssh_connector = AsyncSSHConnector(address, port, user, passwd, logger=logger, pool=GLOBAL_POOL)
+        return cls(ssh_connector, logger=logger)
+
+    async def __systemctl(self, action: str, service: str) -> None:
+        await self.check(service)
+
+        escape_string(service)
+        _ = await self.connector.sudo_run(f"systemctl {action} {service}", passwd=self.sudo_passwd)
+
+    async def check(self, service: str) -> None:
+        """See Service.check"""
+        self.logger.info("Checking if service exists")
+
+        services = [service["unit"] for service in await self.list()]
+        if service not in services:
+            raise NotFound("No service was found with the given name")
+
+    async def list(self) -> List[Dict[str, str]]:
+        """See Service.list"""
+        self.logger.info("Listing all services")
+
+        command = "systemctl list-units -all --no-pager --no-legend | tr -cd '\11\12\15\40-\176'"
+        stdout = await self.connector.run(command)
+        return service_parser(stdout.decode())
+
+    async def start(self, service: str) -> None:
+        """See Service.start"""
+        self.logger.info("Starting a service")
+
+        await self.__systemctl("start", service)
+
+    async def stop(self, service: str) -> None:
+        """See Service.stop"""
+        self.logger.info("Stopping a service")
+
+        await self.__systemctl("stop", service)
+
+    async def restart(self, service: str) -> None:
+        """See Service.restart"""
+        self.logger.info("Restarting a service")
+
+        await self.__systemctl("restart", service)
+
+    async def enable(self, service: str) -> None:
+        """See Service.enable"""
+        self.logger.info("Enabling a service")
+
+        await self.__systemctl("enable", service)
+
+    async def disable(self, service: str) -> None:
+        """See Service.disable"""
+        self.logger.info("Disabling a service")
+
+        await self.__systemctl("disable", service)
+
+    async def logs(self, service: str) -> List[str]:
+        """See Service.logs"""
+        self.logger.info("Getting logs of a service")
+
+        await self.check(service)
+
+        escape_string(service)
+        stdout = await self.connector.sudo_run(f"sudo journalctl -u {service} -b -o short-iso",
+                                               passwd=self.sudo_passwd)
+        return stdout.decode().strip().splitlines()
+
+    async def daemon_reload(self) -> None:
+        """See Service.daemon_reload"""
+        _ = await self.connector.sudo_run("sudo systemctl daemon-reload", passwd=self.sudo_passwd)
@@ -1,16 +1,55 @@
 from datetime import datetime
 from logging import Logger
-from typing import Optional, List, Dict, Union
+from typing import Optional, List, Dict, Union, Iterable, Iterator
 
 from typing_extensions import Self
 
 from post import SSHConnector
 from post.connection.model_connector import ModelConnector
+from post.connection.pool import GLOBAL_POOL
+from post.connection.result_cache import ResultCache
 from post.service.model_service import ModelService
 from post.utils.common import escape_string, GLOBAL_LOGGER
 from post.utils.error import NotFound
+from post.utils.tracing import traced_methods
 
 
+def service_stream_parser(lines: Iterable[str]) -> Iterator[Dict[str, str]]:
+    """
+    Parses `systemctl list-units`'s output line by line and yields services as they are parsed
+
+    Args:
+        lines (Iterable[str]): lines of the output of `systemctl list-units --no-legend`
+
+    Returns:
+        Iterator[Dict[str, str]]: services as dictionaries.
+    """
+    for row in lines:
+        if row:
+            columns = row.split()
+            yield {
+                "unit": columns[0],
+                "load": columns[1],
+                "active": columns[2],
+                "substate": columns[3],
+                "description": " ".join(columns[4:])
+            }
+
+
+def service_parser(text: str) -> List[Dict[str, str]]:
+    """
+    Parses `systemctl list-units`'s output to a list of services
+
+    Args:
+        text (str): the output of `systemctl list-units --no-legend`
+
+    Returns:
+        List[Dict[str, str]]: The list of services as a dictionary.
+    """
+    return list(service_stream_parser(text.split("\n")))
+
+
+@traced_methods
 class Service(ModelService):
     """
     Service package manager.
@@ -19,9 +58,11 @@ class Service(ModelService):
         connector (ModelConnector): A connector that extends from ModelConnector abstract class.
         sudo_passwd (str, optional): The sudo password of the user if the connection is done by an ssh key. Defaults to None.
         logger (Logger, optional): A logger to log. Defaults to None.
+        cache (ResultCache, optional): The cache of unit lists, e.g. GLOBAL_RESULT_CACHE. Defaults to None (no
+            caching).
     """
     def __init__(self, connector: ModelConnector, sudo_passwd: Optional[str] = None,
-                 logger: Optional[Logger] = None) -> None:
+                 logger: Optional[Logger] = None, cache: Optional[ResultCache] = None) -> None:
         """
         Constructs an Service object
 
@@ -29,6 +70,8 @@ class Service(ModelService):
             connector (ModelConnector): A connector that extends from ModelConnector abstract class.
             sudo_passwd (str, optional): The sudo password of the user if the connection is done by an ssh key. Defaults to None.
             logger (Logger, optional): A logger to log. Defaults to None.
+            cache (ResultCache, optional): The cache of unit lists, e.g. GLOBAL_RESULT_CACHE. Defaults to None (no
+                caching).
         """
         if logger is None:
             self.logger = GLOBAL_LOGGER
@@ -37,6 +80,7 @@ class Service(ModelService):
 
         self.sudo_passwd = sudo_passwd
         self.connector = connector
+        self.cache = cache
 
     def __str__(self) -> str:
         return f"{self.__class__.__name__}(connector: {self.connector})"
@@ -63,7 +107,7 @@ class Service(ModelService):
                 Raises:
                     ValueError: If a connection cannot be established
                 """
-        ssh_connector = SSHConnector(address, port, user, passwd, logger=logger)
+        ssh_connector = SSHConnector(address, port, user, passwd, logger=logger, pool=GLOBAL_POOL)
         return cls(ssh_connector, logger=logger)
 
     def check(self, service: str) -> None:
@@ -84,31 +128,28 @@ class Service(ModelService):
 
     def list(self) -> List[Dict[str, str]]:
         """
-        Returns a list of services as a dictionary
+        Returns a list of services as a dictionary. With a `cache`, a non-empty result is kept per host (see
+        `ResultCache`) until a mutating method of Service runs on the host.
 
         Returns:
             List[Dict[str, str]]: The list of services as a dictionary.
         """
         self.logger.info("Listing all services")
 
+        if self.cache is None:
+            return self.__list_units()
+
+        return list(self.cache.get_or_load(self.connector, "systemd.units", self.__list_units, cacheable=bool))
+
+    def __list_units(self) -> List[Dict[str, str]]:
+        """Runs `systemctl list-units` and parses its output"""
+        agent = self.connector.get_agent(passwd=self.sudo_passwd)
+        if agent is not None:
+            return service_parser(agent.systemd_units())
+
         command = "systemctl list-units -all --no-pager --no-legend | tr -cd '\11\12\15\40-\176'"
-        stdout = self.connector.run(command)
-
-        table_to_return = []
-        for row in stdout.read().decode().split("\n"):
-            if row:
-                columns = row.split()
-                table_to_return.append(
-                    {
-                        "unit": columns[0],
-                        "load": columns[1],
-                        "active": columns[2],
-                        "substate": columns[3],
-                        "description": " ".join(columns[4:])
-                    }
-                )
-
-        return table_to_return
+
+        return list(service_stream_parser(self.connector.run_stream(command)))
 
     def start(self, service: str) -> None:
         """
@@ -129,6 +170,7 @@ class Service(ModelService):
 
         stdout = self.connector.sudo_run(command, passwd=self.sudo_passwd)
         _ = stdout.read().decode().strip().splitlines()
+        self._changed()
 
     def stop(self, service: str) -> None:
         """
@@ -148,6 +190,7 @@ class Service(ModelService):
         command = f"systemctl stop {service}"
         stdout = self.connector.sudo_run(command, passwd=self.sudo_passwd)
         _ = stdout.read().decode().strip().splitlines()
+        self._changed()
 
     def restart(self, service: str) -> None:
         """
@@ -168,6 +211,7 @@ class Service(ModelService):
 
         stdout = self.connector.sudo_run(command, passwd=self.sudo_passwd)
         _ = stdout.read().decode().strip().splitlines()
+        self._changed()
 
     def enable(self, service: str) -> None:
         """
@@ -188,6 +232,7 @@ class Service(ModelService):
 
         stdout = self.connector.sudo_run(command, passwd=self.sudo_passwd)
         _ = stdout.read().decode().strip().splitlines()
+        self._changed()
 
     def disable(self, service: str) -> None:
         """
@@ -208,6 +253,7 @@ class Service(ModelService):
 
         stdout = self.connector.sudo_run(command, passwd=self.sudo_passwd)
         _ = stdout.read().decode().strip().splitlines()
+        self._changed()
 
     def logs(self, service: str) -> List[str]:
         """
@@ -224,15 +270,34 @@ class Service(ModelService):
         """
         self.logger.info("Getting logs of a service")
 
+        return "\n".join(self.iter_logs(service)).strip().splitlines()
+
+    def iter_logs(self, service: str) -> Iterator[str]:
+        """
+        Yields logs of a service line by line while `journalctl` is still running.
+
+        Args:
+            service (str): The name of the service.
+
+        Returns:
+            Iterator[str]: each log line
+
+        Raises:
+            NotFound: If the service is not found.
+        """
         self.check(service)
 
         escape_string(service)
         command = f"sudo journalctl -u {service} -b -o short-iso"
 
-        stdout = self.connector.sudo_run(command, passwd=self.sudo_passwd)
-
-        return stdout.read().decode().strip().splitlines()
+        yield from self.connector.sudo_run_stream(command, passwd=self.sudo_passwd)
 
     def daemon_reload(self) -> None:
         stdout = self.connector.sudo_run("sudo systemctl daemon-reload", passwd=self.sudo_passwd)
         _ = stdout.read().decode().strip().splitlines()
+        self._changed()
+
+    def _changed(self) -> None:
+        """Drops the cached unit lists of the host after it was changed"""
+        if self.cache is not None:
+            self.cache.invalidate(self.connector, "systemd.")
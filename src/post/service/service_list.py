@@ -9,8 +9,10 @@ from post.connection.model_connector import ModelConnector
 from post.service.model_service_list import ModelServiceList
 from post.utils.common import GLOBAL_LOGGER
 from post.utils.error import NumberOfElementsError
+from post.utils.tracing import traced_methods
 
 
+@traced_methods
 class ServiceList(ModelServiceList):
     """
     ServiceList package manager.
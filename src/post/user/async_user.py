@@ -0,0 +1,154 @@
+from logging import Logger
+from typing import Optional, List, Union
+
+from typing_extensions import Self
+
+from post.connection.async_model_connector import AsyncModelConnector
+from post.connection.async_ssh_connector import AsyncSSHConnector
+from post.connection.pool import GLOBAL_POOL
+from post.user.user import (LIST_COMMAND, LIST_GROUPS_COMMAND, add_command, disable_command, enable_command,
+                            exist_command, group_add_command, group_rm_command, group_set_command, groups_command,
+                            groups_parser, info_command, info_parser, is_enabled_command, rm_command,
+                            set_password_command)
+from post.utils.common import GLOBAL_LOGGER
+
+
+class AsyncUser:
+    """
+    asyncio User manager. Does what User does using an AsyncModelConnector.
+
+    Args:
+        connector (AsyncModelConnector): A connector that extends from AsyncModelConnector abstract class.
+        sudo_passwd (str, optional): The sudo password of the user if the connection is done by an ssh key. Defaults to None.
+        logger (Logger, optional): A logger to log. Defaults to None.
+    """
+    def __init__(self, connector: AsyncModelConnector, sudo_passwd: Optional[str] = None,
+                 logger: Optional[Logger] = None) -> None:
+        """
+        Constructs an AsyncUser object
+
+        Args:
+            connector (AsyncModelConnector): A connector that extends from AsyncModelConnector abstract class.
+            sudo_passwd (str, optional): The sudo password of the user if the connection is done by an ssh key. Defaults to None.
+            logger (Logger, optional): A logger to log. Defaults to None.
+        """
+        if logger is None:
+            self.logger = GLOBAL_LOGGER
+        else:
+            self.logger = logger
+
+        self.sudo_passwd = sudo_passwd
+        self.connector = connector
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({self.connector})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    @classmethod
+    def from_ssh_connector(cls, address: str, port: int, user: str, passwd: str,
+                           logger: Optional[Logger] = None) -> Self:
+        """
+        Creates a Self from a given SSH information. The connection is established on the first call.
+
+        Args:
+            address (str): The address of the SSH connection.
+            port (int): The port of the SSH connection.
+            user (str): The username of the SSH connection.
+            passwd (str): The password of the SSH connection.
+            logger (Logger, optional): A logger to log. Defaults to None.
+
+        Returns:
+            Self: an instance of the self.
+        """
+        ssh_connector = AsyncSSHConnector(address, port, user, passwd, logger=logger, pool=GLOBAL_POOL)
+        return cls(ssh_connector, logger=logger)
+
+    async def __sudo(self, command: str) -> str:
+        stdout = await self.connector.sudo_run(command, passwd=self.sudo_passwd)
+        return stdout.decode()
+
+    async def __must_exist(self, username: str) -> None:
+        if not await self.exist(username):
+            raise ValueError("User does not exist")
+
+    async def list(self) -> List[str]:
+        """See User.list"""
+        return (await self.__sudo(LIST_COMMAND)).split()
+
+    async def list_groups(self) -> List[str]:
+        """See User.list_groups"""
+        return (await self.__sudo(LIST_GROUPS_COMMAND)).split()
+
+    async def exist(self, username: str) -> bool:
+        """See User.exist"""
+        return (await self.__sudo(exist_command(username))).strip() == "1"
+
+    async def add(self, username: str, home_dir: Optional[str] = None, shell: Optional[str] = None,
+                  full_name: Optional[str] = None) -> None:
+        """See User.add"""
+        if await self.exist(username):
+            raise ValueError("User already exists")
+
+        _ = await self.__sudo(add_command(username, home_dir, shell, full_name))
+
+    async def rm(self, username: str, remove_all_files: bool = False, remove_home_dir: bool = False) -> None:
+        """See User.rm"""
+        await self.__must_exist(username)
+
+        _ = await self.__sudo(rm_command(username, remove_all_files, remove_home_dir))
+
+    async def groups(self, username: str) -> List[str]:
+        """See User.groups"""
+        await self.__must_exist(username)
+
+        return groups_parser(await self.__sudo(groups_command(username)))
+
+    async def group_add(self, username: str, group_name: str) -> None:
+        """See User.group_add"""
+        if group_name in await self.groups(username):
+            raise ValueError("Already in the group")
+
+        _ = await self.__sudo(group_add_command(username, group_name))
+
+    async def group_set(self, username: str, group_names: List[str]) -> None:
+        """See User.group_set"""
+        await self.__must_exist(username)
+
+        _ = await self.__sudo(group_set_command(username, group_names))
+
+    async def group_rm(self, username: str, group_name: str) -> None:
+        """See User.group_rm"""
+        if group_name not in await self.groups(username):
+            raise ValueError("User is not in the group")
+
+        _ = await self.__sudo(group_rm_command(username, group_name))
+
+    async def enable(self, username: str) -> None:
+        """See User.enable"""
+        await self.__must_exist(username)
+
+        _ = await self.__sudo(enable_command(username))
+
+    async def disable(self, username: str) -> None:
+        """See User.disable"""
+        await self.__must_exist(username)
+
+        _ = await self.__sudo(disable_command(username))
+
+    async def is_enabled(self, username: str) -> bool:
+        """See User.is_enabled"""
+        return (await self.__sudo(is_enabled_command(username))).strip() != "L"
+
+    async def set_password(self, username: str, password: str) -> None:
+        """See User.set_password"""
+        await self.__must_exist(username)
+
+        _ = await self.__sudo(set_password_command(username, password))
+
+    async def info(self, username: str) -> List[Union[str, bool, int]]:
+        """See User.info"""
+        await self.__must_exist(username)
+
+        return info_parser(await self.__sudo(info_command(username)), await self.is_enabled(username))
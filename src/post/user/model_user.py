@@ -67,5 +67,5 @@ class ModelUser(ABC):
         """Change password"""
 
     @abstractmethod
-    def info(self, username: str) -> List[str]:
+    def info(self, username: str) -> List[Union[str, bool, int]]:
         """Get info about a user"""
\ No newline at end of file
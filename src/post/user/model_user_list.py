@@ -33,7 +33,7 @@ class ModelUserList(ABC):
         """Creates a Self of users from a list of connections and usernames"""
 
     @abstractmethod
-    def list(self) -> List[List[ModelUser]]:
+    def list(self) -> List[List[str]]:
         """Returns a list of users"""
 
     @abstractmethod
@@ -86,5 +86,5 @@ class ModelUserList(ABC):
         """Sets a user's password'"""
 
     @abstractmethod
-    def info(self, username: str) -> List[str]:
+    def info(self, username: str) -> List[List[Union[str, bool, int]]]:
         """Returns info about a user"""
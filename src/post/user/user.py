@@ -1,14 +1,150 @@
 from logging import Logger
-from typing import Optional, List
+from typing import Optional, List, Union
 
 from typing_extensions import Self
 
 from post import SSHConnector
 from post.connection.model_connector import ModelConnector
+from post.connection.pool import GLOBAL_POOL
 from post.user.model_user import ModelUser
 from post.utils.common import GLOBAL_LOGGER
+from post.utils.tracing import traced_methods
 
+LIST_COMMAND = "cat /etc/passwd | cut -d: -f1"
 
+LIST_GROUPS_COMMAND = "cat /etc/group|cut -d: -f1"
+
+
+def exist_command(username: str) -> str:
+    """Returns the command printing 1 if a user exists"""
+    return f"id '{username}' &>/dev/null && echo 1"
+
+
+def add_command(username: str, home_dir: Optional[str] = None, shell: Optional[str] = None,
+                full_name: Optional[str] = None) -> str:
+    """
+    Returns the command adding a user. See `User.add`.
+
+    Args:
+        username (str): The username of the user.
+        home_dir (str, optional): The home directory of the user.
+        shell (str, optional): The shell command of the user.
+        full_name (str, optional): The full name of the user.
+
+    Returns:
+        str: the command
+    """
+    command = "useradd -m"
+
+    if home_dir is not None:
+        command += f" -d {home_dir}"
+
+    if shell is not None:
+        command += f" -s {shell}"
+
+    if full_name is not None:
+        command += f" -c '{full_name}'"
+
+    return command + f" {username}"
+
+
+def rm_command(username: str, remove_all_files: bool = False, remove_home_dir: bool = False) -> str:
+    """
+    Returns the command removing a user. See `User.rm`.
+
+    Args:
+        username (str): The username of the user.
+        remove_all_files (bool, optional): Remove all files. Defaults to False.
+        remove_home_dir (bool, optional): Remove home directory. Defaults to False.
+
+    Returns:
+        str: the command
+    """
+    command = "deluser --backup --backup-to='/root'"
+
+    if remove_all_files:
+        command += " --remove-all-files"
+
+    if remove_home_dir:
+        command += " --remove-home"
+
+    return command + f" {username}"
+
+
+def groups_command(username: str) -> str:
+    """Returns the command listing the groups of a user. See `groups_parser`."""
+    return f"groups {username}"
+
+
+def group_add_command(username: str, group_name: str) -> str:
+    """Returns the command adding a user to a group"""
+    return f"adduser {username} {group_name}"
+
+
+def group_set_command(username: str, group_names: List[str]) -> str:
+    """Returns the command setting the groups of a user"""
+    return f"usermod -G {','.join(group_names)} {username}"
+
+
+def group_rm_command(username: str, group_name: str) -> str:
+    """Returns the command removing a user from a group"""
+    return f"deluser {username} {group_name}"
+
+
+def enable_command(username: str) -> str:
+    """Returns the command unlocking the password of a user"""
+    return f"passwd --unlock {username}"
+
+
+def disable_command(username: str) -> str:
+    """Returns the command locking the password of a user"""
+    return f"passwd --lock {username}"
+
+
+def is_enabled_command(username: str) -> str:
+    """Returns the command printing the password status of a user: `L` if it is locked"""
+    return f"passwd -S '{username}' | awk '{{print \\$2}}'"
+
+
+def set_password_command(username: str, password: str) -> str:
+    """Returns the command setting the password of a user"""
+    return f"echo '{username}:{password}' | chpasswd"
+
+
+def info_command(username: str) -> str:
+    """Returns the command printing the passwd entry of a user. See `info_parser`."""
+    return f"getent passwd {username}"
+
+
+def groups_parser(text: str) -> List[str]:
+    """
+    Parses the output of `groups <user>` to the group names
+
+    Args:
+        text (str): the output, `user : group group ...`
+
+    Returns:
+        List[str]: the group names
+    """
+    return text.split(":")[-1].strip().split()
+
+
+def info_parser(text: str, enabled: bool) -> List[Union[str, bool, int]]:
+    """
+    Parses the passwd entry of a user to what `User.info` returns
+
+    Args:
+        text (str): the entry, `name:password:uid:gid:gecos:home:shell`
+        enabled (bool): whether the user is enabled
+
+    Returns:
+        List[Union[str, bool, int]]: The name, enabled, uid, gid, full name and home directory of the user.
+    """
+    info = text.strip().split(":")
+    return [info[0], enabled, int(info[2]), int(info[3]), info[4], info[5]]
+
+
+@traced_methods
 class User(ModelUser):
     """
     User package manager.
@@ -62,7 +198,7 @@ class User(ModelUser):
         Returns:
             Self: an instance of the self.         
         """
-        ssh_connector = SSHConnector(address, port, user, passwd, logger=logger)
+        ssh_connector = SSHConnector(address, port, user, passwd, logger=logger, pool=GLOBAL_POOL)
         return cls(ssh_connector, logger=logger)
 
     def list(self) -> List[str]:
@@ -72,9 +208,11 @@ class User(ModelUser):
         Returns:
             List[str]: A list of all users.
         """
-        result = self.connector.sudo_run(
-            f"cat /etc/passwd | cut -d: -f1", passwd=self.sudo_passwd
-        )
+        agent = self.connector.get_agent(passwd=self.sudo_passwd)
+        if agent is not None:
+            return [entry["name"] for entry in agent.passwd()]
+
+        result = self.connector.sudo_run(LIST_COMMAND, passwd=self.sudo_passwd)
         users = result.read().decode().split()
         return users
 
@@ -85,9 +223,11 @@ class User(ModelUser):
         Returns:
             List[str]: A list of all groups.
         """
-        result = self.connector.sudo_run(
-            f"cat /etc/group|cut -d: -f1", passwd=self.sudo_passwd
-        )
+        agent = self.connector.get_agent(passwd=self.sudo_passwd)
+        if agent is not None:
+            return [entry["name"] for entry in agent.group()]
+
+        result = self.connector.sudo_run(LIST_GROUPS_COMMAND, passwd=self.sudo_passwd)
         users = result.read().decode().split()
         return users
 
@@ -101,9 +241,15 @@ class User(ModelUser):
         Returns:
             bool: True if the user exists.
         """
-        result = self.connector.sudo_run(
-            f"id '{username}' &>/dev/null && echo 1", passwd=self.sudo_passwd
-        )
+        agent = self.connector.get_agent(passwd=self.sudo_passwd)
+        if agent is not None:
+            try:
+                agent.user(username)
+            except KeyError:
+                return False
+            return True
+
+        result = self.connector.sudo_run(exist_command(username), passwd=self.sudo_passwd)
         return result.read().decode().strip() == "1"
 
     def add(self, username: str, home_dir: Optional[str] = None, shell: Optional[str] = None,
@@ -120,20 +266,7 @@ class User(ModelUser):
         if self.exist(username):
             raise ValueError("User already exists")
 
-        command = "useradd -m"
-
-        if home_dir is not None:
-            command += f" -d {home_dir}"
-
-        if shell is not None:
-            command += f" -s {shell}"
-
-        if full_name is not None:
-            command += f" -c '{full_name}'"
-
-        command += f" {username}"
-
-        stdout = self.connector.sudo_run(command, passwd=self.sudo_passwd)
+        stdout = self.connector.sudo_run(add_command(username, home_dir, shell, full_name), passwd=self.sudo_passwd)
         _ = stdout.read().decode()
 
     def rm(self, username: str, remove_all_files: bool = False, remove_home_dir: bool = False) -> None:
@@ -149,17 +282,8 @@ class User(ModelUser):
         if not self.exist(username):
             raise ValueError("User does not exist")
 
-        command = "deluser --backup --backup-to='/root'"
-
-        if remove_all_files:
-            command += " --remove-all-files"
-
-        if remove_home_dir:
-            command += " --remove-home"
-
-        command += f" {username}"
-
-        stdout = self.connector.sudo_run(command, passwd=self.sudo_passwd)
+        stdout = self.connector.sudo_run(rm_command(username, remove_all_files, remove_home_dir),
+                                         passwd=self.sudo_passwd)
         _ = stdout.read().decode()
 
     def groups(self, username: str) -> List[str]:
@@ -175,9 +299,12 @@ class User(ModelUser):
         if not self.exist(username):
             raise ValueError("User does not exist")
 
-        result = self.connector.sudo_run(f"groups {username}", passwd=self.sudo_passwd)
-        groups_as_string = result.read().decode().split(":")[-1].strip()
-        return groups_as_string.split()
+        agent = self.connector.get_agent(passwd=self.sudo_passwd)
+        if agent is not None:
+            return agent.user_groups(username)
+
+        result = self.connector.sudo_run(groups_command(username), passwd=self.sudo_passwd)
+        return groups_parser(result.read().decode())
 
     def group_add(self, username: str, group_name: str) -> None:
         """
@@ -193,9 +320,7 @@ class User(ModelUser):
         if group_name in self.groups(username):
             raise ValueError("Already in the group")
 
-        stdout = self.connector.sudo_run(
-            f"adduser {username} {group_name}", passwd=self.sudo_passwd
-        )
+        stdout = self.connector.sudo_run(group_add_command(username, group_name), passwd=self.sudo_passwd)
         _ = stdout.read().decode()
 
     def group_set(self, username: str, group_names: List[str]) -> None:
@@ -211,9 +336,7 @@ class User(ModelUser):
             raise ValueError("User does not exist")
 
 
-        stdout = self.connector.sudo_run(
-            f"sudo usermod -G {','.join(group_names)} {username}", passwd=self.sudo_passwd
-        )
+        stdout = self.connector.sudo_run(group_set_command(username, group_names), passwd=self.sudo_passwd)
         _ = stdout.read().decode()
 
     def group_rm(self, username: str, group_name: str) -> None:
@@ -230,9 +353,7 @@ class User(ModelUser):
         if group_name not in self.groups(username):
             raise ValueError("User is not in the group")
 
-        stdout = self.connector.sudo_run(
-            f"deluser {username} {group_name}", passwd=self.sudo_passwd
-        )
+        stdout = self.connector.sudo_run(group_rm_command(username, group_name), passwd=self.sudo_passwd)
         _ = stdout.read().decode()
 
     def enable(self, username: str) -> None:
@@ -245,9 +366,7 @@ class User(ModelUser):
         if not self.exist(username):
             raise ValueError("User does not exist")
 
-        stdout = self.connector.sudo_run(
-            f"passwd --lock {username}", passwd=self.sudo_passwd
-        )
+        stdout = self.connector.sudo_run(enable_command(username), passwd=self.sudo_passwd)
         _ = stdout.read().decode()
 
     def disable(self, username: str) -> None:
@@ -260,9 +379,7 @@ class User(ModelUser):
         if not self.exist(username):
             raise ValueError("User does not exist")
 
-        stdout = self.connector.sudo_run(
-            f"passwd --unlock {username}", passwd=self.sudo_passwd
-        )
+        stdout = self.connector.sudo_run(disable_command(username), passwd=self.sudo_passwd)
         _ = stdout.read().decode()
 
     def is_enabled(self, username: str) -> bool:
@@ -275,8 +392,11 @@ class User(ModelUser):
         Returns:
             bool: Whether the user is enabled.
         """
-        command = f"passwd -S '{username}' | awk '{{print \$2}}'"
-        result = self.connector.sudo_run(command, passwd=self.sudo_passwd)
+        agent = self.connector.get_agent(passwd=self.sudo_passwd)
+        if agent is not None:
+            return agent.password_status(username) != "L"
+
+        result = self.connector.sudo_run(is_enabled_command(username), passwd=self.sudo_passwd)
         return result.read().decode().strip() != "L"
 
     def set_password(self, username: str, password: str) -> None:
@@ -290,12 +410,10 @@ class User(ModelUser):
         if not self.exist(username):
             raise ValueError("User does not exist")
 
-        stdout = self.connector.sudo_run(
-            f"echo '{username}:{password}' | sudo chpasswd", passwd=self.sudo_passwd
-        )
+        stdout = self.connector.sudo_run(set_password_command(username, password), passwd=self.sudo_passwd)
         _ = stdout.read().decode()
 
-    def info(self, username: str) -> List[str]:
+    def info(self, username: str) -> List[Union[str, bool, int]]:
         """
         Returns information about a user.
 
@@ -303,13 +421,19 @@ class User(ModelUser):
             username (str): The username of the user.
 
         Returns:
-            List[str]: A list of information about the user.
+            List[Union[str, bool, int]]: The name, enabled, uid, gid, full name and home directory of the user.
         """
         if not self.exist(username):
             raise ValueError("User does not exist")
 
-        stdout = self.connector.sudo_run(
-            f"getent passwd {username}", passwd=self.sudo_passwd
-        )
-        info = stdout.read().decode().strip().split(":")
-        return [info[0], self.is_enabled(username), int(info[2]), int(info[3]), info[4], info[5]]
+        agent = self.connector.get_agent(passwd=self.sudo_passwd)
+        if agent is not None:
+            try:
+                entry = agent.user(username)
+            except KeyError:
+                raise ValueError("User does not exist")
+            return [entry["name"], self.is_enabled(username), entry["uid"], entry["gid"], entry["gecos"],
+                    entry["home"]]
+
+        stdout = self.connector.sudo_run(info_command(username), passwd=self.sudo_passwd)
+        return info_parser(stdout.read().decode(), self.is_enabled(username))
@@ -7,8 +7,10 @@ from post.connection.model_connector import ModelConnector
 from post.user.model_user_list import ModelUserList
 from post.user.user import User
 from post.utils.common import GLOBAL_LOGGER
+from post.utils.tracing import traced_methods
 
 
+@traced_methods
 class UserList(ModelUserList):
     """
     UserList package manager.
@@ -85,14 +87,14 @@ class UserList(ModelUserList):
             ]
         )
 
-    def list(self) -> List[List[User]]:
+    def list(self) -> List[List[str]]:
         """
         See User.list
         """
         users = []
         for user in self.users:
             try:
-                users.append(user.__list())
+                users.append(user.list())
             except Exception as e:
                 self.logger.warning(e)
 
@@ -106,7 +108,7 @@ class UserList(ModelUserList):
         groups = []
         for user in self.users:
             try:
-                groups.append(user.groups())
+                groups.append(user.list_groups())
             except Exception as e:
                 self.logger.warning(e)
 
@@ -237,7 +239,7 @@ class UserList(ModelUserList):
             except Exception as e:
                 self.logger.warning(e)
 
-    def info(self, username: str) -> List[str]:
+    def info(self, username: str) -> List[List[Union[str, bool, int]]]:
         """
         See User.info
         """
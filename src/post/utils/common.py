@@ -1,7 +1,8 @@
+import asyncio
 import re
 import uuid
 from logging import getLogger, basicConfig
-from typing import Dict, Optional, List
+from typing import Any, Awaitable, Dict, Iterable, Optional, List
 
 import socket
 
@@ -69,17 +70,38 @@ def check_ssh(ip: str, port: int = 22) -> bool:
 
 def nmap(first_octet: int = 192, second_octet: int = 168, third_octet: int = 1, start_ip: int = 0, end_ip: int = 255,
          port: int = 22) -> List[str]:
-    ip_list = []
-    for last_octet in range(start_ip, end_ip + 1):
-        ip = f"{first_octet}.{second_octet}.{third_octet}.{last_octet}"
+    # the scanner logs with GLOBAL_LOGGER, so it is imported here
+    from post.utils.scanner import Scanner
 
-        check = check_ssh(ip, port=port)
-        if check:
-            ip_list.append(ip)
-
-    return ip_list
+    prefix = f"{first_octet}.{second_octet}.{third_octet}"
+    # a fixed 1 second timeout, as `check_ssh` used, so slow hosts are still found
+    scanner = Scanner(f"{prefix}.{start_ip}-{prefix}.{end_ip}", ports=[port], timeout=1.0, min_timeout=1.0,
+                      banners=False)
+    return [result.address for result in scanner.run()]
 
 
 def random_filename(extension="ps1", prefix="post_", suffix=""):
     unique_id = uuid.uuid4().hex
-    return f"{prefix}{unique_id}{suffix}.{extension}"
\ No newline at end of file
+    return f"{prefix}{unique_id}{suffix}.{extension}"
+
+
+async def gather_limited(awaitables: Iterable[Awaitable[Any]], concurrency: int = 64,
+                         return_exceptions: bool = True) -> List[Any]:
+    """
+    `asyncio.gather` with at most `concurrency` awaitables running at the same time.
+
+    Args:
+        awaitables (Iterable[Awaitable]): coroutines to be awaited, e.g. `[apt.list() for apt in apts]`
+        concurrency (int): maximum number of concurrently running awaitables. Defaults to 64.
+        return_exceptions (bool): return the exceptions instead of raising the first one. Defaults to True.
+
+    Returns:
+        List: results in the same order as the awaitables
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(awaitable: Awaitable[Any]) -> Any:
+        async with semaphore:
+            return await awaitable
+
+    return await asyncio.gather(*(limited(each) for each in awaitables), return_exceptions=return_exceptions)
@@ -0,0 +1,637 @@
+import asyncio
+import base64
+import errno
+import hashlib
+import ipaddress
+import queue
+import re
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from logging import Logger
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import paramiko
+
+from post.utils.common import GLOBAL_LOGGER
+
+try:
+    import resource
+except ImportError:
+    resource = None  # type: ignore[assignment]
+
+IPAddress = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+BANNER_LIMIT = 8192
+
+CLIENT_IDENTIFICATION = b"SSH-2.0-post_scanner\r\n"
+
+SSH_BANNER = re.compile(r"^SSH-(?P<protocol>[\d.]+)-(?P<software>\S+)(?:\s+(?P<comments>.*))?$")
+
+OS_HINTS = (
+    ("pardus", "Pardus"), ("ubuntu", "Ubuntu"), ("raspbian", "Raspbian"), ("debian", "Debian"),
+    ("freebsd", "FreeBSD"), ("for_windows", "Windows"),
+)
+
+
+def parse_target(target: str) -> Tuple[IPAddress, IPAddress]:
+    """
+    Parses an address (`10.0.0.5`), a network (`10.0.0.0/24`) or a range (`10.0.0.10-10.0.0.50`, or `10.0.0.10-50`
+    for the last octet). The network and broadcast addresses of a network are left out.
+
+    Args:
+        target (str): the target
+
+    Returns:
+        Tuple[IPAddress, IPAddress]: the first and the last address
+
+    Raises:
+        ValueError: If the target is not valid
+    """
+    target = target.strip()
+    if "/" in target:
+        network = ipaddress.ip_network(target, strict=False)
+        if network.num_addresses > 2:
+            return network.network_address + 1, network.broadcast_address - 1
+
+        return network.network_address, network.broadcast_address
+
+    if "-" in target:
+        first, last = (part.strip() for part in target.split("-", 1))
+        start = ipaddress.ip_address(first)
+        if "." not in last and ":" not in last and start.version == 4:
+            last = f"{first.rsplit('.', 1)[0]}.{last}"
+
+        end = ipaddress.ip_address(last)
+        if isinstance(start, ipaddress.IPv4Address) and isinstance(end, ipaddress.IPv4Address) and start <= end:
+            return start, end
+
+        if isinstance(start, ipaddress.IPv6Address) and isinstance(end, ipaddress.IPv6Address) and start <= end:
+            return start, end
+
+        raise ValueError(f"Invalid range: {target}")
+
+    address = ipaddress.ip_address(target)
+    return address, address
+
+
+def parse_networks(targets: Iterable[str]) -> List[IPNetwork]:
+    """
+    Returns the networks covering targets, merged. See `parse_target`. Whole networks are covered.
+
+    Args:
+        targets (Iterable[str]): addresses, networks and ranges
+
+    Returns:
+        List[IPNetwork]: the networks, IPv4 ones first
+    """
+    networks: List[IPNetwork] = []
+    for target in targets:
+        if "/" in target:
+            networks.append(ipaddress.ip_network(target.strip(), strict=False))
+        else:
+            networks.extend(ipaddress.summarize_address_range(*parse_target(target)))
+
+    ipv4 = [network for network in networks if isinstance(network, ipaddress.IPv4Network)]
+    ipv6 = [network for network in networks if isinstance(network, ipaddress.IPv6Network)]
+    return [*ipaddress.collapse_addresses(ipv4), *ipaddress.collapse_addresses(ipv6)]
+
+
+def read_identification(data: bytes) -> Optional[str]:
+    """
+    Returns the identification line of an SSH server (`SSH-2.0-OpenSSH_9.2p1 Debian-2+deb12u3`) from the first
+    bytes it sent. Servers may send other lines before it. If there is none, the first line is returned, so other
+    services are told apart too.
+
+    Args:
+        data (bytes): the bytes received after connecting
+
+    Returns:
+        Optional[str]: the line without its line break. None if nothing was received.
+    """
+    lines = data.split(b"\n")
+    for line in lines[:-1]:
+        if line.startswith(b"SSH-"):
+            return line.rstrip(b"\r").decode(errors="replace")
+
+    first = lines[0].rstrip(b"\r").decode(errors="replace").strip()
+    return first or None
+
+
+def classify_banner(banner: Optional[str]) -> Dict[str, Optional[str]]:
+    """
+    Tells the software, its version and the operating system of an SSH server from its identification line.
+
+    The operating system is a hint from the package version the distribution put in the line: `Debian-2+deb12u3` is
+    `Debian 12`. Pardus builds on Debian and keeps Debian's OpenSSH package, so a Pardus 23 host usually shows up as
+    `Debian 12`.
+
+    Args:
+        banner (str, optional): the identification line
+
+    Returns:
+        Dict[str, Optional[str]]: `protocol`, `software`, `version` and `os`. None for what is not known.
+    """
+    info: Dict[str, Optional[str]] = {"protocol": None, "software": None, "version": None, "os": None}
+    match = SSH_BANNER.match(banner or "")
+    if match is None:
+        return info
+
+    software = match.group("software")
+    comments = match.group("comments") or ""
+    info["protocol"] = match.group("protocol")
+
+    parts = software.split("_")
+    if len(parts) > 1 and parts[-1][:1].isdigit():
+        info["software"], info["version"] = parts[0], parts[-1]
+    else:
+        name, _, version = software.rpartition("-")
+        if name and version[:1].isdigit():
+            info["software"], info["version"] = name, version
+        else:
+            info["software"] = software
+
+    text = f"{software} {comments}".lower()
+    for hint, name in OS_HINTS:
+        if hint in text:
+            info["os"] = name
+            break
+
+    release = re.search(r"deb(\d+)u\d+", comments)
+    if info["os"] == "Debian" and release is not None:
+        info["os"] = f"Debian {release.group(1)}"
+
+    return info
+
+
+def fingerprint(key: paramiko.PKey) -> str:
+    """Returns the SHA256 fingerprint of a key, as `ssh-keygen -l` prints it"""
+    digest = hashlib.sha256(key.asbytes()).digest()
+    return f"SHA256:{base64.b64encode(digest).decode().rstrip('=')}"
+
+
+class ScanResult:
+    """
+    A port that accepted a connection, with what the server told about itself.
+
+    Args:
+        address (str): The address of the host.
+        port (int): The port.
+        seconds (float): The time the connection took.
+        banner (str, optional): The first line the server sent, its identification if it is an SSH server.
+            Defaults to None.
+        key_type (str, optional): The type of its host key, e.g. `ssh-ed25519`. Defaults to None.
+        fingerprint (str, optional): The SHA256 fingerprint of its host key. Defaults to None.
+    """
+
+    def __init__(self, address: str, port: int, seconds: float, banner: Optional[str] = None,
+                 key_type: Optional[str] = None, fingerprint: Optional[str] = None) -> None:
+        self.address = address
+        self.port = port
+        self.seconds = seconds
+        self.banner = banner
+        self.key_type = key_type
+        self.fingerprint = fingerprint
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(address: {self.address}, port: {self.port}, banner: {self.banner})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ScanResult):
+            return NotImplemented
+
+        return (self.address, self.port) == (other.address, other.port)
+
+    def __hash__(self) -> int:
+        return hash((self.address, self.port))
+
+    @property
+    def sort_key(self) -> Tuple[int, int, int]:
+        """Orders results by address, then port"""
+        address = ipaddress.ip_address(self.address)
+        return address.version, int(address), self.port
+
+    @property
+    def is_ssh(self) -> bool:
+        """True if the server identified itself as an SSH server"""
+        return self.banner is not None and self.banner.startswith("SSH-")
+
+    @property
+    def info(self) -> Dict[str, Optional[str]]:
+        """The software, version and operating system told by the banner. See `classify_banner`."""
+        return classify_banner(self.banner)
+
+    @property
+    def summary(self) -> str:
+        """A short description, e.g. `OpenSSH 9.2p1, Debian 12, ssh-ed25519 SHA256:...`"""
+        info = self.info
+        parts = [" ".join(part for part in (info["software"], info["version"]) if part) or self.banner or "unknown"]
+        if info["os"]:
+            parts.append(info["os"])
+        if self.key_type:
+            parts.append(f"{self.key_type} {self.fingerprint}")
+
+        return ", ".join(parts)
+
+    def matches(self, text: str) -> bool:
+        """
+        Checks if the banner, the operating system hint, the key type or the fingerprint contains a text, ignoring
+        case.
+
+        Args:
+            text (str): the text to look for
+
+        Returns:
+            bool: True if it is found, or the text is empty
+        """
+        text = text.strip().lower()
+        if not text:
+            return True
+
+        fields = [self.banner, self.info["os"], self.key_type, self.fingerprint]
+        return any(text in field.lower() for field in fields if field)
+
+
+class AdaptiveTimeout:
+    """
+    The connection timeout, following the round trip times measured on the scanned network as TCP does
+    (RFC 6298): the smoothed time plus four times its variation, between `minimum` and `maximum`.
+
+    Closed ports answer as fast as open ones, so both are measured. Silent addresses then cost a few round trips
+    instead of the whole `maximum`.
+
+    Args:
+        maximum (float): The timeout before anything was measured, and its upper bound. Defaults to 1.
+        minimum (float): The lower bound. Defaults to 0.25.
+    """
+
+    def __init__(self, maximum: float = 1.0, minimum: float = 0.25) -> None:
+        self.maximum = maximum
+        self.minimum = min(minimum, maximum)
+        self.smoothed: Optional[float] = None
+        self.variation = 0.0
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(value: {self.value:.3f})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def observe(self, seconds: float) -> None:
+        """Updates the estimation with a measured round trip"""
+        if self.smoothed is None:
+            self.smoothed = seconds
+            self.variation = seconds / 2
+            return
+
+        self.variation = 0.75 * self.variation + 0.25 * abs(self.smoothed - seconds)
+        self.smoothed = 0.875 * self.smoothed + 0.125 * seconds
+
+    @property
+    def value(self) -> float:
+        """The current timeout in seconds"""
+        if self.smoothed is None:
+            return self.maximum
+
+        return min(self.maximum, max(self.minimum, self.smoothed + 4 * self.variation))
+
+
+class Scanner:
+    """
+    Finds hosts listening on TCP ports, many connection attempts at a time.
+
+    Targets are addresses, networks and ranges (see `parse_target`). The addresses of `exclude` are skipped. At most
+    `concurrency` connections are pending at once, started at most `rate` times a second. The timeout adapts to the
+    network (see `AdaptiveTimeout`), so a /16 of mostly silent addresses takes seconds to minutes instead of hours.
+
+    On each open port the first line the server sends is read in the same connection, so SSH servers tell their
+    software and operating system (see `classify_banner`) before any authentication. With `host_keys`, the key
+    exchange is done too, for the type and fingerprint of the host key.
+
+    `scan` yields the open ports as they are found, `stream` does the same for synchronous code, `run` returns them
+    all.
+
+    Args:
+        targets (Union[str, Sequence[str]]): The addresses, networks and ranges to scan.
+        ports (Sequence[int]): The ports to check on each address. Defaults to 22.
+        exclude (Sequence[str], optional): Addresses, networks and ranges to skip. Defaults to None.
+        concurrency (int): Maximum number of pending connections. It is kept below the open file limit.
+            Defaults to 256.
+        rate (float, optional): Maximum number of connections started per second. Defaults to None (no limit).
+        timeout (float): The connection timeout before the network is measured, and its upper bound.
+            Defaults to 1.
+        min_timeout (float): The lower bound of the adaptive timeout. Set it to `timeout` to disable adaptation.
+            Defaults to 0.25.
+        banners (bool): Read the banner of open ports. Defaults to True.
+        host_keys (bool): Read the host key of SSH servers. Defaults to False.
+        banner_timeout (float): Seconds to wait for a banner or a host key. Defaults to 2.
+        logger (Logger, optional): The logger to log. Defaults to None.
+
+    Raises:
+        ValueError: If a target, an exclusion or a port is not valid
+    """
+
+    def __init__(self, targets: Union[str, Sequence[str]], ports: Sequence[int] = (22,),
+                 exclude: Optional[Sequence[str]] = None, concurrency: int = 256, rate: Optional[float] = None,
+                 timeout: float = 1.0, min_timeout: float = 0.25, banners: bool = True, host_keys: bool = False,
+                 banner_timeout: float = 2.0, logger: Optional[Logger] = None) -> None:
+        if logger is None:
+            self.logger = GLOBAL_LOGGER
+        else:
+            self.logger = logger
+
+        if isinstance(targets, str):
+            targets = [targets]
+
+        if isinstance(exclude, str):
+            exclude = [exclude]
+
+        self.targets = [parse_target(target) for target in targets]
+        self.exclude = parse_networks(exclude or [])
+
+        self.ports = list(ports)
+        if not self.ports or any(not 0 < port < 65536 for port in self.ports):
+            raise ValueError(f"Invalid ports: {ports}")
+
+        # Windows has no `resource`, and no file descriptor limit to keep under
+        if resource is not None:
+            file_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+            if file_limit != resource.RLIM_INFINITY:
+                concurrency = min(concurrency, max(1, file_limit - 64))
+
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.timeout = timeout
+        self.min_timeout = min_timeout
+        self.banners = banners
+        self.host_keys = host_keys
+        self.banner_timeout = banner_timeout
+
+        self.adaptive_timeout = AdaptiveTimeout(timeout, min_timeout)
+        self.scanned = 0
+        self.stopped = threading.Event()
+        self.__next_slot = 0.0
+        self.__executor: Optional[ThreadPoolExecutor] = None
+
+    def __str__(self) -> str:
+        return (f"{self.__class__.__name__}(targets: {len(self.targets)}, ports: {self.ports}, "
+                f"concurrency: {self.concurrency})")
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    @property
+    def total(self) -> int:
+        """The number of connection attempts of a scan"""
+        addresses = 0
+        for start, end in self.targets:
+            addresses += int(end) - int(start) + 1
+            for network in self.exclude:
+                if network.version == start.version:
+                    first = max(int(start), int(network.network_address))
+                    last = min(int(end), int(network.broadcast_address))
+                    addresses -= max(0, last - first + 1)
+
+        return addresses * len(self.ports)
+
+    def addresses(self) -> Iterator[IPAddress]:
+        """
+        Yields the addresses to scan, without the excluded ones.
+
+        Returns:
+            Iterator[IPAddress]: the addresses in the order of the targets
+        """
+        for start, end in self.targets:
+            for number in range(int(start), int(end) + 1):
+                address = ipaddress.ip_address(number) if start.version == 4 else ipaddress.IPv6Address(number)
+                if not any(address in network for network in self.exclude):
+                    yield address
+
+    def stop(self) -> None:
+        """Stops a running scan. The connections in progress are finished."""
+        self.stopped.set()
+
+    async def __pace(self) -> None:
+        """Waits for the next connection slot if `rate` is set"""
+        if self.rate is None:
+            return
+
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(self.__next_slot, now)
+        self.__next_slot = slot + 1 / self.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def probe(self, address: str, port: int) -> Optional[ScanResult]:
+        """
+        Tries to connect to a port.
+
+        Args:
+            address (str): the address
+            port (int): the port
+
+        Returns:
+            Optional[ScanResult]: the result if the port accepted the connection. None otherwise.
+        """
+        loop = asyncio.get_running_loop()
+        family = socket.AF_INET6 if ":" in address else socket.AF_INET
+        with socket.socket(family, socket.SOCK_STREAM) as sock:
+            sock.setblocking(False)
+            start = loop.time()
+            try:
+                await asyncio.wait_for(loop.sock_connect(sock, (address, port)), self.adaptive_timeout.value)
+            except ConnectionRefusedError:
+                self.adaptive_timeout.observe(loop.time() - start)
+                return None
+            except (asyncio.TimeoutError, OSError) as e:
+                if not isinstance(e, asyncio.TimeoutError) and e.errno in (errno.EMFILE, errno.ENFILE):
+                    self.logger.warning(f"Cannot check {address}:{port}: {e}")
+                return None
+
+            seconds = loop.time() - start
+            self.adaptive_timeout.observe(seconds)
+            result = ScanResult(address, port, seconds)
+            if self.host_keys:
+                await loop.run_in_executor(self.__executor, self.__read_host_key, sock, result)
+            elif self.banners:
+                result.banner = await self.__read_banner(sock)
+
+        return result
+
+    async def __read_banner(self, sock: socket.socket) -> Optional[str]:
+        """Reads the first lines a server sends until its SSH identification, at most `banner_timeout` seconds"""
+        loop = asyncio.get_running_loop()
+        data = b""
+
+        async def read() -> None:
+            nonlocal data
+            while len(data) < BANNER_LIMIT:
+                chunk = await loop.sock_recv(sock, 1024)
+                if not chunk:
+                    return
+
+                data += chunk
+                if any(line.startswith(b"SSH-") for line in data.split(b"\n")[:-1]):
+                    return
+
+        try:
+            await asyncio.wait_for(read(), self.banner_timeout)
+        except (asyncio.TimeoutError, OSError):
+            pass
+
+        banner = read_identification(data)
+        if banner is not None and banner.startswith("SSH-"):
+            # identifying back makes the server log a closed connection rather than a protocol error
+            try:
+                await asyncio.wait_for(loop.sock_sendall(sock, CLIENT_IDENTIFICATION), self.banner_timeout)
+            except (asyncio.TimeoutError, OSError):
+                pass
+
+        return banner
+
+    def __read_host_key(self, sock: socket.socket, result: ScanResult) -> None:
+        """Does the key exchange on a connected socket and fills the banner and the host key of the result"""
+        sock.settimeout(self.banner_timeout)
+        transport = paramiko.Transport(sock)
+        transport.banner_timeout = self.banner_timeout
+        try:
+            transport.start_client(timeout=self.banner_timeout)
+            key = transport.get_remote_server_key()
+            result.key_type = key.get_name()
+            result.fingerprint = fingerprint(key)
+        except (paramiko.SSHException, OSError, EOFError) as e:
+            self.logger.debug(f"No host key from {result.address}:{result.port}: {e}")
+        finally:
+            result.banner = transport.remote_version or None
+            transport.close()
+
+    async def scan(self) -> AsyncIterator[ScanResult]:
+        """
+        Scans the targets and yields the open ports as they are found.
+
+        Returns:
+            AsyncIterator[ScanResult]: the open ports, in the order they answered
+        """
+        self.stopped.clear()
+        async for result in self.__scan():
+            yield result
+
+    async def __scan(self) -> AsyncIterator[ScanResult]:
+        """Scans the targets until they are done or `stopped` is set"""
+        self.logger.info("Scanning")
+
+        self.scanned = 0
+        self.adaptive_timeout = AdaptiveTimeout(self.timeout, self.min_timeout)
+        self.__next_slot = 0.0
+
+        probes = ((str(address), port) for address in self.addresses() for port in self.ports)
+        results: "asyncio.Queue[Optional[ScanResult]]" = asyncio.Queue()
+
+        async def worker() -> None:
+            try:
+                for address, port in probes:
+                    if self.stopped.is_set():
+                        return
+
+                    await self.__pace()
+                    result = await self.probe(address, port)
+                    self.scanned += 1
+                    if result is not None:
+                        results.put_nowait(result)
+            finally:
+                results.put_nowait(None)
+
+        if self.host_keys:
+            self.__executor = ThreadPoolExecutor(min(self.concurrency, 32), thread_name_prefix="post-host-key")
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(self.concurrency)]
+        try:
+            running = len(workers)
+            while running:
+                result = await results.get()
+                if result is None:
+                    running -= 1
+                    continue
+
+                yield result
+        finally:
+            for each in workers:
+                each.cancel()
+
+            await asyncio.gather(*workers, return_exceptions=True)
+            if self.__executor is not None:
+                self.__executor.shutdown(wait=False)
+                self.__executor = None
+
+    async def run_async(self) -> List[ScanResult]:
+        """
+        Scans the targets.
+
+        Returns:
+            List[ScanResult]: the open ports, ordered by address and port
+        """
+        return sorted([result async for result in self.scan()], key=lambda result: result.sort_key)
+
+    def run(self) -> List[ScanResult]:
+        """
+        Scans the targets in a new event loop. Use `run_async` in a running one.
+
+        Returns:
+            List[ScanResult]: the open ports, ordered by address and port
+        """
+        return asyncio.run(self.run_async())
+
+    def stream(self, heartbeat: Optional[float] = None) -> Iterator[Optional[ScanResult]]:
+        """
+        Scans the targets in a background thread and yields the open ports as they are found.
+
+        With `heartbeat`, None is yielded each time nothing was found for that long, so a GUI can update its
+        progress (`scanned` out of `total`). Leaving the loop stops the scan.
+
+        Args:
+            heartbeat (float, optional): seconds without a result after which None is yielded. Defaults to None.
+
+        Returns:
+            Iterator[Optional[ScanResult]]: the open ports, in the order they answered
+        """
+        found: "queue.Queue[Union[ScanResult, BaseException, None]]" = queue.Queue()
+
+        async def feed() -> None:
+            async for result in self.__scan():
+                found.put(result)
+
+        def target() -> None:
+            try:
+                asyncio.run(feed())
+            except BaseException as e:
+                found.put(e)
+            finally:
+                found.put(None)
+
+        self.stopped.clear()
+        thread = threading.Thread(target=target, name="post-scanner", daemon=True)
+        thread.start()
+        try:
+            while True:
+                try:
+                    item = found.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield None
+                    continue
+
+                if item is None:
+                    return
+
+                if isinstance(item, BaseException):
+                    raise item
+
+                yield item
+        finally:
+            self.stop()
+            thread.join()
@@ -0,0 +1,335 @@
+import functools
+import inspect
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging import Logger
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TypeVar, Union
+
+from post.utils.common import GLOBAL_LOGGER
+
+T = TypeVar("T")
+
+
+class Span:
+    """
+    A timed operation. Spans opened while another one is active are its children.
+
+    Args:
+        name (str): The name, e.g. `Apt.install` or `apt list`.
+        category (str): The category, e.g. `manager` or `connector`.
+        span_id (int): The id of the span.
+        parent_id (int, optional): The id of the parent span. None for a root span.
+        attributes (Dict[str, Any], optional): Extra information shown with the span. Defaults to None.
+    """
+
+    def __init__(self, name: str, category: str, span_id: int, parent_id: Optional[int] = None,
+                 attributes: Optional[Dict[str, Any]] = None) -> None:
+        self.name = name
+        self.category = category
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.attributes = attributes if attributes is not None else {}
+        self.thread_id = threading.get_ident()
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(name: {self.name}, id: {self.span_id}, parent: {self.parent_id})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    @property
+    def duration(self) -> float:
+        """Seconds from the start to the end of the span. Up to now if it did not end yet."""
+        end = self.end if self.end is not None else time.perf_counter()
+        return end - self.start
+
+
+class Tracer:
+    """
+    Collects spans of manager methods and connector calls.
+
+    Tracing is off by default and costs a flag check per call then. Once enabled, each public method of a manager
+    opens a span and each command run by a connector becomes a child span of it. The spans can be written as Chrome
+    trace events and opened in `chrome://tracing` or https://ui.perfetto.dev.
+
+    Connector spans are named after the command family (e.g. `apt.list`). The command line itself is only kept with
+    `record_commands`, since commands may carry passwords (e.g. `chpasswd` or `samba-tool` calls).
+
+    Args:
+        enabled (bool): Collect spans. Defaults to False.
+        max_spans (int): Spans kept at most. Later spans are dropped. Defaults to 100000.
+        record_commands (bool): Keep the command lines in connector spans. Defaults to False.
+        logger (Logger, optional): The logger to log. Defaults to None.
+    """
+
+    def __init__(self, enabled: bool = False, max_spans: int = 100000, record_commands: bool = False,
+                 logger: Optional[Logger] = None) -> None:
+        if logger is None:
+            self.logger = GLOBAL_LOGGER
+        else:
+            self.logger = logger
+
+        self.enabled = enabled
+        self.max_spans = max_spans
+        self.record_commands = record_commands
+        self.dropped = 0
+
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._spans: List[Span] = []
+        self._current: ContextVar[Optional[Span]] = ContextVar(f"post_span_{id(self)}", default=None)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(enabled: {self.enabled}, spans: {len(self._spans)})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def enable(self) -> None:
+        """Starts collecting spans"""
+        self.enabled = True
+
+    def disable(self) -> None:
+        """Stops collecting spans. The collected ones are kept."""
+        self.enabled = False
+
+    def command_attributes(self, command: str) -> Dict[str, Any]:
+        """
+        Returns the span attributes of a command line: the command itself with `record_commands`, else nothing.
+
+        Args:
+            command (str): the command line
+
+        Returns:
+            Dict[str, Any]: the attributes
+        """
+        if not self.record_commands:
+            return {}
+
+        return {"command": command}
+
+    def current(self) -> Optional[Span]:
+        """Returns the active span of the calling thread or task"""
+        return self._current.get()
+
+    def begin(self, name: str, category: str = "post", **attributes: Any) -> Optional[Span]:
+        """
+        Starts a span as a child of the active one, without activating it. See `span` to activate it.
+
+        Args:
+            name (str): the name of the span
+            category (str): the category of the span. Defaults to `post`.
+            **attributes: extra information shown with the span
+
+        Returns:
+            Span: the span. None if tracing is disabled.
+        """
+        if not self.enabled:
+            return None
+
+        parent = self._current.get()
+        return Span(name, category, next(self._ids), parent.span_id if parent is not None else None, attributes)
+
+    def finish(self, span: Optional[Span], error: Optional[BaseException] = None) -> None:
+        """
+        Ends a span and keeps it.
+
+        Args:
+            span (Span, optional): the span from `begin`. Nothing is done if None.
+            error (BaseException, optional): the exception the operation raised. Defaults to None.
+        """
+        if span is None:
+            return
+
+        span.end = time.perf_counter()
+        if error is not None:
+            span.attributes["error"] = f"{type(error).__name__}: {error}"
+
+        with self._lock:
+            if len(self._spans) < self.max_spans:
+                self._spans.append(span)
+            else:
+                self.dropped += 1
+
+    @contextmanager
+    def span(self, name: str, category: str = "post", **attributes: Any) -> Iterator[Optional[Span]]:
+        """
+        Opens a span that is active (the parent of new spans) until the block ends.
+
+        Args:
+            name (str): the name of the span
+            category (str): the category of the span. Defaults to `post`.
+            **attributes: extra information shown with the span
+
+        Returns:
+            Iterator[Optional[Span]]: the span. None if tracing is disabled.
+        """
+        span = self.begin(name, category, **attributes)
+        if span is None:
+            yield None
+            return
+
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self.finish(span, error=e)
+            raise
+        else:
+            self.finish(span)
+        finally:
+            self._current.reset(token)
+
+    def iterate(self, span: Optional[Span], iterable: Iterable[T]) -> Iterator[T]:
+        """
+        Yields the items of an iterable within a span, which is active only while an item is being produced.
+
+        A generator cannot keep a span active between its items, since the consumer runs in the meantime.
+
+        Args:
+            span (Span, optional): the span from `begin`. The items are yielded as they are if None.
+            iterable (Iterable): the iterable, usually a generator
+
+        Returns:
+            Iterator: the items
+        """
+        if span is None:
+            yield from iterable
+            return
+
+        iterator = iter(iterable)
+        try:
+            while True:
+                token = self._current.set(span)
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    self._current.reset(token)
+
+                yield item
+        except GeneratorExit:
+            self.finish(span)
+            raise
+        except BaseException as e:
+            self.finish(span, error=e)
+            raise
+        else:
+            self.finish(span)
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    def spans(self) -> List[Span]:
+        """Returns the finished spans"""
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self) -> None:
+        """Drops the finished spans"""
+        with self._lock:
+            self._spans.clear()
+            self.dropped = 0
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """
+        Returns the finished spans as Chrome trace events (complete `X` events, one track per thread).
+
+        Returns:
+            Dict[str, Any]: the trace document
+        """
+        pid = os.getpid()
+        spans = self.spans()
+        events: List[Dict[str, Any]] = []
+        threads = {span.thread_id for span in spans}
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id in sorted(threads):
+            events.append({
+                "name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id,
+                "args": {"name": names.get(thread_id, str(thread_id))},
+            })
+
+        for span in sorted(spans, key=lambda each: each.start):
+            args = {key: value if isinstance(value, (bool, int, float, str)) else str(value)
+                    for key, value in span.attributes.items()}
+            args["span_id"] = span.span_id
+            if span.parent_id is not None:
+                args["parent_id"] = span.parent_id
+
+            events.append({
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": span.start * 1e6,
+                "dur": span.duration * 1e6,
+                "pid": pid,
+                "tid": span.thread_id,
+                "args": args,
+            })
+
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path: Union[str, Path]) -> None:
+        """
+        Writes the finished spans as a Chrome trace JSON file.
+
+        Args:
+            path (Union[str, Path]): the path of the file
+        """
+        self.logger.info(f"Writing trace to {path}")
+
+        with open(path, "w") as f:
+            json.dump(self.to_chrome_trace(), f)
+
+
+GLOBAL_TRACER = Tracer()
+
+
+def traced(function: Callable[..., T]) -> Callable[..., T]:
+    """
+    Wraps a method, so each call is a span of `GLOBAL_TRACER` named `<class>.<method>`.
+
+    Generator methods are traced until they are exhausted.
+    """
+    name = function.__qualname__
+
+    if inspect.isgeneratorfunction(function):
+        @functools.wraps(function)
+        def generator_wrapper(*args: Any, **kwargs: Any) -> Any:
+            span = GLOBAL_TRACER.begin(name, "manager")
+            return GLOBAL_TRACER.iterate(span, function(*args, **kwargs))
+
+        return generator_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not GLOBAL_TRACER.enabled:
+            return function(*args, **kwargs)
+
+        with GLOBAL_TRACER.span(name, "manager"):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+def traced_methods(cls: type) -> type:
+    """
+    A class decorator tracing `__init__` and each public method defined in the class. See `traced`.
+
+    Class methods, static methods and properties are left as they are.
+    """
+    for attribute, value in list(vars(cls).items()):
+        if (attribute == "__init__" or not attribute.startswith("_")) and inspect.isfunction(value):
+            setattr(cls, attribute, traced(value))
+
+    return cls
@@ -0,0 +1,68 @@
+import base64
+import io
+import os
+import tempfile
+import unittest
+
+from post.connection import remote_agent
+
+DPKG_STATUS = """Package: apt
+Status: install ok installed
+Architecture: amd64
+Version: 2.6.1
+Description: commandline package manager
+ This package provides commandline tools.
+
+Package: dstat
+Status: deinstall ok config-files
+Architecture: all
+Version: 0.7.4-6.1
+"""
+
+
+class TestRemoteAgent(unittest.TestCase):
+    def test_frames(self):
+        stream = io.BytesIO()
+        remote_agent.write_frame(stream, {"id": 1, "method": "ping"})
+        stream.seek(0)
+        self.assertEqual(remote_agent.read_frame(stream), {"id": 1, "method": "ping"})
+        self.assertIsNone(remote_agent.read_frame(stream))
+
+    def test_dpkg_status(self):
+        with tempfile.NamedTemporaryFile("w", delete=False) as f:
+            f.write(DPKG_STATUS)
+
+        try:
+            packages = remote_agent.dpkg_status(f.name)
+        finally:
+            os.unlink(f.name)
+
+        self.assertEqual(
+            packages,
+            [
+                {"package": "apt", "status": "install ok installed", "architecture": "amd64", "version": "2.6.1"},
+                {"package": "dstat", "status": "deinstall ok config-files", "architecture": "all",
+                 "version": "0.7.4-6.1"},
+            ]
+        )
+
+    def test_write_file_keeps_mode(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "config")
+            with open(path, "w") as f:
+                f.write("old")
+            os.chmod(path, 0o600)
+
+            remote_agent.write_file(path, base64.b64encode(b"new").decode())
+            self.assertEqual(base64.b64decode(remote_agent.read_file(path)), b"new")
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+            self.assertEqual(os.listdir(directory), ["config"])
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+    def test_user(self):
+        self.assertEqual(remote_agent.user("root")["uid"], 0)
+        with self.assertRaises(KeyError):
+            remote_agent.user("no-such-user-post")
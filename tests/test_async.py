@@ -0,0 +1,104 @@
+import asyncio
+import unittest
+
+from post import AsyncApt, AsyncService, AsyncUser, gather_limited
+from post.connection.async_model_connector import AsyncModelConnector
+from post.utils.error import NotFound
+
+APT_LIST = b"""Listing...
+apt/yirmiuc-deb,now 2.6.1 amd64 [installed]
+dstat/yirmiuc-deb 0.7.4-6.1 all
+"""
+
+SYSTEMCTL = b"""ssh.service loaded active running OpenBSD Secure Shell server
+cron.service loaded active running Regular background program processing daemon
+"""
+
+GETENT = b"pardus:x:1000:1000:Pardus,,,:/home/pardus:/bin/bash\n"
+
+
+class FakeAsyncConnector(AsyncModelConnector):
+    def __init__(self, outputs):
+        self.outputs = outputs
+        self.commands = []
+
+    async def run(self, command):
+        self.commands.append(command)
+        for key, value in self.outputs.items():
+            if command.startswith(key):
+                return value
+        return b""
+
+    async def sudo_run(self, command, passwd=None):
+        return await self.run(command)
+
+    async def close(self):
+        pass
+
+
+class TestAsync(unittest.TestCase):
+    def test_apt_list(self):
+        apt = AsyncApt(FakeAsyncConnector({"apt list": APT_LIST}))
+        self.assertIn(
+            {
+                "package": "apt",
+                "repo": "yirmiuc-deb,now",
+                "version": "2.6.1",
+                "arch": "amd64",
+                "tags": ["installed"],
+            },
+            asyncio.run(apt.list()),
+        )
+
+    def test_apt_install(self):
+        connector = FakeAsyncConnector({"apt list": APT_LIST})
+        asyncio.run(AsyncApt(connector).install(["dstat", "apt"]))
+        self.assertIn("DEBIAN_FRONTEND=noninteractive apt install dstat -y", connector.commands)
+
+    def test_apt_install_wrong_name(self):
+        with self.assertRaises(NotFound):
+            asyncio.run(AsyncApt(FakeAsyncConnector({"apt list": APT_LIST})).install("MOHAMMAD"))
+
+    def test_service_list(self):
+        service = AsyncService(FakeAsyncConnector({"systemctl": SYSTEMCTL}))
+        self.assertEqual([each["unit"] for each in asyncio.run(service.list())], ["ssh.service", "cron.service"])
+
+    def test_user_info(self):
+        user = AsyncUser(FakeAsyncConnector({"id 'pardus'": b"1\n", "getent": GETENT, "passwd -S": b"P\n"}))
+        self.assertEqual(asyncio.run(user.info("pardus")), ["pardus", True, 1000, 1000, "Pardus,,,", "/home/pardus"])
+
+    def test_user_commands(self):
+        connector = FakeAsyncConnector({"id 'pardus'": b"1\n"})
+        user = AsyncUser(connector)
+        asyncio.run(user.enable("pardus"))
+        asyncio.run(user.disable("pardus"))
+        asyncio.run(user.group_set("pardus", ["sudo", "adm"]))
+        asyncio.run(user.set_password("pardus", "secret"))
+        self.assertEqual(
+            [command for command in connector.commands if not command.startswith("id ")],
+            ["passwd --unlock pardus", "passwd --lock pardus", "usermod -G sudo,adm pardus",
+             "echo 'pardus:secret' | chpasswd"],
+        )
+
+    def test_user_does_not_exist(self):
+        with self.assertRaises(ValueError):
+            asyncio.run(AsyncUser(FakeAsyncConnector({})).groups("MOHAMMAD"))
+
+    def test_gather_limited(self):
+        running = []
+        peak = []
+
+        async def job(value):
+            running.append(value)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(value)
+            return value
+
+        results = asyncio.run(gather_limited([job(each) for each in range(20)], concurrency=3))
+        self.assertEqual(results, list(range(20)))
+        self.assertLessEqual(max(peak), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+from unittest import mock
+
+from post import Apt, Service
+from post.connection.command_result import CommandResult
+from post.connection.model_connector import ModelConnector
+from post.connection.result_cache import ResultCache
+
+APT_LIST = [
+    "Listing...",
+    "bash/stable,now 5.2.15-2 amd64 [installed]",
+    "htop/stable 3.2.2-2 amd64",
+]
+
+UNITS = [
+    "ssh.service loaded active running OpenBSD Secure Shell server",
+    "cron.service loaded active running Regular background program processing daemon",
+]
+
+
+class CountingConnector(ModelConnector):
+    def __init__(self, address="10.0.0.1", apt_list=APT_LIST):
+        self.address = address
+        self.apt_list = apt_list
+        self.port = 22
+        self.user = "pardus"
+        self.commands = []
+
+    def run(self, command):
+        return self.sudo_run(command)
+
+    def sudo_run(self, command, passwd=None):
+        self.commands.append(command)
+        if command.startswith("apt show"):
+            return CommandResult(command, 0, b"Package: bash\nVersion: 5.2.15-2\n", b"", 0.0)
+
+        return CommandResult(command, 0, b"", b"", 0.0)
+
+    def sudo_run_stream(self, command, passwd=None):
+        self.commands.append(command)
+        if command.startswith("apt list"):
+            return iter(self.apt_list)
+
+        return iter(UNITS)
+
+    def run_stream(self, command):
+        return self.sudo_run_stream(command)
+
+    def count(self, prefix):
+        return len([command for command in self.commands if command.startswith(prefix)])
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.CACHE = ResultCache(ttls={"apt": 60, "systemd": 30})
+
+    def test_apt_list_reused(self):
+        connector = CountingConnector()
+        apt = Apt(connector, cache=self.CACHE)
+        apt.search("bash")
+        apt.show("bash")
+        self.assertEqual(connector.count("apt list"), 1)
+
+        apt.install("htop")
+        apt.remove("bash")
+        self.assertEqual(connector.count("apt list"), 2)
+
+    def test_shared_by_host(self):
+        first, second = CountingConnector(), CountingConnector()
+        Apt(first, cache=self.CACHE).list()
+        Apt(second, cache=self.CACHE).list()
+        Apt(CountingConnector("10.0.0.2"), cache=self.CACHE).list()
+        self.assertEqual(first.count("apt list") + second.count("apt list"), 1)
+        self.assertEqual(len(self.CACHE), 2)
+
+    def test_service_invalidated(self):
+        connector = CountingConnector()
+        service = Service(connector, cache=self.CACHE)
+        service.start("ssh.service")
+        service.stop("ssh.service")
+        self.assertEqual(connector.count("systemctl list-units"), 2)
+        service.list()
+        service.list()
+        self.assertEqual(connector.count("systemctl list-units"), 3)
+
+    def test_ttl(self):
+        connector = CountingConnector()
+        service = Service(connector, cache=self.CACHE)
+        service.list()
+        with mock.patch("post.connection.result_cache.time.monotonic", return_value=10 ** 9):
+            service.list()
+
+        self.assertEqual(connector.count("systemctl list-units"), 2)
+
+    def test_disabled(self):
+        connector = CountingConnector()
+        apt = Apt(connector)
+        apt.list()
+        apt.list()
+        self.assertEqual(connector.count("apt list"), 2)
+
+    def test_empty_not_cached(self):
+        connector = CountingConnector(apt_list=[])
+        apt = Apt(connector, cache=self.CACHE)
+        apt.list()
+        apt.list()
+        self.assertEqual(connector.count("apt list"), 2)
+        self.assertEqual(len(self.CACHE), 0)
+
+    def test_loading_pruned(self):
+        Service(CountingConnector(), cache=self.CACHE).list()
+        Apt(CountingConnector("10.0.0.2"), cache=self.CACHE).list()
+        self.assertEqual(self.CACHE._loading, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import gzip
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from post import CompressionPolicy, OpenSSHConnector
+from post.connection.command_result import CommandResult
+from post.connection.compression import Decompressor, split_status, wrap_command
+from post.connection.metrics import CommandEvent, MetricsRegistry
+
+
+class TestCompression(unittest.TestCase):
+    @unittest.skipIf(shutil.which("gzip") is None, "gzip is not installed")
+    def test_wrap_command(self):
+        command = wrap_command("seq 20000; echo 'it''s' >&2; exit 3", "gzip")
+        result = subprocess.run(command, shell=True, capture_output=True)
+        self.assertEqual(result.returncode, 0)
+
+        stderr, exit_code = split_status(result.stderr)
+        self.assertEqual((stderr, exit_code), (b"its\n", 3))
+        self.assertEqual(gzip.decompress(result.stdout).splitlines()[-1], b"20000")
+
+    def test_decompressor(self):
+        data = "\n".join(f"package{index}/yirmiuc 1.0 amd64" for index in range(5000)).encode()
+        compressed = gzip.compress(data)
+        decompressor = Decompressor("gzip")
+        chunks = [compressed[index:index + 1000] for index in range(0, len(compressed), 1000)]
+        self.assertEqual(b"".join(decompressor.iterate(chunks)), data)
+        self.assertEqual((decompressor.compressed_bytes, decompressor.decompressed_bytes), (len(compressed), len(data)))
+
+        with self.assertRaises(ValueError):
+            Decompressor("bzip2")
+
+    def test_policy(self):
+        policy = CompressionPolicy(min_bytes=1000)
+        self.assertTrue(policy.wanted("a:22", "sudo -S -p '' su -c \"apt list --installed\""))
+        self.assertFalse(policy.wanted("a:22", "cat /var/log/syslog"))
+
+        policy.observe("a:22", "cat /var/log/syslog", CommandResult("cat /var/log/syslog", 0, b"x" * 1000, b"", 0.5))
+        self.assertTrue(policy.wanted("a:22", "cat /var/log/syslog"))
+        self.assertFalse(policy.wanted("b:22", "cat /var/log/syslog"))
+        self.assertEqual(policy.rates["a:22"], 2000)
+
+        probes = []
+        self.assertEqual(policy.codec_for("a:22", lambda command: probes.append(command) or True), "gzip")
+        self.assertEqual(policy.codec_for("a:22", lambda command: probes.append(command) or True), "gzip")
+        self.assertIsNone(policy.codec_for("b:22", lambda command: False))
+        self.assertEqual(probes, ["command -v gzip"])
+
+        data = b"y" * 10000
+        wrapped = CommandResult("apt list", 0, gzip.compress(data), b"E: warning\npost-exit:100\n", 1.0)
+        result = policy.unwrap("a:22", wrapped, "gzip")
+        self.assertEqual((result.exit_code, result.stdout, result.stderr), (100, data, b"E: warning\n"))
+        self.assertEqual(result.bytes_saved, len(data) - len(wrapped.stdout))
+        self.assertGreater(result.seconds_saved, 0)
+
+        broken = policy.unwrap("a:22", CommandResult("apt list", 0, b"garbage", b"post-exit:0\n", 1.0), "gzip")
+        self.assertNotEqual(broken.exit_code, 0)
+
+    def test_metrics(self):
+        registry = MetricsRegistry()
+        registry.record(CommandEvent("a:22", "apt list", False, 0.1, bytes_received=100, exit_code=0, compressed=True,
+                                     bytes_saved=900, seconds_saved=0.2))
+        summary = registry.summary()["a:22"]["apt list"]
+        self.assertEqual((summary["compressed"], summary["bytes_saved"]), (1, 900))
+        self.assertIn("post_compression_saved_bytes_total{host=\"a:22\",family=\"apt list\"} 900",
+                      registry.to_prometheus())
+
+    def test_forced_call(self):
+        with tempfile.TemporaryDirectory() as directory:
+            connector = OpenSSHConnector("10.0.0.2", 2222, "pardus", control_dir=directory, lazy=True, metrics=None)
+            connector._execute = lambda command, **kwargs: CommandResult(command, 0, b"", b"", 0.0)
+            self.assertEqual(connector._codec("apt list", compress=True), "gzip")
+            self.assertIsNone(connector.compression)
+            self.assertIsNone(connector._codec("apt list"))
+
+
+if __name__ == "__main__":
+    unittest.main()
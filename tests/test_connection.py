@@ -1,6 +1,18 @@
+import os
+import re
+import tempfile
 import unittest
 
-from post import SSHConnector
+from post import SSHConnector, LocalConnector, MetricsRegistry, OpenSSHConnector, connect_all
+from post.connection.base_ssh_connector import BaseSSHConnector
+from post.connection import output
+from post.connection.command_result import CommandResult, collect, collect_many
+from post.connection.model_connector import ModelConnector
+from post.connection.output import OutputBuffer
+from post.connection.retry import RetryPolicy
+from post.connection.shell_session import PersistentShellSession
+from post.connection.sudo_cache import PASSWORD_REQUIRED, SudoCache
+from post.utils.error import CommandError
 
 
 class TestConnection(unittest.TestCase):
@@ -20,5 +32,512 @@ class TestConnection(unittest.TestCase):
         )
 
 
+class FakeChannel:
+    def __init__(self, stdout_chunks, stderr_chunks, exit_code):
+        self.stdout_chunks = list(stdout_chunks)
+        self.stderr_chunks = list(stderr_chunks)
+        self.exit_code = exit_code
+        self.sent = b""
+        self.closed = False
+
+    @property
+    def eof_received(self):
+        return not self.stdout_chunks and not self.stderr_chunks
+
+    def sendall(self, data):
+        self.sent += data
+
+    def recv_ready(self):
+        return bool(self.stdout_chunks)
+
+    def recv(self, _):
+        return self.stdout_chunks.pop(0)
+
+    def recv_stderr_ready(self):
+        return bool(self.stderr_chunks)
+
+    def recv_stderr(self, _):
+        return self.stderr_chunks.pop(0)
+
+    def recv_exit_status(self):
+        return self.exit_code
+
+    def close(self):
+        self.closed = True
+
+
+class TestCommandResult(unittest.TestCase):
+    def test_collect(self):
+        channel = FakeChannel([b"out", b"put"], [b"e" * 100000, b"rr"], 3)
+        result = collect(channel, "cmd", stdin_data=b"passwd\n")
+        self.assertEqual(result.read(), b"output")
+        self.assertEqual(len(result.stderr), 100002)
+        self.assertEqual(result.exit_code, 3)
+        self.assertEqual(channel.sent, b"passwd\n")
+        self.assertEqual(result.bytes_transferred, 6 + 100002 + 7)
+        self.assertTrue(channel.closed)
+
+    def test_collect_many(self):
+        channels = [FakeChannel([b"a", b"b"], [], 0), FakeChannel([], [b"err"], 2), FakeChannel([b"c"], [], 0)]
+        results = collect_many(channels, ["one", "two", "three"], [b"x\n", None, None])
+        self.assertEqual([result.read() for result in results], [b"ab", b"", b"c"])
+        self.assertEqual([result.exit_code for result in results], [0, 2, 0])
+        self.assertEqual(results[1].stderr, b"err")
+        self.assertEqual(channels[0].sent, b"x\n")
+        self.assertTrue(all(channel.closed for channel in channels))
+
+    def test_check(self):
+        with self.assertRaises(CommandError):
+            CommandResult("false", 1, b"", b"failed", 0.1).check()
+
+        self.assertTrue(CommandResult("true", 0, b"", b"", 0.1).check().ok)
+
+
+class TestOutputBuffer(unittest.TestCase):
+    def test_spill(self):
+        buffer = OutputBuffer(spill_bytes=100)
+        buffer.write("çalışma\n".encode())
+        self.assertFalse(buffer.spilled)
+        for index in range(1000):
+            buffer.write(f"line {index}\n".encode())
+
+        self.assertTrue(buffer.spilled)
+        result = CommandResult("journalctl", 0, buffer, b"", 0.1)
+        lines = list(result.lines())
+        self.assertEqual((lines[0], lines[-1], len(lines)), ("çalışma", "line 999", 1001))
+        self.assertEqual(result.text(), result.read().decode())
+        self.assertEqual(result.output, result.stdout)
+        self.assertEqual(result.bytes_transferred, len(result.stdout))
+        with self.assertRaises(ValueError):
+            buffer.write(b"more")
+
+        del lines
+        result.close()
+
+    def test_local_spill(self):
+        spill_bytes = output.SPILL_BYTES
+        output.SPILL_BYTES = 1000
+        try:
+            result = LocalConnector("", metrics=None).run("seq 10000")
+        finally:
+            output.SPILL_BYTES = spill_bytes
+
+        self.assertTrue(result.output.spilled)
+        self.assertEqual(sum(1 for _ in result.lines()), 10000)
+        self.assertEqual(len(result.stdout), len(result.output))
+
+
+class FakeShellChannel(FakeChannel):
+    def __init__(self):
+        super().__init__([], [], 0)
+
+    @property
+    def eof_received(self):
+        return False
+
+    def exit_status_ready(self):
+        return self.closed
+
+    def exec_command(self, command):
+        self.stderr_chunks.append(re.search(r"-p '([^']*)'", command).group(1).encode())
+        self.marker = re.search(r"echo (\w+);", command).group(1)
+
+    def sendall(self, data):
+        super().sendall(data)
+        if data.endswith(b"secret\n"):
+            self.stdout_chunks.append(f"{self.marker}\n".encode())
+        sentinel = re.search(rb"printf '\\n%s %d\\n' (\w+)", data)
+        if sentinel is not None:
+            self.stdout_chunks.append(b"out\n\n" + sentinel.group(1) + b" 3\n")
+            self.stderr_chunks.append(b"err\n\n" + sentinel.group(1) + b"\n")
+
+
+class FakeTransport:
+    def __init__(self):
+        self.channel = FakeShellChannel()
+
+    def open_session(self):
+        return self.channel
+
+
+class TestPersistentShellSession(unittest.TestCase):
+    def test_run(self):
+        transport = FakeTransport()
+        session = PersistentShellSession(transport, passwd="secret")
+        self.assertTrue(transport.channel.sent.startswith(b"secret\n"))
+
+        result = session.run("false")
+        self.assertEqual((result.read(), result.stderr, result.exit_code), (b"out\n", b"err\n", 3))
+        self.assertIn(b'( eval "false" )', transport.channel.sent)
+
+        session.close()
+        self.assertFalse(session.active)
+        with self.assertRaises(CommandError):
+            session.run("true")
+
+
+class CountingConnector(BaseSSHConnector):
+    dials = 0
+
+    def _new_client(self):
+        if self.address == "dead":
+            raise ValueError("Unable to connect")
+
+        CountingConnector.dials += 1
+        return FakeClient()
+
+
+class FakeClient:
+    def get_transport(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class TestLazyConnector(unittest.TestCase):
+    def test_connect_all(self):
+        CountingConnector.dials = 0
+        connectors = [CountingConnector(address, 22, "user", lazy=True) for address in ["a", "dead", "b"]]
+        self.assertEqual(CountingConnector.dials, 0)
+        self.assertFalse(connectors[0].connected)
+
+        errors = connect_all(connectors, concurrency=2)
+        self.assertIsNone(errors[0])
+        self.assertIsInstance(errors[1], ValueError)
+        self.assertEqual(CountingConnector.dials, 2)
+
+        connectors[0].ensure_connected()
+        self.assertEqual(CountingConnector.dials, 2)
+
+        connectors[2].client = None
+        connectors[2].close()
+        with self.assertRaises(ValueError):
+            connectors[2].ensure_connected()
+
+
+class CountingShellChannel(FakeShellChannel):
+    def __init__(self):
+        super().__init__()
+        self.commands = []
+
+    def exec_command(self, command):
+        self.commands.append(command)
+        super().exec_command(command)
+
+
+class ShellTransport(FakeTransport):
+    def __init__(self):
+        self.channel = CountingShellChannel()
+
+    def is_active(self):
+        return True
+
+    def set_keepalive(self, _):
+        pass
+
+
+class ShellClient(FakeClient):
+    def __init__(self):
+        self.transport = ShellTransport()
+
+    def get_transport(self):
+        return self.transport
+
+
+class ShellSSHConnector(BaseSSHConnector):
+    def _new_client(self):
+        return ShellClient()
+
+
+class TestPersistentShellConnector(unittest.TestCase):
+    def test_sudo(self):
+        connector = ShellSSHConnector("a", 22, "user", "secret", persistent_shell=True, lazy=True, metrics=None)
+        self.assertEqual(list(connector.sudo_run_stream("id -u")), ["out"])
+        results = connector.sudo_run_many(["id -u", "id -g"])
+        self.assertEqual([result.exit_code for result in results], [3, 3])
+        self.assertEqual(connector.sudo_run("id -u").read(), b"out\n")
+        self.assertEqual(len(connector.client.transport.channel.commands), 1)
+
+
+class TestRetry(unittest.TestCase):
+    def test_policy(self):
+        policy = RetryPolicy(attempts=4, backoff=1, multiplier=2, max_backoff=5, jitter=0)
+        self.assertEqual(list(policy.delays()), [1, 2, 4, 5])
+        self.assertTrue(policy.is_idempotent("cat /etc/passwd"))
+        self.assertFalse(policy.is_idempotent("apt install vim -y"))
+
+    def test_retrying(self):
+        CountingConnector.dials = 0
+        connector = CountingConnector("a", 22, "user", retry=RetryPolicy(attempts=2, backoff=0))
+        connector.ensure_connected()
+        failures = [EOFError(), EOFError()]
+
+        def operation():
+            if failures:
+                raise failures.pop()
+            return "done"
+
+        self.assertEqual(connector._retrying(operation, idempotent=True), "done")
+        self.assertEqual(CountingConnector.dials, 3)
+
+        failures = [EOFError()]
+        with self.assertRaises(EOFError):
+            connector._retrying(operation, idempotent=False)
+
+
+class TestSudoCache(unittest.TestCase):
+    def test_fallback(self):
+        state = {"timestamp": False}
+        commands = []
+
+        def execute(command, stdin_data):
+            commands.append(command)
+            if command.startswith("sudo -S -p '' -v"):
+                state["timestamp"] = True
+                return CommandResult(command, 0, b"", b"", 0.5)
+            if not state["timestamp"]:
+                return CommandResult(command, 1, b"", PASSWORD_REQUIRED + b"\n", 0.0)
+            return CommandResult(command, 0, b"ok", b"", 0.0)
+
+        cache = SudoCache(max_misses=2)
+        self.assertEqual(cache.run(execute, "id -u", b"pw\n").read(), b"ok")
+        self.assertEqual(cache.run(execute, "id -u", b"pw\n").read(), b"ok")
+        self.assertEqual(commands, ["sudo -S -p '' -v", SudoCache.command("id -u"), SudoCache.command("id -u")])
+        self.assertTrue(SudoCache.command("id -u").startswith("sudo -n true"))
+
+        state["timestamp"] = False
+        cache.validated = True
+        self.assertIsNone(cache.run(execute, "id -u", b"pw\n"))
+        self.assertEqual(cache.metrics()["fallbacks"], 1)
+        self.assertEqual(cache.saved_seconds, 1.0)
+
+        state["timestamp"] = False
+        cache.validated = True
+        cache.run(execute, "id -u", b"pw\n")
+        self.assertFalse(cache.enabled)
+
+    def test_connector(self):
+        registry = MetricsRegistry()
+        connector = CachedSSHConnector("a", 22, "user", "pw", cache_sudo=True, lazy=True, metrics=registry)
+        results = connector.sudo_run_many(["id -u", "false"])
+        self.assertEqual([result.exit_code for result in results], [0, 1])
+        self.assertEqual(connector.sudo_cache.metrics()["hits"], 2)
+
+        connector.expired = True
+        self.assertEqual(list(connector.sudo_run_stream("id -u")), ["ok"])
+        self.assertEqual(connector.sudo_cache.metrics()["fallbacks"], 1)
+        self.assertTrue(connector.commands[-1].startswith("sudo -S -p ''"))
+
+        summary = registry.summary()["a:22"]["id"]
+        self.assertEqual((summary["sudo_cache_hits"], summary["sudo_cache_fallbacks"]), (1, 1))
+        self.assertIn("post_sudo_cache_fallbacks_total{host=\"a:22\",family=\"id\"} 1", registry.to_prometheus())
+
+    def test_openssh_stream(self):
+        with tempfile.TemporaryDirectory() as directory:
+            connector = OpenSSHConnector("10.0.0.2", 2222, "pardus", "pw", control_dir=directory, lazy=True,
+                                         cache_sudo=True, metrics=None)
+            commands = []
+
+            def stream(command, display_command=None, stdin_data=None, codec=None, transfer=None, results=None):
+                commands.append(command)
+                if results is not None:
+                    results.append(CommandResult(command, 0, b"", b"", 0.0))
+                yield "ok"
+
+            connector._execute = lambda command, **kwargs: CommandResult(command, 0, b"", b"", 0.0)
+            connector._execute_stream = stream
+            self.assertEqual(list(connector.sudo_run_stream("id -u")), ["ok"])
+            self.assertEqual(commands, [SudoCache.command("id -u")])
+            self.assertEqual(connector.sudo_cache.metrics()["hits"], 1)
+
+
+class CachedSSHConnector(ShellSSHConnector):
+    expired = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.commands = []
+
+    def __result(self, command):
+        self.commands.append(command)
+        if command.startswith("sudo -n true"):
+            if self.expired:
+                return CommandResult(command, 1, b"", PASSWORD_REQUIRED + b"\n", 0.0)
+            if command.endswith('"false"'):
+                return CommandResult(command, 1, b"", b"", 0.0)
+        return CommandResult(command, 0, b"ok\n", b"", 0.0)
+
+    def _execute(self, command, stdin_data=None, idempotent=False, codec=None):
+        return self.__result(command)
+
+    def _execute_many(self, commands, stdin_data=None, idempotent=False, codecs=None):
+        return [self.__result(command) for command in commands]
+
+    def _execute_stream(self, command, stdin_data=None, codec=None, transfer=None, results=None):
+        result = self.__result(command)
+        if results is not None:
+            results.append(result)
+        if result.exit_code == 0:
+            yield "ok"
+
+
+class TestOpenSSHConnector(unittest.TestCase):
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            connector = OpenSSHConnector("10.0.0.2", 2222, "pardus", "pardus", control_dir=directory, lazy=True,
+                                         options={"UserKnownHostsFile": "/dev/null", "ServerAliveInterval": 5},
+                                         metrics=None)
+            other = OpenSSHConnector("10.0.0.2", 2222, "pardus", control_dir=directory, lazy=True, metrics=None)
+            self.assertEqual(connector.control_path, other.control_path)
+            self.assertFalse(connector.connected)
+
+            arguments = connector._command("echo 'a b'")
+            self.assertEqual(arguments[0], "ssh")
+            self.assertEqual(arguments[-3:], ["pardus@10.0.0.2", "--", "echo 'a b'"])
+            self.assertIn(f"ControlPath={connector.control_path}", arguments)
+            self.assertIn("ControlMaster=no", arguments)
+            self.assertIn("UserKnownHostsFile=/dev/null", arguments)
+            self.assertLess(arguments.index("ServerAliveInterval=5"), arguments.index("ServerAliveInterval=30"))
+            self.assertNotIn("pardus", " ".join(arguments[:-3]))
+
+    def test_write_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            connector = OpenSSHConnector("10.0.0.2", 2222, "pardus", control_dir=directory, lazy=True, metrics=None)
+            commands = []
+
+            def execute(command, passwd=None, **kwargs):
+                commands.append(command)
+                return CommandResult(command, 0, b"", b"", 0.0)
+
+            connector._execute = connector.sudo_run = connector.run = execute
+            connector.stat = lambda path, passwd=None: None
+            connector.write_file("/etc/post.conf", b"[yirmi]\n")
+            self.assertTrue(commands[1].startswith("install -m 644 /tmp/.post-"))
+
+            connector.stat = lambda path, passwd=None: {"mode": 0o100600, "uid": 0, "gid": 4}
+            connector.write_file("/etc/post.conf", b"[yirmi]\n")
+            self.assertTrue(commands[4].startswith("install -m 600 -o 0 -g 4 /tmp/.post-"))
+
+
+class TestLocalConnector(unittest.TestCase):
+    def setUp(self):
+        self.CONNECTION = LocalConnector("")
+
+    def test_run(self):
+        result = self.CONNECTION.run("echo out; echo err >&2; exit 4")
+        self.assertEqual(result.read().decode().strip(), "out")
+        self.assertEqual(result.stderr.decode().strip(), "err")
+        self.assertEqual(result.exit_code, 4)
+
+    def test_fail_fast(self):
+        with self.assertRaises(CommandError):
+            LocalConnector("", fail_fast=True).run("exit 1")
+
+    def test_run_many(self):
+        results = self.CONNECTION.run_many(["echo one", "echo two >&2; exit 1"])
+        self.assertEqual(results[0].read(), b"one\n")
+        self.assertEqual(results[1].exit_code, 1)
+
+    def test_run_stream(self):
+        self.assertEqual(list(self.CONNECTION.run_stream("seq 3; echo err >&2")), ["1", "2", "3"])
+
+    def test_run_stream_fail_fast(self):
+        with self.assertRaises(CommandError):
+            list(LocalConnector("", fail_fast=True).run_stream("echo 1; exit 2"))
+
+    def test_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "post.conf")
+            self.assertFalse(self.CONNECTION.exists(path))
+            self.assertIsNone(self.CONNECTION.stat(path))
+
+            self.CONNECTION.write_file(path, b"[yirmi]\n")
+            os.chmod(path, 0o600)
+            self.CONNECTION.write_file(path, b"[yirmiuc]\n")
+            self.assertEqual(self.CONNECTION.read_file(path), b"[yirmiuc]\n")
+            self.assertTrue(self.CONNECTION.exists(path))
+            self.assertEqual(self.CONNECTION.stat(path)["mode"] & 0o777, 0o600)
+            self.assertEqual(os.listdir(directory), ["post.conf"])
+
+            with self.assertRaises(FileNotFoundError):
+                self.CONNECTION.read_file(os.path.join(directory, "missing"))
+
+    @unittest.skipIf(os.geteuid() != 0, "sudo would ask for a password")
+    def test_agent(self):
+        connector = LocalConnector("", use_agent=True, metrics=None)
+        agent = connector.get_agent()
+        self.assertIsNotNone(agent)
+
+        result = connector.sudo_run("echo out; echo err >&2; exit 3")
+        self.assertEqual((result.read(), result.stderr, result.exit_code), (b"out\n", b"err\n", 3))
+        self.assertEqual(list(connector.sudo_run_stream("seq 2")), ["1", "2"])
+        self.assertIs(connector.get_agent(), agent)
+
+        connector.close()
+        self.assertFalse(agent.active)
+
+    def test_sudo_cache_stream(self):
+        connector = CachedLocalConnector("pw", cache_sudo=True, metrics=None)
+        self.assertEqual(list(connector.sudo_run_stream("id -u")), ["ok"])
+        self.assertEqual(connector.sudo_cache.metrics()["hits"], 1)
+
+        connector.expired = True
+        self.assertEqual(list(connector.sudo_run_stream("id -u")), ["ok"])
+        self.assertEqual(connector.sudo_cache.metrics()["fallbacks"], 1)
+        self.assertTrue(connector.commands[-1].startswith("sudo -S -p ''"))
+
+
+class CachedLocalConnector(LocalConnector):
+    expired = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.commands = []
+
+    def __result(self, command):
+        self.commands.append(command)
+        if command.startswith("sudo -n true") and self.expired:
+            return CommandResult(command, 1, b"", PASSWORD_REQUIRED + b"\n", 0.0)
+        return CommandResult(command, 0, b"ok\n", b"", 0.0)
+
+    def _execute(self, command, display_command=None, stdin_data=None, validate=True):
+        return self.__result(command)
+
+    def _execute_stream(self, command, display_command=None, stdin_data=None, results=None):
+        result = self.__result(command)
+        if results is not None:
+            results.append(result)
+        if result.exit_code == 0:
+            yield "ok"
+
+
+class ShellConnector(ModelConnector):
+    def run(self, command):
+        return LocalConnector("").run(command)
+
+    def sudo_run(self, command, passwd=None):
+        return LocalConnector("").run(command)
+
+
+class TestFileDefaults(unittest.TestCase):
+    def test_round_trip(self):
+        connector = ShellConnector()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "it's a file")
+            data = b"quotes ' \" $HOME\n\x00\xff"
+            connector.write_file(path, data)
+            self.assertEqual(connector.read_file(path), data)
+
+            info = connector.stat(path)
+            self.assertEqual(info["size"], len(data))
+            self.assertFalse(info["is_dir"])
+            self.assertTrue(connector.stat(directory)["is_dir"])
+            self.assertIsNone(connector.stat(os.path.join(directory, "missing")))
+
+            with self.assertRaises(FileNotFoundError):
+                connector.read_file(os.path.join(directory, "missing"))
+
+
 if __name__ == "__main__":
     unittest.main()
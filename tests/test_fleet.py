@@ -0,0 +1,51 @@
+import pickle
+import unittest
+
+from post import FleetExecutor, HostSpec, Operation
+from post.utils.error import Nope
+
+
+class TestFleet(unittest.TestCase):
+    def test_parse(self):
+        operation = Operation.parse("Apt.list(installed=True)")
+        self.assertEqual((operation.manager, operation.method, operation.kwargs), ("Apt", "list", {"installed": True}))
+
+        operation = Operation.parse("Config(path='/etc/ssh/sshd_config').read()")
+        self.assertEqual(operation.manager_kwargs, {"path": "/etc/ssh/sshd_config"})
+        self.assertEqual(str(operation), "Config(path='/etc/ssh/sshd_config').read()")
+
+        self.assertEqual(str(pickle.loads(pickle.dumps(operation))), str(operation))
+
+        with self.assertRaises(ValueError):
+            Operation.parse("Apt")
+
+        with self.assertRaises(ValueError):
+            Operation.parse("Apt.install(__import__('os'))")
+
+        with self.assertRaises(Nope):
+            Operation.parse("Apt._changed()")
+
+    def test_host_spec(self):
+        self.assertEqual(HostSpec("10.0.0.1").label, "10.0.0.1:22")
+        self.assertEqual(HostSpec("", kind="local").label, "localhost")
+        with self.assertRaises(ValueError):
+            HostSpec("10.0.0.1", kind="telnet")
+
+    def test_errors_come_back(self):
+        hosts = [HostSpec("", kind="local", options={"metrics": None}) for _ in range(3)]
+        with FleetExecutor(hosts, processes=2, threads=2) as executor:
+            results = list(executor.run("ConfigRaw(path='/nonexistent/post.conf').read()"))
+            self.assertEqual(len(results), 3)
+            self.assertTrue(all("FileNotFoundError" in result.error for result in results))
+            self.assertEqual(executor.map("ConfigRaw(path='/nonexistent/post.conf').read()"), {})
+
+    def test_unpicklable_result(self):
+        hosts = [HostSpec("", kind="local", options={"metrics": None}) for _ in range(2)]
+        with FleetExecutor(hosts, processes=1, threads=2) as executor:
+            results = list(executor.run("Apt.iter_list()"))
+            self.assertEqual(len(results), 2)
+            self.assertTrue(all("cannot be sent back" in result.error for result in results))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import json
+import unittest
+
+from post import LocalConnector, MetricsRegistry
+from post.connection.metrics import Histogram, command_family
+
+
+class TestCommandFamily(unittest.TestCase):
+    def test_families(self):
+        self.assertEqual(command_family("apt list --installed"), "apt list")
+        self.assertEqual(command_family("DEBIAN_FRONTEND=noninteractive apt install htop -y"), "apt install")
+        self.assertEqual(command_family("sudo -S -p '' su -c \"systemctl start ssh\""), "systemctl start")
+        self.assertEqual(command_family("sudo systemctl daemon-reload"), "systemctl daemon-reload")
+        self.assertEqual(command_family("cat /etc/hosts"), "cat")
+        self.assertEqual(command_family("/usr/bin/samba-tool gpo list"), "samba-tool gpo")
+        self.assertEqual(command_family(""), "shell")
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.METRICS = MetricsRegistry()
+        self.CONNECTION = LocalConnector("", metrics=self.METRICS)
+
+    def test_record(self):
+        events = []
+        self.METRICS.add_hook(events.append)
+        self.CONNECTION.run("echo hello")
+        self.CONNECTION.run("false")
+        self.assertEqual(list(self.CONNECTION.run_stream("printf 'a\\nb\\n'")), ["a", "b"])
+
+        self.assertEqual([event.family for event in events], ["echo", "false", "printf"])
+        self.assertEqual(events[0].bytes_received, 6)
+        self.assertTrue(events[1].failed)
+
+        summary = json.loads(self.METRICS.to_json())
+        self.assertEqual(summary["localhost"]["echo"]["commands"], 1)
+        self.assertEqual(summary["localhost"]["false"]["errors"], 1)
+        self.assertEqual(summary["localhost"]["printf"]["bytes_received"], 4)
+
+    def test_prometheus(self):
+        self.CONNECTION.run("echo hello")
+        text = self.METRICS.to_prometheus()
+        self.assertIn("# TYPE post_command_seconds histogram", text)
+        self.assertIn('post_command_seconds_bucket{host="localhost",family="echo",le="+Inf"} 1', text)
+        self.assertIn('post_commands_total{host="localhost",family="echo"} 1', text)
+        self.assertIn('post_sudo_commands_total{host="localhost",family="echo"} 0', text)
+
+    def test_disabled(self):
+        connector = LocalConnector("", metrics=None)
+        connector.run("echo hello")
+        self.assertEqual(self.METRICS.summary(), {})
+
+    def test_histogram(self):
+        histogram = Histogram((0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 3.0):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.cumulative(), [("0.1", 1), ("1.0", 3), ("+Inf", 4)])
+        self.assertEqual(histogram.quantile(0.5), 1.0)
+        self.assertEqual(histogram.quantile(1.0), 3.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+
+from post.apt.apt import package_parser, package_stream_parser, search_parser, show_parser
+from post.connection.stream import iter_lines
+from post.sambatool.gpo import gpo_parser, gpo_stream_parser
+from post.service.service import service_parser
+
+APT_LIST = """Listing...
+apt/yirmiuc-deb,now 2.6.1 amd64 [installed]
+dstat/yirmiuc-deb 0.7.4-6.1 all
+libc6/yirmiuc-deb,now 2.36-9+deb12u4 amd64 [installed,automatic]
+"""
+
+APT_SEARCH = """Sorting...
+Full Text Search...
+apt/yirmiuc-deb,now 2.6.1 amd64 [installed]
+  commandline package manager
+
+apt-utils/yirmiuc-deb 2.6.1 amd64
+  package management related utility programs
+"""
+
+APT_SHOW = """Package: dstat
+Version: 0.7.4-6.1
+Depends: python3:any, python3-six
+Description: versatile resource statistics tool
+ Dstat is a versatile replacement for vmstat, iostat and ifstat.
+"""
+
+GPO_LISTALL = """GPO          : {31B2F340-016D-11D2-945F-00C04FB984F9}
+display name : Default Domain Policy
+path         : \\\\domain.prd\\sysvol\\domain.prd\\Policies\\{31B2F340-016D-11D2-945F-00C04FB984F9}
+
+GPO          : {6AC1786C-016F-11D2-945F-00C04FB984F9}
+display name : Default Domain Controllers Policy
+"""
+
+SYSTEMCTL = """ssh.service loaded active running OpenBSD Secure Shell server
+cron.service loaded active running Regular background program processing daemon
+"""
+
+
+class TestParsers(unittest.TestCase):
+    def test_package_parser(self):
+        packages = package_parser(APT_LIST)
+        self.assertEqual(len(packages), 3)
+        self.assertEqual(packages[2]["tags"], ["installed", "automatic"])
+        self.assertEqual(packages[1]["tags"], [])
+
+    def test_package_stream_parser(self):
+        chunks = [APT_LIST.encode()[i:i + 7] for i in range(0, len(APT_LIST), 7)]
+        self.assertEqual(list(package_stream_parser(iter_lines(chunks))), package_parser(APT_LIST))
+
+    def test_search_parser(self):
+        self.assertEqual(
+            search_parser(APT_SEARCH),
+            [
+                {
+                    "name": "apt",
+                    "repo": "yirmiuc-deb,now",
+                    "version": "2.6.1",
+                    "architecture": "amd64",
+                    "description": "commandline package manager",
+                },
+                {
+                    "name": "apt-utils",
+                    "repo": "yirmiuc-deb",
+                    "version": "2.6.1",
+                    "architecture": "amd64",
+                    "description": "package management related utility programs",
+                },
+            ],
+        )
+
+    def test_show_parser(self):
+        package = show_parser(APT_SHOW)
+        self.assertEqual(package["Depends"], ["python3:any", "python3-six"])
+        self.assertIn("Dstat is", package["Description"])
+
+    def test_gpo_parser(self):
+        gpos = gpo_parser(GPO_LISTALL)
+        self.assertEqual(list(gpos.keys()), ["{31B2F340-016D-11D2-945F-00C04FB984F9}",
+                                             "{6AC1786C-016F-11D2-945F-00C04FB984F9}"])
+        self.assertEqual(gpos["{6AC1786C-016F-11D2-945F-00C04FB984F9}"]["display_name"],
+                         "Default Domain Controllers Policy")
+        self.assertEqual(dict(gpo_stream_parser(iter_lines([GPO_LISTALL.encode()]))), gpos)
+
+    def test_service_parser(self):
+        services = service_parser(SYSTEMCTL)
+        self.assertEqual(services[0]["description"], "OpenBSD Secure Shell server")
+
+    def test_iter_lines_multibyte(self):
+        data = "ğüşiöç\nPardus\n".encode()
+        chunks = [data[i:i + 1] for i in range(len(data))]
+        self.assertEqual(list(iter_lines(chunks)), ["ğüşiöç", "Pardus"])
+
+
+if __name__ == "__main__":
+    unittest.main()
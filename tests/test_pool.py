@@ -0,0 +1,177 @@
+import getpass
+import threading
+import time
+import unittest
+
+from post import JumpHost, SSHConnectionPool, SSHConnector
+
+
+class FakeTransport:
+    def __init__(self):
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+    def is_authenticated(self):
+        return True
+
+    def send_ignore(self):
+        pass
+
+
+class FakeChannel:
+    def __init__(self, destination):
+        self.destination = destination
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    def __init__(self):
+        self.transport = FakeTransport()
+        self.transport.open_channel = lambda kind, destination, origin, timeout=None: FakeChannel(destination)
+        self.closed = False
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.closed = True
+        self.transport.active = False
+
+
+class TestSSHConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.POOL = SSHConnectionPool(max_per_host=2, max_leases_per_client=2, idle_timeout=60)
+        self.dialed = []
+
+    def factory(self):
+        client = FakeClient()
+        self.dialed.append(client)
+        return client
+
+    def test_reuse(self):
+        first = self.POOL.acquire("10.0.0.1", 22, "pardus", self.factory)
+        second = self.POOL.acquire("10.0.0.1", 22, "pardus", self.factory)
+        self.assertIs(first, second)
+        self.assertEqual(len(self.dialed), 1)
+
+    def test_key(self):
+        first = self.POOL.acquire("10.0.0.1", 22, "pardus", self.factory)
+        second = self.POOL.acquire("10.0.0.1", 22, "root", self.factory)
+        self.assertIsNot(first, second)
+        self.assertEqual(len(self.dialed), 2)
+
+    def test_credentials(self):
+        first = self.POOL.acquire("10.0.0.1", 22, "pardus", self.factory, "first")
+        second = self.POOL.acquire("10.0.0.1", 22, "pardus", self.factory, "second")
+        self.assertIsNot(first, second)
+        self.assertEqual(len(self.dialed), 2)
+
+    def test_connector_credentials(self):
+        pool = self.POOL
+        factory = self.factory
+
+        class FakeConnector(SSHConnector):
+            def _new_client(self):
+                return factory()
+
+        FakeConnector("10.0.0.1", 22, "pardus", "right", pool=pool, keepalive=0, metrics=None)
+        FakeConnector("10.0.0.1", 22, "pardus", "wrong", pool=pool, keepalive=0, metrics=None)
+        FakeConnector("10.0.0.1", 22, "pardus", "right", pool=pool, keepalive=0, metrics=None)
+        self.assertEqual(len(self.dialed), 2)
+
+    def test_reconnect_shared(self):
+        pool = self.POOL
+        factory = self.factory
+
+        class FakeConnector(SSHConnector):
+            def _new_client(self):
+                return factory()
+
+        first = FakeConnector("10.0.0.1", 22, "pardus", "passwd", pool=pool, keepalive=0, metrics=None)
+        second = FakeConnector("10.0.0.1", 22, "pardus", "passwd", pool=pool, keepalive=0, metrics=None)
+        self.assertIs(first.client, second.client)
+
+        first.reconnect()
+        self.assertFalse(second.client.closed)
+        self.assertIs(first.client, second.client)
+
+        second.client.transport.active = False
+        second.reconnect()
+        self.assertTrue(first.client.closed)
+        self.assertIsNot(first.client, second.client)
+
+    def test_max_per_host(self):
+        clients = [self.POOL.acquire("10.0.0.1", 22, "pardus", self.factory) for _ in range(6)]
+        self.assertEqual(len(self.dialed), 2)
+        self.assertEqual(len(set(map(id, clients))), 2)
+
+    def test_dead_client(self):
+        first = self.POOL.acquire("10.0.0.1", 22, "pardus", self.factory)
+        first.transport.active = False
+        second = self.POOL.acquire("10.0.0.1", 22, "pardus", self.factory)
+        self.assertIsNot(first, second)
+        self.assertTrue(first.closed)
+
+    def test_idle_timeout(self):
+        pool = SSHConnectionPool(idle_timeout=0)
+        client = pool.acquire("10.0.0.1", 22, "pardus", self.factory)
+        pool.release(client)
+        self.assertEqual(pool.prune(), 1)
+        self.assertTrue(client.closed)
+        self.assertEqual(len(pool), 0)
+
+    def test_close_all(self):
+        client = self.POOL.acquire("10.0.0.1", 22, "pardus", self.factory)
+        self.POOL.close_all()
+        self.assertTrue(client.closed)
+        self.assertEqual(len(self.POOL), 0)
+
+    def test_concurrent_dial(self):
+        pool = SSHConnectionPool(max_per_host=1)
+
+        def slow_factory():
+            time.sleep(0.1)
+            return self.factory()
+
+        threads = [threading.Thread(target=pool.acquire, args=("10.0.0.1", 22, "pardus", slow_factory))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.dialed), 1)
+
+
+class TestJumpHost(unittest.TestCase):
+    def test_shared_transport(self):
+        pool = SSHConnectionPool(max_per_host=1)
+        jump = JumpHost("bastion", 22, "pardus", "pardus", pool=pool)
+        jump._new_client = FakeClient
+
+        channels = [jump.open_channel(f"10.0.0.{i}", 22) for i in range(1, 101)]
+        self.assertEqual(len(pool), 1)
+        self.assertEqual(len(jump), 100)
+        self.assertEqual(channels[4].destination, ("10.0.0.5", 22))
+
+        jump.release(channels[0])
+        self.assertTrue(channels[0].closed)
+        channels[1].closed = True
+        self.assertEqual(jump.reap(), 1)
+        self.assertEqual(len(jump), 98)
+
+        jump.close()
+        self.assertEqual(len(jump), 0)
+        self.assertTrue(all(channel.closed for channel in channels))
+
+    def test_default_user(self):
+        self.assertEqual(JumpHost("bastion").user, getpass.getuser())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import time
+import unittest
+
+from post import Apt, AptList, LocalConnector, RecordingConnector, ReplayConnector
+from post.connection.recording import load_records
+from post.utils.error import NotFound
+
+
+class TestRecording(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "recording.jsonl")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        recorder = RecordingConnector(LocalConnector("", metrics=None), self.path)
+        recorder.run("echo first")
+        recorder.run("false")
+        self.assertEqual(list(recorder.run_stream("printf 'a\\nb\\n'")), ["a", "b"])
+        self.assertEqual(list(recorder.run_stream("echo failed >&2; exit 3")), [])
+        recorder.run_many(["echo one", "echo two"])
+        recorder.close()
+
+        replay = ReplayConnector(self.path, metrics=None)
+        self.assertEqual(replay.run("echo first").read(), b"first\n")
+        self.assertEqual(replay.run("false").exit_code, 1)
+        self.assertEqual(list(replay.run_stream("printf 'a\\nb\\n'")), ["a", "b"])
+        failed = replay.run("echo failed >&2; exit 3")
+        self.assertEqual((failed.exit_code, failed.stderr), (3, b"failed\n"))
+        self.assertEqual([result.read() for result in replay.run_many(["echo two", "echo one"])],
+                         [b"two\n", b"one\n"])
+
+        with self.assertRaises(NotFound):
+            replay.sudo_run("echo first")
+
+        self.assertEqual(ReplayConnector(self.path, strict=False, metrics=None).run("missing").exit_code, 127)
+
+    def test_order_and_uuid(self):
+        recorder = RecordingConnector(LocalConnector("", metrics=None), self.path)
+        recorder.run("echo 1 # /tmp/.post-0123456789abcdef0123456789abcdef")
+        recorder.run("echo 2 # /tmp/.post-0123456789abcdef0123456789abcdef")
+        recorder.close()
+
+        replay = ReplayConnector(self.path, metrics=None)
+        self.assertEqual(replay.run("echo 1 # /tmp/.post-ffffffffffffffffffffffffffffffff").read(), b"1\n")
+        replay.rewind()
+        self.assertEqual(replay.run("echo 1 # /tmp/.post-ffffffffffffffffffffffffffffffff").read(), b"1\n")
+
+    def test_fleet(self):
+        with open(self.path, "w") as f:
+            f.write('{"sudo": true, "command": "apt list", "exit_code": 0, '
+                    '"stdout": "YmFzaC9zdGFibGUsbm93IDUuMiBhbWQ2NCBbaW5zdGFsbGVkXQo=", "stderr": "", '
+                    '"wall_time": 0.05}\n')
+
+        records = load_records(self.path)
+        connectors = [ReplayConnector(records, address=f"10.0.{i // 256}.{i % 256}", latency=0.01, metrics=None)
+                      for i in range(1000)]
+        start = time.monotonic()
+        packages = AptList([Apt(connector, cache=None) for connector in connectors]).list()
+        self.assertLess(time.monotonic() - start, 30)
+        self.assertEqual(len(packages), 1000)
+        self.assertTrue(all(value[0]["package"] == "bash" for value in packages.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
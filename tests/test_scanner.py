@@ -0,0 +1,126 @@
+import asyncio
+import socket
+import threading
+import unittest
+from unittest import mock
+
+import paramiko
+
+from post import Scanner, nmap
+from post.utils import scanner as scanner_module
+from post.utils.scanner import (AdaptiveTimeout, ScanResult, classify_banner, fingerprint, parse_networks, parse_target,
+                                read_identification)
+
+
+class TestScanner(unittest.TestCase):
+    def setUp(self):
+        self.listeners = []
+        for _ in range(2):
+            listener = socket.socket()
+            listener.bind(("127.0.0.1", 0))
+            listener.listen()
+            self.listeners.append(listener)
+
+        self.ports = [listener.getsockname()[1] for listener in self.listeners]
+
+    def tearDown(self):
+        for listener in self.listeners:
+            listener.close()
+
+    def test_parse(self):
+        self.assertEqual([str(each) for each in parse_target("10.0.0.0/30")], ["10.0.0.1", "10.0.0.2"])
+        self.assertEqual([str(each) for each in parse_target("10.0.0.10-20")], ["10.0.0.10", "10.0.0.20"])
+        self.assertEqual([str(each) for each in parse_target("10.0.0.7")], ["10.0.0.7", "10.0.0.7"])
+        self.assertEqual([str(each) for each in parse_networks(["10.0.0.0/30", "10.0.0.4-7"])], ["10.0.0.0/29"])
+
+        with self.assertRaises(ValueError):
+            parse_target("10.0.0.20-10")
+
+        with self.assertRaises(ValueError):
+            Scanner("10.0.0.0/24", ports=[70000])
+
+    def test_without_resource(self):
+        with mock.patch.object(scanner_module, "resource", None):
+            self.assertEqual(Scanner("10.0.0.0/24", concurrency=100000).concurrency, 100000)
+
+    def test_total(self):
+        scanner = Scanner(["10.0.0.0/24", "10.0.1.1-10"], ports=[22, 2222], exclude=["10.0.0.128/25", "10.0.1.5"])
+        self.assertEqual(scanner.total, (127 + 9) * 2)
+        self.assertEqual(len(list(scanner.addresses())), 127 + 9)
+
+    def test_run(self):
+        scanner = Scanner("127.0.0.1-3", ports=self.ports + [1], exclude=["127.0.0.2"], banners=False)
+        results = scanner.run()
+        self.assertEqual([(result.address, result.port) for result in results],
+                         [("127.0.0.1", port) for port in sorted(self.ports)])
+        self.assertEqual(scanner.scanned, scanner.total)
+        self.assertEqual(nmap(127, 0, 0, 1, 1, port=self.ports[0]), ["127.0.0.1"])
+
+        with mock.patch.object(scanner_module, "Scanner", wraps=Scanner) as wrapped:
+            nmap(127, 0, 0, 1, 1, port=self.ports[0])
+            self.assertEqual(wrapped.call_args.kwargs["min_timeout"], 1.0)
+
+    def test_stream(self):
+        scanner = Scanner("127.0.0.1", ports=self.ports, rate=50, banners=False)
+        found = [result for result in scanner.stream(heartbeat=0.01) if result is not None]
+        self.assertEqual(sorted(result.port for result in found), sorted(self.ports))
+
+        async def first():
+            async for result in Scanner("127.0.0.0/29", ports=self.ports, banners=False).scan():
+                return result
+
+        self.assertIn(asyncio.run(first()).port, self.ports)
+
+    def test_banner(self):
+        def serve(listener, lines):
+            connection, _ = listener.accept()
+            connection.sendall(lines)
+            connection.recv(100)
+            connection.close()
+
+        banners = [b"Welcome\r\nSSH-2.0-OpenSSH_9.2p1 Debian-2+deb12u3\r\n", b"220 ftp ready\r\n"]
+        threads = [threading.Thread(target=serve, args=(listener, lines))
+                   for listener, lines in zip(self.listeners, banners)]
+        for thread in threads:
+            thread.start()
+
+        results = Scanner("127.0.0.1", ports=self.ports, banner_timeout=0.5).run()
+        for thread in threads:
+            thread.join()
+
+        banner = {result.port: result for result in results}
+        ssh, ftp = banner[self.ports[0]], banner[self.ports[1]]
+        self.assertEqual(ssh.banner, "SSH-2.0-OpenSSH_9.2p1 Debian-2+deb12u3")
+        self.assertTrue(ssh.is_ssh)
+        self.assertEqual(ssh.summary, "OpenSSH 9.2p1, Debian 12")
+        self.assertTrue(ssh.matches("debian 12"))
+        self.assertEqual((ftp.banner, ftp.is_ssh, ftp.matches("debian")), ("220 ftp ready", False, False))
+
+    def test_classify(self):
+        self.assertEqual(classify_banner("SSH-2.0-OpenSSH_8.9p1 Ubuntu-3ubuntu0.10"),
+                         {"protocol": "2.0", "software": "OpenSSH", "version": "8.9p1", "os": "Ubuntu"})
+        self.assertEqual(classify_banner("SSH-2.0-OpenSSH_for_Windows_8.1")["os"], "Windows")
+        self.assertEqual(classify_banner("SSH-2.0-dropbear_2022.83")["version"], "2022.83")
+        self.assertEqual(classify_banner("SSH-2.0-OpenSSH_9.2p1 Pardus-1")["os"], "Pardus")
+        self.assertIsNone(classify_banner(None)["software"])
+        self.assertIsNone(read_identification(b""))
+        self.assertEqual(read_identification(b"SSH-2.0-OpenSSH_9.2p1\r\n"), "SSH-2.0-OpenSSH_9.2p1")
+
+        key = paramiko.RSAKey.generate(1024)
+        self.assertEqual(fingerprint(key), key.fingerprint)
+        result = ScanResult("10.0.0.1", 22, 0.01, "SSH-2.0-OpenSSH_9.2p1", key.get_name(), fingerprint(key))
+        self.assertTrue(result.matches("rsa"))
+
+    def test_adaptive_timeout(self):
+        timeout = AdaptiveTimeout(maximum=1.0, minimum=0.05)
+        self.assertEqual(timeout.value, 1.0)
+        for _ in range(20):
+            timeout.observe(0.01)
+
+        self.assertAlmostEqual(timeout.value, 0.05, places=2)
+        timeout.observe(5.0)
+        self.assertEqual(timeout.value, 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
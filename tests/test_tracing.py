@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+import unittest
+
+from post import LocalConnector
+from post.utils.tracing import GLOBAL_TRACER, traced_methods
+
+
+@traced_methods
+class Manager:
+    def __init__(self, connector):
+        self.connector = connector
+
+    def outer(self):
+        self.connector.run("echo outer")
+        return self.inner()
+
+    def inner(self):
+        return list(self.lines())
+
+    def lines(self):
+        yield from self.connector.run_stream("printf 'a\\nb\\n'")
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        GLOBAL_TRACER.clear()
+        GLOBAL_TRACER.enable()
+
+    def tearDown(self):
+        GLOBAL_TRACER.disable()
+        GLOBAL_TRACER.clear()
+
+    def test_tree(self):
+        manager = Manager(LocalConnector("", metrics=None))
+        self.assertEqual(manager.outer(), ["a", "b"])
+
+        spans = {span.name: span for span in GLOBAL_TRACER.spans()}
+        self.assertEqual(set(spans), {"Manager.__init__", "Manager.outer", "Manager.inner", "Manager.lines", "echo",
+                                      "printf"})
+        self.assertIsNone(spans["Manager.outer"].parent_id)
+        self.assertEqual(spans["echo"].parent_id, spans["Manager.outer"].span_id)
+        self.assertEqual(spans["Manager.inner"].parent_id, spans["Manager.outer"].span_id)
+        self.assertEqual(spans["Manager.lines"].parent_id, spans["Manager.inner"].span_id)
+        self.assertEqual(spans["printf"].parent_id, spans["Manager.lines"].span_id)
+        self.assertEqual(spans["echo"].attributes["exit_code"], 0)
+        self.assertIsNone(GLOBAL_TRACER.current())
+
+    def test_chrome_trace(self):
+        Manager(LocalConnector("", metrics=None)).outer()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.json")
+            GLOBAL_TRACER.write_chrome_trace(path)
+            with open(path) as f:
+                trace = json.load(f)
+
+        events = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+        self.assertEqual(len(events), 6)
+        self.assertEqual(events[0]["name"], "Manager.__init__")
+        self.assertTrue(all(event["dur"] >= 0 for event in events))
+
+    def test_commands_redacted(self):
+        connector = LocalConnector("", metrics=None)
+        connector.run("echo 'user:secret'")
+        self.assertNotIn("command", GLOBAL_TRACER.spans()[0].attributes)
+
+        GLOBAL_TRACER.record_commands = True
+        try:
+            connector.run("echo 'user:secret'")
+        finally:
+            GLOBAL_TRACER.record_commands = False
+        self.assertEqual(GLOBAL_TRACER.spans()[1].attributes["command"], "echo 'user:secret'")
+
+    def test_disabled(self):
+        GLOBAL_TRACER.disable()
+        Manager(LocalConnector("", metrics=None)).outer()
+        self.assertEqual(GLOBAL_TRACER.spans(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()